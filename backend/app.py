@@ -3,6 +3,7 @@ from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from config import config
 import os
+from utils.auth_utils import jwt_required_custom
 from routes.appointments import appointments_bp
 
 def create_app(config_name='development'):
@@ -27,6 +28,26 @@ def create_app(config_name='development'):
     # Initialize extensions
     CORS(app, origins=app.config['CORS_ORIGINS'], supports_credentials=True, allow_headers=["Content-Type", "Authorization"], methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
     jwt = JWTManager(app)
+
+    # Share one pooled DB connection per request (released on teardown)
+    from utils.database import init_app as init_database
+    init_database(app)
+
+    # Load the table/column names used to pick queries for older schemas
+    from utils.schema_registry import init_app as init_schema_registry
+    init_schema_registry(app)
+
+    # Resume queued report OCR/AI jobs left over from a previous run
+    from utils.report_jobs import init_app as init_report_jobs
+    init_report_jobs(app)
+
+    # Return beds from expired holds
+    from utils.bed_reservations import init_app as init_bed_reservations
+    init_bed_reservations(app)
+
+    # Notify hospitals as unanswered SOS requests widen their radius
+    from utils.sos_escalation import init_app as init_sos_escalation
+    init_sos_escalation(app)
     
     # Register blueprints (routes)
     from routes.auth import auth_bp
@@ -77,6 +98,52 @@ def create_app(config_name='development'):
     def health():
         return jsonify({'status': 'healthy'}), 200
     
+    # Per-worker metrics: DB pool state, query fingerprints, endpoint histograms, slow log, RSS/upload spooling, SOS escalation
+    @app.route('/metrics')
+    def metrics():
+        import hmac
+        import ipaddress
+        from flask import request
+
+        # Fail closed: METRICS_TOKEN or an admin JWT. Without a token configured,
+        # only debug runs and direct loopback requests (not via a proxy) get in.
+        token = app.config.get('METRICS_TOKEN')
+        if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return _metrics_payload()
+        if not token:
+            try:
+                loopback = ipaddress.ip_address(request.remote_addr or '').is_loopback
+            except ValueError:
+                loopback = False
+            if app.debug or (loopback and not request.headers.get('X-Forwarded-For')):
+                return _metrics_payload()
+        return _admin_metrics()
+
+    @jwt_required_custom
+    def _admin_metrics():
+        from flask_jwt_extended import get_jwt_identity
+
+        if not str(get_jwt_identity() or '').startswith('admin_'):
+            return jsonify({'error': 'Admin access required'}), 403
+        return _metrics_payload()
+
+    def _metrics_payload():
+        from flask import request
+        from utils.database import get_pool
+        from utils.db_metrics import metrics as query_metrics
+        from utils.report_cache import get_report_cache
+        from utils.sos_escalation import get_escalation_scheduler
+        from utils.upload_spool import memory_stats
+
+        top = request.args.get('top', 50, type=int)
+        payload = query_metrics.snapshot(top=max(1, min(top, 500)))
+        payload['pool'] = get_pool().stats()
+        payload['report_cache'] = get_report_cache().stats()
+        payload['memory'] = memory_stats()
+        payload['sos_escalation'] = get_escalation_scheduler().metrics.snapshot()
+        payload['pid'] = os.getpid()
+        return jsonify(payload), 200
+
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
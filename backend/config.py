@@ -26,7 +26,18 @@ class Config:
     DB_USER = os.getenv('DB_USER', 'root')
     DB_PASSWORD = os.getenv('DB_PASSWORD', '')
     DB_NAME = os.getenv('DB_NAME', 'pocketcare_db')
-    
+
+    # Connection pool settings (per worker process)
+    DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 1))
+    DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))  # seconds to wait for a free connection
+    DB_POOL_RECYCLE_SECONDS = int(os.getenv('DB_POOL_RECYCLE_SECONDS', 300))  # close connections idle longer than this
+    DB_POOL_PING_INTERVAL = float(os.getenv('DB_POOL_PING_INTERVAL', 5))  # ping on borrow if idle longer than this
+
+    # Query instrumentation
+    DB_SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', 200))  # log statements slower than this
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')  # /metrics takes "Authorization: Bearer <token>" or an admin JWT; unset = debug/loopback only
+
     # Construct database URI
     SQLALCHEMY_DATABASE_URI = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
@@ -36,11 +47,67 @@ class Config:
     
     # API Keys
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
+
+    # AI gateway (shared keep-alive session for all Gemini calls)
+    GEMINI_API_BASE_URL = os.getenv('GEMINI_API_BASE_URL', 'https://generativelanguage.googleapis.com/v1beta')  # point at a local stub for tests
+    AI_CONNECT_TIMEOUT = float(os.getenv('AI_CONNECT_TIMEOUT', 5))
+    AI_READ_TIMEOUT = float(os.getenv('AI_READ_TIMEOUT', 60))
+    AI_MAX_RETRIES = int(os.getenv('AI_MAX_RETRIES', 2))  # retries on 429/5xx/network errors, jittered backoff
+    AI_HTTP_POOL_SIZE = int(os.getenv('AI_HTTP_POOL_SIZE', 10))
+    # Classify + explain reports in one structured-output call (two-step path is the fallback)
+    GEMINI_COMBINED_REPORT_CALL = os.getenv('GEMINI_COMBINED_REPORT_CALL', 'true').strip().lower() in ('1', 'true', 'yes')
     
     # File upload settings
     MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', 10485760))  # 10MB default
     UPLOAD_FOLDER = 'uploads'
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'pdf'}
+    UPLOAD_SPOOL_THRESHOLD = int(os.getenv('UPLOAD_SPOOL_THRESHOLD', 1048576))  # uploads above this go to a temp file (1MB)
+    UPLOAD_SPOOL_DIR = os.getenv('UPLOAD_SPOOL_DIR', os.path.join(UPLOAD_FOLDER, 'spool'))
+    UPLOAD_MEMORY_BUDGET = int(os.getenv('UPLOAD_MEMORY_BUDGET', 16777216))  # in-memory upload bytes per worker before spooling everything (16MB)
+
+    # Report OCR (multi-page PDFs are OCR'd on a process pool)
+    OCR_WORKERS = int(os.getenv('OCR_WORKERS', min(4, os.cpu_count() or 1)))  # processes per backend worker; 0 = inline
+    OCR_PAGE_TIMEOUT = float(os.getenv('OCR_PAGE_TIMEOUT', 60))  # seconds per page
+    OCR_PDF_TEXT_LAYER = os.getenv('OCR_PDF_TEXT_LAYER', 'true').strip().lower() in ('1', 'true', 'yes')  # use embedded PDF text, OCR only pages without it
+    OCR_PDF_MIN_TEXT_CHARS = int(os.getenv('OCR_PDF_MIN_TEXT_CHARS', 40))  # less native text than this -> OCR the page
+    OCR_MIN_DPI = float(os.getenv('OCR_MIN_DPI', 150))  # upscale low-DPI scans (max 2x) up to this
+    OCR_MAX_DPI = float(os.getenv('OCR_MAX_DPI', 300))  # downscale larger images (e.g. phone photos) to this
+    OCR_OSD = os.getenv('OCR_OSD', 'true').strip().lower() in ('1', 'true', 'yes')  # detect 90/180/270 rotation with Tesseract OSD
+    OCR_BINARIZE = os.getenv('OCR_BINARIZE', 'true').strip().lower() in ('1', 'true', 'yes')  # adaptive (local mean) threshold before OCR
+
+    # Report simplification result cache (keyed on file SHA-256 + model)
+    REPORT_CACHE_MAX_ENTRIES = int(os.getenv('REPORT_CACHE_MAX_ENTRIES', 256))
+    REPORT_CACHE_MAX_BYTES = int(os.getenv('REPORT_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    REPORT_CACHE_DIR = os.getenv('REPORT_CACHE_DIR', '')  # optional disk persistence (stores report text)
+    REPORT_CACHE_DISK_MAX_BYTES = int(os.getenv('REPORT_CACHE_DISK_MAX_BYTES', 256 * 1024 * 1024))
+
+    # Background report jobs (POST /api/reports/jobs)
+    REPORT_JOB_WORKERS = int(os.getenv('REPORT_JOB_WORKERS', 2))  # threads per worker process
+    REPORT_JOB_DIR = os.getenv('REPORT_JOB_DIR', os.path.join('uploads', 'report_jobs'))  # uploads + rendered pages
+    REPORT_JOB_STALE_SECONDS = int(os.getenv('REPORT_JOB_STALE_SECONDS', 600))  # running jobs idle this long are resumed at startup
+    REPORT_JOB_WORKDIR_TTL_SECONDS = int(os.getenv('REPORT_JOB_WORKDIR_TTL_SECONDS', 86400))  # files of failed/cancelled jobs kept this long (0 = never swept)
+
+    # Hospital search: in-memory spatial index of hospital coordinates (per worker)
+    HOSPITAL_INDEX_ENABLED = os.getenv('HOSPITAL_INDEX_ENABLED', 'true').strip().lower() in ('1', 'true', 'yes')  # false = bounding-box SQL on idx_location
+    HOSPITAL_INDEX_CELL_DEG = float(os.getenv('HOSPITAL_INDEX_CELL_DEG', 0.1))  # grid cell size in degrees (~11km)
+    HOSPITAL_INDEX_REFRESH_SECONDS = float(os.getenv('HOSPITAL_INDEX_REFRESH_SECONDS', 30))  # pull newly created hospitals
+    HOSPITAL_INDEX_REBUILD_SECONDS = float(os.getenv('HOSPITAL_INDEX_REBUILD_SECONDS', 600))  # full reload (catches edits from other workers)
+    HOSPITAL_CATALOG_TTL_SECONDS = float(os.getenv('HOSPITAL_CATALOG_TTL_SECONDS', 60))  # cached listing + filter indexes; writes in this worker invalidate it
+
+    # SOS registry (in-memory grid of open requests) and push to hospital dashboards
+    # (GET /api/hospital/emergency/stream); each open stream holds a worker thread
+    SOS_STREAM_SYNC_SECONDS = float(os.getenv('SOS_STREAM_SYNC_SECONDS', 2))  # one pending-SOS query per worker per interval (changes from other workers)
+    SOS_STREAM_HEARTBEAT_SECONDS = float(os.getenv('SOS_STREAM_HEARTBEAT_SECONDS', 15))
+    SOS_STREAM_MAX_SECONDS = float(os.getenv('SOS_STREAM_MAX_SECONDS', 300))  # clients reconnect after this
+    SOS_ESCALATION_ENABLED = os.getenv('SOS_ESCALATION_ENABLED', 'true').strip().lower() in ('1', 'true', 'yes')  # background thread notifying hospitals on each radius expansion
+    SOS_ESCALATION_QUEUE_SIZE = int(os.getenv('SOS_ESCALATION_QUEUE_SIZE', 1000))  # pending notifications; more are dropped (and counted)
+
+    # Bed reservations: holds set a bed aside until confirmed or expired
+    BED_HOLD_TTL_SECONDS = int(os.getenv('BED_HOLD_TTL_SECONDS', 300))
+    BED_HOLD_SWEEP_SECONDS = float(os.getenv('BED_HOLD_SWEEP_SECONDS', 60))  # background release of expired holds; 0 = only when a ward looks full
+
+    # Cached table/column names (picks query variants for partially-migrated schemas)
+    SCHEMA_REGISTRY_REFRESH_SECONDS = float(os.getenv('SCHEMA_REGISTRY_REFRESH_SECONDS', 300))  # also reloaded when a query still hits a schema error
 
 
 class DevelopmentConfig(Config):
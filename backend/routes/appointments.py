@@ -1,6 +1,7 @@
 
 from flask import Blueprint, request, jsonify
 from utils.database import get_db_connection
+from utils.schema_registry import get_schema_registry
 from flask_jwt_extended import get_jwt_identity, jwt_required
 import re
 import pymysql
@@ -70,7 +71,7 @@ def get_doctors():
         max_fee = request.args.get('max_fee')
 
         # Only select non-sensitive columns. Some deployments may have an older
-        # doctors table missing optional columns, so detect which ones exist.
+        # doctors table missing optional columns, so select only the ones that exist.
         desired_columns = [
             'id',
             'name',
@@ -85,21 +86,9 @@ def get_doctors():
             'is_available',
         ]
 
-        cursor.execute('SELECT DATABASE() AS db')
-        row = cursor.fetchone() or {}
-        db_name = row.get('db')
-
-        existing_columns = set()
-        if db_name:
-            cursor.execute(
-                """
-                SELECT COLUMN_NAME
-                FROM INFORMATION_SCHEMA.COLUMNS
-                WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'doctors'
-                """,
-                (db_name,),
-            )
-            existing_columns = {r.get('COLUMN_NAME') for r in (cursor.fetchall() or []) if r.get('COLUMN_NAME')}
+        # Cached per worker (utils/schema_registry.py) instead of an
+        # INFORMATION_SCHEMA lookup per request; None/empty = unknown, select all.
+        existing_columns = get_schema_registry().columns('doctors') or set()
 
         selected_columns = [c for c in desired_columns if (not existing_columns) or (c in existing_columns)]
         # Safety: always include minimal identifiers
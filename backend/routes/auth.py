@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify, send_from_directory
 from flask_jwt_extended import create_access_token, get_jwt_identity
-from utils.database import execute_query
+from utils.database import execute_query, stream_query
+from utils.geo_index import get_hospital_locator
+from utils.hospital_catalog import invalidate_hospital_catalog
+from utils.pagination import decode_cursor, keyset_condition, split_page
 from utils.auth_utils import hash_password, verify_password, jwt_required_custom
 from utils.validators import validate_email_format, validate_password_strength, validate_required_fields
 from datetime import datetime
@@ -978,6 +981,10 @@ def admin_create_hospital():
             commit=True,
         )
 
+        # Make the new hospital searchable by location right away in this worker
+        get_hospital_locator().upsert(hospital_id, latitude, longitude)
+        invalidate_hospital_catalog()
+
         return jsonify({
             'message': 'Hospital account created',
             'hospital': {
@@ -1457,7 +1464,8 @@ def admin_symptoms_analytics():
 
         series = _fill_daily_series(start, days, by_day, {'total': 0, 'low': 0, 'medium': 0, 'high': 0})
 
-        rows = execute_query(
+        # Streamed from a server-side cursor; only the counters stay in memory.
+        rows = stream_query(
             """
             SELECT symptoms
             FROM symptom_logs
@@ -1465,11 +1473,10 @@ def admin_symptoms_analytics():
             LIMIT 5000
             """,
             (start,),
-            fetch_all=True,
         )
 
         counts = {}
-        for r in rows or []:
+        for r in rows:
             raw = (r.get('symptoms') or '').strip().lower()
             if not raw:
                 continue
@@ -1512,20 +1519,19 @@ def admin_weight_analytics():
             fetch_one=True,
         ) or {}
 
-        entries = execute_query(
+        entries = stream_query(
             """
             SELECT user_id, entry_date
             FROM weight_entries
             WHERE entry_date >= %s
             """,
             (start,),
-            fetch_all=True,
         )
 
         by_week = {}
         users_set = set()
 
-        for r in entries or []:
+        for r in entries:
             user_id = r.get('user_id')
             dt = r.get('entry_date')
             if user_id is not None:
@@ -1669,8 +1675,12 @@ def admin_get_all_users():
     try:
         search = request.args.get('search', '')
         page = request.args.get('page', 1, type=int)
-        limit = request.args.get('limit', 20, type=int)
-        offset = (page - 1) * limit
+        limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+        offset = max(0, (page - 1) * limit)
+        try:
+            position = decode_cursor(request.args.get('cursor'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Get total count
         count_query = """
@@ -1682,18 +1692,27 @@ def admin_get_all_users():
         total = count_result['total'] if count_result else 0
         
         # Get users
-        query = """
+        # Keyset pagination on (created_at, id): pass next_cursor back as
+        # ?cursor=. Plain ?page=N (OFFSET) is still accepted for old clients.
+        after_sql, after_params = keyset_condition('created_at', 'id', position)
+        query = f"""
             SELECT id, email, name, phone, date_of_birth, gender, blood_group, 
                    COALESCE(is_blocked, FALSE) as is_blocked, created_at
             FROM users
-            WHERE (%s = '' OR name LIKE %s OR email LIKE %s)
-            ORDER BY created_at DESC
-            LIMIT %s OFFSET %s
+            WHERE (%s = '' OR name LIKE %s OR email LIKE %s){after_sql}
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s
         """
-        users = execute_query(query, (search, search_pattern, search_pattern, limit, offset), fetch_all=True)
+        query_params = (search, search_pattern, search_pattern, *after_params, limit + 1)
+        if position is None and offset > 0:
+            query += " OFFSET %s"
+            query_params += (offset,)
+        rows = execute_query(query, query_params, fetch_all=True)
+        users, next_cursor = split_page(rows, limit, ts_key='created_at')
         
         return jsonify({
-            'users': users or [],
+            'users': users,
+            'next_cursor': next_cursor,
             'total': total,
             'page': page,
             'limit': limit,
@@ -1714,8 +1733,12 @@ def admin_get_all_doctors():
     try:
         search = request.args.get('search', '')
         page = request.args.get('page', 1, type=int)
-        limit = request.args.get('limit', 20, type=int)
-        offset = (page - 1) * limit
+        limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+        offset = max(0, (page - 1) * limit)
+        try:
+            position = decode_cursor(request.args.get('cursor'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Get total count
         count_query = """
@@ -1727,19 +1750,28 @@ def admin_get_all_doctors():
         total = count_result['total'] if count_result else 0
         
         # Get doctors
-        query = """
+        # Keyset pagination on (created_at, id): pass next_cursor back as
+        # ?cursor=. Plain ?page=N (OFFSET) is still accepted for old clients.
+        after_sql, after_params = keyset_condition('created_at', 'id', position)
+        query = f"""
             SELECT id, email, name, phone, specialty, qualification, experience, 
                    rating, consultation_fee, is_available,
                    COALESCE(is_blocked, FALSE) as is_blocked, created_at
             FROM doctors
-            WHERE (%s = '' OR name LIKE %s OR email LIKE %s OR specialty LIKE %s)
-            ORDER BY created_at DESC
-            LIMIT %s OFFSET %s
+            WHERE (%s = '' OR name LIKE %s OR email LIKE %s OR specialty LIKE %s){after_sql}
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s
         """
-        doctors = execute_query(query, (search, search_pattern, search_pattern, search_pattern, limit, offset), fetch_all=True)
+        query_params = (search, search_pattern, search_pattern, search_pattern, *after_params, limit + 1)
+        if position is None and offset > 0:
+            query += " OFFSET %s"
+            query_params += (offset,)
+        rows = execute_query(query, query_params, fetch_all=True)
+        doctors, next_cursor = split_page(rows, limit, ts_key='created_at')
         
         return jsonify({
-            'doctors': doctors or [],
+            'doctors': doctors,
+            'next_cursor': next_cursor,
             'total': total,
             'page': page,
             'limit': limit,
@@ -1,27 +1,49 @@
 
-import pymysql
-import requests
-from flask import Blueprint, request, jsonify
+import json
+import time
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from config import Config
-import os
+from utils.ai_gateway import get_gateway
+from utils.database import execute_query, stream_query
+from utils.pagination import decode_cursor, keyset_condition, parse_limit, split_page
+from utils.streaming import stream_json_response, wants_ndjson
 
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', Config.GEMINI_API_KEY)
-GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key=" + GEMINI_API_KEY
+CHAT_MODEL = "gemini-2.5-flash"
 
-DB_CONFIG = {
-    "host": Config.DB_HOST,
-    "user": Config.DB_USER,
-    "password": Config.DB_PASSWORD,
-    "database": Config.DB_NAME,
-    "port": int(Config.DB_PORT)
-}
+chat_bp = Blueprint('chat', __name__)
 
-def get_db_connection():
-    conn = pymysql.connect(**DB_CONFIG, cursorclass=pymysql.cursors.DictCursor)
-    return conn
 
-chat_bp = Blueprint('chat', __name__)
+def _sage_prompt(user_message):
+    return (
+        "Your name is Sage, an AI health assistant. Always respond to this if someone ask your name."
+        "You are a professional health assistant. Only answer health-related questions. "
+        "If the question is not about health, politely say with an apology that you can only answer health-related queries. "
+        "Keep your answers short, clear, and professional. "
+        "Always format your response using bullet points or numbered lists for clarity. "
+        "Avoid long paragraphs. Organize information so it's easy to read, like ChatGPT or Gemini web UI.\n\n"
+        f"User: {user_message}"
+    )
+
+
+def _save_chat_turn(user_id, user_message, ai_text=None):
+    """Persist a chat turn in one round trip and return the DB time in ms.
+
+    The user message and (when available) the AI reply are written with a
+    single multi-row INSERT on a pooled connection.
+    """
+    rows = [(user_id, 'user', user_message)]
+    if ai_text is not None:
+        rows.append((user_id, 'ai', ai_text))
+    placeholders = ", ".join(["(%s, %s, %s)"] * len(rows))
+    params = tuple(value for row in rows for value in row)
+
+    started = time.perf_counter()
+    execute_query(
+        f"INSERT INTO chat_messages (user_id, sender, message) VALUES {placeholders}",
+        params,
+        commit=True
+    )
+    return (time.perf_counter() - started) * 1000.0
 
 @chat_bp.route('/send', methods=['POST'])
 @jwt_required()
@@ -31,51 +53,99 @@ def send_message():
     user_message = data.get('message', '')
     if not user_message:
         return jsonify({'error': 'No message provided'}), 400
-    # Save user message
-    conn = get_db_connection()
-    with conn.cursor() as cursor:
-        cursor.execute(
-            "INSERT INTO chat_messages (user_id, sender, message) VALUES (%s, %s, %s)",
-            (user_id, 'user', user_message)
-        )
-        conn.commit()
-    conn.close()
-    # AI response
-    payload = {
-        "contents": [
-            {"parts": [
-                {"text": (
-                    "Your name is Sage, an AI health assistant. Always respond to this if someone ask your name."
-                    "You are a professional health assistant. Only answer health-related questions. "
-                    "If the question is not about health, politely say with an apology that you can only answer health-related queries. "
-                    "Keep your answers short, clear, and professional. "
-                    "Always format your response using bullet points or numbered lists for clarity. "
-                    "Avoid long paragraphs. Organize information so it's easy to read, like ChatGPT or Gemini web UI.\n\n"
-                    f"User: {user_message}"
-                )}
-            ]}
-        ]
-    }
+    # AI response (both messages are saved together once it is back)
     try:
-        response = requests.post(GEMINI_API_URL, json=payload)
-        response.raise_for_status()
-        gemini_response = response.json()
-        ai_text = gemini_response['candidates'][0]['content']['parts'][0]['text']
-        # Save AI response
-        conn = get_db_connection()
-        with conn.cursor() as cursor:
-            cursor.execute(
-                "INSERT INTO chat_messages (user_id, sender, message) VALUES (%s, %s, %s)",
-                (user_id, 'ai', ai_text)
-            )
-            conn.commit()
-        conn.close()
-        return jsonify({'response': ai_text})
+        ai_text = get_gateway().generate_text(_sage_prompt(user_message), model=CHAT_MODEL)
     except Exception as e:
         import traceback
         traceback.print_exc()
+        # Keep the user's message even when the model call fails
+        try:
+            db_ms = _save_chat_turn(user_id, user_message)
+            current_app.logger.info('chat turn user=%s db_ms=%.1f rows=1 ai=failed', user_id, db_ms)
+        except Exception:
+            traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+    try:
+        db_ms = _save_chat_turn(user_id, user_message, ai_text)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+    current_app.logger.info('chat turn user=%s db_ms=%.1f rows=2', user_id, db_ms)
+    return jsonify({'response': ai_text})
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@chat_bp.route('/stream', methods=['POST'])
+@jwt_required()
+def stream_message():
+    """Streaming variant of /send: relays model tokens as Server-Sent Events.
+
+    Events: ``token`` ({"text": delta}) while generating, then ``done``
+    ({"response": full_text}) or ``error`` ({"error": message}). The turn is
+    persisted once the stream completes, in the same single write as /send.
+    """
+    user_id = get_jwt_identity()
+    data = request.get_json() or {}
+    user_message = data.get('message', '')
+    if not user_message:
+        return jsonify({'error': 'No message provided'}), 400
+
+    def generate():
+        started = time.perf_counter()
+        first_token_ms = None
+        chunks = []
+        ai_text = None
+        try:
+            for delta in get_gateway().stream_text(_sage_prompt(user_message), model=CHAT_MODEL):
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - started) * 1000.0
+                chunks.append(delta)
+                yield _sse('token', {'text': delta})
+            ai_text = ''.join(chunks).strip()
+            if not ai_text:
+                raise RuntimeError('Empty response from Gemini')
+        except GeneratorExit:
+            # Client went away mid-stream: keep the user's message only
+            try:
+                _save_chat_turn(user_id, user_message)
+            except Exception:
+                pass
+            raise
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            try:
+                _save_chat_turn(user_id, user_message)
+            except Exception:
+                traceback.print_exc()
+            yield _sse('error', {'error': str(e)})
+            return
+
+        try:
+            db_ms = _save_chat_turn(user_id, user_message, ai_text)
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            yield _sse('error', {'error': str(e)})
+            return
+        current_app.logger.info(
+            'chat stream user=%s ttft_ms=%.1f total_ms=%.1f db_ms=%.1f rows=2',
+            user_id, first_token_ms or 0.0, (time.perf_counter() - started) * 1000.0, db_ms
+        )
+        yield _sse('done', {'response': ai_text})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @chat_bp.route('/history', methods=['GET'])
 def get_history():
     import sys
@@ -88,12 +158,28 @@ def get_history():
     except Exception as e:
         print('JWT ERROR:', e, file=sys.stderr)
         return jsonify({'error': 'JWT error', 'message': str(e)}), 422
-    conn = get_db_connection()
-    with conn.cursor() as cursor:
-        cursor.execute(
-            "SELECT sender, message, created_at FROM chat_messages WHERE user_id=%s ORDER BY created_at ASC",
+    if wants_ndjson():
+        # Full export: stream every row from a server-side cursor as NDJSON.
+        rows = stream_query(
+            "SELECT sender, message, created_at FROM chat_messages WHERE user_id=%s ORDER BY created_at ASC, id ASC",
             (user_id,)
         )
-        history = cursor.fetchall()
-    conn.close()
-    return jsonify({'history': history})
+        return stream_json_response(rows, key='history', ndjson=True)
+
+    # Newest page first via keyset on (created_at, id); returned oldest-first
+    # for display. Pass next_cursor back as ?cursor= to load older messages.
+    try:
+        position = decode_cursor(request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = parse_limit(request.args.get('limit'), default=100, maximum=500)
+    after_sql, after_params = keyset_condition('created_at', 'id', position)
+    rows = execute_query(
+        "SELECT id, sender, message, created_at FROM chat_messages WHERE user_id=%s" + after_sql +
+        " ORDER BY created_at DESC, id DESC LIMIT %s",
+        (user_id, *after_params, limit + 1),
+        fetch_all=True
+    )
+    page, next_cursor = split_page(rows, limit, ts_key='created_at')
+    page.reverse()
+    return jsonify({'history': page, 'next_cursor': next_cursor})
@@ -4,10 +4,13 @@ This module implements the backend API for PocketCare's SOS flow:
 - Users create SOS requests with location + optional type/note.
 - Users can fetch latest/history and resolve only when not handled by a hospital.
 - Hospitals discover nearby pending requests, accept them, and resolve them.
+- Hospitals can subscribe to a server-sent event stream of requests in their
+  radius instead of polling (see utils/sos_events.py).
 
 Design notes:
 - Uses JWT identity strings to distinguish actors (user id vs 'hospital_<id>').
-- Uses multiple SQL variants with fallbacks to tolerate partially-migrated schemas.
+- Keeps several SQL variants to tolerate partially-migrated schemas; the cached
+  schema registry (utils/schema_registry.py) picks one per query.
 """
 
 from __future__ import annotations
@@ -15,27 +18,56 @@ from __future__ import annotations
 from datetime import datetime, timedelta
 from typing import Any, Dict, Optional
 
-from flask import Blueprint, jsonify, request
+import numpy as np
+from flask import Blueprint, Response, current_app, jsonify, request
 from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
 
+from config import Config
 from utils.database import get_db_connection
+from utils.geo_index import bounding_box_clause
+from utils.geodesic import haversine_km_many
+from utils import sos_events
+from utils.schema_registry import get_schema_registry
+from utils.sos_events import get_sos_hub, sos_schema_variant
 
 
 emergency_sos_bp = Blueprint('emergency_sos', __name__)
 
-# SOS visibility expansion (hospital discovery of pending requests).
-# Rationale: if no nearby hospital sees/accepts a request quickly, gradually
-# widen the radius so farther hospitals can respond.
-_SOS_BASE_RADIUS_KM_DEFAULT = 10.0
-_SOS_EXPAND_EVERY_SECONDS = 180  # 3 minutes
-_SOS_EXPAND_STEP_KM = 10.0
-_SOS_MAX_RADIUS_KM = 50.0
+# SOS visibility expansion (hospital discovery of pending requests); the rule
+# lives with the in-memory SOS registry in utils/sos_events.py.
+_SOS_BASE_RADIUS_KM_DEFAULT = sos_events.BASE_RADIUS_KM_DEFAULT
+_SOS_EXPAND_EVERY_SECONDS = sos_events.EXPAND_EVERY_SECONDS
+_SOS_EXPAND_STEP_KM = sos_events.EXPAND_STEP_KM
+_SOS_MAX_RADIUS_KM = sos_events.MAX_RADIUS_KM
 _SOS_ACCEPTED_VISIBLE_SECONDS = 60
+_SOS_PENDING_LIMIT = 200
+# Rows fetched from the bounding box before the exact distance filter.
+_SOS_CANDIDATE_LIMIT = 1000
+
+
+def _within_effective_radius(rows, lat: float, lng: float):
+    """Keep rows whose distance is within their ``effective_radius_km``.
+
+    Distances are computed for all candidates at once and attached as
+    ``distance_km``; row order (newest first) is preserved.
+    """
+    rows = [r for r in rows if r.get('latitude') is not None and r.get('longitude') is not None]
+    if not rows:
+        return []
+    distances = haversine_km_many(lat, lng, [r['latitude'] for r in rows], [r['longitude'] for r in rows])
+    radii = np.fromiter((float(r['effective_radius_km']) for r in rows), dtype=np.float64, count=len(rows))
+    visible = []
+    for i in np.flatnonzero(distances <= radii)[:_SOS_PENDING_LIMIT]:
+        row = rows[i]
+        row['distance_km'] = float(distances[i])
+        visible.append(row)
+    return visible
 
 
 # --- Schema / migration compatibility helpers ---
-# These helpers are used to decide which fallback SQL query to run when a
-# deployment is missing a table/column (common during local development).
+# Deployments may be missing the emergency_types table or the optional
+# emergency_requests columns (common during local development). The cached
+# schema registry picks the matching query shape up front.
 
 
 def _is_missing_emergency_types(err: Exception) -> bool:
@@ -52,6 +84,29 @@ def _is_unknown_column(err: Exception) -> bool:
     return 'unknown column' in str(err).lower()
 
 
+def _execute_variant(cursor, queries: Dict[str, str], params) -> None:
+    """Run the query shape this schema supports (``with_types``, ``without_types`` or ``minimal``).
+
+    ``params`` is one tuple for all shapes or a dict keyed like ``queries``.
+    If the schema changed since the registry was loaded (a migration ran),
+    the registry is reloaded and the query retried once with the new shape.
+    """
+    def run(variant: str) -> None:
+        cursor.execute(queries[variant], params[variant] if isinstance(params, dict) else params)
+
+    variant = sos_schema_variant()
+    try:
+        run(variant)
+    except Exception as e:
+        if not (_is_missing_emergency_types(e) or _is_unknown_column(e)):
+            raise
+        get_schema_registry().refresh()
+        retry = sos_schema_variant()
+        if retry == variant:
+            raise
+        run(retry)
+
+
 def _is_missing_emergency_requests(err: Exception) -> bool:
     msg = str(err).lower()
     return 'emergency_requests' in msg and ('doesn\'t exist' in msg or 'table' in msg)
@@ -137,6 +192,7 @@ def create_emergency_sos():
             connection.commit()
             request_id = cursor.lastrowid
 
+        get_sos_hub().publish_created(request_id)
         return jsonify({'success': True, 'request_id': request_id, 'status': 'pending'}), 201
     except Exception as e:
         connection.rollback()
@@ -159,9 +215,8 @@ def get_latest_emergency_sos():
     connection = get_db_connection()
     try:
         with connection.cursor() as cursor:
-                        # Query strategy:
-                        # - Prefer the richest shape (joins emergency_types + hospitals)
-                        # - Fall back when tables/columns aren't present.
+                        # Query shapes, richest first (joins emergency_types + hospitals);
+                        # _execute_variant runs the one this database's schema supports.
                         sql_with_types = """
                                 SELECT
                                     er.id,
@@ -229,26 +284,12 @@ def get_latest_emergency_sos():
                                 LIMIT 1
                         """
 
-                        try:
-                                cursor.execute(sql_with_types, (user_id,))
-                                row = cursor.fetchone()
-                        except Exception as e:
-                                try:
-                    # Fallbacks for older schemas.
-                                        if _is_missing_emergency_types(e):
-                                                cursor.execute(sql_without_types, (user_id,))
-                                                row = cursor.fetchone()
-                                        elif _is_unknown_column(e):
-                                                cursor.execute(sql_minimal, (user_id,))
-                                                row = cursor.fetchone()
-                                        else:
-                                                raise
-                                except Exception as e2:
-                                        if _is_unknown_column(e2):
-                                                cursor.execute(sql_minimal, (user_id,))
-                                                row = cursor.fetchone()
-                                        else:
-                                                raise
+                        _execute_variant(
+                                cursor,
+                                {'with_types': sql_with_types, 'without_types': sql_without_types, 'minimal': sql_minimal},
+                                (user_id,),
+                        )
+                        row = cursor.fetchone()
 
         return jsonify({'success': True, 'request': row}), 200
     except Exception as e:
@@ -285,9 +326,8 @@ def get_emergency_sos_history():
     connection = get_db_connection()
     try:
         with connection.cursor() as cursor:
-                        # Query strategy:
-                        # - Prefer the richest shape (joins emergency_types + hospitals)
-                        # - Fall back when tables/columns aren't present.
+                        # Query shapes, richest first (joins emergency_types + hospitals);
+                        # _execute_variant runs the one this database's schema supports.
                         sql_with_types = """
                                 SELECT
                                     er.id,
@@ -355,26 +395,12 @@ def get_emergency_sos_history():
                                 LIMIT %s OFFSET %s
                         """
 
-                        try:
-                                cursor.execute(sql_with_types, (user_id, limit, offset))
-                                rows = cursor.fetchall() or []
-                        except Exception as e:
-                                try:
-                                # Fallbacks for older schemas.
-                                        if _is_missing_emergency_types(e):
-                                                cursor.execute(sql_without_types, (user_id, limit, offset))
-                                                rows = cursor.fetchall() or []
-                                        elif _is_unknown_column(e):
-                                                cursor.execute(sql_minimal, (user_id, limit, offset))
-                                                rows = cursor.fetchall() or []
-                                        else:
-                                                raise
-                                except Exception as e2:
-                                        if _is_unknown_column(e2):
-                                                cursor.execute(sql_minimal, (user_id, limit, offset))
-                                                rows = cursor.fetchall() or []
-                                        else:
-                                                raise
+                        _execute_variant(
+                                cursor,
+                                {'with_types': sql_with_types, 'without_types': sql_without_types, 'minimal': sql_minimal},
+                                (user_id, limit, offset),
+                        )
+                        rows = cursor.fetchall() or []
 
         has_more = len(rows) == limit
         next_offset = offset + len(rows)
@@ -446,7 +472,7 @@ def user_resolve_emergency_sos(request_id: int):
             if status not in ('pending', 'acknowledged'):
                 return jsonify({'error': 'Request is not eligible to resolve', 'status': status}), 409
 
-            try:
+            if get_schema_registry().has_columns('emergency_requests', 'resolved_at', 'hospital_id'):
                 # Use a guarded UPDATE to avoid races (e.g., hospital accepts while user resolves).
                 cursor.execute(
                     """
@@ -457,25 +483,23 @@ def user_resolve_emergency_sos(request_id: int):
                     """,
                     (datetime.now(), request_id, user_id),
                 )
-            except Exception as e:
-                if _is_unknown_column(e):
-                    # Older schema without resolved_at column.
-                    cursor.execute(
-                        """
-                        UPDATE emergency_requests
-                        SET status='resolved'
-                        WHERE id=%s AND user_id=%s AND status IN ('pending', 'acknowledged')
-                        """,
-                        (request_id, user_id),
-                    )
-                else:
-                    raise
+            else:
+                # Older schema without resolved_at column.
+                cursor.execute(
+                    """
+                    UPDATE emergency_requests
+                    SET status='resolved'
+                    WHERE id=%s AND user_id=%s AND status IN ('pending', 'acknowledged')
+                    """,
+                    (request_id, user_id),
+                )
 
             connection.commit()
 
             if cursor.rowcount == 0:
                 return jsonify({'error': 'Request not found or not eligible to resolve'}), 409
 
+        get_sos_hub().publish_closed(request_id, status='resolved')
         return jsonify({'success': True, 'request_id': request_id, 'status': 'resolved'}), 200
     except Exception as e:
         connection.rollback()
@@ -486,6 +510,144 @@ def user_resolve_emergency_sos(request_id: int):
         connection.close()
 
 
+def _query_pending_requests(cursor, hlat: float, hlng: float, radius_km: float, hospital_id: int, accepted_cutoff: datetime):
+    """Visible pending (and recently accepted) requests straight from MySQL.
+
+    Fallback for when the in-memory SOS registry cannot be loaded.
+    """
+    # Dynamic effective radius: effective_radius_km expands over time
+    # for older pending requests. SQL only narrows candidates to the
+    # bounding box of the largest radius (status + latitude range on
+    # idx_emergency_status_location); exact distances are computed in one
+    # vectorized pass.
+    bbox_sql, bbox_params = bounding_box_clause(hlat, hlng, _SOS_MAX_RADIUS_KM, prefix='er.')
+    pending_sql_with_types = f"""
+        SELECT
+          er.id,
+          er.user_id,
+          u.name AS user_name,
+          u.phone AS user_phone,
+          u.blood_group AS blood_group,
+          er.latitude,
+          er.longitude,
+          er.emergency_type,
+          COALESCE(
+            et.label,
+            CASE
+              WHEN er.emergency_type IS NULL OR er.emergency_type = '' THEN 'General'
+              ELSE er.emergency_type
+            END
+          ) AS emergency_type_label,
+          er.note,
+          er.status,
+          er.hospital_id,
+                            h_acc.name AS accepted_hospital_name,
+          er.created_at,
+          er.acknowledged_at,
+          er.resolved_at,
+                            LEAST(
+                                (%s + (%s * FLOOR(TIMESTAMPDIFF(SECOND, er.created_at, NOW()) / %s))),
+                                %s
+                            ) AS effective_radius_km
+        FROM emergency_requests er
+        JOIN users u ON u.id = er.user_id
+        LEFT JOIN emergency_types et ON et.code = er.emergency_type
+                        LEFT JOIN hospitals h_acc ON h_acc.id = er.hospital_id
+                        WHERE (
+                            er.status = 'pending'
+                            OR (
+                                er.status = 'acknowledged'
+                                AND er.hospital_id IS NOT NULL
+                                AND er.hospital_id <> %s
+                                AND er.acknowledged_at IS NOT NULL
+                                AND er.acknowledged_at >= %s
+                            )
+                        )
+                        AND {bbox_sql}
+        ORDER BY er.created_at DESC
+        LIMIT {_SOS_CANDIDATE_LIMIT}
+    """
+    pending_sql_without_types = f"""
+        SELECT
+          er.id,
+          er.user_id,
+          u.name AS user_name,
+          u.phone AS user_phone,
+          u.blood_group AS blood_group,
+          er.latitude,
+          er.longitude,
+          er.emergency_type,
+          CASE
+            WHEN er.emergency_type IS NULL OR er.emergency_type = '' THEN 'General'
+            ELSE er.emergency_type
+          END AS emergency_type_label,
+          er.note,
+          er.status,
+          er.hospital_id,
+                            h_acc.name AS accepted_hospital_name,
+          er.created_at,
+          er.acknowledged_at,
+          er.resolved_at,
+                            LEAST(
+                                (%s + (%s * FLOOR(TIMESTAMPDIFF(SECOND, er.created_at, NOW()) / %s))),
+                                %s
+                            ) AS effective_radius_km
+        FROM emergency_requests er
+        JOIN users u ON u.id = er.user_id
+                        LEFT JOIN hospitals h_acc ON h_acc.id = er.hospital_id
+                        WHERE (
+                            er.status = 'pending'
+                            OR (
+                                er.status = 'acknowledged'
+                                AND er.hospital_id IS NOT NULL
+                                AND er.hospital_id <> %s
+                                AND er.acknowledged_at IS NOT NULL
+                                AND er.acknowledged_at >= %s
+                            )
+                        )
+                        AND {bbox_sql}
+        ORDER BY er.created_at DESC
+        LIMIT {_SOS_CANDIDATE_LIMIT}
+    """
+
+    pending_sql_minimal = f"""
+        SELECT
+          er.id,
+          er.user_id,
+          u.name AS user_name,
+          u.phone AS user_phone,
+          u.blood_group AS blood_group,
+          er.latitude,
+          er.longitude,
+          NULL AS emergency_type,
+          'General' AS emergency_type_label,
+          NULL AS note,
+          er.status,
+          er.created_at,
+                            LEAST(
+                                (%s + (%s * FLOOR(TIMESTAMPDIFF(SECOND, er.created_at, NOW()) / %s))),
+                                %s
+                            ) AS effective_radius_km
+        FROM emergency_requests er
+        JOIN users u ON u.id = er.user_id
+        WHERE er.status = 'pending'
+                        AND {bbox_sql}
+        ORDER BY er.created_at DESC
+        LIMIT {_SOS_CANDIDATE_LIMIT}
+    """
+
+    expand_params = (radius_km, _SOS_EXPAND_STEP_KM, _SOS_EXPAND_EVERY_SECONDS, _SOS_MAX_RADIUS_KM)
+    full_params = (*expand_params, hospital_id, accepted_cutoff, *bbox_params)
+    _execute_variant(
+        cursor,
+        {'with_types': pending_sql_with_types, 'without_types': pending_sql_without_types, 'minimal': pending_sql_minimal},
+        {'with_types': full_params, 'without_types': full_params, 'minimal': (*expand_params, *bbox_params)},
+    )
+    pending = cursor.fetchall()
+
+    return _within_effective_radius(pending, hlat, hlng)
+
+
 @emergency_sos_bp.route('/hospital/emergency/requests', methods=['GET', 'OPTIONS'])
 def hospital_list_emergency_requests():
     """List SOS requests visible to the authenticated hospital.
@@ -520,205 +682,17 @@ def hospital_list_emergency_requests():
             hlat = float(hospital['latitude'])
             hlng = float(hospital['longitude'])
 
-            # Haversine distance (km) + dynamic effective radius.
-            # effective_radius_km expands over time for older pending requests.
-            pending_sql_with_types = """
-                SELECT
-                  er.id,
-                  er.user_id,
-                  u.name AS user_name,
-                  u.phone AS user_phone,
-                  u.blood_group AS blood_group,
-                  er.latitude,
-                  er.longitude,
-                  er.emergency_type,
-                  COALESCE(
-                    et.label,
-                    CASE
-                      WHEN er.emergency_type IS NULL OR er.emergency_type = '' THEN 'General'
-                      ELSE er.emergency_type
-                    END
-                  ) AS emergency_type_label,
-                  er.note,
-                  er.status,
-                  er.hospital_id,
-                                    h_acc.name AS accepted_hospital_name,
-                  er.created_at,
-                  er.acknowledged_at,
-                  er.resolved_at,
-                                    LEAST(
-                                        (%s + (%s * FLOOR(TIMESTAMPDIFF(SECOND, er.created_at, NOW()) / %s))),
-                                        %s
-                                    ) AS effective_radius_km,
-                  (6371 * 2 * ASIN(SQRT(
-                      POWER(SIN(RADIANS(er.latitude - %s) / 2), 2) +
-                      COS(RADIANS(%s)) * COS(RADIANS(er.latitude)) *
-                      POWER(SIN(RADIANS(er.longitude - %s) / 2), 2)
-                  ))) AS distance_km
-                FROM emergency_requests er
-                JOIN users u ON u.id = er.user_id
-                LEFT JOIN emergency_types et ON et.code = er.emergency_type
-                                LEFT JOIN hospitals h_acc ON h_acc.id = er.hospital_id
-                                WHERE (
-                                    er.status = 'pending'
-                                    OR (
-                                        er.status = 'acknowledged'
-                                        AND er.hospital_id IS NOT NULL
-                                        AND er.hospital_id <> %s
-                                        AND er.acknowledged_at IS NOT NULL
-                                        AND er.acknowledged_at >= %s
-                                    )
-                                )
-                                HAVING distance_km <= effective_radius_km
-                ORDER BY er.created_at DESC
-                LIMIT 200
-            """
-            pending_sql_without_types = """
-                SELECT
-                  er.id,
-                  er.user_id,
-                  u.name AS user_name,
-                  u.phone AS user_phone,
-                  u.blood_group AS blood_group,
-                  er.latitude,
-                  er.longitude,
-                  er.emergency_type,
-                  CASE
-                    WHEN er.emergency_type IS NULL OR er.emergency_type = '' THEN 'General'
-                    ELSE er.emergency_type
-                  END AS emergency_type_label,
-                  er.note,
-                  er.status,
-                  er.hospital_id,
-                                    h_acc.name AS accepted_hospital_name,
-                  er.created_at,
-                  er.acknowledged_at,
-                  er.resolved_at,
-                                    LEAST(
-                                        (%s + (%s * FLOOR(TIMESTAMPDIFF(SECOND, er.created_at, NOW()) / %s))),
-                                        %s
-                                    ) AS effective_radius_km,
-                  (6371 * 2 * ASIN(SQRT(
-                      POWER(SIN(RADIANS(er.latitude - %s) / 2), 2) +
-                      COS(RADIANS(%s)) * COS(RADIANS(er.latitude)) *
-                      POWER(SIN(RADIANS(er.longitude - %s) / 2), 2)
-                  ))) AS distance_km
-                FROM emergency_requests er
-                JOIN users u ON u.id = er.user_id
-                                LEFT JOIN hospitals h_acc ON h_acc.id = er.hospital_id
-                                WHERE (
-                                    er.status = 'pending'
-                                    OR (
-                                        er.status = 'acknowledged'
-                                        AND er.hospital_id IS NOT NULL
-                                        AND er.hospital_id <> %s
-                                        AND er.acknowledged_at IS NOT NULL
-                                        AND er.acknowledged_at >= %s
-                                    )
-                                )
-                                HAVING distance_km <= effective_radius_km
-                ORDER BY er.created_at DESC
-                LIMIT 200
-            """
-
-            pending_sql_minimal = """
-                SELECT
-                  er.id,
-                  er.user_id,
-                  u.name AS user_name,
-                  u.phone AS user_phone,
-                  u.blood_group AS blood_group,
-                  er.latitude,
-                  er.longitude,
-                  NULL AS emergency_type,
-                  'General' AS emergency_type_label,
-                  NULL AS note,
-                  er.status,
-                  er.created_at,
-                                    LEAST(
-                                        (%s + (%s * FLOOR(TIMESTAMPDIFF(SECOND, er.created_at, NOW()) / %s))),
-                                        %s
-                                    ) AS effective_radius_km,
-                  (6371 * 2 * ASIN(SQRT(
-                      POWER(SIN(RADIANS(er.latitude - %s) / 2), 2) +
-                      COS(RADIANS(%s)) * COS(RADIANS(er.latitude)) *
-                      POWER(SIN(RADIANS(er.longitude - %s) / 2), 2)
-                  ))) AS distance_km
-                FROM emergency_requests er
-                JOIN users u ON u.id = er.user_id
-                WHERE er.status = 'pending'
-                                HAVING distance_km <= effective_radius_km
-                ORDER BY er.created_at DESC
-                LIMIT 200
-            """
-
-            try:
-                cursor.execute(
-                    pending_sql_with_types,
-                    (
-                        radius_km,
-                        _SOS_EXPAND_STEP_KM,
-                        _SOS_EXPAND_EVERY_SECONDS,
-                        _SOS_MAX_RADIUS_KM,
-                        hlat,
-                        hlat,
-                        hlng,
-                        hospital_id,
-                        accepted_cutoff,
-                    ),
+            hub = get_sos_hub()
+            if hub.ensure_synced():
+                # In-memory registry: grid lookup around the hospital, radii advanced per expansion tick.
+                now = datetime.now()
+                pending = hub.visible(hlat, hlng, radius_km, now=now) + hub.recently_accepted(
+                    hlat, hlng, radius_km, since=accepted_cutoff, exclude_hospital_id=hospital_id, now=now
                 )
-                pending = cursor.fetchall()
-            except Exception as e:
-                try:
-                    if _is_missing_emergency_types(e):
-                        cursor.execute(
-                            pending_sql_without_types,
-                            (
-                                radius_km,
-                                _SOS_EXPAND_STEP_KM,
-                                _SOS_EXPAND_EVERY_SECONDS,
-                                _SOS_MAX_RADIUS_KM,
-                                hlat,
-                                hlat,
-                                hlng,
-                                hospital_id,
-                                accepted_cutoff,
-                            ),
-                        )
-                        pending = cursor.fetchall()
-                    elif _is_unknown_column(e):
-                        cursor.execute(
-                            pending_sql_minimal,
-                            (
-                                radius_km,
-                                _SOS_EXPAND_STEP_KM,
-                                _SOS_EXPAND_EVERY_SECONDS,
-                                _SOS_MAX_RADIUS_KM,
-                                hlat,
-                                hlat,
-                                hlng,
-                            ),
-                        )
-                        pending = cursor.fetchall()
-                    else:
-                        raise
-                except Exception as e2:
-                    if _is_unknown_column(e2):
-                        cursor.execute(
-                            pending_sql_minimal,
-                            (
-                                radius_km,
-                                _SOS_EXPAND_STEP_KM,
-                                _SOS_EXPAND_EVERY_SECONDS,
-                                _SOS_MAX_RADIUS_KM,
-                                hlat,
-                                hlat,
-                                hlng,
-                            ),
-                        )
-                        pending = cursor.fetchall()
-                    else:
-                        raise
+                pending.sort(key=lambda row: row.get('created_at') or datetime.min, reverse=True)
+                pending = pending[:_SOS_PENDING_LIMIT]
+            else:
+                pending = _query_pending_requests(cursor, hlat, hlng, radius_km, hospital_id, accepted_cutoff)
 
             assigned = []
             if include_assigned:
@@ -802,25 +776,16 @@ def hospital_list_emergency_requests():
                                         LIMIT 200
                                 """
 
-                                try:
-                                        cursor.execute(assigned_sql_with_types, (hospital_id,))
-                                        assigned = cursor.fetchall()
-                                except Exception as e:
-                                        try:
-                                                if _is_missing_emergency_types(e):
-                                                        cursor.execute(assigned_sql_without_types, (hospital_id,))
-                                                        assigned = cursor.fetchall()
-                                                elif _is_unknown_column(e):
-                                                        cursor.execute(assigned_sql_minimal, (hospital_id,))
-                                                        assigned = cursor.fetchall()
-                                                else:
-                                                        raise
-                                        except Exception as e2:
-                                                if _is_unknown_column(e2):
-                                                        cursor.execute(assigned_sql_minimal, (hospital_id,))
-                                                        assigned = cursor.fetchall()
-                                                else:
-                                                        raise
+                                _execute_variant(
+                                        cursor,
+                                        {
+                                                'with_types': assigned_sql_with_types,
+                                                'without_types': assigned_sql_without_types,
+                                                'minimal': assigned_sql_minimal,
+                                        },
+                                        (hospital_id,),
+                                )
+                                assigned = cursor.fetchall()
 
         return (
             jsonify(
@@ -874,9 +839,15 @@ def hospital_accept_emergency_request(request_id: int):
                 """,
                 (hospital_id, datetime.now(), request_id),
             )
+            accepted = cursor.rowcount == 1
+            hospital_name = None
+            if accepted:
+                # Named in the closed event, so other hospitals' "recently accepted" rows say who took it.
+                cursor.execute("SELECT name FROM hospitals WHERE id=%s", (hospital_id,))
+                hospital_name = (cursor.fetchone() or {}).get('name')
             connection.commit()
 
-            if cursor.rowcount == 0:
+            if not accepted:
                 # Race-condition friendly message: request exists but was already accepted.
                 try:
                     cursor.execute(
@@ -905,6 +876,9 @@ def hospital_accept_emergency_request(request_id: int):
 
                 return jsonify({'error': 'Request not found or not pending'}), 404
 
+        get_sos_hub().publish_closed(
+            request_id, status='acknowledged', hospital_id=hospital_id, hospital_name=hospital_name
+        )
         return jsonify({'success': True, 'request_id': request_id, 'status': 'acknowledged'}), 200
     except Exception as e:
         connection.rollback()
@@ -941,9 +915,71 @@ def hospital_resolve_emergency_request(request_id: int):
             if cursor.rowcount == 0:
                 return jsonify({'error': 'Request not found or not assigned to this hospital'}), 404
 
+        get_sos_hub().publish_closed(request_id, status='resolved', hospital_id=hospital_id)
         return jsonify({'success': True, 'request_id': request_id, 'status': 'resolved'}), 200
     except Exception as e:
         connection.rollback()
         return jsonify({'error': str(e)}), 500
     finally:
         connection.close()
+
+
+@emergency_sos_bp.route('/hospital/emergency/stream', methods=['GET', 'OPTIONS'])
+def hospital_emergency_stream():
+    """Server-sent event stream of SOS requests visible to the authenticated hospital.
+
+    Sends ``sos.snapshot`` first, then ``sos.created`` / ``sos.accepted`` /
+    ``sos.resolved`` as requests enter the hospital's expanding radius or stop
+    being pending, with ``: ping`` comments as heartbeats. The stream closes
+    after SOS_STREAM_MAX_SECONDS; clients reconnect and get a fresh snapshot.
+    Authenticate with the usual ``Authorization`` header (e.g. fetch() with a
+    streaming body reader).
+    """
+    if request.method == 'OPTIONS':
+        return ('', 200)
+
+    verify_jwt_in_request()
+    hospital_id = _parse_hospital_id(get_jwt_identity())
+    if hospital_id is None:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    radius_km = _as_float(request.args.get('radius_km')) or _SOS_BASE_RADIUS_KM_DEFAULT
+
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT latitude, longitude FROM hospitals WHERE id=%s", (hospital_id,))
+            hospital = cursor.fetchone()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        connection.close()
+    if not hospital or hospital.get('latitude') is None or hospital.get('longitude') is None:
+        return jsonify({'error': 'Hospital location (latitude/longitude) is not set'}), 400
+
+    subscription = get_sos_hub().subscribe(
+        hospital_id=hospital_id,
+        latitude=float(hospital['latitude']),
+        longitude=float(hospital['longitude']),
+        radius_km=radius_km,
+    )
+    # Serialize like jsonify (dates, decimals); the generator runs after the request context is gone.
+    dumps = current_app.json.dumps
+
+    def generate():
+        # A retry hint for EventSource-style clients, then events.
+        yield 'retry: 3000\n\n'
+        for event in subscription.stream(
+            max_seconds=Config.SOS_STREAM_MAX_SECONDS,
+            heartbeat_seconds=Config.SOS_STREAM_HEARTBEAT_SECONDS,
+        ):
+            if event is None:
+                yield ': ping\n\n'
+            else:
+                yield f"event: {event['type']}\ndata: {dumps(event)}\n\n"
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
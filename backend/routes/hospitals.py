@@ -3,49 +3,86 @@ from utils.database import get_db_connection
 from flask_jwt_extended import jwt_required
 import pymysql
 import json
-from math import radians, cos, sin, asin, sqrt
+from utils.geo_index import bounding_box_clause, get_hospital_locator
+from utils.geodesic import haversine_km_many
+from utils.hospital_catalog import get_hospital_catalog
 
 hospitals_bp = Blueprint('hospitals', __name__)
 
 
-def get_hospital_bed_stats(cursor, hospital_id):
+def get_bed_stats_for_hospitals(cursor, hospital_ids):
     """
-    Get aggregated bed statistics from bed_wards table for a hospital.
-    Returns total_beds, available_beds, and icu_beds.
+    Get aggregated bed statistics from bed_wards table for many hospitals in one grouped query.
+    Returns {hospital_id: {total_beds, available_beds, icu_beds}}; hospitals without wards get zeros.
     """
-    cursor.execute("""
+    hospital_ids = list(dict.fromkeys(hospital_ids))
+    stats = {hospital_id: {'total_beds': 0, 'available_beds': 0, 'icu_beds': 0} for hospital_id in hospital_ids}
+    if not hospital_ids:
+        return stats
+    cursor.execute(f"""
         SELECT 
+            hospital_id,
             COALESCE(SUM(total_beds), 0) as total_beds,
             COALESCE(SUM(available_beds), 0) as available_beds,
             COALESCE(SUM(CASE WHEN ward_type = 'icu' THEN total_beds ELSE 0 END), 0) as icu_beds
         FROM bed_wards
-        WHERE hospital_id = %s
-    """, (hospital_id,))
-    result = cursor.fetchone()
-    return {
-        'total_beds': result['total_beds'] if result else 0,
-        'available_beds': result['available_beds'] if result else 0,
-        'icu_beds': result['icu_beds'] if result else 0
-    }
+        WHERE hospital_id IN ({', '.join(['%s'] * len(hospital_ids))})
+        GROUP BY hospital_id
+    """, hospital_ids)
+    for row in cursor.fetchall():
+        stats[row['hospital_id']] = {
+            'total_beds': row['total_beds'],
+            'available_beds': row['available_beds'],
+            'icu_beds': row['icu_beds']
+        }
+    return stats
 
 
-def haversine(lon1, lat1, lon2, lat2):
+def get_hospital_bed_stats(cursor, hospital_id):
     """
-    Calculate the great circle distance in kilometers between two points 
-    on the earth (specified in decimal degrees)
+    Get aggregated bed statistics from bed_wards table for a hospital.
+    Returns total_beds, available_beds, and icu_beds.
     """
-    # Convert decimal degrees to radians
-    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-    
-    # Haversine formula
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a))
-    
-    # Radius of earth in kilometers
-    r = 6371
-    return c * r
+    return get_bed_stats_for_hospitals(cursor, [hospital_id])[hospital_id]
+
+
+def fill_bed_stats(cursor, hospitals):
+    """
+    Use aggregated bed_wards data for hospitals whose own bed columns are NULL or 0.
+    All such hospitals are looked up with a single query; rows are updated in place.
+    """
+    missing = [hospital['id'] for hospital in hospitals if not hospital['total_beds']]
+    if not missing:
+        return
+    stats = get_bed_stats_for_hospitals(cursor, missing)
+    for hospital in hospitals:
+        if not hospital['total_beds']:
+            hospital.update(stats[hospital['id']])
+
+
+def hospitals_within(cursor, lat, lon, radius_km):
+    """
+    Return {hospital_id: distance_km} for hospitals with coordinates within radius_km.
+    Uses the in-memory spatial index, or a bounding-box query on idx_location if it's unavailable.
+    """
+    locator = get_hospital_locator()
+    if locator.available():
+        return dict(locator.within(lat, lon, radius_km))
+
+    clause, params = bounding_box_clause(lat, lon, radius_km)
+    cursor.execute(f"SELECT id, latitude, longitude FROM hospitals WHERE {clause}", params)
+    rows = cursor.fetchall()
+    distances = haversine_km_many(lat, lon, [row['latitude'] for row in rows], [row['longitude'] for row in rows])
+    return {row['id']: float(d) for row, d in zip(rows, distances) if d <= radius_km}
+
+
+def nearest_hospitals(cursor, lat, lon, k, radius_km):
+    """Return [(hospital_id, distance_km)] for the k nearest hospitals within radius_km, nearest first."""
+    locator = get_hospital_locator()
+    if locator.available():
+        return locator.nearest(lat, lon, k, max_km=radius_km)
+    ranked = sorted(hospitals_within(cursor, lat, lon, radius_km).items(), key=lambda item: (item[1], item[0]))
+    return ranked[:max(k, 0)]
 
 
 @hospitals_bp.route('/hospitals', methods=['GET'])
@@ -58,9 +95,9 @@ def get_hospitals():
     - latitude: User's latitude for distance calculation
     - longitude: User's longitude for distance calculation
     - radius: Search radius in kilometers (default: 50)
-    - city: Filter by city name
-    - service: Filter by service offered
-    - search: Search by hospital name
+    - city: Filter by city name (word prefixes, e.g. "dha")
+    - service: Filter by service offered (word prefixes, e.g. "cardio")
+    - search: Search by hospital name (word prefixes)
     """
     conn = None
     cursor = None
@@ -76,58 +113,30 @@ def get_hospitals():
         service = request.args.get('service', type=str)
         search = request.args.get('search', type=str)
         
-        # Build query
-        query = """
-            SELECT 
-                id, name, address, city, state, 
-                latitude, longitude, phone, email,
-                emergency_contact, total_beds, available_beds, 
-                icu_beds, services, rating
-            FROM hospitals
-            WHERE 1=1
-        """
-        params = []
-        
-        # Add filters
-        if city:
-            query += " AND LOWER(city) LIKE LOWER(%s)"
-            params.append(f"%{city}%")
+        # city/search/service filters are index lookups on the cached catalog
+        catalog = get_hospital_catalog().snapshot()
+        hospital_ids = catalog.filter(city=city, search=search, service=service)
         
-        if search:
-            query += " AND LOWER(name) LIKE LOWER(%s)"
-            params.append(f"%{search}%")
+        # Radius filter via the spatial index; hospitals without coordinates
+        # have no distance and are still listed (after the located ones).
+        distances = None
+        if user_lat is not None and user_lon is not None:
+            distances = hospitals_within(cursor, user_lat, user_lon, radius)
+            hospital_ids = [
+                hospital_id for hospital_id in hospital_ids
+                if hospital_id in distances
+                or catalog.hospitals[hospital_id]['latitude'] is None
+                or catalog.hospitals[hospital_id]['longitude'] is None
+            ]
         
-        query += " ORDER BY rating DESC, name ASC"
+        hospitals = catalog.rows(hospital_ids)
         
-        cursor.execute(query, params)
-        hospitals = cursor.fetchall()
+        # Bed data - aggregated bed_wards data if hospital columns are NULL or 0
+        fill_bed_stats(cursor, hospitals)
         
         # Process results
         result = []
         for hospital in hospitals:
-            # Parse services JSON string to list
-            services_raw = hospital['services']
-            if isinstance(services_raw, str):
-                try:
-                    services_list = json.loads(services_raw)
-                except (json.JSONDecodeError, TypeError):
-                    services_list = []
-            elif isinstance(services_raw, list):
-                services_list = services_raw
-            else:
-                services_list = []
-            
-            # Get bed data - use aggregated bed_wards data if hospital columns are NULL or 0
-            total_beds = hospital['total_beds']
-            available_beds = hospital['available_beds']
-            icu_beds = hospital['icu_beds']
-            
-            if not total_beds or total_beds == 0:
-                bed_stats = get_hospital_bed_stats(cursor, hospital['id'])
-                total_beds = bed_stats['total_beds']
-                available_beds = bed_stats['available_beds']
-                icu_beds = bed_stats['icu_beds']
-            
             hospital_data = {
                 'id': hospital['id'],
                 'name': hospital['name'],
@@ -139,31 +148,17 @@ def get_hospitals():
                 'phone': hospital['phone'],
                 'email': hospital['email'],
                 'emergency_contact': hospital['emergency_contact'],
-                'total_beds': total_beds,
-                'available_beds': available_beds,
-                'icu_beds': icu_beds,
-                'services': services_list,
+                'total_beds': hospital['total_beds'],
+                'available_beds': hospital['available_beds'],
+                'icu_beds': hospital['icu_beds'],
+                'services': list(hospital['services']),
                 'rating': float(hospital['rating']) if hospital['rating'] else 0.0,
                 'distance': None
             }
             
-            # Calculate distance if user location is provided
-            if user_lat is not None and user_lon is not None:
-                if hospital['latitude'] and hospital['longitude']:
-                    distance = haversine(
-                        user_lon, user_lat,
-                        float(hospital['longitude']), float(hospital['latitude'])
-                    )
-                    hospital_data['distance'] = round(distance, 2)
-                    
-                    # Filter by radius if location provided
-                    if distance > radius:
-                        continue
-            
-            # Filter by service if provided
-            if service:
-                if not any(service.lower() in s.lower() for s in services_list):
-                    continue
+            # Distance from the radius lookup if user location is provided
+            if distances is not None and hospital['id'] in distances:
+                hospital_data['distance'] = round(distances[hospital['id']], 2)
             
             result.append(hospital_data)
         
@@ -298,61 +293,49 @@ def get_nearby_hospitals():
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT 
-                id, name, address, city, state, 
-                latitude, longitude, phone, email,
-                emergency_contact, total_beds, available_beds, 
-                icu_beds, services, rating
-            FROM hospitals
-            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
-        """)
+        nearest = nearest_hospitals(cursor, user_lat, user_lon, limit, radius)
         
-        hospitals = cursor.fetchall()
+        hospitals = {}
+        if nearest:
+            cursor.execute(f"""
+                SELECT 
+                    id, name, address, city, state, 
+                    latitude, longitude, phone, email,
+                    emergency_contact, total_beds, available_beds, 
+                    icu_beds, services, rating
+                FROM hospitals
+                WHERE id IN ({', '.join(['%s'] * len(nearest))})
+            """, [hospital_id for hospital_id, _ in nearest])
+            rows = cursor.fetchall()
+            # Bed data - aggregated bed_wards data if hospital columns are NULL or 0
+            fill_bed_stats(cursor, rows)
+            hospitals = {row['id']: row for row in rows}
         
-        # Calculate distances and filter
+        # Already sorted by distance and limited
         nearby = []
-        for hospital in hospitals:
-            if hospital['latitude'] and hospital['longitude']:
-                distance = haversine(
-                    user_lon, user_lat,
-                    float(hospital['longitude']), float(hospital['latitude'])
-                )
-                
-                if distance <= radius:
-                    # Get bed data - use aggregated bed_wards data if hospital columns are NULL or 0
-                    total_beds = hospital['total_beds']
-                    available_beds = hospital['available_beds']
-                    icu_beds = hospital['icu_beds']
-                    
-                    if not total_beds or total_beds == 0:
-                        bed_stats = get_hospital_bed_stats(cursor, hospital['id'])
-                        total_beds = bed_stats['total_beds']
-                        available_beds = bed_stats['available_beds']
-                        icu_beds = bed_stats['icu_beds']
-                    
-                    nearby.append({
-                        'id': hospital['id'],
-                        'name': hospital['name'],
-                        'address': hospital['address'],
-                        'city': hospital['city'],
-                        'state': hospital['state'],
-                        'latitude': float(hospital['latitude']),
-                        'longitude': float(hospital['longitude']),
-                        'phone': hospital['phone'],
-                        'email': hospital['email'],
-                        'emergency_contact': hospital['emergency_contact'],
-                        'total_beds': total_beds,
-                        'available_beds': available_beds,
-                        'icu_beds': icu_beds,
-                        'services': hospital['services'],
-                        'rating': float(hospital['rating']) if hospital['rating'] else 0.0,
-                        'distance': round(distance, 2)
-                    })
-        
-        # Sort by distance and limit
-        nearby.sort(key=lambda x: x['distance'])
-        nearby = nearby[:limit]
+        for hospital_id, distance in nearest:
+            hospital = hospitals.get(hospital_id)
+            if not hospital or hospital['latitude'] is None or hospital['longitude'] is None:
+                continue  # removed or moved since the index was refreshed
+            
+            nearby.append({
+                'id': hospital['id'],
+                'name': hospital['name'],
+                'address': hospital['address'],
+                'city': hospital['city'],
+                'state': hospital['state'],
+                'latitude': float(hospital['latitude']),
+                'longitude': float(hospital['longitude']),
+                'phone': hospital['phone'],
+                'email': hospital['email'],
+                'emergency_contact': hospital['emergency_contact'],
+                'total_beds': hospital['total_beds'],
+                'available_beds': hospital['available_beds'],
+                'icu_beds': hospital['icu_beds'],
+                'services': hospital['services'],
+                'rating': float(hospital['rating']) if hospital['rating'] else 0.0,
+                'distance': round(distance, 2)
+            })
         
         return jsonify({
             'hospitals': nearby,
@@ -6,17 +6,32 @@ from flask_jwt_extended import get_jwt_identity
 from werkzeug.utils import secure_filename
 
 from config import Config
+from utils.ai_gateway import AIGatewayError
 from utils.auth_utils import jwt_required_custom
 from utils.database import execute_query
-from utils.gemini_utils import explain_bytes_with_gemini, simplify_ocr_text
-from utils.ocr_utils import extract_text_from_image_bytes
-from utils.pdf_utils import extract_text_from_pdf_bytes
+from utils.gemini_utils import NotMedicalDocumentError, explain_bytes_with_gemini, simplify_ocr_text
+from utils.ocr_utils import extract_text_from_image_bytes, ocr_image_bytes
+from utils.pagination import decode_cursor, keyset_condition, parse_limit, split_page
+from utils.report_cache import VERDICT_MEDICAL, VERDICT_NOT_MEDICAL, digest_key, get_report_cache
+from utils.report_jobs import (
+    OCR_FAILED_PLACEHOLDER,
+    RETRYABLE_STATUSES,
+    STAGES,
+    STATUS_SUCCEEDED,
+    get_job_runner,
+    load_stages,
+    mime_type_for,
+)
+from utils.pdf_utils import extract_pdf_text, extract_text_from_pdf_bytes
+from utils.upload_spool import SpooledUpload, UploadTooLargeError, spool_upload
 
 reports_bp = Blueprint("reports", __name__)
 
 
 _ALLOWED_REPORT_EXTS = {"png", "jpg", "jpeg", "pdf"}
 
+_DEFAULT_MODEL = "gemini-3-flash-preview"
+
 
 def _gemini_error_response(exc: Exception):
     """Map Gemini/GenAI failures to user-friendly HTTP responses."""
@@ -38,6 +53,31 @@ def _gemini_error_response(exc: Exception):
             503,
         )
 
+    if isinstance(exc, AIGatewayError):
+        if exc.status_code in (429, 500, 502, 503, 504) or exc.status_code is None:
+            return (
+                jsonify(
+                    {
+                        "error": "AI busy",
+                        "message": "The AI service is currently busy (overloaded). Please try again in a moment.",
+                    }
+                ),
+                503,
+            )
+        if exc.status_code in (401, 403):
+            return (
+                jsonify(
+                    {
+                        "error": "AI unavailable",
+                        "message": (
+                            "AI permission denied. The API key may be invalid or revoked. "
+                            "Create a new key in Google AI Studio, set GEMINI_API_KEY in backend/.env, and restart the backend."
+                        ),
+                    }
+                ),
+                503,
+            )
+
     # Try to use google.api_core exceptions when available.
     try:
         from google.api_core.exceptions import (
@@ -80,57 +120,130 @@ def _as_user_id() -> int:
         raise ValueError("Invalid user identity")
 
 
-def _ocr_bytes(*, ext: str, data: bytes):
+def _ocr_bytes(*, ext: str, data):
+    """OCR upload content; ``data`` is bytes or a file path."""
+
     if ext == "pdf":
         return extract_text_from_pdf_bytes(data)
     return extract_text_from_image_bytes(data)
 
 
-@reports_bp.route("/ocr", methods=["POST"])
-@jwt_required_custom
-def ocr_report():
-    """Extract raw text from an uploaded report image using Tesseract.
+def _read_report_upload():
+    """Validate the multipart 'file' field. Returns (filename, ext, upload, error_response).
 
-    Request: multipart/form-data with field 'file'
-    Response: { text: str, confidence: number|null }
+    ``upload`` is a ``SpooledUpload`` (large files live in a temp file); the
+    caller must close it.
     """
 
-    _ = _as_user_id()  # Ensure request is authenticated
-
     if "file" not in request.files:
-        return jsonify({"error": "Missing file", "message": "Send multipart field 'file'"}), 400
+        return None, None, None, (jsonify({"error": "Missing file", "message": "Send multipart field 'file'"}), 400)
 
     f = request.files["file"]
     if not f or not getattr(f, "filename", ""):
-        return jsonify({"error": "Invalid file", "message": "No file selected"}), 400
+        return None, None, None, (jsonify({"error": "Invalid file", "message": "No file selected"}), 400)
 
     filename = secure_filename(f.filename)
     ext = (Path(filename).suffix or "").lstrip(".").lower()
-
     if ext not in _ALLOWED_REPORT_EXTS:
-        return jsonify(
-            {
-                "error": "Unsupported file type",
-                "message": f"Allowed: {', '.join(sorted(_ALLOWED_REPORT_EXTS))}",
-            }
-        ), 400
-
-    image_bytes = f.read()
-    if not image_bytes:
-        return jsonify({"error": "Empty file", "message": "Uploaded file is empty"}), 400
-
-    # Optional: save original upload for debugging/auditing later.
-    # For MVP we keep it off by default.
-    if (os.getenv("SAVE_OCR_UPLOADS") or "").strip().lower() in {"1", "true", "yes"}:
-        base = Path(Config.UPLOAD_FOLDER) / "reports"
-        base.mkdir(parents=True, exist_ok=True)
-        (base / filename).write_bytes(image_bytes)
+        return (
+            None,
+            None,
+            None,
+            (
+                jsonify(
+                    {
+                        "error": "Unsupported file type",
+                        "message": f"Allowed: {', '.join(sorted(_ALLOWED_REPORT_EXTS))}",
+                    }
+                ),
+                400,
+            ),
+        )
 
     try:
-        text, confidence = _ocr_bytes(ext=ext, data=image_bytes)
-        return jsonify({"text": text, "confidence": confidence}), 200
-    except Exception as exc:
-        return jsonify({"error": "OCR failed", "message": str(exc)}), 500
+        upload = spool_upload(f.stream)
+    except UploadTooLargeError as exc:
+        return None, None, None, (jsonify({"error": "File too large", "message": str(exc)}), 413)
+    if not upload.size:
+        upload.close()
+        return None, None, None, (jsonify({"error": "Empty file", "message": "Uploaded file is empty"}), 400)
+
+    return filename, ext, upload, None
+
+
+def _isoformat(value):
+    if not value:
+        return None
+    try:
+        return value.isoformat()
+    except Exception:
+        return str(value)
+
+
+def _simplify_upload(*, ext: str, upload: SpooledUpload, model: str):
+    """OCR + Gemini explanation for an upload. Returns (ocr_text, confidence, explanation)."""
+
+    ocr_text, confidence = _ocr_bytes(ext=ext, data=upload.source())
+
+    # Keep OCR for database/search even if it's imperfect.
+    if not (ocr_text or "").strip():
+        ocr_text = OCR_FAILED_PLACEHOLDER
+        confidence = None
+
+    # Accuracy upgrade: for the explanation, prefer Gemini multimodal analysis
+    # using the original file bytes so tables/columns/layout are preserved.
+    mime_type = mime_type_for(ext)
+
+    try:
+        explanation = explain_bytes_with_gemini(upload.view(), mime_type=mime_type, model=model)
+    except NotMedicalDocumentError:
+        raise
+    except Exception:
+        # Fallback: keep the original behavior if vision/PDF analysis fails.
+        # This prevents regressions on environments/models that don't support multimodal.
+        if (ocr_text or "").strip() and not ocr_text.startswith("[OCR failed"):
+            explanation = simplify_ocr_text(ocr_text, model=model)
+        else:
+            raise
+
+    return ocr_text, confidence, explanation
+
+
+@reports_bp.route("/ocr", methods=["POST"])
+@jwt_required_custom
+def ocr_report():
+    """Extract raw text from an uploaded report image using Tesseract.
+
+    Request: multipart/form-data with field 'file'
+    Response: { text: str, confidence: number|null, pages?: [{page, method: "text"|"ocr", chars}] }
+    Images accept ``?words=1`` to also return word boxes from the same OCR pass.
+    """
+
+    _ = _as_user_id()  # Ensure request is authenticated
+
+    filename, ext, upload, error = _read_report_upload()
+    if error:
+        return error
+
+    with upload:
+        # Optional: save original upload for debugging/auditing later.
+        # For MVP we keep it off by default.
+        if (os.getenv("SAVE_OCR_UPLOADS") or "").strip().lower() in {"1", "true", "yes"}:
+            base = Path(Config.UPLOAD_FOLDER) / "reports"
+            base.mkdir(parents=True, exist_ok=True)
+            upload.copy_to(base / filename)
+
+        try:
+            if ext == "pdf":
+                # Report which pages used the PDF text layer vs. OCR.
+                text, confidence, pages = extract_pdf_text(upload.source())
+                return jsonify({"text": text, "confidence": confidence, "pages": pages}), 200
+            result = ocr_image_bytes(upload.source())
+            if (request.args.get("words") or "").strip().lower() not in {"1", "true", "yes"}:
+                result.pop("words", None)
+            return jsonify(result), 200
+        except Exception as exc:
+            return jsonify({"error": "OCR failed", "message": str(exc)}), 500
 
 
 @reports_bp.route("/explain", methods=["POST"])
@@ -175,58 +288,39 @@ def simplify_report_and_save():
     except Exception as exc:
         return jsonify({"error": "Unauthorized", "message": str(exc)}), 401
 
-    if "file" not in request.files:
-        return jsonify({"error": "Missing file", "message": "Send multipart field 'file'"}), 400
-
-    f = request.files["file"]
-    if not f or not getattr(f, "filename", ""):
-        return jsonify({"error": "Invalid file", "message": "No file selected"}), 400
-
-    filename = secure_filename(f.filename)
-    ext = (Path(filename).suffix or "").lstrip(".").lower()
-    if ext not in _ALLOWED_REPORT_EXTS:
-        return (
-            jsonify(
-                {
-                    "error": "Unsupported file type",
-                    "message": f"Allowed: {', '.join(sorted(_ALLOWED_REPORT_EXTS))}",
-                }
-            ),
-            400,
-        )
+    filename, ext, upload, error = _read_report_upload()
+    if error:
+        return error
 
-    model = (request.form.get("model") or request.args.get("model") or "gemini-3-flash-preview").strip()
+    model = (request.form.get("model") or request.args.get("model") or _DEFAULT_MODEL).strip()
 
-    data = f.read()
-    if not data:
-        return jsonify({"error": "Empty file", "message": "Uploaded file is empty"}), 400
+    # Re-uploads of the same file (same bytes + model) skip OCR and Gemini.
+    cache = get_report_cache()
+    key = digest_key(upload.sha256, model)
+    cached = cache.get(key)
 
     try:
-        ocr_text, confidence = _ocr_bytes(ext=ext, data=data)
-
-        # Keep OCR for database/search even if it's imperfect.
-        if not (ocr_text or "").strip():
-            ocr_text = "[OCR failed to extract text, but AI analysis may still succeed]"
-            confidence = None
-
-        # Accuracy upgrade: for the explanation, prefer Gemini multimodal analysis
-        # using the original file bytes so tables/columns/layout are preserved.
-        if ext == "pdf":
-            mime_type = "application/pdf"
-        elif ext == "png":
-            mime_type = "image/png"
+        if cached is not None:
+            if cached.get("verdict") == VERDICT_NOT_MEDICAL:
+                return jsonify({"error": "Invalid input", "message": cached.get("reason") or ""}), 400
+            ocr_text = cached.get("ocr_text") or ""
+            confidence = cached.get("confidence")
+            explanation = cached.get("explanation") or ""
         else:
-            mime_type = "image/jpeg"
-
-        try:
-            explanation = explain_bytes_with_gemini(data, mime_type=mime_type, model=model)
-        except Exception:
-            # Fallback: keep the original behavior if vision/PDF analysis fails.
-            # This prevents regressions on environments/models that don't support multimodal.
-            if (ocr_text or "").strip() and not ocr_text.startswith("[OCR failed"):
-                explanation = simplify_ocr_text(ocr_text, model=model)
-            else:
+            try:
+                ocr_text, confidence, explanation = _simplify_upload(ext=ext, upload=upload, model=model)
+            except NotMedicalDocumentError as exc:
+                cache.put(key, {"verdict": VERDICT_NOT_MEDICAL, "reason": str(exc)})
                 raise
+            cache.put(
+                key,
+                {
+                    "verdict": VERDICT_MEDICAL,
+                    "ocr_text": ocr_text,
+                    "confidence": confidence,
+                    "explanation": explanation,
+                },
+            )
 
         report_id = execute_query(
             """
@@ -248,12 +342,7 @@ def simplify_report_and_save():
             fetch_one=True,
         )
 
-        uploaded_at = None
-        if row and row.get("uploaded_at"):
-            try:
-                uploaded_at = row["uploaded_at"].isoformat()
-            except Exception:
-                uploaded_at = str(row.get("uploaded_at"))
+        uploaded_at = _isoformat((row or {}).get("uploaded_at"))
 
         return (
             jsonify(
@@ -265,6 +354,7 @@ def simplify_report_and_save():
                     "explanation": explanation,
                     "model": model,
                     "uploaded_at": uploaded_at,
+                    "cached": cached is not None,
                 }
             ),
             201,
@@ -283,6 +373,124 @@ def simplify_report_and_save():
             payload["error"] = "Simplify failed"
             return jsonify(payload), code
         return res, code
+    finally:
+        upload.close()
+
+
+def _job_payload(job):
+    stages = load_stages(job)
+    payload = {
+        "job_id": int(job["id"]),
+        "status": job.get("status"),
+        "stage": job.get("stage"),
+        "stages": [{"name": name, "status": "pending", **stages.get(name, {})} for name in STAGES],
+        "progress": sum(1 for name in STAGES if stages.get(name, {}).get("status") == "done") / len(STAGES),
+        "attempts": int(job.get("attempts") or 0),
+        "error": job.get("error"),
+        "retryable": job.get("status") in RETRYABLE_STATUSES and bool(job.get("work_dir")),
+        "file_name": job.get("file_name"),
+        "model": job.get("model"),
+        "created_at": _isoformat(job.get("created_at")),
+        "finished_at": _isoformat(job.get("finished_at")),
+    }
+    if job.get("status") == STATUS_SUCCEEDED:
+        payload["result"] = {
+            "report_id": job.get("report_id"),
+            "text": job.get("ocr_text"),
+            "confidence": job.get("ocr_confidence"),
+            "explanation": job.get("explanation"),
+        }
+    return payload
+
+
+@reports_bp.route("/jobs", methods=["POST"])
+@jwt_required_custom
+def submit_report_job():
+    """Queue a report for background OCR + AI simplification.
+
+    Request: multipart/form-data with field 'file' and optional 'model'
+    Response (202): job status (see GET /jobs/<id>)
+    """
+
+    try:
+        user_id = _as_user_id()
+    except Exception as exc:
+        return jsonify({"error": "Unauthorized", "message": str(exc)}), 401
+
+    filename, ext, upload, error = _read_report_upload()
+    if error:
+        return error
+
+    model = (request.form.get("model") or request.args.get("model") or _DEFAULT_MODEL).strip()
+
+    try:
+        runner = get_job_runner()
+        job_id = runner.create(user_id=user_id, file_name=filename, file_ext=ext, data=upload, model=model)
+        runner.submit(job_id)
+        job = runner.store.get(job_id, user_id=user_id)
+        return jsonify(_job_payload(job)), 202
+    except Exception as exc:
+        return jsonify({"error": "Failed to queue report", "message": str(exc)}), 500
+    finally:
+        upload.close()
+
+
+@reports_bp.route("/jobs/<int:job_id>", methods=["GET"])
+@jwt_required_custom
+def get_report_job(job_id):
+    """Job status with per-stage progress.
+
+    Returns at once; clients short-poll every second or two. Waiting here
+    would hold a gunicorn worker and a pooled connection for the whole job.
+    """
+
+    try:
+        user_id = _as_user_id()
+        job = get_job_runner().store.get(job_id, user_id=user_id)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+
+        return jsonify(_job_payload(job)), 200
+    except Exception as exc:
+        return jsonify({"error": "Failed to fetch job", "message": str(exc)}), 500
+
+
+@reports_bp.route("/jobs/<int:job_id>/cancel", methods=["POST"])
+@jwt_required_custom
+def cancel_report_job(job_id):
+    """Cancel a queued or running job (remaining OCR pages are abandoned)."""
+
+    try:
+        user_id = _as_user_id()
+        runner = get_job_runner()
+        if not runner.cancel(job_id, user_id=user_id):
+            job = runner.store.get(job_id, user_id=user_id)
+            if not job:
+                return jsonify({"error": "Job not found"}), 404
+            return jsonify({"error": "Job already finished", "status": job.get("status")}), 409
+        return jsonify(_job_payload(runner.store.get(job_id, user_id=user_id))), 200
+    except Exception as exc:
+        return jsonify({"error": "Failed to cancel job", "message": str(exc)}), 500
+
+
+@reports_bp.route("/jobs/<int:job_id>/retry", methods=["POST"])
+@jwt_required_custom
+def retry_report_job(job_id):
+    """Re-queue a failed job; stages that already finished are not repeated."""
+
+    try:
+        user_id = _as_user_id()
+        runner = get_job_runner()
+        if not runner.store.requeue(job_id, user_id=user_id):
+            job = runner.store.get(job_id, user_id=user_id)
+            if not job:
+                return jsonify({"error": "Job not found"}), 404
+            return jsonify({"error": "Job is not retryable", "status": job.get("status")}), 409
+
+        runner.submit(job_id)
+        return jsonify(_job_payload(runner.store.get(job_id, user_id=user_id))), 202
+    except Exception as exc:
+        return jsonify({"error": "Failed to retry job", "message": str(exc)}), 500
 
 
 @reports_bp.route("/history", methods=["GET"])
@@ -292,32 +500,31 @@ def list_report_history():
 
     try:
         user_id = _as_user_id()
-        limit = request.args.get("limit", "20")
+        limit_i = parse_limit(request.args.get("limit"), default=20, maximum=100)
         try:
-            limit_i = max(1, min(int(limit), 100))
-        except Exception:
-            limit_i = 20
+            position = decode_cursor(request.args.get("cursor"))
+        except ValueError as exc:
+            return jsonify({"error": str(exc)}), 400
 
+        after_sql, after_params = keyset_condition("uploaded_at", "id", position)
         rows = execute_query(
-            """
+            f"""
             SELECT id, file_name, ai_interpretation, uploaded_at
             FROM medical_reports
-            WHERE user_id = %s
+            WHERE user_id = %s{after_sql}
             ORDER BY uploaded_at DESC, id DESC
             LIMIT %s
             """,
-            (user_id, limit_i),
+            (user_id, *after_params, limit_i + 1),
             fetch_all=True,
         )
+        rows, next_cursor = split_page(rows, limit_i, ts_key="uploaded_at")
 
-        for r in rows or []:
+        for r in rows:
             if r.get("uploaded_at"):
-                try:
-                    r["uploaded_at"] = r["uploaded_at"].isoformat()
-                except Exception:
-                    r["uploaded_at"] = str(r.get("uploaded_at"))
+                r["uploaded_at"] = _isoformat(r["uploaded_at"])
 
-        return jsonify({"history": rows or []}), 200
+        return jsonify({"history": rows, "next_cursor": next_cursor}), 200
     except Exception as exc:
         return jsonify({"error": "Failed to fetch history", "message": str(exc)}), 500
 
@@ -1,26 +1,21 @@
 import json
-import os
 import re
 import time
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Tuple
 
-import requests
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import get_jwt_identity
 
-from config import Config
+from utils.ai_gateway import AIGatewayError, get_gateway
 from utils.auth_utils import jwt_required_custom
 from utils.database import execute_query
+from utils.pagination import decode_cursor, keyset_condition, parse_limit, split_page
 from utils.validators import validate_required_fields
 
 symptoms_bp = Blueprint("symptoms", __name__)
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", Config.GEMINI_API_KEY)
-GEMINI_API_URL = (
-    "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key="
-    + (GEMINI_API_KEY or "")
-)
+SYMPTOM_MODEL = "gemini-2.5-flash"
 _SPECIALTY_CANON = [
     "General Practice",
     "Cardiology",
@@ -242,9 +237,6 @@ def _normalize_specialty(value: Optional[str], allowed: List[str]) -> str:
 def _gemini_symptom_analysis(
     payload: Dict[str, Any], allowed_specialties: List[str]
 ) -> Tuple[str, Optional[Dict[str, Any]]]:
-    if not GEMINI_API_KEY:
-        raise RuntimeError("GEMINI_API_KEY is not set")
-
     symptoms = (payload.get("symptoms") or "").strip()
     age = payload.get("age")
     gender = (payload.get("gender") or "").strip()
@@ -284,22 +276,7 @@ def _gemini_symptom_analysis(
         "Return ONLY JSON. No markdown."
     )
 
-    req = {
-        "contents": [
-            {
-                "parts": [
-                    {
-                        "text": prompt,
-                    }
-                ]
-            }
-        ]
-    }
-
-    resp = requests.post(GEMINI_API_URL, json=req, timeout=30)
-    resp.raise_for_status()
-    data = resp.json()
-    ai_text = data["candidates"][0]["content"]["parts"][0]["text"]
+    ai_text = get_gateway().generate_text(prompt, model=SYMPTOM_MODEL)
 
     parsed = _extract_json_object(ai_text)
     return ai_text, parsed
@@ -438,7 +415,7 @@ def analyze_symptoms():
             }
         )
 
-    except requests.HTTPError as e:
+    except AIGatewayError as e:
         return jsonify({"error": "AI service error", "message": str(e)}), 502
     except Exception as e:
         return jsonify({"error": "Failed to analyze symptoms", "message": str(e)}), 500
@@ -453,24 +430,29 @@ def symptom_history():
             user_id = int(raw_identity)
         except (TypeError, ValueError):
             return jsonify({"error": "Invalid authentication identity"}), 401
-        limit = request.args.get("limit", default=20, type=int)
-        limit = max(1, min(limit, 100))
+        limit = parse_limit(request.args.get("limit"), default=20, maximum=100)
+        try:
+            position = decode_cursor(request.args.get("cursor"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
+        after_sql, after_params = keyset_condition("created_at", "id", position)
         rows = execute_query(
-            """
+            f"""
             SELECT id, symptoms, ai_analysis, recommended_specialty, urgency_level, created_at
             FROM symptom_logs
-            WHERE user_id = %s
-            ORDER BY created_at DESC
+            WHERE user_id = %s{after_sql}
+            ORDER BY created_at DESC, id DESC
             LIMIT %s
             """,
-            (user_id, limit),
+            (user_id, *after_params, limit + 1),
             fetch_all=True,
         )
+        rows, next_cursor = split_page(rows, limit, ts_key="created_at")
 
         # Parse ai_analysis JSON if possible for nicer UI, otherwise omit heavy blob.
         history: List[Dict[str, Any]] = []
-        for row in rows or []:
+        for row in rows:
             ai_obj = _extract_json_object(row.get("ai_analysis") or "")
             history.append(
                 {
@@ -485,7 +467,7 @@ def symptom_history():
                 }
             )
 
-        return jsonify({"history": history})
+        return jsonify({"history": history, "next_cursor": next_cursor})
 
     except Exception as e:
         return jsonify({"error": "Failed to fetch history", "message": str(e)}), 500
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from utils.database import get_db_connection
+from utils.bed_reservations import BedUnavailableError, HoldNotActiveError, get_bed_reservations, restore_bed
+from utils.database import execute_query, get_db_connection
 import pymysql
 
 user_bed_booking_bp = Blueprint('user_bed_booking', __name__)
@@ -21,6 +22,13 @@ def get_hospital_id_from_jwt():
     return int(jwt_identity)
 
 
+def get_idempotency_key(data):
+    """Idempotency key from the ``Idempotency-Key`` header or an ``idempotency_key`` field"""
+    key = request.headers.get('Idempotency-Key') or (data or {}).get('idempotency_key')
+    key = str(key).strip() if key else ''
+    return key[:64] or None
+
+
 def get_user_id_from_jwt():
     """Extract user ID from JWT identity (handles 'user_X' format if applicable)"""
     jwt_identity = get_jwt_identity()
@@ -74,12 +82,16 @@ def debug_all_bookings():
 @user_bed_booking_bp.route('/user/bed-bookings', methods=['POST'])
 @jwt_required()
 def create_bed_booking():
-    """Create a new bed booking request from a user"""
-    conn = None
-    cursor = None
+    """Create a new bed booking request from a user
+
+    The bed is taken atomically (see utils/bed_reservations.py). Send an
+    ``Idempotency-Key`` header (or ``idempotency_key`` field) to make retries
+    safe, and ``hold_id`` to confirm a bed held via POST /user/bed-holds.
+    """
     try:
         user_id = get_user_id_from_jwt()
         data = request.get_json()
+        hold_id = clean_value(data.get('hold_id'))
         
         # Required fields
         hospital_id = data.get('hospital_id')
@@ -88,39 +100,33 @@ def create_bed_booking():
         patient_phone = data.get('patient_phone')
         admission_date = data.get('admission_date')  # Maps to preferred_date in DB
         
-        if not all([hospital_id, ward_type, patient_name, patient_phone, admission_date]):
+        if not all([hospital_id or hold_id, ward_type or hold_id, patient_name, patient_phone, admission_date]):
             return jsonify({'error': 'Missing required fields: hospital_id, ward_type, patient_name, patient_phone, admission_date'}), 400
         
         # Optional fields - clean empty strings
         ac_type = clean_value(data.get('ac_type')) or 'not_applicable'
         room_config = clean_value(data.get('room_config'))
-        patient_age = clean_value(data.get('patient_age'))
-        patient_gender = clean_value(data.get('patient_gender'))
         patient_email = clean_value(data.get('patient_email'))
-        emergency_contact = clean_value(data.get('emergency_contact'))
-        medical_condition = clean_value(data.get('medical_condition'))  # Maps to admission_reason in DB
-        expected_discharge_date = clean_value(data.get('expected_discharge_date'))
-        doctor_name = clean_value(data.get('doctor_name'))
-        special_requirements = clean_value(data.get('special_requirements'))
-        notes = clean_value(data.get('notes'))
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
         # Default patient_email to the logged-in user's email when not explicitly provided.
         if not patient_email:
             try:
-                cursor.execute("SELECT email FROM users WHERE id = %s", (user_id,))
-                user_row = cursor.fetchone()
+                user_row = execute_query("SELECT email FROM users WHERE id = %s", (user_id,), fetch_one=True)
                 if user_row and user_row.get('email'):
                     patient_email = user_row['email']
             except Exception:
                 # Non-fatal: booking can proceed without patient_email.
                 pass
         
+        reservations = get_bed_reservations()
+        if hold_id:
+            hold = reservations.get_hold(int(hold_id), user_id=user_id)
+            if not hold:
+                return jsonify({'error': 'Bed hold not found'}), 404
+            hospital_id = hold['hospital_id']
+        
         # Verify hospital exists
-        cursor.execute("SELECT id, name FROM hospitals WHERE id = %s", (hospital_id,))
-        hospital = cursor.fetchone()
+        hospital = execute_query("SELECT id, name FROM hospitals WHERE id = %s", (hospital_id,), fetch_one=True)
         if not hospital:
             return jsonify({'error': 'Hospital not found'}), 404
         
@@ -128,83 +134,105 @@ def create_bed_booking():
         if ward_type == 'private_room':
             ac_type = 'not_applicable'
 
-        # Check bed availability before booking
-        if ward_type == 'private_room' and room_config:
-            cursor.execute("""
-                SELECT available_beds FROM bed_wards 
-                WHERE hospital_id = %s AND ward_type = %s AND room_config = %s
-            """, (hospital_id, ward_type, room_config))
-        elif ward_type in ['icu', 'emergency']:
-            cursor.execute("""
-                SELECT available_beds FROM bed_wards 
-                WHERE hospital_id = %s AND ward_type = %s
-            """, (hospital_id, ward_type))
-        else:
-            cursor.execute("""
-                SELECT available_beds FROM bed_wards 
-                WHERE hospital_id = %s AND ward_type = %s AND ac_type = %s
-            """, (hospital_id, ward_type, ac_type))
-        
-        bed_availability = cursor.fetchone()
-        if not bed_availability or bed_availability['available_beds'] <= 0:
-            return jsonify({'error': 'No beds available for the selected ward type. Please choose a different option.'}), 400
-        
-        # Insert booking (using actual DB column names) - Status is 'confirmed' immediately
-        cursor.execute("""
-            INSERT INTO user_bed_bookings (
-                user_id, hospital_id, ward_type, ac_type, room_config,
-                patient_name, patient_age, patient_gender, patient_phone,
-                patient_email, emergency_contact, preferred_date,
-                expected_discharge_date, admission_reason, doctor_name,
-                special_requirements, notes, status
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 'confirmed')
-        """, (
-            user_id, hospital_id, ward_type, ac_type, room_config,
-            patient_name, patient_age, patient_gender, patient_phone,
-            patient_email, emergency_contact, admission_date,
-            expected_discharge_date, medical_condition, doctor_name,
-            special_requirements, notes
-        ))
-        
-        # Update bed_wards table: decrease available_beds and increase occupied_beds
-        if ward_type == 'private_room' and room_config:
-            cursor.execute("""
-                UPDATE bed_wards 
-                SET available_beds = available_beds - 1, occupied_beds = occupied_beds + 1
-                WHERE hospital_id = %s AND ward_type = %s AND room_config = %s AND available_beds > 0
-            """, (hospital_id, ward_type, room_config))
-        elif ward_type in ['icu', 'emergency']:
-            cursor.execute("""
-                UPDATE bed_wards 
-                SET available_beds = available_beds - 1, occupied_beds = occupied_beds + 1
-                WHERE hospital_id = %s AND ward_type = %s AND available_beds > 0
-            """, (hospital_id, ward_type))
-        else:
-            cursor.execute("""
-                UPDATE bed_wards 
-                SET available_beds = available_beds - 1, occupied_beds = occupied_beds + 1
-                WHERE hospital_id = %s AND ward_type = %s AND ac_type = %s AND available_beds > 0
-            """, (hospital_id, ward_type, ac_type))
-        
-        conn.commit()
-        booking_id = cursor.lastrowid
+        # Status is 'confirmed' immediately (column names are the actual DB ones)
+        result = reservations.book(
+            user_id=user_id,
+            hospital_id=hospital_id,
+            ward_type=ward_type,
+            ac_type=ac_type,
+            room_config=room_config,
+            hold_id=int(hold_id) if hold_id else None,
+            idempotency_key=get_idempotency_key(data),
+            fields={
+                'patient_name': patient_name,
+                'patient_age': clean_value(data.get('patient_age')),
+                'patient_gender': clean_value(data.get('patient_gender')),
+                'patient_phone': patient_phone,
+                'patient_email': patient_email,
+                'emergency_contact': clean_value(data.get('emergency_contact')),
+                'preferred_date': admission_date,
+                'expected_discharge_date': clean_value(data.get('expected_discharge_date')),
+                'admission_reason': clean_value(data.get('medical_condition')),
+                'doctor_name': clean_value(data.get('doctor_name')),
+                'special_requirements': clean_value(data.get('special_requirements')),
+                'notes': clean_value(data.get('notes')),
+            },
+        )
         
         return jsonify({
             'message': 'Bed booked successfully! Your reservation is confirmed.',
-            'booking_id': booking_id,
+            'booking_id': result['booking_id'],
             'hospital_name': hospital['name'],
-            'status': 'confirmed'
-        }), 201
-        
+            'status': 'confirmed',
+            'replayed': result['replayed']
+        }), 200 if result['replayed'] else 201
+        
+    except BedUnavailableError:
+        return jsonify({'error': 'No beds available for the selected ward type. Please choose a different option.'}), 400
+    except HoldNotActiveError as e:
+        return jsonify({'error': str(e)}), 409
     except pymysql.MySQLError as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
     except Exception as e:
         return jsonify({'error': f'Failed to create booking: {str(e)}'}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+
+
+@user_bed_booking_bp.route('/user/bed-holds', methods=['POST'])
+@jwt_required()
+def create_bed_hold():
+    """Set a bed aside for BED_HOLD_TTL_SECONDS while the user fills in the booking form"""
+    try:
+        user_id = get_user_id_from_jwt()
+        data = request.get_json() or {}
+        hospital_id = data.get('hospital_id')
+        ward_type = data.get('ward_type')
+        if not all([hospital_id, ward_type]):
+            return jsonify({'error': 'Missing required fields: hospital_id, ward_type'}), 400
+        
+        reservations = get_bed_reservations()
+        if not reservations.holds_supported:
+            return jsonify({'error': 'Bed holds are not available on this database (apply database/schema.sql)'}), 503
+        
+        ac_type = clean_value(data.get('ac_type')) or 'not_applicable'
+        if ward_type == 'private_room':
+            ac_type = 'not_applicable'
+        hold = reservations.hold(
+            user_id=user_id,
+            hospital_id=hospital_id,
+            ward_type=ward_type,
+            ac_type=ac_type,
+            room_config=clean_value(data.get('room_config')),
+            idempotency_key=get_idempotency_key(data),
+        )
+        
+        return jsonify({
+            'hold_id': hold['id'],
+            'status': hold['status'],
+            'expires_at': str(hold['expires_at']) if hold.get('expires_at') else None,
+            'replayed': hold['replayed']
+        }), 200 if hold['replayed'] else 201
+        
+    except BedUnavailableError:
+        return jsonify({'error': 'No beds available for the selected ward type. Please choose a different option.'}), 400
+    except pymysql.MySQLError as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+    except Exception as e:
+        return jsonify({'error': f'Failed to hold bed: {str(e)}'}), 500
+
+
+@user_bed_booking_bp.route('/user/bed-holds/<int:hold_id>', methods=['DELETE'])
+@jwt_required()
+def release_bed_hold(hold_id):
+    """Give a held bed back before its hold expires"""
+    try:
+        user_id = get_user_id_from_jwt()
+        if not get_bed_reservations().release(hold_id, user_id=user_id):
+            return jsonify({'error': 'Hold not found or no longer held'}), 404
+        return jsonify({'message': 'Bed hold released'}), 200
+    except pymysql.MySQLError as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+    except Exception as e:
+        return jsonify({'error': f'Failed to release hold: {str(e)}'}), 500
 
 
 @user_bed_booking_bp.route('/user/bed-bookings', methods=['GET'])
@@ -278,9 +306,9 @@ def cancel_booking(booking_id):
         cursor = conn.cursor()
         
         # Verify booking belongs to user and get booking details
+        # SELECT * so ward_id is read where the column exists (older schemas lack it)
         cursor.execute("""
-            SELECT id, status, hospital_id, ward_type, ac_type, room_config 
-            FROM user_bed_bookings 
+            SELECT * FROM user_bed_bookings 
             WHERE id = %s AND user_id = %s
         """, (booking_id, user_id))
         
@@ -291,37 +319,19 @@ def cancel_booking(booking_id):
         if booking['status'] in ['cancelled', 'completed']:
             return jsonify({'error': f'Cannot cancel a {booking["status"]} booking'}), 400
         
-        # Update booking status to cancelled
+        # Update booking status to cancelled; only the request that actually
+        # changed the status restores the bed (concurrent cancels can't double-count).
         cursor.execute("""
             UPDATE user_bed_bookings 
             SET status = 'cancelled', updated_at = NOW()
-            WHERE id = %s
-        """, (booking_id,))
+            WHERE id = %s AND status = %s
+        """, (booking_id, booking['status']))
+        if cursor.rowcount != 1:
+            conn.rollback()
+            return jsonify({'error': 'Booking was modified concurrently, please retry'}), 409
         
-        # Restore bed availability: increase available_beds and decrease occupied_beds
-        ward_type = booking['ward_type']
-        hospital_id = booking['hospital_id']
-        ac_type = booking['ac_type']
-        room_config = booking['room_config']
-        
-        if ward_type == 'private_room' and room_config:
-            cursor.execute("""
-                UPDATE bed_wards 
-                SET available_beds = available_beds + 1, occupied_beds = GREATEST(occupied_beds - 1, 0)
-                WHERE hospital_id = %s AND ward_type = %s AND room_config = %s
-            """, (hospital_id, ward_type, room_config))
-        elif ward_type in ['icu', 'emergency']:
-            cursor.execute("""
-                UPDATE bed_wards 
-                SET available_beds = available_beds + 1, occupied_beds = GREATEST(occupied_beds - 1, 0)
-                WHERE hospital_id = %s AND ward_type = %s
-            """, (hospital_id, ward_type))
-        else:
-            cursor.execute("""
-                UPDATE bed_wards 
-                SET available_beds = available_beds + 1, occupied_beds = GREATEST(occupied_beds - 1, 0)
-                WHERE hospital_id = %s AND ward_type = %s AND ac_type = %s
-            """, (hospital_id, ward_type, ac_type))
+        # Restore bed availability in the ward the booking took it from
+        restore_bed(cursor, booking)
         
         conn.commit()
         
@@ -533,8 +543,7 @@ def update_booking_status(booking_id):
         
         # Get full booking details for bed availability update
         cursor.execute("""
-            SELECT id, status, ward_type, ac_type, room_config 
-            FROM user_bed_bookings WHERE id = %s
+            SELECT * FROM user_bed_bookings WHERE id = %s
         """, (booking_id,))
         booking_details = cursor.fetchone()
         old_status = booking_details['status']
@@ -546,36 +555,19 @@ def update_booking_status(booking_id):
             update_query += ", notes = %s"
             params.append(notes)
         
-        update_query += " WHERE id = %s"
-        params.append(booking_id)
+        update_query += " WHERE id = %s AND status = %s"
+        params.extend([booking_id, old_status])
         
         cursor.execute(update_query, params)
-        
-        # Handle bed availability based on status change
-        ward_type = booking_details['ward_type']
-        ac_type = booking_details['ac_type']
-        room_config = booking_details['room_config']
+        # Guard on the status read above so a concurrent change can't restore the bed twice
+        # (a same-status update may legitimately report 0 changed rows).
+        if new_status != old_status and cursor.rowcount != 1:
+            conn.rollback()
+            return jsonify({'error': 'Booking was modified concurrently, please retry'}), 409
         
         # If changing from confirmed to cancelled/rejected/completed - restore bed
         if old_status == 'confirmed' and new_status in ['cancelled', 'rejected', 'completed']:
-            if ward_type == 'private_room' and room_config:
-                cursor.execute("""
-                    UPDATE bed_wards 
-                    SET available_beds = available_beds + 1, occupied_beds = GREATEST(occupied_beds - 1, 0)
-                    WHERE hospital_id = %s AND ward_type = %s AND room_config = %s
-                """, (hospital_id, ward_type, room_config))
-            elif ward_type in ['icu', 'emergency']:
-                cursor.execute("""
-                    UPDATE bed_wards 
-                    SET available_beds = available_beds + 1, occupied_beds = GREATEST(occupied_beds - 1, 0)
-                    WHERE hospital_id = %s AND ward_type = %s
-                """, (hospital_id, ward_type))
-            else:
-                cursor.execute("""
-                    UPDATE bed_wards 
-                    SET available_beds = available_beds + 1, occupied_beds = GREATEST(occupied_beds - 1, 0)
-                    WHERE hospital_id = %s AND ward_type = %s AND ac_type = %s
-                """, (hospital_id, ward_type, ac_type))
+            restore_bed(cursor, booking_details)
         
         conn.commit()
         
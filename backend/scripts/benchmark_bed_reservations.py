@@ -0,0 +1,180 @@
+"""Hammer one ward with concurrent bookings and check for overselling.
+
+Creates a scratch hospital, user and ward with ``--beds`` free beds in the
+configured database (``.env``), then starts ``--threads`` threads that each
+try to book ``--attempts`` times:
+
+- legacy: the old ``create_bed_booking`` flow (read ``available_beds``,
+  insert the booking, conditional decrement whose row count is ignored);
+- atomic: ``BedReservationService.book`` (insert + conditional decrement,
+  decided by the affected-row count);
+- hold:   ``BedReservationService.hold`` then ``book(hold_id=...)``.
+
+Reports confirmed bookings vs beds (oversold must be 0 for atomic/hold),
+throughput and per-attempt latency. The scratch rows are deleted afterwards
+unless ``--keep`` is given.
+
+Usage:
+    python scripts/benchmark_bed_reservations.py --threads 32 --beds 20 --attempts 5
+"""
+
+import argparse
+import statistics
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+_BACKEND_DIR = Path(__file__).resolve().parents[1]
+if str(_BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(_BACKEND_DIR))
+
+from utils.bed_reservations import BedReservationService, BedUnavailableError, HoldNotActiveError  # noqa: E402
+from utils.database import execute_query, get_db_connection  # noqa: E402
+
+
+_FIELDS = {"patient_name": "Benchmark", "patient_phone": "0000", "preferred_date": "2030-01-01"}
+
+
+def _setup(beds: int):
+    tag = uuid.uuid4().hex[:10]
+    hospital_id = execute_query(
+        """
+        INSERT INTO hospitals (name, address, city, email, password_hash, total_beds, available_beds, icu_beds)
+        VALUES (%s, 'benchmark', 'benchmark', %s, 'x', %s, %s, 0)
+        """,
+        (f"Bed benchmark {tag}", f"bed-bench-{tag}@example.invalid", beds, beds),
+        commit=True,
+    )
+    user_id = execute_query(
+        "INSERT INTO users (email, password_hash, name) VALUES (%s, 'x', 'Bed benchmark')",
+        (f"bed-bench-{tag}@example.invalid",),
+        commit=True,
+    )
+    return hospital_id, user_id
+
+
+def _reset_ward(hospital_id: int, beds: int) -> None:
+    execute_query("DELETE FROM user_bed_bookings WHERE hospital_id = %s", (hospital_id,), commit=True)
+    execute_query("DELETE FROM bed_wards WHERE hospital_id = %s", (hospital_id,), commit=True)
+    execute_query(
+        """
+        INSERT INTO bed_wards (hospital_id, ward_type, ac_type, total_beds, available_beds, occupied_beds)
+        VALUES (%s, 'general', 'ac', %s, %s, 0)
+        """,
+        (hospital_id, beds, beds),
+        commit=True,
+    )
+
+
+def _legacy_book(hospital_id: int, user_id: int) -> bool:
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT available_beds FROM bed_wards WHERE hospital_id = %s AND ward_type = 'general' AND ac_type = 'ac'",
+                (hospital_id,),
+            )
+            row = cursor.fetchone()
+            if not row or row["available_beds"] <= 0:
+                return False
+            cursor.execute(
+                """
+                INSERT INTO user_bed_bookings (user_id, hospital_id, ward_type, ac_type, patient_name, patient_phone, preferred_date, status)
+                VALUES (%s, %s, 'general', 'ac', %s, %s, %s, 'confirmed')
+                """,
+                (user_id, hospital_id, _FIELDS["patient_name"], _FIELDS["patient_phone"], _FIELDS["preferred_date"]),
+            )
+            cursor.execute(
+                """
+                UPDATE bed_wards SET available_beds = available_beds - 1, occupied_beds = occupied_beds + 1
+                WHERE hospital_id = %s AND ward_type = 'general' AND ac_type = 'ac' AND available_beds > 0
+                """,
+                (hospital_id,),
+            )
+        conn.commit()
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def _run(mode: str, service: BedReservationService, hospital_id: int, user_id: int, threads: int, attempts: int):
+    latencies, confirmed, errors = [], [0], [0]
+    lock = threading.Lock()
+    start = threading.Barrier(threads)
+
+    def attempt() -> bool:
+        book = dict(user_id=user_id, hospital_id=hospital_id, ward_type="general", ac_type="ac", room_config=None, fields=_FIELDS)
+        if mode == "legacy":
+            return _legacy_book(hospital_id, user_id)
+        try:
+            if mode == "hold":
+                hold = service.hold(user_id=user_id, hospital_id=hospital_id, ward_type="general", ac_type="ac", room_config=None)
+                service.book(hold_id=hold["id"], **book)
+            else:
+                service.book(**book)
+            return True
+        except (BedUnavailableError, HoldNotActiveError):
+            return False
+
+    def worker():
+        start.wait()
+        for _ in range(attempts):
+            began = time.perf_counter()
+            try:
+                ok = attempt()
+            except Exception:
+                ok = False
+                with lock:
+                    errors[0] += 1
+            with lock:
+                latencies.append((time.perf_counter() - began) * 1000.0)
+                confirmed[0] += 1 if ok else 0
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    began = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return time.perf_counter() - began, latencies, confirmed[0], errors[0]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Concurrent bed booking benchmark (needs the configured MySQL database)")
+    parser.add_argument("--threads", type=int, default=32, help="Concurrent bookers (default: 32)")
+    parser.add_argument("--beds", type=int, default=20, help="Free beds in the ward (default: 20)")
+    parser.add_argument("--attempts", type=int, default=5, help="Booking attempts per thread (default: 5)")
+    parser.add_argument("--modes", nargs="+", choices=["legacy", "atomic", "hold"], default=["legacy", "atomic", "hold"])
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch hospital/user/ward rows")
+    args = parser.parse_args()
+
+    service = BedReservationService(hold_ttl_seconds=60)
+    hospital_id, user_id = _setup(args.beds)
+    try:
+        print(f"{'mode':<7} {'attempts':>8} {'booked':>6} {'rows':>5} {'oversold':>8} {'errors':>6} {'ops/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        for mode in args.modes:
+            _reset_ward(hospital_id, args.beds)
+            elapsed, latencies, confirmed, errors = _run(mode, service, hospital_id, user_id, max(1, args.threads), max(1, args.attempts))
+            rows = execute_query(
+                "SELECT COUNT(*) AS n FROM user_bed_bookings WHERE hospital_id = %s", (hospital_id,), fetch_one=True
+            )["n"]
+            latencies.sort()
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            print(
+                f"{mode:<7} {len(latencies):>8} {confirmed:>6} {rows:>5} {max(0, rows - args.beds):>8} {errors:>6} "
+                f"{len(latencies) / elapsed:>8.0f} {statistics.median(latencies):>8.2f} {p99:>8.2f}"
+            )
+    finally:
+        if not args.keep:
+            execute_query("DELETE FROM hospitals WHERE id = %s", (hospital_id,), commit=True)
+            execute_query("DELETE FROM users WHERE id = %s", (user_id,), commit=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
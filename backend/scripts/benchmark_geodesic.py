@@ -0,0 +1,104 @@
+"""Compare scalar and vectorized hospital distance math.
+
+For each dataset size, times three ways of answering "hospitals within R km"
+and "k nearest hospitals" for random query points:
+
+- scalar: a Python loop of ``haversine_km`` over every hospital (the old path);
+- vector: one ``PointArray`` call over every hospital;
+- grid:   ``GeoGridIndex`` (grid candidates + vectorized distances).
+
+Usage:
+    python scripts/benchmark_geodesic.py --sizes 1000 10000 100000 --queries 50
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+_BACKEND_DIR = Path(__file__).resolve().parents[1]
+if str(_BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(_BACKEND_DIR))
+
+from utils.geo_index import GeoGridIndex  # noqa: E402
+from utils.geodesic import PointArray, haversine_km  # noqa: E402
+
+
+# Roughly Bangladesh, so radius queries hit a realistic number of hospitals.
+_LAT_RANGE = (20.7, 26.6)
+_LON_RANGE = (88.0, 92.7)
+
+
+def _scalar_within(points, lat, lon, radius_km):
+    hits = []
+    for pid, (plat, plon) in points.items():
+        d = haversine_km(lat, lon, plat, plon)
+        if d <= radius_km:
+            hits.append((pid, d))
+    hits.sort(key=lambda x: (x[1], x[0]))
+    return hits
+
+
+def _scalar_nearest(points, lat, lon, k):
+    hits = [(pid, haversine_km(lat, lon, plat, plon)) for pid, (plat, plon) in points.items()]
+    hits.sort(key=lambda x: (x[1], x[0]))
+    return hits[:k]
+
+
+def _time_ms(fn, queries):
+    samples = []
+    for lat, lon in queries:
+        started = time.perf_counter()
+        fn(lat, lon)
+        samples.append((time.perf_counter() - started) * 1000.0)
+    return statistics.median(samples)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark scalar vs vectorized hospital distance queries")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Hospital counts")
+    parser.add_argument("--queries", type=int, default=50, help="Query points per size (default: 50)")
+    parser.add_argument("--radius", type=float, default=10.0, help="Radius in km (default: 10)")
+    parser.add_argument("--k", type=int, default=20, help="Neighbours for nearest queries (default: 20)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    queries = [(rng.uniform(*_LAT_RANGE), rng.uniform(*_LON_RANGE)) for _ in range(max(1, args.queries))]
+
+    print(f"{'hospitals':>9} {'query':<8} {'scalar ms':>10} {'vector ms':>10} {'grid ms':>9} {'vec x':>7} {'grid x':>7}")
+    for size in args.sizes:
+        points = {i: (rng.uniform(*_LAT_RANGE), rng.uniform(*_LON_RANGE)) for i in range(1, size + 1)}
+        array = PointArray(capacity=size)
+        grid = GeoGridIndex(cell_deg=0.1)
+        for pid, (lat, lon) in points.items():
+            array.upsert(pid, lat, lon)
+            grid.upsert(pid, lat, lon)
+
+        cases = {
+            "within": (
+                lambda lat, lon: _scalar_within(points, lat, lon, args.radius),
+                lambda lat, lon: array.within(lat, lon, args.radius),
+                lambda lat, lon: grid.within(lat, lon, args.radius),
+            ),
+            "nearest": (
+                lambda lat, lon: _scalar_nearest(points, lat, lon, args.k),
+                lambda lat, lon: array.nearest(lat, lon, args.k),
+                lambda lat, lon: grid.nearest(lat, lon, args.k),
+            ),
+        }
+        for label, (scalar, vector, indexed) in cases.items():
+            scalar_ms = _time_ms(scalar, queries)
+            vector_ms = _time_ms(vector, queries)
+            grid_ms = _time_ms(indexed, queries)
+            print(
+                f"{size:>9} {label:<8} {scalar_ms:>10.3f} {vector_ms:>10.3f} {grid_ms:>9.3f} "
+                f"{scalar_ms / max(1e-9, vector_ms):>6.1f}x {scalar_ms / max(1e-9, grid_ms):>6.1f}x"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
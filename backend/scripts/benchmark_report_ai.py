@@ -0,0 +1,112 @@
+"""Compare the combined (one call) and two-step report explanation paths.
+
+Runs ``explain_bytes_with_gemini`` (or ``simplify_ocr_text`` for ``.txt``
+input) against the real Gemini API in both modes and reports per-run latency,
+number of model calls and token usage taken from ``usageMetadata``.
+
+Usage:
+    python scripts/benchmark_report_ai.py path/to/report.pdf --runs 3
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+_BACKEND_DIR = Path(__file__).resolve().parents[1]
+if str(_BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(_BACKEND_DIR))
+
+from utils.ai_gateway import get_gateway  # noqa: E402
+from utils.gemini_utils import NotMedicalDocumentError, explain_bytes_with_gemini, simplify_ocr_text  # noqa: E402
+
+
+_MIME_TYPES = {".pdf": "application/pdf", ".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg"}
+
+
+class _UsageRecorder:
+    """Wraps ``gateway.generate_content`` to count calls and sum token usage."""
+
+    def __init__(self, gateway):
+        self.gateway = gateway
+        self._original = gateway.generate_content
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.total_tokens = 0
+
+    def __enter__(self):
+        def recording(*args, **kwargs):
+            data = self._original(*args, **kwargs)
+            usage = data.get("usageMetadata") or {}
+            self.calls += 1
+            self.prompt_tokens += int(usage.get("promptTokenCount") or 0)
+            self.output_tokens += int(usage.get("candidatesTokenCount") or 0)
+            self.total_tokens += int(usage.get("totalTokenCount") or 0)
+            return data
+
+        self.gateway.generate_content = recording
+        return self
+
+    def __exit__(self, *exc):
+        del self.gateway.generate_content
+
+
+def _run_once(path: Path, data: bytes, *, model: str, combined: bool) -> str:
+    if path.suffix.lower() == ".txt":
+        return simplify_ocr_text(data.decode("utf-8"), model=model, combined=combined)
+    return explain_bytes_with_gemini(data, mime_type=_MIME_TYPES[path.suffix.lower()], model=model, combined=combined)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark combined vs two-step report explanation")
+    parser.add_argument("file", help="Report file (.pdf, .png, .jpg, .jpeg or OCR text in .txt)")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per mode (default: 3)")
+    parser.add_argument("--model", default="gemini-2.5-flash", help="Gemini model name")
+    args = parser.parse_args()
+
+    path = Path(args.file)
+    if path.suffix.lower() not in _MIME_TYPES and path.suffix.lower() != ".txt":
+        print(f"Unsupported file type: {path.suffix}")
+        return 2
+    data = path.read_bytes()
+
+    recorder = _UsageRecorder(get_gateway())
+    results = {}
+    with recorder:
+        for label, combined in (("two-step", False), ("combined", True)):
+            rows = []
+            for _ in range(max(1, args.runs)):
+                recorder.reset()
+                started = time.perf_counter()
+                try:
+                    _run_once(path, data, model=args.model, combined=combined)
+                    outcome = "medical"
+                except NotMedicalDocumentError:
+                    outcome = "not medical"
+                elapsed_ms = (time.perf_counter() - started) * 1000.0
+                rows.append((elapsed_ms, recorder.calls, recorder.prompt_tokens, recorder.output_tokens, recorder.total_tokens, outcome))
+            results[label] = rows
+
+    print(f"{'mode':<10} {'runs':>4} {'p50 ms':>9} {'max ms':>9} {'calls':>5} {'prompt':>8} {'output':>8} {'total':>8}  outcome")
+    for label, rows in results.items():
+        latencies = [r[0] for r in rows]
+        print(
+            f"{label:<10} {len(rows):>4} {statistics.median(latencies):>9.0f} {max(latencies):>9.0f} "
+            f"{statistics.median(r[1] for r in rows):>5.0f} {statistics.median(r[2] for r in rows):>8.0f} "
+            f"{statistics.median(r[3] for r in rows):>8.0f} {statistics.median(r[4] for r in rows):>8.0f}  {rows[-1][5]}"
+        )
+
+    two, one = results["two-step"], results["combined"]
+    speedup = statistics.median(r[0] for r in two) / max(1e-9, statistics.median(r[0] for r in one))
+    token_ratio = statistics.median(r[4] for r in one) / max(1, statistics.median(r[4] for r in two))
+    print(f"\ncombined is {speedup:.2f}x faster and uses {token_ratio:.0%} of the two-step tokens (median)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
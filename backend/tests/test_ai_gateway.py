@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class _StubGemini(BaseHTTPRequestHandler):
+    """Minimal local stand-in for the Gemini REST API."""
+
+    protocol_version = "HTTP/1.1"
+    fail_first = 0
+    seen = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        type(self).seen.append(
+            {"path": self.path, "key": self.headers.get("x-goog-api-key"), "port": self.client_address[1], "body": body}
+        )
+        if type(self).fail_first > 0:
+            type(self).fail_first -= 1
+            self._send(503, {"error": {"message": "model is overloaded"}})
+            return
+        prompt = body["contents"][0]["parts"][0]["text"]
+        self._send(200, {"candidates": [{"content": {"parts": [{"text": f"echo: {prompt}"}]}}]})
+
+    def _send(self, status, payload):
+        raw = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def stub_url():
+    _StubGemini.fail_first = 0
+    _StubGemini.seen = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubGemini)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1beta"
+    server.shutdown()
+    server.server_close()
+
+
+def _gateway(url, **kwargs):
+    from utils.ai_gateway import AIGateway
+
+    return AIGateway(base_url=url, api_key="test-key", backoff_base=0.001, **kwargs)
+
+
+def test_generate_text_reuses_keep_alive_connection(stub_url):
+    gw = _gateway(stub_url)
+
+    assert gw.generate_text("hello", model="gemini-test") == "echo: hello"
+    assert gw.generate_text("again", model="gemini-test") == "echo: again"
+
+    assert [s["path"] for s in _StubGemini.seen] == ["/v1beta/models/gemini-test:generateContent"] * 2
+    assert {s["key"] for s in _StubGemini.seen} == {"test-key"}
+    assert len({s["port"] for s in _StubGemini.seen}) == 1
+
+
+def test_retries_on_503_then_gives_up(stub_url):
+    from utils.ai_gateway import AIGatewayError
+
+    _StubGemini.fail_first = 1
+    assert _gateway(stub_url, max_retries=1).generate_text("hi", model="m") == "echo: hi"
+
+    _StubGemini.fail_first = 5
+    with pytest.raises(AIGatewayError) as info:
+        _gateway(stub_url, max_retries=1).generate_text("hi", model="m")
+    assert info.value.status_code == 503
+    assert "overloaded" in str(info.value)
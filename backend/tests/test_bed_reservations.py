@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import re
+import threading
+from datetime import datetime, timedelta
+
+import pymysql
+import pytest
+
+from utils import bed_reservations
+from utils.bed_reservations import BedReservationService, BedUnavailableError, HoldNotActiveError, restore_bed
+
+
+class _FakeDb:
+    """bed_wards / user_bed_bookings / bed_holds with per-connection rollback."""
+
+    def __init__(self, beds):
+        self.lock = threading.Lock()
+        self.wards = {1: {"id": 1, "hospital_id": 9, "ward_type": "general", "ac_type": "ac", "room_config": None,
+                          "available_beds": beds, "occupied_beds": 0}}
+        self.bookings = {}
+        self.holds = {}
+        self.now = datetime.now()
+
+    def _ward(self):
+        return self.wards[1]
+
+    # execute_query (autocommit reads)
+    def execute_query(self, sql, params=None, fetch_one=False, fetch_all=False, **kwargs):
+        with self.lock:
+            if "FROM bed_wards" in sql:
+                return dict(self._ward())
+            if "FROM bed_holds h" in sql:
+                hold = self.holds.get(params[0])
+                if not hold or hold["user_id"] != params[1]:
+                    return None
+                return dict(hold, active=hold["expires_at"] > self.now, **{k: self._ward()[k] for k in ("hospital_id", "ward_type", "ac_type", "room_config")})
+            if "idempotency_key = %s" in sql:
+                table = self.holds if "bed_holds" in sql else self.bookings
+                return next((dict(r) for r in table.values() if (r["user_id"], r.get("idempotency_key")) == params), None)
+            if "SELECT id FROM bed_holds" in sql:
+                return [{"id": h["id"]} for h in self.holds.values() if h["status"] == "held" and h["expires_at"] <= self.now]
+            raise AssertionError(sql)
+
+
+class _Conn:
+    def __init__(self, db):
+        self.db = db
+        self.undo = []
+
+    def begin(self):
+        self.undo = []
+
+    def commit(self):
+        self.undo = []
+
+    def rollback(self):
+        with self.db.lock:
+            for fn in reversed(self.undo):
+                fn()
+        self.undo = []
+
+    def close(self):
+        pass
+
+    def cursor(self):
+        return _Cursor(self)
+
+
+class _Cursor:
+    def __init__(self, conn):
+        self.conn, self.db = conn, conn.db
+        self.rowcount = 0
+        self.lastrowid = None
+        self._row = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def fetchone(self):
+        return self._row
+
+    def _set(self, record, **changes):
+        old = {k: record[k] for k in changes}
+        record.update(changes)
+        self.conn.undo.append(lambda: record.update(old))
+
+    def execute(self, sql, params=()):
+        db, ward = self.db, self.db._ward()
+        with db.lock:
+            self.rowcount = 0
+            if sql.lstrip().startswith("INSERT INTO"):
+                table = db.bookings if "user_bed_bookings" in sql else db.holds
+                if "bed_holds" in sql:
+                    row = dict(zip(("ward_id", "user_id", "idempotency_key", "status"), params), booking_id=None,
+                               expires_at=db.now + timedelta(seconds=params[4]))
+                else:
+                    row = dict(zip(re.search(r"\((.*?)\)", sql).group(1).split(", "), params))
+                key = row.get("idempotency_key")
+                if key and any((r["user_id"], r.get("idempotency_key")) == (row["user_id"], key) for r in table.values()):
+                    raise pymysql.err.IntegrityError(1062, "Duplicate entry")
+                row["id"] = self.lastrowid = max(table, default=0) + 1
+                table[row["id"]] = row
+                self.conn.undo.append(lambda: table.pop(row["id"]))
+            elif "SELECT * FROM bed_holds" in sql:
+                self._row = dict(db.holds[params[0]])
+            elif "available_beds = available_beds - 1" in sql:
+                if ward["available_beds"] > 0:
+                    taken = {"available_beds": ward["available_beds"] - 1}
+                    if "occupied_beds + 1" in sql:
+                        taken["occupied_beds"] = ward["occupied_beds"] + 1
+                    self._set(ward, **taken)
+                    self.rowcount = 1
+            elif "SET occupied_beds = occupied_beds + 1" in sql:
+                self._set(ward, occupied_beds=ward["occupied_beds"] + 1)
+                self.rowcount = 1
+            elif "w.available_beds + 1" in sql:
+                self._set(ward, available_beds=ward["available_beds"] + 1)
+                self.rowcount = 1
+            elif sql.lstrip().startswith("UPDATE bed_holds"):
+                if "booking_id = %s" in sql:
+                    status, booking_id, hold_id, user_id, expected = params
+                    hold = db.holds.get(hold_id)
+                    ok = hold and hold["user_id"] == user_id and hold["status"] == expected and hold["expires_at"] > db.now
+                    changes = {"status": status, "booking_id": booking_id}
+                else:
+                    status, hold_id, expected = params[:3]
+                    hold = db.holds.get(hold_id)
+                    ok = hold and hold["status"] == expected and (len(params) == 3 or hold["user_id"] == params[3])
+                    changes = {"status": status}
+                if ok:
+                    self._set(hold, **changes)
+                    self.rowcount = 1
+            else:
+                raise AssertionError(sql)
+
+
+class _Schema:
+    def has_table(self, table):
+        return True
+
+    def has_columns(self, table, *columns):
+        return True
+
+
+@pytest.fixture()
+def make_db(monkeypatch):
+    def make(beds):
+        db = _FakeDb(beds)
+        monkeypatch.setattr(bed_reservations, "execute_query", db.execute_query)
+        monkeypatch.setattr(bed_reservations, "get_db_connection", lambda: _Conn(db))
+        monkeypatch.setattr(bed_reservations, "get_schema_registry", lambda: _Schema())
+        return db
+
+    return make
+
+
+def _book(service, user_id=5, **kwargs):
+    return service.book(user_id=user_id, hospital_id=9, ward_type="general", ac_type="ac", room_config=None,
+                        fields={"patient_name": "P", "patient_phone": "1", "preferred_date": "2026-01-01"}, **kwargs)
+
+
+def test_concurrent_bookings_never_oversell(make_db):
+    db = make_db(beds=5)
+    service = BedReservationService()
+    results = []
+
+    def worker(user_id):
+        try:
+            results.append(_book(service, user_id=user_id)["booking_id"])
+        except BedUnavailableError:
+            results.append(None)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(40)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sum(r is not None for r in results) == 5
+    assert len(db.bookings) == 5  # losers' inserts were rolled back
+    assert {b["ward_id"] for b in db.bookings.values()} == {1}
+    assert db.wards[1]["available_beds"] == 0 and db.wards[1]["occupied_beds"] == 5
+
+
+def test_idempotency_key_replays_the_original_booking(make_db):
+    db = make_db(beds=1)
+    service = BedReservationService()
+
+    first = _book(service, idempotency_key="retry-me")
+    # The ward is full now, but the retry still gets its booking back.
+    again = _book(service, idempotency_key="retry-me")
+
+    assert first == {"booking_id": 1, "replayed": False}
+    assert again == {"booking_id": 1, "replayed": True}
+    assert len(db.bookings) == 1 and db.wards[1]["occupied_beds"] == 1
+    with pytest.raises(BedUnavailableError):
+        _book(service, idempotency_key="someone-else")
+
+
+def test_hold_confirm_release_and_expiry(make_db):
+    db = make_db(beds=2)
+    service = BedReservationService(hold_ttl_seconds=60)
+
+    hold = service.hold(user_id=5, hospital_id=9, ward_type="general", ac_type="ac", room_config=None, idempotency_key="h1")
+    assert service.hold(user_id=5, hospital_id=9, ward_type="general", ac_type="ac", room_config=None, idempotency_key="h1")["id"] == hold["id"]
+    assert db.wards[1]["available_beds"] == 1  # set aside once
+
+    booked = _book(service, hold_id=hold["id"])
+    assert db.holds[hold["id"]]["status"] == "confirmed"
+    assert db.bookings[booked["booking_id"]]["ward_id"] == hold["ward_id"]
+    assert db.wards[1] == dict(db.wards[1], available_beds=1, occupied_beds=1)
+    assert _book(service, hold_id=hold["id"]) == dict(booked, replayed=True)
+
+    other = service.hold(user_id=6, hospital_id=9, ward_type="general", ac_type="ac", room_config=None)
+    assert not service.release(other["id"], user_id=5)  # not theirs
+    db.now += timedelta(seconds=61)
+    with pytest.raises(HoldNotActiveError):
+        _book(service, user_id=6, hold_id=other["id"])
+
+    # The ward looks full, so the expired hold is returned before answering.
+    assert _book(service, user_id=7)["replayed"] is False
+    assert db.holds[other["id"]]["status"] == "expired"
+    assert db.wards[1]["available_beds"] == 0 and db.wards[1]["occupied_beds"] == 2
+
+
+class _RecordingCursor:
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, sql, params=()):
+        self.executed.append((" ".join(sql.split()), params))
+
+
+def test_restore_bed_targets_the_booked_ward():
+    cursor = _RecordingCursor()
+    booking = {"hospital_id": 9, "ward_type": "general", "ac_type": "ac", "room_config": None}
+
+    restore_bed(cursor, dict(booking, ward_id=4))
+    restore_bed(cursor, dict(booking, ward_id=None))  # booked before ward_id existed
+
+    (by_id, by_id_params), (legacy, legacy_params) = cursor.executed
+    assert by_id.endswith("WHERE id = %s") and by_id_params == (4,)
+    assert legacy.endswith("WHERE hospital_id = %s AND ward_type = %s AND ac_type = %s")
+    assert legacy_params == (9, "general", "ac")
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+
+
+@pytest.fixture()
+def chat_client():
+    from routes.chat import chat_bp
+
+    app = Flask(__name__)
+    app.config.update({"TESTING": True, "JWT_SECRET_KEY": "test-jwt-secret"})
+    JWTManager(app)
+    app.register_blueprint(chat_bp, url_prefix="/api/chat")
+    with app.app_context():
+        token = create_access_token(identity="5")
+    return app.test_client(), {"Authorization": f"Bearer {token}"}
+
+
+class _FakeGateway:
+    def generate_text(self, contents, *, model):
+        assert "User: headache" in contents
+        return "- Drink water"
+
+
+def test_send_writes_both_messages_in_one_insert(monkeypatch, chat_client):
+    import routes.chat as chat_mod
+
+    client, headers = chat_client
+    monkeypatch.setattr(chat_mod, "get_gateway", lambda: _FakeGateway())
+
+    writes = []
+
+    def fake_execute_query(sql, params=None, fetch_one=False, fetch_all=False, commit=False):
+        writes.append((sql, params, commit))
+        return 1
+
+    monkeypatch.setattr(chat_mod, "execute_query", fake_execute_query)
+
+    resp = client.post("/api/chat/send", json={"message": "headache"}, headers=headers)
+
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    assert resp.get_json() == {"response": "- Drink water"}
+    assert len(writes) == 1
+    sql, params, commit = writes[0]
+    assert "INSERT INTO chat_messages" in sql
+    assert params == ("5", "user", "headache", "5", "ai", "- Drink water")
+    assert commit
+
+
+def test_history_is_paginated_by_keyset(monkeypatch, chat_client):
+    from datetime import datetime
+
+    import routes.chat as chat_mod
+    from utils.pagination import decode_cursor
+
+    client, headers = chat_client
+    calls = []
+    newest_first = [
+        {"id": 9, "sender": "ai", "message": "c", "created_at": datetime(2024, 1, 1, 10, 0, 2)},
+        {"id": 8, "sender": "user", "message": "b", "created_at": datetime(2024, 1, 1, 10, 0, 1)},
+        {"id": 7, "sender": "ai", "message": "a", "created_at": datetime(2024, 1, 1, 10, 0, 0)},
+    ]
+
+    def fake_execute_query(sql, params=None, fetch_one=False, fetch_all=False, commit=False):
+        calls.append((sql, params))
+        return newest_first
+
+    monkeypatch.setattr(chat_mod, "execute_query", fake_execute_query)
+
+    resp = client.get("/api/chat/history?limit=2", headers=headers)
+    payload = resp.get_json()
+    assert [m["id"] for m in payload["history"]] == [8, 9]
+    assert decode_cursor(payload["next_cursor"]) == (datetime(2024, 1, 1, 10, 0, 1), 8)
+    assert calls[-1][1] == ("5", 3)
+
+    client.get(f"/api/chat/history?limit=2&cursor={payload['next_cursor']}", headers=headers)
+    sql, params = calls[-1]
+    assert "created_at < %s OR (created_at = %s AND id < %s)" in sql
+    assert params == ("5", datetime(2024, 1, 1, 10, 0, 1), datetime(2024, 1, 1, 10, 0, 1), 8, 3)
+
+    assert client.get("/api/chat/history?cursor=garbage", headers=headers).status_code == 400
+
+
+def test_history_export_is_streamed_as_ndjson(monkeypatch, chat_client):
+    import routes.chat as chat_mod
+
+    client, headers = chat_client
+    rows = [{"sender": "user", "message": "hi"}, {"sender": "ai", "message": "hello"}]
+    monkeypatch.setattr(chat_mod, "stream_query", lambda sql, params: iter(rows))
+
+    resp = client.get("/api/chat/history?format=ndjson", headers=headers)
+    assert resp.is_streamed
+    assert resp.mimetype == "application/x-ndjson"
+    assert resp.get_data(as_text=True).splitlines() == [
+        '{"message": "hi", "sender": "user"}',
+        '{"message": "hello", "sender": "ai"}',
+    ]
+
+
+class _FakeStreamingGateway:
+    def stream_text(self, contents, *, model):
+        yield "- Rest"
+        yield " and hydrate"
+
+
+def test_stream_relays_tokens_as_sse_then_saves_turn(monkeypatch, chat_client):
+    import routes.chat as chat_mod
+
+    client, headers = chat_client
+    monkeypatch.setattr(chat_mod, "get_gateway", lambda: _FakeStreamingGateway())
+    writes = []
+    monkeypatch.setattr(
+        chat_mod,
+        "execute_query",
+        lambda sql, params=None, fetch_one=False, fetch_all=False, commit=False: writes.append(params) or 1,
+    )
+
+    resp = client.post("/api/chat/stream", json={"message": "tired"}, headers=headers)
+
+    assert resp.mimetype == "text/event-stream"
+    body = resp.get_data(as_text=True)
+    assert body.split("\n\n")[:3] == [
+        'event: token\ndata: {"text": "- Rest"}',
+        'event: token\ndata: {"text": " and hydrate"}',
+        'event: done\ndata: {"response": "- Rest and hydrate"}',
+    ]
+    assert writes == [("5", "user", "tired", "5", "ai", "- Rest and hydrate")]
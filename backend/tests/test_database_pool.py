@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import gc
+
+import pytest
+
+
+class FakeConnection:
+    def __init__(self, n: int):
+        self.n = n
+        self.open = True
+        self.server_status = 0
+        self.pings = 0
+        self.healthy = True
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if not self.healthy:
+            raise ConnectionError("gone away")
+
+    def rollback(self):
+        self.server_status = 0
+
+    def close(self):
+        self.open = False
+
+    def autocommit(self, value):
+        self.autocommit_mode = value
+
+    def cursor(self):
+        return FakeCursor()
+
+
+class FakeCursor:
+    lastrowid = None
+    rowcount = 1
+
+    def close(self):
+        return None
+
+    def execute(self, query, params=None):
+        self.query = query
+
+    def fetchone(self):
+        return {"n": 1}
+
+
+def _make_pool(**kwargs):
+    from utils.database import ConnectionPool
+
+    created = []
+
+    def factory():
+        conn = FakeConnection(len(created))
+        created.append(conn)
+        return conn
+
+    opts = {"min_size": 0, "max_size": 2, "timeout": 0.05, "recycle_seconds": 300, "ping_interval": 0}
+    opts.update(kwargs)
+    return ConnectionPool(factory, **opts), created
+
+
+def test_close_returns_connection_for_reuse():
+    pool, created = _make_pool()
+
+    conn = pool.acquire()
+    conn.close()
+    conn.close()  # idempotent
+    again = pool.acquire()
+
+    assert len(created) == 1
+    assert again.n == 0
+    assert created[0].open
+
+
+def test_exhausted_pool_times_out():
+    from utils.database import PoolTimeoutError
+
+    pool, _ = _make_pool(max_size=1)
+    held = pool.acquire()
+
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+
+    held.close()
+    assert pool.acquire().n == 0
+
+
+def test_unhealthy_connection_is_replaced_on_borrow():
+    pool, created = _make_pool()
+
+    conn = pool.acquire()
+    conn.close()
+    created[0].healthy = False
+
+    replacement = pool.acquire()
+    assert replacement.n == 1
+    assert not created[0].open
+    assert pool.size == 1
+
+
+def test_idle_connections_are_recycled():
+    pool, created = _make_pool(recycle_seconds=0.001)
+
+    pool.acquire().close()
+    import time
+
+    time.sleep(0.01)
+    conn = pool.acquire()
+
+    assert conn.n == 1
+    assert not created[0].open
+
+
+def test_open_transaction_is_rolled_back_on_release():
+    from pymysql.constants import SERVER_STATUS
+
+    pool, created = _make_pool()
+    conn = pool.acquire()
+    created[0].server_status = SERVER_STATUS.SERVER_STATUS_IN_TRANS
+    conn.close()
+
+    assert created[0].server_status == 0
+
+
+def test_leaked_connection_is_returned_when_collected():
+    pool, _ = _make_pool(max_size=1)
+
+    def leak():
+        pool.acquire()
+
+    leak()
+    gc.collect()
+    assert pool.acquire().n == 0
+
+
+def test_execute_query_reuses_one_connection_per_request(monkeypatch):
+    from flask import Flask
+
+    import utils.database as database
+
+    pool, created = _make_pool()
+    monkeypatch.setattr(database, "get_pool", lambda: pool)
+
+    app = Flask(__name__)
+    database.init_app(app)
+
+    with app.test_request_context("/"):
+        for _ in range(6):
+            assert database.execute_query("SELECT COUNT(*) AS n FROM users", fetch_one=True) == {"n": 1}
+        assert pool.size == 1
+        assert pool.idle_count == 0
+
+    assert len(created) == 1
+    assert pool.idle_count == 1
+    assert created[0].autocommit_mode is False
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+
+def test_fingerprint_normalizes_literals_and_lists():
+    from utils.db_metrics import fingerprint
+
+    a = fingerprint("SELECT * FROM users\n  WHERE id = %s AND email = 'a@b.c' AND id IN (%s, %s, %s) LIMIT 10")
+    b = fingerprint("SELECT * FROM users WHERE id = 7 AND email = 'x@y.z' AND id IN (%s) LIMIT 25")
+
+    assert a == b == "SELECT * FROM users WHERE id = ? AND email = ? AND id IN (?+) LIMIT ?"
+
+
+def test_record_builds_histograms_and_slow_log():
+    from utils.db_metrics import QueryMetrics
+
+    qm = QueryMetrics(slow_query_ms=100)
+    qm.record("SELECT 1 FROM t WHERE id = %s", duration_ms=3, rows=1, endpoint="auth.login")
+    qm.record("SELECT 1 FROM t WHERE id = %s", duration_ms=150, rows=1, pool_wait_ms=2, endpoint="auth.login")
+
+    snap = qm.snapshot()
+    (query,) = snap["queries"]
+    assert query["count"] == 2
+    assert query["max_ms"] == 150
+    assert query["endpoints"] == ["auth.login"]
+
+    histogram = snap["endpoints"]["auth.login"]["histogram"]
+    assert histogram[0] == {"le_ms": 1, "count": 0}
+    assert histogram[1] == {"le_ms": 5, "count": 1}
+    assert histogram[-1] == {"le_ms": "+Inf", "count": 2}
+
+    assert [s["duration_ms"] for s in snap["slow_queries"]] == [150]
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from utils import gemini_utils
+
+
+class _FakeGateway:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def _next(self, contents, kwargs):
+        self.calls.append({"contents": contents, **kwargs})
+        item = self.responses.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def generate_content(self, contents, *, model, generation_config=None, timeout=None):
+        text = self._next(contents, {"generation_config": generation_config})
+        return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+    def generate_text(self, contents, *, model, **kwargs):
+        return self._next(contents, kwargs)
+
+
+@pytest.fixture()
+def install_gateway(monkeypatch):
+    import utils.gemini_utils as mod
+
+    def install(*responses):
+        gw = _FakeGateway(*responses)
+        monkeypatch.setattr(mod, "get_gateway", lambda: gw)
+        return gw
+
+    return install
+
+
+def test_combined_call_uploads_file_once(install_gateway):
+    gw = install_gateway(json.dumps({"is_medical": True, "reason": "", "explanation": "Summary: normal CBC"}))
+
+    out = gemini_utils.explain_bytes_with_gemini(b"%PDF-1.4", mime_type="application/pdf", model="m", combined=True)
+
+    assert out == "Summary: normal CBC"
+    assert len(gw.calls) == 1
+    assert gw.calls[0]["generation_config"]["responseMimeType"] == "application/json"
+    assert sum(1 for p in gw.calls[0]["contents"] if "inline_data" in p) == 1
+
+
+def test_combined_not_medical_raises_with_reason(install_gateway):
+    install_gateway(json.dumps({"is_medical": False, "reason": "This appears to be a bus ticket.", "explanation": ""}))
+
+    with pytest.raises(gemini_utils.NotMedicalDocumentError, match="bus ticket"):
+        gemini_utils.simplify_ocr_text("Route 42 - Fare $2", model="m", combined=True)
+
+
+def test_malformed_combined_response_falls_back_to_two_step(install_gateway):
+    gw = install_gateway("not json at all", "MEDICAL", "Two-step explanation")
+
+    out = gemini_utils.simplify_ocr_text("Hemoglobin 13.5 g/dL", model="m", combined=True)
+
+    assert out == "Two-step explanation"
+    assert len(gw.calls) == 3
+
+
+def test_capacity_errors_are_not_retried_through_fallback(install_gateway):
+    from utils.ai_gateway import AIGatewayError
+
+    gw = install_gateway(AIGatewayError("busy", status_code=503))
+
+    with pytest.raises(AIGatewayError):
+        gemini_utils.simplify_ocr_text("Hemoglobin 13.5 g/dL", model="m", combined=True)
+    assert len(gw.calls) == 1
+
+
+def test_two_step_mode_skips_structured_call(install_gateway):
+    gw = install_gateway("MEDICAL", "Explained")
+
+    assert gemini_utils.explain_bytes_with_gemini(b"img", mime_type="image/png", model="m", combined=False) == "Explained"
+    assert gw.calls[0]["generation_config"] is None
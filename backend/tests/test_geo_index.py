@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import random
+
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager
+
+from config import Config
+from utils import geo_index, hospital_catalog
+from utils.geo_index import GeoGridIndex, HospitalLocator, bounding_box_clause
+from utils.geodesic import haversine_km
+from utils.hospital_catalog import HospitalCatalog
+
+
+def _points(seed, n, lat_range=(-60.0, 60.0), lon_range=(-180.0, 180.0)):
+    rng = random.Random(seed)
+    return {i: (rng.uniform(*lat_range), rng.uniform(*lon_range)) for i in range(1, n + 1)}
+
+
+def _brute_force(points, lat, lon):
+    return sorted(((pid, haversine_km(lat, lon, plat, plon)) for pid, (plat, plon) in points.items()), key=lambda x: (x[1], x[0]))
+
+
+def _same(hits, expected):
+    # Vectorized and scalar haversine differ in the last few ulps.
+    return [pid for pid, _ in hits] == [pid for pid, _ in expected] and all(
+        d == pytest.approx(e, abs=1e-9) for (_, d), (_, e) in zip(hits, expected)
+    )
+
+
+def test_radius_query_matches_brute_force():
+    # Dense cluster around Dhaka plus points across the antimeridian.
+    points = _points(1, 400, (23.6, 23.95), (90.2, 90.6))
+    points.update({1000 + k: v for k, v in _points(2, 200, (-20.0, -15.0), (178.0, 180.0)).items()})
+    points.update({2000 + k: v for k, v in _points(3, 200, (-20.0, -15.0), (-180.0, -178.0)).items()})
+    index = GeoGridIndex(cell_deg=0.1)
+    for pid, (lat, lon) in points.items():
+        index.upsert(pid, lat, lon)
+
+    for lat, lon, radius in [(23.78, 90.41, 5), (23.78, 90.41, 25), (-17.5, 179.9, 150), (23.5, 90.0, 0.5)]:
+        expected = [hit for hit in _brute_force(points, lat, lon) if hit[1] <= radius]
+        assert _same(index.within(lat, lon, radius), expected)
+
+
+def test_nearest_matches_brute_force():
+    points = _points(4, 1500)
+    points.update({5000 + k: v for k, v in _points(5, 100, (70.0, 89.0)).items()})
+    index = GeoGridIndex(cell_deg=0.5)
+    for pid, (lat, lon) in points.items():
+        index.upsert(pid, lat, lon)
+
+    rng = random.Random(6)
+    for _ in range(40):
+        lat, lon = rng.uniform(-80, 88), rng.uniform(-180, 180)
+        expected = _brute_force(points, lat, lon)
+        assert _same(index.nearest(lat, lon, 5), expected[:5])
+        assert _same(index.nearest(lat, lon, 3, max_km=300), [hit for hit in expected[:3] if hit[1] <= 300])
+
+
+def test_upsert_moves_and_remove():
+    index = GeoGridIndex()
+    index.upsert(1, 23.78, 90.41)
+    index.upsert(1, 22.35, 91.78)  # moved to Chittagong
+    assert index.within(23.78, 90.41, 10) == []
+    assert [pid for pid, _ in index.within(22.35, 91.78, 1)] == [1]
+    index.remove(1)
+    assert len(index) == 0 and index.nearest(22.35, 91.78, 1) == []
+
+
+def test_bounding_box_clause_splits_at_antimeridian():
+    clause, params = bounding_box_clause(0.0, 179.95, 20)
+    assert clause.count("longitude BETWEEN") == 2
+    assert params[2:4] == [pytest.approx(179.77, abs=0.01), 180.0]
+    assert params[4:6] == [-180.0, pytest.approx(-179.87, abs=0.01)]
+
+
+def test_locator_refreshes_incrementally(monkeypatch):
+    rows = [{"id": 1, "latitude": 23.78, "longitude": 90.41}, {"id": 2, "latitude": None, "longitude": None}]
+    queries = []
+
+    def fake_execute_query(sql, params=None, fetch_all=False, **kwargs):
+        queries.append((sql, params))
+        last_seen = params[0] if params else 0
+        return [row for row in rows if row["id"] > last_seen]
+
+    monkeypatch.setattr(geo_index, "execute_query", fake_execute_query)
+    locator = HospitalLocator(refresh_seconds=0, rebuild_seconds=3600)
+
+    assert locator.available()
+    assert [pid for pid, _ in locator.within(23.78, 90.41, 1)] == [1]
+
+    rows.append({"id": 3, "latitude": 23.79, "longitude": 90.40})  # registered via another worker
+    assert locator.available()
+    assert [pid for pid, _ in locator.nearest(23.78, 90.41, 5)] == [1, 3]
+    assert "WHERE id > %s" in queries[-1][0] and queries[-1][1] == (2,)
+
+    locator.upsert(4, 23.781, 90.411)  # registered in this worker
+    assert [pid for pid, _ in locator.within(23.78, 90.41, 1)][:2] == [1, 4]
+
+
+@pytest.fixture()
+def app() -> Flask:
+    from routes.hospitals import hospitals_bp
+
+    app = Flask(__name__)
+    app.config.update({"TESTING": True, "JWT_SECRET_KEY": "test-jwt-secret"})
+    JWTManager(app)
+    app.register_blueprint(hospitals_bp, url_prefix="/api")
+    return app
+
+
+class _FakeCursor:
+    def __init__(self, rows, ward_stats=None):
+        self.rows = rows
+        self.ward_stats = ward_stats or {}
+        self.queries = []
+        self._result = []
+
+    def execute(self, sql, params=None):
+        self.queries.append((" ".join(sql.split()), list(params or [])))
+        if "FROM bed_wards" in sql:
+            self._result = [dict(self.ward_stats[hid], hospital_id=hid) for hid in params if hid in self.ward_stats]
+        elif "id IN" in sql:
+            unmapped = "latitude IS NULL" in sql
+            self._result = [row for row in self.rows if row["id"] in params or (unmapped and row["latitude"] is None)]
+        elif "latitude BETWEEN" in sql:
+            lat_lo, lat_hi, lon_lo, lon_hi = params
+            self._result = [
+                row for row in self.rows
+                if row["latitude"] is not None and lat_lo <= row["latitude"] <= lat_hi and lon_lo <= row["longitude"] <= lon_hi
+            ]
+        else:
+            self._result = list(self.rows)
+
+    def fetchall(self):
+        return self._result
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def close(self):
+        pass
+
+
+def _hospital(hid, lat, lon, name):
+    return {
+        "id": hid, "name": name, "address": "addr", "city": "Dhaka", "state": None,
+        "latitude": lat, "longitude": lon, "phone": None, "email": None, "emergency_contact": None,
+        "total_beds": 10, "available_beds": 4, "icu_beds": 1, "services": "[]", "rating": 4.0,
+    }
+
+
+_ROWS = [
+    _hospital(1, 23.780, 90.410, "Near"),
+    _hospital(2, 23.800, 90.420, "Close"),
+    _hospital(3, 22.350, 91.780, "Far"),
+    _hospital(4, None, None, "Unmapped"),
+]
+
+
+@pytest.fixture()
+def fake_db(monkeypatch):
+    import routes.hospitals as hospitals_mod
+
+    cursor = _FakeCursor(_ROWS)
+    conn = type("Conn", (), {"cursor": lambda self: cursor, "close": lambda self: None})()
+    monkeypatch.setattr(hospitals_mod, "get_db_connection", lambda: conn)
+    monkeypatch.setattr(
+        geo_index,
+        "execute_query",
+        lambda sql, params=None, fetch_all=False, **kw: [{k: r[k] for k in ("id", "latitude", "longitude")} for r in _ROWS],
+    )
+    monkeypatch.setattr(geo_index, "_locator", HospitalLocator())
+    monkeypatch.setattr(hospital_catalog, "execute_query", lambda sql, params=None, fetch_all=False, **kw: list(cursor.rows))
+    monkeypatch.setattr(hospital_catalog, "_catalog", HospitalCatalog())
+    return cursor
+
+
+@pytest.mark.parametrize("index_enabled", [True, False])
+def test_nearby_endpoint_uses_index_or_bounding_box(monkeypatch, fake_db, client, auth_header, index_enabled):
+    monkeypatch.setattr(Config, "HOSPITAL_INDEX_ENABLED", index_enabled)
+
+    resp = client.get("/api/hospitals/nearby?latitude=23.78&longitude=90.41&radius=10&limit=5", headers=auth_header)
+
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    body = resp.get_json()
+    assert [h["name"] for h in body["hospitals"]] == ["Near", "Close"]
+    assert body["hospitals"][0]["distance"] == 0.0
+    # Only the candidate rows are loaded; never a full-table scan.
+    assert all("WHERE" in sql for sql, _ in fake_db.queries)
+    assert any("latitude BETWEEN" in sql for sql, _ in fake_db.queries) is (not index_enabled)
+
+
+def test_hospital_list_filters_by_radius_and_keeps_unmapped(fake_db, client, auth_header):
+    resp = client.get("/api/hospitals?latitude=23.78&longitude=90.41&radius=10", headers=auth_header)
+
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    names = [h["name"] for h in resp.get_json()["hospitals"]]
+    assert names == ["Near", "Close", "Unmapped"]
+    # Rows come from the cached catalog, not a per-request hospitals query.
+    assert not any("FROM hospitals" in sql for sql, _ in fake_db.queries)
+
+
+def test_bed_stats_for_listing_use_one_grouped_query(monkeypatch, fake_db, client, auth_header):
+    fake_db.rows = [dict(row, total_beds=0, available_beds=0, icu_beds=0) for row in _ROWS]
+    fake_db.ward_stats = {1: {"total_beds": 30, "available_beds": 12, "icu_beds": 4}}
+
+    for url in ("/api/hospitals?latitude=23.78&longitude=90.41&radius=10", "/api/hospitals/nearby?latitude=23.78&longitude=90.41&radius=10"):
+        fake_db.queries.clear()
+        resp = client.get(url, headers=auth_header)
+
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+        beds = {h["name"]: (h["total_beds"], h["available_beds"], h["icu_beds"]) for h in resp.get_json()["hospitals"]}
+        assert beds["Near"] == (30, 12, 4) and beds["Close"] == (0, 0, 0)
+        bed_queries = [sql for sql, _ in fake_db.queries if "FROM bed_wards" in sql]
+        assert len(bed_queries) == 1 and "GROUP BY hospital_id" in bed_queries[0]
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import random
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from utils.geodesic import PointArray, haversine_km, haversine_km_many, rank
+
+
+def test_vectorized_distances_match_scalar():
+    rng = random.Random(7)
+    lats = [rng.uniform(-89, 89) for _ in range(500)]
+    lons = [rng.uniform(-180, 180) for _ in range(500)]
+
+    distances = haversine_km_many(23.78, 90.41, lats, lons)
+
+    expected = [haversine_km(23.78, 90.41, lat, lon) for lat, lon in zip(lats, lons)]
+    assert distances.dtype == np.float64
+    assert distances.tolist() == pytest.approx(expected, abs=1e-9)
+
+
+def test_rank_top_k_keeps_ties_ordered_by_id():
+    ids = np.array([5, 3, 9, 1, 7])
+    distances = np.array([2.0, 1.0, 1.0, 4.0, 1.0])
+
+    assert rank(ids, distances, k=2) == [(3, 1.0), (7, 1.0)]
+    assert rank(ids, distances, max_km=2.0) == [(3, 1.0), (7, 1.0), (9, 1.0), (5, 2.0)]
+    assert rank(ids, distances, k=0) == []
+
+
+def test_point_array_upsert_remove_and_grow():
+    points = PointArray(capacity=2)
+    for pid in range(1, 6):
+        points.upsert(pid, 23.0 + pid / 100, 90.0)
+    points.upsert(2, 0.0, 0.0)  # moved far away
+    points.remove(1)  # last row is moved into the hole
+
+    assert len(points) == 4 and 1 not in points
+    assert [pid for pid, _ in points.nearest(23.0, 90.0, 3)] == [3, 4, 5]
+    assert [pid for pid, _ in points.within(0.0, 0.0, 1.0)] == [2]
+    assert [pid for pid, _ in points.within(23.0, 90.0, 100, rows=points.rows_for([5, 1, 4]))] == [4, 5]
+
+
+def test_sos_pending_filtered_by_each_effective_radius():
+    from routes.emergency_sos import _within_effective_radius
+
+    now = datetime(2026, 1, 1, 12, 0)
+    rows = [
+        {"id": 1, "latitude": 23.80, "longitude": 90.41, "effective_radius_km": 10.0, "created_at": now},  # ~2km
+        {"id": 2, "latitude": 23.95, "longitude": 90.41, "effective_radius_km": 10.0, "created_at": now},  # ~19km
+        {"id": 3, "latitude": 23.95, "longitude": 90.41, "effective_radius_km": 20.0, "created_at": now},  # expanded
+        {"id": 4, "latitude": None, "longitude": None, "effective_radius_km": 50.0, "created_at": now},
+    ]
+
+    visible = _within_effective_radius(rows, 23.78, 90.41)
+
+    assert [r["id"] for r in visible] == [1, 3]
+    assert visible[0]["distance_km"] == pytest.approx(haversine_km(23.78, 90.41, 23.80, 90.41))
+
+
+def test_distance_matrix_matches_per_point_distances():
+    rng = random.Random(11)
+    points = PointArray()
+    for pid in range(40):
+        points.upsert(pid, rng.uniform(20, 26), rng.uniform(88, 92))
+    lats, lons = [23.78, 22.35, 24.9], [90.41, 91.78, 91.87]
+
+    ids, matrix = points.distance_matrix(lats, lons)
+
+    assert matrix.shape == (3, 40)
+    for row, (lat, lon) in enumerate(zip(lats, lons)):
+        assert matrix[row].tolist() == pytest.approx(points.distances(lat, lon)[1].tolist(), abs=1e-9)
+    assert ids.tolist() == list(range(40))
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import pytest
+
+from utils import hospital_catalog
+from utils.hospital_catalog import CatalogSnapshot, HospitalCatalog
+
+
+def _row(hid, name, city, services, rating=4.0):
+    return {
+        "id": hid, "name": name, "address": "addr", "city": city, "state": None,
+        "latitude": None, "longitude": None, "phone": None, "email": None, "emergency_contact": None,
+        "total_beds": 10, "available_beds": 4, "icu_beds": 1, "services": services, "rating": rating,
+    }
+
+
+_ROWS = [
+    _row(1, "Square Hospital", "Dhaka", '["Emergency", "Cardiology", "ICU"]', rating=4.8),
+    _row(2, "Chittagong Medical College Hospital", "Chittagong", '["Emergency", "Neurology"]', rating=4.5),
+    _row(3, "Dhaka Medical College", "Dhaka", ["Pediatric Surgery", "Cardiac Surgery"], rating=4.2),
+    _row(4, "Broken Services Clinic", "North Dhaka", "not json", rating=3.0),
+]
+
+
+@pytest.fixture()
+def snapshot():
+    return CatalogSnapshot(_ROWS)
+
+
+def test_services_are_parsed_once(snapshot):
+    assert snapshot.hospitals[1]["services"] == ["Emergency", "Cardiology", "ICU"]
+    assert snapshot.hospitals[3]["services"] == ["Pediatric Surgery", "Cardiac Surgery"]
+    assert snapshot.hospitals[4]["services"] == []
+
+
+@pytest.mark.parametrize(
+    "filters, expected",
+    [
+        ({}, [1, 2, 3, 4]),
+        ({"city": "dhaka"}, [1, 3, 4]),
+        ({"city": "DHA"}, [1, 3, 4]),
+        ({"service": "cardi"}, [1, 3]),
+        ({"service": "emergency", "city": "dhaka"}, [1]),
+        ({"search": "medical coll"}, [2, 3]),
+        ({"search": "medical", "service": "neuro"}, [2]),
+        ({"service": "oncology"}, []),
+        ({"search": "  "}, [1, 2, 3, 4]),
+    ],
+)
+def test_filters_are_index_intersections_in_listing_order(snapshot, filters, expected):
+    assert snapshot.filter(**filters) == expected
+
+
+def test_rows_are_copies(snapshot):
+    rows = snapshot.rows([3, 99])
+    rows[0]["total_beds"] = 0
+    assert [r["id"] for r in rows] == [3] and snapshot.hospitals[3]["total_beds"] == 10
+
+
+def test_catalog_reloads_after_ttl_or_invalidation(monkeypatch):
+    loads = []
+
+    def fake_execute_query(sql, params=None, fetch_all=False, **kwargs):
+        loads.append(sql)
+        return list(_ROWS[: len(loads) + 1])
+
+    monkeypatch.setattr(hospital_catalog, "execute_query", fake_execute_query)
+    catalog = HospitalCatalog(ttl_seconds=3600)
+
+    assert len(catalog.snapshot()) == 2
+    assert len(catalog.snapshot()) == 2 and len(loads) == 1
+
+    catalog.invalidate()  # e.g. a hospital registered in this worker
+    assert len(catalog.snapshot()) == 3 and len(loads) == 2
+
+    catalog.ttl_seconds = 0
+    assert len(catalog.snapshot()) == 4 and len(loads) == 3
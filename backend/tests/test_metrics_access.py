@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+
+@pytest.fixture()
+def metrics_app():
+    from app import create_app
+
+    app = create_app("testing")
+    app.config["METRICS_TOKEN"] = ""
+    return app
+
+
+def _bearer(app, identity):
+    with app.app_context():
+        return {"Authorization": f"Bearer {create_access_token(identity=identity)}"}
+
+
+def test_without_token_only_direct_loopback_requests_get_metrics(metrics_app):
+    client = metrics_app.test_client()
+
+    assert client.get("/metrics").status_code == 200
+    assert client.get("/metrics", environ_base={"REMOTE_ADDR": "10.0.0.5"}).status_code == 401
+    assert client.get("/metrics", headers={"X-Forwarded-For": "203.0.113.9"}).status_code == 401
+
+
+def test_token_or_admin_jwt_is_required_once_configured(metrics_app):
+    metrics_app.config["METRICS_TOKEN"] = "s3cret"
+    client = metrics_app.test_client()
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    resp = client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+    assert resp.status_code == 200 and "pool" in resp.get_json()
+    assert client.get("/metrics", headers=_bearer(metrics_app, "admin_1")).status_code == 200
+    assert client.get("/metrics", headers=_bearer(metrics_app, "42")).status_code == 403
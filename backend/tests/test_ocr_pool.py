@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from utils.ocr_pool import OCRCancelledError, OCRPool, OCRTimeoutError
+
+
+def _slow_echo(page: bytes, *, lang: str, timeout: float):
+    # Earlier pages take longer, so completion order is the reverse of page order.
+    delay = float(page.split(b":")[1])
+    time.sleep(delay)
+    return page.decode().split(":")[0], 90.0
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = OCRPool(workers=2, page_timeout=5)
+    yield pool
+    pool.shutdown()
+
+
+def test_pages_run_in_parallel_and_keep_order(pool):
+    pages = [b"p1:0.6", b"p2:0.3", b"p3:0.1", b"p4:0.1"]
+    pool.map_pages([b"warm:0"], ocr_func=_slow_echo)  # start the worker processes
+
+    done = []
+    started = time.perf_counter()
+    results = pool.map_pages(iter(pages), ocr_func=_slow_echo, on_page=done.append)
+    elapsed = time.perf_counter() - started
+
+    assert [text for text, _ in results] == ["p1", "p2", "p3", "p4"]
+    assert done == [1, 2, 3, 4]
+    assert elapsed < 1.0  # sequential would take 1.1s
+
+
+def test_page_timeout():
+    pool_short = OCRPool(workers=1, page_timeout=0.5)
+    try:
+        pool_short._get_executor().submit(_slow_echo, b"warm:0", lang="eng", timeout=0).result()
+        with pytest.raises(OCRTimeoutError, match="page 2"):
+            pool_short.map_pages([b"p1:0", b"p2:3"], ocr_func=_slow_echo)
+    finally:
+        pool_short._reset_executor()
+
+
+def test_cancel_event_abandons_remaining_pages(pool):
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+
+    with pytest.raises(OCRCancelledError):
+        pool.map_pages([b"p1:1", b"p2:1", b"p3:1"], ocr_func=_slow_echo, cancel_event=cancel)
+
+
+def test_inline_mode_without_processes():
+    results = OCRPool(workers=0).map_pages([b"a:0", b"b:0"], ocr_func=_slow_echo)
+    assert results == [("a", 90.0), ("b", 90.0)]
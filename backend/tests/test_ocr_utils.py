@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import io
+import sys
+import types
+
+from config import Config
+from utils.ocr_utils import extract_text_from_image_bytes, ocr_image_bytes, preprocess_image_bytes, text_from_tesseract_data
+
+
+def _data(rows):
+    keys = ("level", "page_num", "block_num", "par_num", "line_num", "word_num", "left", "top", "width", "height", "conf", "text")
+    return {key: [row[i] for row in rows] for i, key in enumerate(keys)}
+
+
+_ROWS = [
+    (1, 1, 0, 0, 0, 0, 0, 0, 800, 600, -1, ""),
+    (2, 1, 1, 0, 0, 0, 10, 10, 300, 40, -1, ""),
+    (5, 1, 1, 1, 1, 1, 10, 10, 120, 20, 95.0, "Hemoglobin"),
+    (5, 1, 1, 1, 1, 2, 140, 10, 40, 20, 90.0, "13.5"),
+    (5, 1, 1, 1, 2, 1, 10, 40, 60, 20, 80.0, "g/dL"),
+    (5, 1, 2, 1, 1, 1, 10, 90, 50, 20, 70.0, "Normal"),
+    (5, 1, 2, 1, 1, 2, 70, 90, 10, 20, -1, " "),
+]
+
+
+def test_text_is_rebuilt_from_word_indices():
+    text, confidence, words = text_from_tesseract_data(_data(_ROWS))
+
+    assert text == "Hemoglobin 13.5\ng/dL\n\nNormal"
+    assert confidence == (95 + 90 + 80 + 70) / 4
+    assert [w["text"] for w in words] == ["Hemoglobin", "13.5", "g/dL", "Normal"]
+    assert words[1] == {"text": "13.5", "conf": 90.0, "left": 140, "top": 10, "width": 40, "height": 20, "block": 1, "par": 1, "line": 1}
+
+
+def test_empty_data():
+    assert text_from_tesseract_data({}) == ("", None, [])
+
+
+def _install_fake_tesseract(monkeypatch, calls, osd=None):
+    fake = types.ModuleType("pytesseract")
+    fake.Output = types.SimpleNamespace(DICT="dict")
+    fake.pytesseract = types.SimpleNamespace(tesseract_cmd="tesseract")
+
+    def image_to_data(image, **kwargs):
+        calls.append(("image_to_data", image.size))
+        return _data(_ROWS)
+
+    def image_to_string(image, **kwargs):  # pragma: no cover - must not be called
+        calls.append(("image_to_string", image.size))
+        return ""
+
+    fake.image_to_data = image_to_data
+    fake.image_to_string = image_to_string
+    if osd is not None:
+        def image_to_osd(image, **kwargs):
+            calls.append(("image_to_osd", image.size))
+            return osd
+
+        fake.image_to_osd = image_to_osd
+    monkeypatch.setitem(sys.modules, "pytesseract", fake)
+
+
+def _encode(image, fmt, **kwargs):
+    buf = io.BytesIO()
+    image.save(buf, format=fmt, **kwargs)
+    return buf.getvalue()
+
+
+def test_single_tesseract_pass(monkeypatch):
+    from PIL import Image
+
+    calls = []
+    _install_fake_tesseract(monkeypatch, calls)
+    png = _encode(Image.new("RGB", (40, 20), "white"), "PNG")
+
+    assert extract_text_from_image_bytes(png) == ("Hemoglobin 13.5\ng/dL\n\nNormal", 83.75)
+    result = ocr_image_bytes(png)
+    assert len(result["words"]) == 4
+    assert [name for name, _ in calls] == ["image_to_data", "image_to_data"]
+    assert set(result["preprocess"]["timings_ms"]) == {"decode", "scale", "osd", "binarize", "crop", "ocr"}
+
+
+def test_phone_photo_is_draft_decoded_and_downscaled(monkeypatch):
+    from PIL import Image, JpegImagePlugin
+
+    monkeypatch.setattr(Config, "OCR_OSD", False)
+    _install_fake_tesseract(monkeypatch, [])
+    photo = _encode(Image.new("RGB", (4000, 3000), (200, 190, 180)), "JPEG", dpi=(72, 72))
+
+    opened = []
+    original_draft = JpegImagePlugin.JpegImageFile.draft
+
+    def spy_draft(self, mode, size):
+        opened.append((mode, size))
+        return original_draft(self, mode, size)
+
+    monkeypatch.setattr(JpegImagePlugin.JpegImageFile, "draft", spy_draft)
+    image, info = preprocess_image_bytes(photo)
+
+    # 4000px over an assumed 11in page is ~364 DPI -> scaled to OCR_MAX_DPI.
+    assert opened and opened[0][0] == "L"
+    assert info["dpi_from_metadata"] is False
+    assert info["source_size"] == [4000, 3000]
+    assert max(image.size) == round(4000 * info["scale"]) == 3300
+
+
+def test_exif_orientation_is_applied(monkeypatch):
+    from PIL import Image
+
+    monkeypatch.setattr(Config, "OCR_OSD", False)
+    _install_fake_tesseract(monkeypatch, [])
+    monkeypatch.setattr(Config, "OCR_BINARIZE", False)
+    exif = Image.Exif()
+    exif[0x0112] = 6  # stored sideways: rotate 90 degrees clockwise to view
+    img = Image.new("L", (300, 100), 255)
+    img.paste(0, (0, 0, 20, 100))  # dark band on the left edge -> top after rotation
+    image, info = preprocess_image_bytes(_encode(img, "JPEG", exif=exif, dpi=(300, 300)))
+
+    assert info["source_size"] == [100, 300]
+    assert info["crop"][1] == 0 and info["crop"][3] < 300
+
+
+def test_adaptive_binarization_and_content_crop(monkeypatch):
+    from PIL import Image, ImageDraw
+
+    monkeypatch.setattr(Config, "OCR_OSD", False)
+    _install_fake_tesseract(monkeypatch, [])
+    # Uneven lighting: background fades from light to mid gray.
+    img = Image.linear_gradient("L").resize((600, 400)).point(lambda v: 230 - v // 3)
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((200, 150, 300, 160), fill=40)
+    draw.rectangle((200, 300, 300, 310), fill=100)  # in the darker half, still darker than its surroundings
+    image, info = preprocess_image_bytes(_encode(img, "PNG", dpi=(200, 200)))
+
+    assert info["scale"] == 1.0
+    assert {color for _, color in image.getcolors()} == {0, 255}
+    left, top, right, bottom = info["crop"]
+    assert 180 <= left <= 200 and 130 <= top <= 150
+    assert 300 <= right <= 320 and 310 <= bottom <= 330
+    assert image.size == (right - left, bottom - top)
+
+
+def test_osd_rotation_and_word_boxes_map_to_source(monkeypatch):
+    from PIL import Image
+
+    calls = []
+    _install_fake_tesseract(monkeypatch, calls, osd={"rotate": 90, "orientation_conf": 6.5})
+    img = Image.new("L", (400, 200), 255)
+    img.paste(0, (100, 50, 300, 150))
+    result = ocr_image_bytes(_encode(img, "PNG", dpi=(300, 300)))
+
+    info = result["preprocess"]
+    assert info["rotation"] == 90
+    assert [name for name, _ in calls] == ["image_to_osd", "image_to_data"]
+    assert calls[1][1] == tuple(info["size"])
+    crop_left, crop_top = info["crop"][:2]
+    assert result["words"][0]["left"] == 10 + crop_left
+    assert result["words"][0]["top"] == 10 + crop_top
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+import pytest
+
+
+def test_cursor_round_trip_is_opaque():
+    from utils.pagination import decode_cursor, encode_cursor
+
+    token = encode_cursor(datetime(2024, 5, 1, 12, 30, 5), 42)
+
+    assert "2024" not in token
+    assert decode_cursor(token) == (datetime(2024, 5, 1, 12, 30, 5), 42)
+    assert decode_cursor("") is None
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_split_page_sets_next_cursor_only_when_more_rows():
+    from utils.pagination import decode_cursor, split_page
+
+    rows = [{"id": i, "created_at": datetime(2024, 1, i)} for i in (3, 2, 1)]
+
+    page, next_cursor = split_page(rows, 2, ts_key="created_at")
+    assert [r["id"] for r in page] == [3, 2]
+    assert decode_cursor(next_cursor) == (datetime(2024, 1, 2), 2)
+
+    page, next_cursor = split_page(rows, 3, ts_key="created_at")
+    assert len(page) == 3
+    assert next_cursor is None
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import utils.pdf_utils as pdf_utils
+
+
+def test_text_layer_heuristic():
+    lab = "Complete Blood Count\nHemoglobin 13.5 g/dL (13.0-17.0)\nWBC 6.2 x10^9/L"
+    assert pdf_utils.text_layer_usable(lab)
+    assert not pdf_utils.text_layer_usable("")
+    assert not pdf_utils.text_layer_usable("Page 1 of 3")  # too short: likely a scan with a footer
+    assert not pdf_utils.text_layer_usable("�" * 30 + "Hemoglobin 13.5 g/dL")  # broken font encoding
+    assert not pdf_utils.text_layer_usable("....---....///,,,,;;;;::::" * 3)
+
+
+class _FakePool:
+    def __init__(self):
+        self.pages = []
+
+    def map_pages(self, pages, **kwargs):
+        out = []
+        for png in pages:
+            self.pages.append(png)
+            out.append((f"ocr:{png.decode()}", 80.0))
+        return out
+
+
+def test_hybrid_extraction_only_ocrs_pages_without_text(monkeypatch):
+    fake_pool = _FakePool()
+    monkeypatch.setattr(pdf_utils, "get_ocr_pool", lambda: fake_pool)
+    monkeypatch.setattr(
+        pdf_utils,
+        "extract_pdf_pages",
+        lambda data, max_pages=10: iter(
+            [
+                (pdf_utils.PAGE_TEXT_LAYER, "native page one"),
+                (pdf_utils.PAGE_OCR, b"scan2"),
+                (pdf_utils.PAGE_TEXT_LAYER, "native page three"),
+            ]
+        ),
+    )
+
+    text, confidence, pages = pdf_utils.extract_pdf_text(b"%PDF")
+
+    assert fake_pool.pages == [b"scan2"]
+    assert text == "--- Page 1 ---\nnative page one\n\n--- Page 2 ---\nocr:scan2\n\n--- Page 3 ---\nnative page three"
+    assert confidence == 80.0
+    assert [p["method"] for p in pages] == ["text", "ocr", "text"]
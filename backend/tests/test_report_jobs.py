@@ -0,0 +1,365 @@
+from __future__ import annotations
+
+import io
+import json
+import time
+from pathlib import Path
+
+import pytest
+
+
+class _MemoryStore:
+    """In-memory stand-in for ReportJobStore."""
+
+    def __init__(self):
+        self.jobs = {}
+        self.reports = []
+
+    def create(self, *, user_id, file_name, file_ext, work_dir, model):
+        job_id = len(self.jobs) + 1
+        self.jobs[job_id] = {
+            "id": job_id,
+            "user_id": user_id,
+            "file_name": file_name,
+            "file_ext": file_ext,
+            "work_dir": work_dir,
+            "model": model,
+            "status": "queued",
+            "stage": None,
+            "stages": "{}",
+            "attempts": 0,
+            "error": None,
+            "ocr_text": None,
+            "ocr_confidence": None,
+            "explanation": None,
+            "report_id": None,
+            "finished_at": None,
+        }
+        return job_id
+
+    def get(self, job_id, *, user_id=None):
+        job = self.jobs.get(job_id)
+        if job is None or (user_id is not None and job["user_id"] != user_id):
+            return None
+        return dict(job)
+
+    def claim(self, job_id):
+        job = self.jobs[job_id]
+        if job["status"] != "queued":
+            return None
+        job.update(status="running", attempts=job["attempts"] + 1, error=None)
+        return job["attempts"]
+
+    def owns(self, job_id, attempt):
+        job = self.jobs[job_id]
+        return job["status"] == "running" and job["attempts"] == attempt
+
+    def requeue(self, job_id, *, user_id):
+        job = self.jobs.get(job_id)
+        if not job or job["user_id"] != user_id or job["status"] != "failed" or not job["work_dir"]:
+            return False
+        job.update(status="queued", error=None, finished_at=None)
+        return True
+
+    def cancel(self, job_id, *, user_id):
+        job = self.jobs.get(job_id)
+        if not job or job["user_id"] != user_id or job["status"] not in ("queued", "running"):
+            return None
+        previous = job["status"]
+        job.update(status="cancelled", finished_at=time.time())
+        return previous
+
+    def status(self, job_id):
+        return self.jobs[job_id]["status"]
+
+    def update(self, job_id, *, attempt, finished=False, **fields):
+        if not self.owns(job_id, attempt):
+            return
+        if "stages" in fields and not isinstance(fields["stages"], str):
+            fields["stages"] = json.dumps(fields["stages"])
+        if finished:
+            fields["finished_at"] = time.time()
+        self.jobs[job_id].update(fields)
+
+    def clear_work_dir(self, job_id, *, work_dir, attempt=None, stages=None):
+        job = self.jobs[job_id]
+        if job["work_dir"] != work_dir or job["status"] not in ("failed", "cancelled"):
+            return False
+        if attempt is not None and job["attempts"] != attempt:
+            return False
+        job["work_dir"] = ""
+        if stages is not None:
+            job["stages"] = json.dumps(stages)
+        return True
+
+    def expired_work_dirs(self, *, ttl_seconds, limit=200):
+        cutoff = time.time() - ttl_seconds
+        return [
+            {"id": job["id"], "work_dir": job["work_dir"]}
+            for job in self.jobs.values()
+            if job["status"] in ("failed", "cancelled") and job["work_dir"] and job["finished_at"] < cutoff
+        ][:limit]
+
+    def insert_report(self, job_id, *, attempt, user_id, file_name, ocr_text, explanation):
+        if not self.owns(job_id, attempt):
+            return None
+        if self.jobs[job_id]["report_id"]:
+            return self.jobs[job_id]["report_id"]
+        self.reports.append((user_id, file_name, ocr_text, explanation))
+        self.jobs[job_id]["report_id"] = len(self.reports)
+        return len(self.reports)
+
+
+@pytest.fixture()
+def jobs(monkeypatch, tmp_path):
+    import utils.report_jobs as jobs_mod
+    from utils.report_cache import ReportResultCache
+
+    cache = ReportResultCache(max_entries=8)
+    monkeypatch.setattr(jobs_mod, "get_report_cache", lambda: cache)
+
+    calls = {"ocr": 0, "classify": 0, "explain": 0}
+    behaviour = {"classify": lambda: None, "explain": lambda: "EXPLAINED"}
+
+    class FakeOCRPool:
+        def map_pages(self, pages, *, cancel_event=None, on_page=None, **kwargs):
+            results = []
+            for page in pages:
+                behaviour["ocr_page"](cancel_event)
+                calls["ocr"] += 1
+                results.append(("Hemoglobin 13.5", 91.0))
+                if on_page:
+                    on_page(len(results))
+            return results
+
+    behaviour["ocr_page"] = lambda cancel_event: None
+
+    def fake_classify(**kwargs):
+        calls["classify"] += 1
+        return behaviour["classify"]()
+
+    def fake_explain(**kwargs):
+        calls["explain"] += 1
+        return behaviour["explain"]()
+
+    monkeypatch.setattr(jobs_mod, "get_ocr_pool", lambda: FakeOCRPool())
+    monkeypatch.setattr(jobs_mod, "classify_report", fake_classify)
+    monkeypatch.setattr(jobs_mod, "explain_report", fake_explain)
+
+    store = _MemoryStore()
+    runner = jobs_mod.ReportJobRunner(store=store, workers=1, base_dir=str(tmp_path))
+    yield runner, store, calls, behaviour
+    runner.shutdown()
+
+
+def _stage_statuses(store, job_id):
+    stages = json.loads(store.jobs[job_id]["stages"])
+    return {name: stages.get(name, {}).get("status") for name in ("render", "ocr", "classify", "explain", "save")}
+
+
+def test_job_runs_every_stage_and_saves_report(jobs):
+    runner, store, calls, behaviour = jobs
+    job_id = runner.create(user_id=7, file_name="lab.png", file_ext="png", data=b"png-bytes", model="m")
+    work_dir = Path(store.jobs[job_id]["work_dir"])
+
+    assert runner.run(job_id) == "succeeded"
+
+    job = store.jobs[job_id]
+    assert _stage_statuses(store, job_id) == dict.fromkeys(_stage_statuses(store, job_id), "done")
+    assert job["report_id"] == 1
+    assert store.reports == [(7, "lab.png", "Hemoglobin 13.5", "EXPLAINED")]
+    assert calls == {"ocr": 1, "classify": 1, "explain": 1}
+    assert not work_dir.exists()
+
+
+def test_failed_stage_is_retried_without_redoing_earlier_stages(jobs):
+    from utils.ai_gateway import AIGatewayError
+
+    runner, store, calls, behaviour = jobs
+
+    def overloaded():
+        raise AIGatewayError("model is overloaded", status_code=503)
+
+    behaviour["explain"] = overloaded
+    job_id = runner.create(user_id=7, file_name="lab.png", file_ext="png", data=b"png-bytes", model="m")
+
+    assert runner.run(job_id) == "failed"
+    assert store.jobs[job_id]["stage"] == "explain"
+    assert _stage_statuses(store, job_id)["classify"] == "done"
+    assert Path(store.jobs[job_id]["work_dir"]).exists()
+
+    behaviour["explain"] = lambda: "EXPLAINED"
+    assert store.requeue(job_id, user_id=7)
+    assert runner.run(job_id) == "succeeded"
+
+    assert calls == {"ocr": 1, "classify": 1, "explain": 3}  # file attempt + OCR-text fallback, then retry
+    assert store.jobs[job_id]["attempts"] == 2
+
+
+def test_combined_classification_skips_explain_and_non_medical_is_rejected(jobs):
+    from utils.gemini_utils import NotMedicalDocumentError
+
+    runner, store, calls, behaviour = jobs
+
+    behaviour["classify"] = lambda: "COMBINED EXPLANATION"
+    ok = runner.create(user_id=7, file_name="a.png", file_ext="png", data=b"a", model="m")
+    assert runner.run(ok) == "succeeded"
+    assert json.loads(store.jobs[ok]["stages"])["explain"]["skipped"] is True
+    assert calls["explain"] == 0
+
+    def not_medical():
+        raise NotMedicalDocumentError("This appears to be a receipt.")
+
+    behaviour["classify"] = not_medical
+    bad = runner.create(user_id=7, file_name="b.png", file_ext="png", data=b"b", model="m")
+    assert runner.run(bad) == "rejected"
+    assert store.jobs[bad]["error"] == "This appears to be a receipt."
+    assert not store.requeue(bad, user_id=7)
+
+
+def test_resubmitted_file_is_served_from_report_cache(jobs):
+    runner, store, calls, behaviour = jobs
+
+    first = runner.create(user_id=7, file_name="lab.png", file_ext="png", data=b"same", model="m")
+    second = runner.create(user_id=7, file_name="lab.png", file_ext="png", data=b"same", model="m")
+    assert runner.run(first) == "succeeded"
+    assert runner.run(second) == "succeeded"
+
+    assert calls == {"ocr": 1, "classify": 1, "explain": 1}
+    assert json.loads(store.jobs[second]["stages"])["ocr"]["cached"] is True
+    assert len(store.reports) == 2
+
+
+def test_submit_and_poll_endpoints(monkeypatch, jobs, client, auth_header):
+    import routes.reports as reports_mod
+
+    runner, store, calls, behaviour = jobs
+    monkeypatch.setattr(reports_mod, "get_job_runner", lambda: runner)
+
+    data = {"file": (io.BytesIO(b"png-bytes"), "lab.png")}
+    resp = client.post("/api/reports/jobs", data=data, headers=auth_header, content_type="multipart/form-data")
+    assert resp.status_code == 202, resp.get_data(as_text=True)
+    job_id = resp.get_json()["job_id"]
+
+    assert client.get(f"/api/reports/jobs/{job_id}", headers=auth_header).status_code == 200
+    runner.shutdown(wait=True)
+    resp = client.get(f"/api/reports/jobs/{job_id}", headers=auth_header)
+    body = resp.get_json()
+
+    assert body["status"] == "succeeded"
+    assert body["progress"] == 1.0
+    assert [s["name"] for s in body["stages"]] == ["render", "ocr", "classify", "explain", "save"]
+    assert body["result"]["explanation"] == "EXPLAINED"
+
+    assert client.post(f"/api/reports/jobs/{job_id}/retry", headers=auth_header).status_code == 409
+    assert client.get("/api/reports/jobs/999", headers=auth_header).status_code == 404
+
+
+def test_cancel_stops_ocr_and_deletes_the_work_dir(jobs):
+    from utils.ocr_pool import OCRCancelledError
+
+    runner, store, calls, behaviour = jobs
+    job_id = runner.create(user_id=7, file_name="lab.png", file_ext="png", data=b"png-bytes", model="m")
+    work_dir = Path(store.jobs[job_id]["work_dir"])
+
+    def cancel_mid_page(cancel_event):
+        assert runner.cancel(job_id, user_id=7)
+        if cancel_event.is_set():
+            raise OCRCancelledError("OCR cancelled")
+
+    behaviour["ocr_page"] = cancel_mid_page
+    assert runner.run(job_id) == "cancelled"
+    assert store.jobs[job_id]["status"] == "cancelled"
+    assert _stage_statuses(store, job_id)["ocr"] == "cancelled"
+    assert calls["classify"] == 0
+    assert not work_dir.exists() and store.jobs[job_id]["work_dir"] == ""
+    assert not store.requeue(job_id, user_id=7)
+
+    queued = runner.create(user_id=7, file_name="lab.png", file_ext="png", data=b"other", model="m")
+    queued_dir = Path(store.jobs[queued]["work_dir"])
+    assert runner.cancel(queued, user_id=7)
+    assert not queued_dir.exists()
+    assert runner.run(queued) is None
+
+
+def test_run_that_lost_its_job_writes_nothing(jobs):
+    import utils.report_jobs as jobs_mod
+
+    runner, store, calls, behaviour = jobs
+    job_id = runner.create(user_id=7, file_name="lab.png", file_ext="png", data=b"png-bytes", model="m")
+    other = jobs_mod.ReportJobRunner(store=store, workers=1, base_dir=runner.base_dir)
+
+    def taken_over_mid_explain():
+        # Another worker decides this run is stale, requeues and finishes the job.
+        behaviour["explain"] = lambda: "SECOND RUN"
+        store.jobs[job_id]["status"] = "queued"
+        assert other.run(job_id) == "succeeded"
+        return "FIRST RUN"
+
+    behaviour["explain"] = taken_over_mid_explain
+    assert runner.run(job_id) is None
+    other.shutdown()
+
+    job = store.jobs[job_id]
+    assert job["status"] == "succeeded" and job["attempts"] == 2
+    assert job["explanation"] == "SECOND RUN"
+    assert store.reports == [(7, "lab.png", "Hemoglobin 13.5", "SECOND RUN")]
+    assert _stage_statuses(store, job_id)["save"] == "done"
+
+
+def test_cancel_during_explain_is_not_requeued_while_the_run_is_alive(jobs):
+    runner, store, calls, behaviour = jobs
+    job_id = runner.create(user_id=7, file_name="lab.png", file_ext="png", data=b"png-bytes", model="m")
+
+    def cancelled_elsewhere():
+        assert store.cancel(job_id, user_id=7) == "running"  # through another worker
+        assert not store.requeue(job_id, user_id=7)
+        return "EXPLAINED"
+
+    behaviour["explain"] = cancelled_elsewhere
+    assert runner.run(job_id) == "cancelled"
+    assert store.reports == []
+    assert store.jobs[job_id]["explanation"] is None
+    assert store.jobs[job_id]["work_dir"] == ""
+
+
+def test_sweep_removes_work_dirs_of_old_failed_jobs(jobs):
+    from utils.ai_gateway import AIGatewayError
+
+    runner, store, calls, behaviour = jobs
+
+    def overloaded():
+        raise AIGatewayError("model is overloaded", status_code=503)
+
+    behaviour["explain"] = overloaded
+    old = runner.create(user_id=7, file_name="a.png", file_ext="png", data=b"a", model="m")
+    recent = runner.create(user_id=7, file_name="b.png", file_ext="png", data=b"b", model="m")
+    assert runner.run(old) == "failed" and runner.run(recent) == "failed"
+    store.jobs[old]["finished_at"] -= 7200
+    old_dir = Path(store.jobs[old]["work_dir"])
+
+    assert runner.sweep_work_dirs(ttl_seconds=3600) == 1
+    assert not old_dir.exists()
+    assert Path(store.jobs[recent]["work_dir"]).exists()
+    assert not store.requeue(old, user_id=7)
+    assert store.requeue(recent, user_id=7)
+
+
+def test_pdf_job_ocrs_only_pages_without_text_layer(monkeypatch, jobs):
+    import utils.report_jobs as jobs_mod
+
+    runner, store, calls, behaviour = jobs
+    monkeypatch.setattr(
+        jobs_mod,
+        "extract_pdf_pages",
+        lambda data: iter([("text", "Native lab values"), ("ocr", b"png"), ("text", "More native text")]),
+    )
+    job_id = runner.create(user_id=7, file_name="lab.pdf", file_ext="pdf", data=b"%PDF-1.4", model="m")
+
+    assert runner.run(job_id) == "succeeded"
+
+    stages = json.loads(store.jobs[job_id]["stages"])
+    assert stages["render"]["methods"] == ["text", "ocr", "text"]
+    assert stages["ocr"]["text_layer_pages"] == 2
+    assert calls["ocr"] == 1
+    assert store.jobs[job_id]["ocr_text"].startswith("--- Page 1 ---\nNative lab values\n\n--- Page 2 ---\nHemoglobin")
@@ -80,3 +80,71 @@ def test_simplify_uses_multimodal_even_when_ocr_empty(monkeypatch, client, auth_
     assert payload["report_id"] == 7
     assert payload["text"].startswith("[OCR failed")
     assert payload["explanation"] == "VISION OK"
+
+
+def test_reupload_of_same_file_skips_ocr_and_ai(monkeypatch, client, auth_header):
+    import routes.reports as reports_mod
+    from utils.report_cache import ReportResultCache
+
+    cache = ReportResultCache(max_entries=8)
+    monkeypatch.setattr(reports_mod, "get_report_cache", lambda: cache)
+
+    calls = {"ocr": 0, "ai": 0}
+
+    def fake_ocr(*, ext, data):
+        calls["ocr"] += 1
+        return ("Hemoglobin 13.5", 88.0)
+
+    def fake_explain(file_bytes, *, mime_type, model):
+        calls["ai"] += 1
+        return "EXPLAINED"
+
+    monkeypatch.setattr(reports_mod, "_ocr_bytes", fake_ocr)
+    monkeypatch.setattr(reports_mod, "explain_bytes_with_gemini", fake_explain)
+
+    inserts = []
+
+    def fake_execute_query(sql, params, commit=False, fetch_one=False, fetch_all=False):
+        if "INSERT INTO medical_reports" in sql:
+            inserts.append(params)
+            return len(inserts)
+        return {"id": len(inserts), "file_name": "lab.png", "uploaded_at": None}
+
+    monkeypatch.setattr(reports_mod, "execute_query", fake_execute_query)
+
+    for _ in range(2):
+        data = {"file": (io.BytesIO(b"same-bytes"), "lab.png")}
+        resp = client.post("/api/reports/simplify", data=data, headers=auth_header, content_type="multipart/form-data")
+        assert resp.status_code == 201, resp.get_data(as_text=True)
+
+    assert calls == {"ocr": 1, "ai": 1}
+    assert len(inserts) == 2
+    assert inserts[1][2:4] == ("Hemoglobin 13.5", "EXPLAINED")
+    assert resp.get_json()["cached"] is True
+
+
+def test_cached_not_medical_verdict_is_returned_without_ai(monkeypatch, client, auth_header):
+    import routes.reports as reports_mod
+    from utils.gemini_utils import NotMedicalDocumentError
+    from utils.report_cache import ReportResultCache
+
+    cache = ReportResultCache(max_entries=8)
+    monkeypatch.setattr(reports_mod, "get_report_cache", lambda: cache)
+    monkeypatch.setattr(reports_mod, "_ocr_bytes", lambda *, ext, data: ("Invoice #42", 90.0))
+
+    ai_calls = []
+
+    def not_medical(*args, **kwargs):
+        ai_calls.append(1)
+        raise NotMedicalDocumentError("This appears to be an invoice.")
+
+    monkeypatch.setattr(reports_mod, "explain_bytes_with_gemini", not_medical)
+    monkeypatch.setattr(reports_mod, "simplify_ocr_text", not_medical)
+
+    for _ in range(2):
+        data = {"file": (io.BytesIO(b"invoice-bytes"), "invoice.png")}
+        resp = client.post("/api/reports/simplify", data=data, headers=auth_header, content_type="multipart/form-data")
+        assert resp.status_code == 400
+        assert resp.get_json()["message"] == "This appears to be an invoice."
+
+    assert len(ai_calls) == 1  # the verdict is not re-checked via the OCR-text fallback
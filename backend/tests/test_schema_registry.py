@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import pytest
+
+from utils import schema_registry, sos_events
+from utils.schema_registry import SchemaRegistry
+
+_FULL_SCHEMA = {
+    "emergency_requests": ["id", "user_id", "latitude", "longitude", "status", "created_at",
+                           "emergency_type", "note", "hospital_id", "acknowledged_at", "resolved_at"],
+    "emergency_types": ["code", "label"],
+    "doctors": ["id", "name", "specialty", "rating"],
+}
+
+
+@pytest.fixture()
+def schema(monkeypatch):
+    state = {"tables": dict(_FULL_SCHEMA), "loads": 0, "fail": False}
+
+    def fake_execute_query(sql, params=None, fetch_all=False, **kwargs):
+        state["loads"] += 1
+        if state["fail"]:
+            raise RuntimeError("Can't connect to MySQL server")
+        return [
+            {"TABLE_NAME": table, "COLUMN_NAME": column.upper()}
+            for table, columns in state["tables"].items()
+            for column in columns
+        ]
+
+    monkeypatch.setattr(schema_registry, "execute_query", fake_execute_query)
+    monkeypatch.setattr(schema_registry, "_registry", SchemaRegistry(refresh_seconds=3600))
+    return state
+
+
+def test_columns_are_loaded_once_and_lowercased(schema):
+    registry = schema_registry.get_schema_registry()
+
+    assert registry.columns("DOCTORS") == {"id", "name", "specialty", "rating"}
+    assert registry.has_columns("emergency_types", "code", "label")
+    assert not registry.has_columns("doctors", "bio")
+    assert registry.columns("missing") == frozenset() and not registry.has_table("missing")
+    assert schema["loads"] == 1
+
+
+def test_unknown_schema_assumes_everything_exists(schema):
+    schema["fail"] = True
+    registry = schema_registry.get_schema_registry()
+
+    assert not registry.known
+    assert registry.columns("doctors") is None
+    assert registry.has_columns("emergency_requests", "resolved_at")
+    assert sos_events.sos_schema_variant() == "with_types"
+
+
+@pytest.mark.parametrize(
+    "drop, expected",
+    [
+        (None, "with_types"),
+        ("emergency_types", "without_types"),
+        ("emergency_requests.resolved_at", "minimal"),
+    ],
+)
+def test_sos_query_variant_follows_schema(schema, drop, expected):
+    if drop == "emergency_types":
+        del schema["tables"]["emergency_types"]
+    elif drop:
+        table, column = drop.split(".")
+        schema["tables"][table] = [c for c in schema["tables"][table] if c != column]
+
+    assert sos_events.sos_schema_variant() == expected
+
+
+class _Cursor:
+    def __init__(self, failing):
+        self.failing = failing
+        self.executed = []
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+        if sql in self.failing:
+            raise RuntimeError(f"(1054, \"Unknown column 'er.note' in 'field list'\") [{sql}]")
+
+
+def test_schema_error_reloads_registry_and_retries_once(schema):
+    from routes.emergency_sos import _execute_variant
+
+    queries = {"with_types": "full", "without_types": "no types", "minimal": "minimal"}
+    params = {"with_types": (1, 2), "without_types": (1, 2), "minimal": (1,)}
+    schema_registry.get_schema_registry().columns("doctors")  # loaded with the full schema
+
+    # A migration rollback dropped the optional columns since the load.
+    schema["tables"]["emergency_requests"] = ["id", "user_id", "latitude", "longitude", "status", "created_at"]
+    cursor = _Cursor(failing={"full"})
+    _execute_variant(cursor, queries, params)
+    assert cursor.executed == [("full", (1, 2)), ("minimal", (1,))]
+
+    # Same variant after the reload: the error is real and surfaces.
+    cursor = _Cursor(failing={"minimal"})
+    with pytest.raises(RuntimeError):
+        _execute_variant(cursor, queries, params)
+    assert len(cursor.executed) == 1
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils import sos_events
+from utils.geo_index import GeoGridIndex
+from utils.sos_escalation import SosEscalationScheduler
+from utils.sos_events import SosEventHub
+
+# Hospitals due north of a request at (23.78, 90.41): ~2km, ~12km, ~24km, ~80km.
+_HOSPITALS = {1: 23.80, 2: 23.89, 3: 23.995, 4: 24.50}
+
+
+class _Locator:
+    def __init__(self):
+        self.index = GeoGridIndex()
+        for hospital_id, lat in _HOSPITALS.items():
+            self.index.upsert(hospital_id, lat, 90.41)
+
+    def available(self):
+        return True
+
+    def distance_matrix(self, lats, lons):
+        return self.index.distance_matrix(lats, lons)
+
+
+@pytest.fixture()
+def db(monkeypatch):
+    state = {"pending": [], "outcomes": {}}
+
+    def fake_execute_query(sql, params=None, fetch_all=False, **kwargs):
+        if "WHERE er.status = 'pending'" in sql:
+            return list(state["pending"])
+        return [state["outcomes"][i] for i in params if i in state["outcomes"]]
+
+    monkeypatch.setattr(sos_events, "execute_query", fake_execute_query)
+    return state
+
+
+def _request(rid, created_at):
+    return {
+        "id": rid, "user_id": 7, "latitude": 23.78, "longitude": 90.41, "status": "pending",
+        "emergency_type_label": "General", "created_at": created_at,
+    }
+
+
+def _drain(scheduler):
+    notified = []
+    while not scheduler.notifications.empty():
+        n = scheduler.notifications.get_nowait()
+        notified.append((n["request_id"], n["hospital_id"], n["radius_km"]))
+    return notified
+
+
+def test_each_tick_notifies_only_newly_in_range_hospitals(db):
+    created = datetime.now()
+    db["pending"] = [_request(1, created)]
+    hub = SosEventHub(sync_seconds=3600)
+    scheduler = SosEscalationScheduler(hub, _Locator(), matrix_rows=1)
+
+    assert scheduler.run_once(now=created) == 1
+    assert _drain(scheduler) == [(1, 1, 10.0)]
+    assert scheduler.run_once(now=created + timedelta(seconds=60)) == 0  # no tick yet
+
+    assert hub.next_tick() == created + timedelta(seconds=180)
+    scheduler.run_once(now=created + timedelta(seconds=181))
+    scheduler.run_once(now=created + timedelta(seconds=361))
+    assert _drain(scheduler) == [(1, 2, 20.0), (1, 3, 30.0)]
+
+    # Hospital #4 (80km) is beyond MAX_RADIUS_KM; nothing else ever fires.
+    scheduler.run_once(now=created + timedelta(hours=1))
+    assert _drain(scheduler) == []
+
+
+def test_acknowledgement_records_time_to_acknowledge(db):
+    created = datetime.now() - timedelta(seconds=200)
+    db["pending"] = [_request(5, created), _request(6, created)]
+    hub = SosEventHub(sync_seconds=3600)
+    scheduler = SosEscalationScheduler(hub, _Locator())
+    scheduler.run_once()
+
+    hub.publish_closed(5, status="acknowledged", hospital_id=2)
+    hub.publish_closed(6, status="resolved")
+    scheduler.run_once()
+
+    stats = scheduler.metrics.snapshot()
+    tta = stats["time_to_acknowledge_seconds"]
+    assert tta["count"] == 1 and tta["avg"] == pytest.approx(200, abs=5)
+    assert stats["closed_without_acknowledgement"] == 1
+    assert {(r["request_id"], r["status"], r["steps"], r["hospitals_notified"]) for r in stats["recent"]} == {
+        (5, "acknowledged", 1, 2), (6, "resolved", 1, 2),
+    }
+    assert stats["notifications"]["enqueued"] == 4 and stats["passes"] == 2
+
+
+def test_subscribed_radius_is_used_per_hospital(db):
+    created = datetime.now()
+    db["pending"] = [_request(1, created)]
+    hub = SosEventHub(sync_seconds=3600)
+    scheduler = SosEscalationScheduler(hub, _Locator())
+    hub.attach(hub.subscribe(hospital_id=2, latitude=23.89, longitude=90.41, radius_km=15.0))
+
+    scheduler.run_once(now=created)
+    assert _drain(scheduler) == [(1, 1, 10.0), (1, 2, 15.0)]
+    scheduler.run_once(now=created + timedelta(seconds=181))
+    assert _drain(scheduler) == []  # #2's ring is now 15-25km; #3 (~24km) is on the default 20km
+    scheduler.run_once(now=created + timedelta(seconds=361))
+    assert _drain(scheduler) == [(1, 3, 30.0)]
+
+
+def test_dispatch_wakes_only_notified_hospitals(db):
+    db["pending"] = [_request(9, datetime.now())]
+    hub = SosEventHub(sync_seconds=3600)
+    scheduler = SosEscalationScheduler(hub, _Locator(), queue_size=1)
+    batches = []
+    scheduler.add_handler(batches.append)
+    near = hub.subscribe(hospital_id=1, latitude=23.80, longitude=90.41, radius_km=10.0)
+    far = hub.subscribe(hospital_id=4, latitude=24.50, longitude=90.41, radius_km=10.0)
+    hub.attach(near)
+    hub.attach(far)
+
+    db["pending"].append(_request(10, datetime.now()))
+    assert scheduler.run_once() == 1  # the second notification doesn't fit
+
+    assert scheduler.dispatch(timeout=0) == 1
+    assert [n["request_id"] for n in batches[0]] == [9]
+    assert near.woken and not far.woken
+    assert scheduler.metrics.snapshot()["notifications"] == {"enqueued": 1, "dropped": 1, "delivered": 1}
+
+    hub.wait(hub.version, 0, subscription=near)
+    assert not near.woken
+    hub.detach(near)
+    hub.detach(far)
+    assert hub.subscribers == 0 and hub.subscriber_radii() == {}
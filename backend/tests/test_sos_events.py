@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+
+from config import Config
+from utils import sos_events
+from utils.sos_events import SosEventHub, effective_radius_km, expansion_steps
+
+# Dhaka hospital; requests ~2km, ~19km and ~29km north of it.
+_HOSPITAL = (23.78, 90.41)
+
+
+def _request(rid, lat, age_seconds=0, lng=90.41):
+    return {
+        "id": rid, "user_id": 7, "user_name": "Patient", "user_phone": None, "blood_group": "O+",
+        "latitude": lat, "longitude": lng, "emergency_type": None, "emergency_type_label": "General",
+        "note": None, "status": "pending", "created_at": datetime.now() - timedelta(seconds=age_seconds),
+    }
+
+
+@pytest.fixture()
+def db(monkeypatch):
+    state = {"pending": [], "outcomes": {}, "queries": 0}
+
+    def fake_execute_query(sql, params=None, fetch_all=False, **kwargs):
+        state["queries"] += 1
+        if "WHERE er.status = 'pending'" in sql:
+            return list(state["pending"])
+        return [state["outcomes"][i] for i in params if i in state["outcomes"]]
+
+    monkeypatch.setattr(sos_events, "execute_query", fake_execute_query)
+    return state
+
+
+def _subscribe(hub, radius_km=10.0):
+    return hub.subscribe(hospital_id=1, latitude=_HOSPITAL[0], longitude=_HOSPITAL[1], radius_km=radius_km)
+
+
+def test_effective_radius_expands_and_caps():
+    assert effective_radius_km(10.0, expansion_steps(0)) == 10.0
+    assert effective_radius_km(10.0, expansion_steps(179)) == 10.0
+    assert effective_radius_km(10.0, expansion_steps(360)) == 30.0
+    assert effective_radius_km(10.0, expansion_steps(3600)) == 50.0
+
+
+def test_radius_grows_on_expansion_ticks_without_reloading(db):
+    db["pending"] = [_request(1, 23.95, age_seconds=170)]  # ~19km away, 10s before its first tick
+    hub = SosEventHub(sync_seconds=3600)
+    hub.ensure_synced()
+    now = datetime.now()
+
+    assert hub.visible(*_HOSPITAL, 10.0, now=now) == []
+    # A larger base radius sees it straight away.
+    assert hub.visible(*_HOSPITAL, 45.0, now=now)[0]["effective_radius_km"] == 45.0
+    later = hub.visible(*_HOSPITAL, 10.0, now=now + timedelta(seconds=15))
+    assert [(r["id"], r["effective_radius_km"]) for r in later] == [(1, 20.0)]
+    # Radii cap at MAX_RADIUS_KM.
+    assert hub.visible(*_HOSPITAL, 10.0, now=now + timedelta(hours=2))[0]["effective_radius_km"] == 50.0
+    assert db["queries"] == 1
+
+
+def test_subscription_sees_requests_inside_expanding_radius(db):
+    db["pending"] = [_request(1, 23.80), _request(2, 23.95), _request(3, 24.04, age_seconds=400)]
+    hub = SosEventHub(sync_seconds=60)
+    hub.ensure_synced()
+
+    snapshot = _subscribe(hub).snapshot()
+
+    # #2 (19km) is outside the fresh 10km radius; #3 (29km) is old enough for 30km.
+    assert [r["id"] for r in snapshot["requests"]] == [1, 3]
+    assert snapshot["requests"][1]["effective_radius_km"] == 30.0
+
+
+def test_local_writes_produce_events_without_waiting_for_sync(db):
+    hub = SosEventHub(sync_seconds=3600)
+    sub = _subscribe(hub)
+    hub.ensure_synced()
+    assert sub.snapshot()["requests"] == []
+
+    db["pending"] = [_request(10, 23.80)]
+    hub.publish_created(10)  # marks the hub dirty: the next sync happens now
+    hub.ensure_synced()
+    events = sub.poll()
+    assert [(e["type"], e["request"]["id"]) for e in events] == [("sos.created", 10)]
+    assert events[0]["request"]["distance_km"] == pytest.approx(2.22, abs=0.01)
+
+    hub.publish_closed(10, status="acknowledged", hospital_id=5)
+    assert sub.poll() == [{"type": "sos.accepted", "request_id": 10, "status": "acknowledged", "hospital_id": 5, "hospital_name": None}]
+
+    # A stale sync that still returns the request doesn't resurrect it.
+    hub._dirty = True
+    hub.ensure_synced()
+    assert sub.poll() == []
+
+
+def test_sync_picks_up_changes_from_other_workers(db):
+    db["pending"] = [_request(20, 23.80), _request(21, 23.79)]
+    hub = SosEventHub(sync_seconds=0)
+    sub = _subscribe(hub)
+    hub.ensure_synced()
+    sub.snapshot()
+
+    db["pending"] = [_request(21, 23.79)]
+    db["outcomes"] = {20: {"id": 20, "status": "resolved", "hospital_id": None, "hospital_name": None}}
+    hub.ensure_synced()
+
+    assert [(e["type"], e["request_id"]) for e in sub.poll()] == [("sos.resolved", 20)]
+
+
+@pytest.fixture()
+def app() -> Flask:
+    from routes.emergency_sos import emergency_sos_bp
+
+    app = Flask(__name__)
+    app.config.update({"TESTING": True, "JWT_SECRET_KEY": "test-jwt-secret"})
+    JWTManager(app)
+    app.register_blueprint(emergency_sos_bp, url_prefix="/api")
+    return app
+
+
+class _Cursor:
+    def __init__(self):
+        self.queries = []
+        self.rowcount = 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.queries.append(sql)
+
+    def fetchone(self):
+        return {"latitude": _HOSPITAL[0], "longitude": _HOSPITAL[1], "name": "Square Hospital"}
+
+    def fetchall(self):
+        return []
+
+
+@pytest.fixture()
+def hospital_db(monkeypatch, db):
+    import routes.emergency_sos as sos_mod
+
+    cursor = _Cursor()
+    conn = type("Conn", (), {"cursor": lambda self: cursor, "close": lambda self: None,
+                             "commit": lambda self: None, "rollback": lambda self: None})()
+    monkeypatch.setattr(sos_mod, "get_db_connection", lambda: conn)
+    monkeypatch.setattr(sos_events, "_hub", SosEventHub(sync_seconds=60))
+    return cursor
+
+
+@pytest.fixture()
+def hospital_header(app):
+    with app.app_context():
+        token = create_access_token(identity="hospital_1")
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_request_list_is_served_from_the_registry(db, hospital_db, client, hospital_header):
+    db["pending"] = [_request(40, 23.80), _request(41, 23.79), _request(42, 23.95)]
+    hub = sos_events._hub
+    hub.ensure_synced()
+    hub.publish_closed(41, status="acknowledged", hospital_id=2, hospital_name="Other")
+
+    resp = client.get("/api/hospital/emergency/requests?include_assigned=0", headers=hospital_header)
+
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    pending = resp.get_json()["pending"]
+    assert sorted((r["id"], r["status"]) for r in pending) == [(40, "pending"), (41, "acknowledged")]
+    assert next(r for r in pending if r["id"] == 41)["accepted_hospital_name"] == "Other"
+    # Only the hospital's own location comes from SQL.
+    assert not any("emergency_requests" in sql for sql in hospital_db.queries)
+
+
+def test_accept_names_the_hospital_in_recently_accepted(db, hospital_db, client, hospital_header):
+    db["pending"] = [_request(50, 23.80)]
+    hub = sos_events._hub
+    hub.ensure_synced()
+    since = datetime.now() - timedelta(seconds=1)
+
+    resp = client.post("/api/hospital/emergency/requests/50/accept", headers=hospital_header)
+
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    assert any("FROM hospitals" in sql for sql in hospital_db.queries)
+    rows = hub.recently_accepted(*_HOSPITAL, 10.0, since=since, exclude_hospital_id=2)
+    assert [(r["id"], r["hospital_id"], r["accepted_hospital_name"]) for r in rows] == [(50, 1, "Square Hospital")]
+
+
+def test_stream_endpoint_sends_snapshot_as_server_sent_events(monkeypatch, db, hospital_db, client, hospital_header):
+    monkeypatch.setattr(Config, "SOS_STREAM_MAX_SECONDS", 0)
+    db["pending"] = [_request(30, 23.80)]
+
+    resp = client.get("/api/hospital/emergency/stream", headers=hospital_header)
+
+    assert resp.status_code == 200 and resp.mimetype == "text/event-stream"
+    body = resp.get_data(as_text=True)
+    assert "event: sos.snapshot\ndata: " in body and '"id": 30' in body
+    assert sos_events._hub.subscribers == 0
+
+
+def test_stream_requires_hospital_identity(client, auth_header):
+    resp = client.get("/api/hospital/emergency/stream", headers=auth_header)
+    assert resp.status_code == 401
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+from pathlib import Path
+
+import pytest
+
+from config import Config
+from utils import upload_spool
+from utils.upload_spool import UploadTooLargeError, map_file, memory_stats, spool_upload
+
+
+def test_small_upload_stays_in_memory(tmp_path):
+    data = b"%PDF-1.4 small"
+    with spool_upload(io.BytesIO(data), threshold=1024, spool_dir=str(tmp_path)) as upload:
+        assert upload.in_memory
+        assert upload.source() == data
+        assert upload.view().tobytes() == data
+        assert upload.sha256 == hashlib.sha256(data).hexdigest()
+        assert memory_stats()["uploads"]["in_memory_bytes"] >= len(data)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_large_upload_is_spooled_and_mmapped(tmp_path):
+    data = os.urandom(300 * 1024)
+    upload = spool_upload(io.BytesIO(data), threshold=64 * 1024, spool_dir=str(tmp_path))
+
+    assert not upload.in_memory
+    assert Path(upload.source()).read_bytes() == data
+    view = upload.view()
+    assert view.readonly and view[:16].tobytes() == data[:16] and len(view) == len(data)
+    assert upload.sha256 == hashlib.sha256(data).hexdigest()
+    del view
+
+    dest = tmp_path / "job" / "upload.pdf"
+    dest.parent.mkdir()
+    upload.save_to(dest)
+    upload.close()  # the moved file now belongs to the job
+
+    assert dest.read_bytes() == data
+    assert [p.name for p in tmp_path.iterdir()] == ["job"]
+
+
+def test_oversized_upload_is_rejected_and_cleaned_up(tmp_path):
+    with pytest.raises(UploadTooLargeError):
+        spool_upload(io.BytesIO(b"x" * 5000), max_bytes=4096, threshold=1024, spool_dir=str(tmp_path))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_memory_budget_spools_concurrent_small_uploads(monkeypatch, tmp_path):
+    monkeypatch.setattr(upload_spool, "_budget", upload_spool._MemoryBudget())
+    monkeypatch.setattr(Config, "UPLOAD_MEMORY_BUDGET", 1500)
+
+    first = spool_upload(io.BytesIO(b"a" * 1000), threshold=4096, spool_dir=str(tmp_path))
+    second = spool_upload(io.BytesIO(b"b" * 1000), threshold=4096, spool_dir=str(tmp_path))
+
+    assert first.in_memory and not second.in_memory
+    first.close()
+    second.close()
+    stats = memory_stats()["uploads"]
+    assert stats["in_memory_bytes"] == 0 and stats["active_files"] == 0
+    assert stats["kept_in_memory"] == 1 and stats["spooled_to_disk"] == 1
+
+
+def test_map_file(tmp_path):
+    path = tmp_path / "page.png"
+    path.write_bytes(b"\x89PNG data")
+    with map_file(path) as view:
+        assert view.tobytes() == b"\x89PNG data"
+    (tmp_path / "empty").write_bytes(b"")
+    with map_file(tmp_path / "empty") as view:
+        assert len(view) == 0
+
+
+def test_ocr_endpoint_passes_spooled_file_path(monkeypatch, client, auth_header, tmp_path):
+    import routes.reports as reports_mod
+
+    monkeypatch.setattr(Config, "UPLOAD_SPOOL_THRESHOLD", 1024)
+    monkeypatch.setattr(Config, "UPLOAD_SPOOL_DIR", str(tmp_path))
+    seen = {}
+
+    def fake_ocr(source):
+        seen["source"] = source
+        seen["exists"] = os.path.exists(source)
+        return {"text": "Hemoglobin 13.5", "confidence": 90.0, "words": []}
+
+    monkeypatch.setattr(reports_mod, "ocr_image_bytes", fake_ocr)
+    data = {"file": (io.BytesIO(b"\xff\xd8" + b"0" * 4096), "scan.jpg")}
+    resp = client.post("/api/reports/ocr", data=data, headers=auth_header, content_type="multipart/form-data")
+
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    assert isinstance(seen["source"], str) and seen["exists"]
+    assert not os.path.exists(seen["source"])  # removed after the request
+
+
+def test_ocr_endpoint_rejects_oversized_upload(monkeypatch, client, auth_header):
+    monkeypatch.setattr(Config, "MAX_FILE_SIZE", 1024)
+    data = {"file": (io.BytesIO(b"0" * 2048), "scan.png")}
+    resp = client.post("/api/reports/ocr", data=data, headers=auth_header, content_type="multipart/form-data")
+    assert resp.status_code == 413
@@ -0,0 +1,222 @@
+"""Process-wide gateway for Gemini calls.
+
+All model calls (chat, symptom analysis, report simplification, weight
+recommendations) go through ``get_gateway()`` so they share:
+- one pooled keep-alive ``requests.Session`` (no TLS handshake per call)
+- uniform connect/read timeouts
+- retries with jittered exponential backoff on 429/5xx and network errors
+
+The REST base URL is configurable (``GEMINI_API_BASE_URL``), so a local stub
+server can stand in for Gemini in tests and offline development.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+
+
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+Part = Dict[str, Any]
+Contents = Union[str, Part, Iterable[Part]]
+
+
+class AIGatewayError(RuntimeError):
+    """A Gemini request failed after retries (``status_code`` is None for network errors)."""
+
+    def __init__(self, message: str, *, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def text_part(text: str) -> Part:
+    return {"text": text}
+
+
+def bytes_part(data: Union[bytes, memoryview], mime_type: str) -> Part:
+    # base64 reads memoryviews (e.g. an mmapped upload) without an extra bytes copy.
+    return {"inline_data": {"mime_type": mime_type, "data": base64.b64encode(data).decode("ascii")}}
+
+
+def _as_contents(contents: Contents) -> List[Dict[str, Any]]:
+    if isinstance(contents, str):
+        parts = [text_part(contents)]
+    elif isinstance(contents, dict):
+        parts = [contents]
+    else:
+        parts = list(contents)
+    return [{"role": "user", "parts": parts}]
+
+
+def response_text(data: Dict[str, Any]) -> str:
+    """Concatenate the text parts of the first candidate ('' if none)."""
+
+    candidates = data.get("candidates") or []
+    if not candidates:
+        return ""
+    parts = ((candidates[0] or {}).get("content") or {}).get("parts") or []
+    return "".join(p.get("text") or "" for p in parts if isinstance(p, dict))
+
+
+class AIGateway:
+    def __init__(
+        self,
+        *,
+        base_url: str,
+        api_key: Optional[str] = None,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        pool_size: int = 10,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self._api_key = api_key
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pid = os.getpid()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @property
+    def api_key(self) -> str:
+        key = (self._api_key or os.getenv("GEMINI_API_KEY") or Config.GEMINI_API_KEY or "").strip()
+        if not key:
+            raise RuntimeError("GEMINI_API_KEY is not set")
+        return key
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return min(self.backoff_max, max(0.0, float(retry_after)))
+            except ValueError:
+                pass
+        # Full jitter: spread retries from concurrent workers apart.
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, model: str, method: str, body: Dict[str, Any], *, stream: bool = False, timeout=None) -> requests.Response:
+        """POST ``models/<model>:<method>`` with retries; returns the successful response."""
+
+        url = f"{self.base_url}/models/{model}:{method}"
+        params = {"alt": "sse"} if stream else None
+        headers = {"x-goog-api-key": self.api_key}
+        timeout = timeout or self.timeout
+
+        attempt = 0
+        while True:
+            try:
+                resp = self.session.post(url, json=body, params=params, headers=headers, timeout=timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                if attempt >= self.max_retries:
+                    raise AIGatewayError(f"Gemini request failed: {exc}") from exc
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+
+            if resp.status_code < 400:
+                return resp
+
+            if resp.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                delay = self._backoff(attempt, resp.headers.get("Retry-After"))
+                resp.close()
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            try:
+                detail = (resp.json().get("error") or {}).get("message") or resp.text
+            except Exception:
+                detail = resp.text
+            resp.close()
+            raise AIGatewayError(f"Gemini error {resp.status_code}: {detail}", status_code=resp.status_code)
+
+    def generate_content(
+        self,
+        contents: Contents,
+        *,
+        model: str,
+        generation_config: Optional[Dict[str, Any]] = None,
+        timeout=None,
+    ) -> Dict[str, Any]:
+        """Call ``generateContent`` and return the raw JSON (incl. ``usageMetadata``)."""
+
+        body: Dict[str, Any] = {"contents": _as_contents(contents)}
+        if generation_config:
+            body["generationConfig"] = generation_config
+        return self.request(model, "generateContent", body, timeout=timeout).json()
+
+    def generate_text(self, contents: Contents, *, model: str, **kwargs) -> str:
+        """Like ``generate_content`` but return the stripped text; raise if empty."""
+
+        text = response_text(self.generate_content(contents, model=model, **kwargs)).strip()
+        if not text:
+            raise RuntimeError("Empty response from Gemini")
+        return text
+
+    def stream_text(self, contents: Contents, *, model: str, generation_config: Optional[Dict[str, Any]] = None, timeout=None) -> Iterator[str]:
+        """Call ``streamGenerateContent`` (SSE) and yield text deltas as they arrive.
+
+        Retries only cover establishing the stream; once tokens flow, errors propagate.
+        """
+
+        body: Dict[str, Any] = {"contents": _as_contents(contents)}
+        if generation_config:
+            body["generationConfig"] = generation_config
+        resp = self.request(model, "streamGenerateContent", body, stream=True, timeout=timeout)
+        try:
+            # Decode ourselves: SSE is always UTF-8, but requests would guess latin-1.
+            for raw_line in resp.iter_lines():
+                line = raw_line.decode("utf-8") if raw_line else ""
+                if not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if not payload:
+                    continue
+                text = response_text(json.loads(payload))
+                if text:
+                    yield text
+        finally:
+            resp.close()
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_gateway: Optional[AIGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> AIGateway:
+    """Return the process-wide gateway (recreated after fork)."""
+
+    global _gateway
+    gw = _gateway
+    if gw is not None and gw.pid == os.getpid():
+        return gw
+    with _gateway_lock:
+        if _gateway is None or _gateway.pid != os.getpid():
+            _gateway = AIGateway(
+                base_url=Config.GEMINI_API_BASE_URL,
+                connect_timeout=Config.AI_CONNECT_TIMEOUT,
+                read_timeout=Config.AI_READ_TIMEOUT,
+                max_retries=Config.AI_MAX_RETRIES,
+                pool_size=Config.AI_HTTP_POOL_SIZE,
+            )
+        return _gateway
@@ -0,0 +1,429 @@
+"""Atomic bed reservations against ``bed_wards`` counters.
+
+``create_bed_booking`` used to read ``available_beds``, insert the booking
+and then run ``UPDATE ... AND available_beds > 0`` without checking whether
+that update matched a row. Concurrent requests for the last bed could
+therefore all get a confirmed booking. ``BedReservationService`` makes the
+counter update the one decision point:
+
+- the booking (or hold) row is inserted first, then a single conditional
+  ``UPDATE bed_wards ... WHERE id = %s AND available_beds > 0`` runs, then
+  the transaction commits. An affected-row count of 1 means the bed is ours;
+  0 rolls the insert back. There is no ``SELECT ... FOR UPDATE``, and the
+  ward row is locked only from the update until the commit;
+- a retried request carrying the same idempotency key hits the
+  ``(user_id, idempotency_key)`` unique key on the insert, before the ward
+  is touched, and gets the original booking or hold back;
+- a hold (``bed_holds``) takes a bed out of ``available_beds`` for
+  ``BED_HOLD_TTL_SECONDS``. Confirming it turns it into a booking without
+  competing for the ward again. Expired holds are returned by a background
+  sweep (``init_app``), and also on demand when a ward looks full.
+
+Bookings record the ward they took the bed from (``user_bed_bookings.ward_id``),
+so cancelling or finishing one gives the bed back to that ward only
+(``restore_bed``).
+
+Holds need the ``bed_holds`` table, idempotent bookings need the
+``user_bed_bookings.idempotency_key`` column and ward ids need
+``user_bed_bookings.ward_id`` (see database/schema.sql). On older schemas
+bookings still reserve atomically, but without those features.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import pymysql
+from flask import has_request_context
+
+from config import Config
+from utils.database import execute_query, get_db_connection, get_request_connection
+from utils.schema_registry import get_schema_registry
+
+
+logger = logging.getLogger("pocketcare.beds")
+
+HOLD_HELD = "held"
+HOLD_CONFIRMED = "confirmed"
+HOLD_RELEASED = "released"
+HOLD_EXPIRED = "expired"
+
+_DUPLICATE_KEY = 1062
+_SWEEP_BATCH = 500
+
+# Patient/booking columns callers may set on user_bed_bookings.
+BOOKING_FIELDS = frozenset(
+    {
+        "patient_name",
+        "patient_age",
+        "patient_gender",
+        "patient_phone",
+        "patient_email",
+        "emergency_contact",
+        "preferred_date",
+        "expected_discharge_date",
+        "admission_reason",
+        "doctor_name",
+        "special_requirements",
+        "notes",
+    }
+)
+
+_TAKE_BED_SQL = """
+    UPDATE bed_wards
+    SET available_beds = available_beds - 1, occupied_beds = occupied_beds + 1
+    WHERE id = %s AND available_beds > 0
+"""
+
+_HOLD_BED_SQL = """
+    UPDATE bed_wards
+    SET available_beds = available_beds - 1
+    WHERE id = %s AND available_beds > 0
+"""
+
+
+_RESTORE_BED_SQL = """
+    UPDATE bed_wards
+    SET available_beds = available_beds + 1, occupied_beds = GREATEST(occupied_beds - 1, 0)
+    WHERE {where}
+"""
+
+
+class BedUnavailableError(RuntimeError):
+    """No bed left in the requested ward."""
+
+
+class HoldNotActiveError(RuntimeError):
+    """The hold does not exist, belongs to someone else, expired or was already used."""
+
+
+def ward_filter(hospital_id: int, ward_type: str, ac_type: Optional[str], room_config: Optional[str]) -> Tuple[str, tuple]:
+    """``WHERE`` clause selecting the ``bed_wards`` rows a booking request refers to.
+
+    Private rooms are matched by ``room_config``, ICU/emergency by ward type
+    alone, everything else by ``ac_type``.
+    """
+
+    if ward_type == "private_room" and room_config:
+        return "hospital_id = %s AND ward_type = %s AND room_config = %s", (hospital_id, ward_type, room_config)
+    if ward_type in ("icu", "emergency"):
+        return "hospital_id = %s AND ward_type = %s", (hospital_id, ward_type)
+    return "hospital_id = %s AND ward_type = %s AND ac_type = %s", (hospital_id, ward_type, ac_type)
+
+
+def restore_bed(cursor, booking: Dict[str, Any]) -> None:
+    """Give a confirmed booking's bed back, on the caller's transaction.
+
+    Uses the booking's ``ward_id``. Bookings made before that column existed
+    fall back to ``ward_filter``, which matches every ward of that kind.
+    """
+
+    if booking.get("ward_id"):
+        where, params = "id = %s", (booking["ward_id"],)
+    else:
+        where, params = ward_filter(booking["hospital_id"], booking["ward_type"], booking["ac_type"], booking["room_config"])
+    cursor.execute(_RESTORE_BED_SQL.format(where=where), params)
+
+
+@contextmanager
+def _transaction() -> Iterator[Tuple[Any, Any]]:
+    """``(connection, cursor)`` inside an explicit transaction.
+
+    Inside a request this is the request's (autocommit) connection, so a
+    booking never holds a second pooled connection. Commits on normal exit,
+    rolls back on error. A block that returns early has already rolled back
+    or has nothing to commit.
+    """
+
+    borrowed = not has_request_context()
+    conn = get_db_connection() if borrowed else get_request_connection()
+    try:
+        conn.begin()
+        with conn.cursor() as cursor:
+            yield conn, cursor
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        if borrowed:
+            conn.close()
+
+
+def _is_duplicate_key(err: Exception) -> bool:
+    return isinstance(err, pymysql.err.IntegrityError) and bool(err.args) and err.args[0] == _DUPLICATE_KEY
+
+
+class BedReservationService:
+    """Bookings and holds that take beds with one conditional ``UPDATE`` each."""
+
+    def __init__(self, *, hold_ttl_seconds: int = 300):
+        self.pid = os.getpid()
+        self.hold_ttl_seconds = hold_ttl_seconds
+
+    # --- lookups (non-locking reads) ---
+
+    def find_ward(self, hospital_id: int, ward_type: str, ac_type: Optional[str], room_config: Optional[str]) -> Optional[Dict[str, Any]]:
+        """The matching ward with the most free beds, or None."""
+
+        where, params = ward_filter(hospital_id, ward_type, ac_type, room_config)
+        return execute_query(
+            f"""
+            SELECT id, hospital_id, ward_type, ac_type, room_config, available_beds
+            FROM bed_wards
+            WHERE {where}
+            ORDER BY available_beds DESC, id
+            LIMIT 1
+            """,
+            params,
+            fetch_one=True,
+        )
+
+    def get_hold(self, hold_id: int, *, user_id: int) -> Optional[Dict[str, Any]]:
+        return execute_query(
+            """
+            SELECT h.id, h.ward_id, h.status, h.booking_id, h.expires_at, h.expires_at > NOW() AS active,
+                   w.hospital_id, w.ward_type, w.ac_type, w.room_config
+            FROM bed_holds h
+            JOIN bed_wards w ON w.id = h.ward_id
+            WHERE h.id = %s AND h.user_id = %s
+            """,
+            (hold_id, user_id),
+            fetch_one=True,
+        )
+
+    def _find_by_key(self, table: str, user_id: int, idempotency_key: str) -> Optional[Dict[str, Any]]:
+        return execute_query(
+            f"SELECT * FROM {table} WHERE user_id = %s AND idempotency_key = %s LIMIT 1",
+            (user_id, idempotency_key),
+            fetch_one=True,
+        )
+
+    @property
+    def holds_supported(self) -> bool:
+        return get_schema_registry().has_table("bed_holds")
+
+    def _booking_keys_supported(self) -> bool:
+        return get_schema_registry().has_columns("user_bed_bookings", "idempotency_key")
+
+    def _booking_ward_ids_supported(self) -> bool:
+        return get_schema_registry().has_columns("user_bed_bookings", "ward_id")
+
+    # --- bookings ---
+
+    def book(
+        self,
+        *,
+        user_id: int,
+        hospital_id: int,
+        ward_type: str,
+        ac_type: Optional[str],
+        room_config: Optional[str],
+        fields: Dict[str, Any],
+        idempotency_key: Optional[str] = None,
+        hold_id: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Create a confirmed booking, taking a bed (or converting ``hold_id``).
+
+        Returns ``{'booking_id', 'replayed'}``; ``replayed`` is True when
+        ``idempotency_key`` matched an earlier booking. Raises
+        ``BedUnavailableError`` / ``HoldNotActiveError``.
+        """
+
+        unknown = set(fields) - BOOKING_FIELDS
+        if unknown:
+            raise ValueError(f"Unknown user_bed_bookings fields: {sorted(unknown)}")
+        if not self._booking_keys_supported():
+            idempotency_key = None
+
+        if hold_id is not None:
+            hold = self.get_hold(hold_id, user_id=user_id)
+            if hold is None:
+                raise HoldNotActiveError("Bed hold not found")
+            if hold["status"] == HOLD_CONFIRMED and hold["booking_id"]:
+                return {"booking_id": int(hold["booking_id"]), "replayed": True}
+            if hold["status"] != HOLD_HELD or not hold["active"]:
+                raise HoldNotActiveError("Bed hold has expired or was released")
+            ward_id = hold["ward_id"]
+            hospital_id, ward_type, ac_type, room_config = hold["hospital_id"], hold["ward_type"], hold["ac_type"], hold["room_config"]
+        else:
+            ward = self.find_ward(hospital_id, ward_type, ac_type, room_config)
+            if ward is None:
+                raise BedUnavailableError("No beds available for the selected ward type")
+            if ward["available_beds"] <= 0 and not self.expire_holds(ward_id=ward["id"]):
+                # Full on a consistent read: answer without touching the ward row,
+                # unless this is a retry of a booking that already succeeded.
+                if idempotency_key:
+                    existing = self._find_by_key("user_bed_bookings", user_id, idempotency_key)
+                    if existing:
+                        return {"booking_id": int(existing["id"]), "replayed": True}
+                raise BedUnavailableError("No beds available for the selected ward type")
+            ward_id = ward["id"]
+
+        columns = {
+            "user_id": user_id,
+            "hospital_id": hospital_id,
+            "ward_type": ward_type,
+            "ac_type": ac_type,
+            "room_config": room_config,
+            **fields,
+            "status": "confirmed",
+        }
+        if self._booking_ward_ids_supported():
+            columns["ward_id"] = ward_id
+        if idempotency_key:
+            columns["idempotency_key"] = idempotency_key
+        insert_sql = (
+            f"INSERT INTO user_bed_bookings ({', '.join(columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))})"
+        )
+
+        with _transaction() as (conn, cursor):
+            try:
+                cursor.execute(insert_sql, tuple(columns.values()))
+            except Exception as e:
+                if not (idempotency_key and _is_duplicate_key(e)):
+                    raise
+                conn.rollback()
+                existing = self._find_by_key("user_bed_bookings", user_id, idempotency_key)
+                return {"booking_id": int(existing["id"]), "replayed": True}
+            booking_id = cursor.lastrowid
+
+            if hold_id is not None:
+                cursor.execute(
+                    """
+                    UPDATE bed_holds SET status = %s, booking_id = %s
+                    WHERE id = %s AND user_id = %s AND status = %s AND expires_at > NOW()
+                    """,
+                    (HOLD_CONFIRMED, booking_id, hold_id, user_id, HOLD_HELD),
+                )
+                if cursor.rowcount != 1:
+                    raise HoldNotActiveError("Bed hold has expired or was released")
+                cursor.execute("UPDATE bed_wards SET occupied_beds = occupied_beds + 1 WHERE id = %s", (ward_id,))
+            else:
+                cursor.execute(_TAKE_BED_SQL, (ward_id,))
+                if cursor.rowcount != 1:
+                    raise BedUnavailableError("No beds available for the selected ward type")
+        return {"booking_id": int(booking_id), "replayed": False}
+
+    # --- holds ---
+
+    def hold(
+        self,
+        *,
+        user_id: int,
+        hospital_id: int,
+        ward_type: str,
+        ac_type: Optional[str],
+        room_config: Optional[str],
+        idempotency_key: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Set a bed aside for ``hold_ttl_seconds``; returns the hold row (``replayed`` if the key matched)."""
+
+        ward = self.find_ward(hospital_id, ward_type, ac_type, room_config)
+        if ward is None:
+            raise BedUnavailableError("No beds available for the selected ward type")
+        if ward["available_beds"] <= 0 and not self.expire_holds(ward_id=ward["id"]):
+            if idempotency_key:
+                existing = self._find_by_key("bed_holds", user_id, idempotency_key)
+                if existing:
+                    return dict(existing, replayed=True)
+            raise BedUnavailableError("No beds available for the selected ward type")
+
+        with _transaction() as (conn, cursor):
+            try:
+                cursor.execute(
+                    """
+                    INSERT INTO bed_holds (ward_id, user_id, idempotency_key, status, expires_at)
+                    VALUES (%s, %s, %s, %s, NOW() + INTERVAL %s SECOND)
+                    """,
+                    (ward["id"], user_id, idempotency_key, HOLD_HELD, int(self.hold_ttl_seconds)),
+                )
+            except Exception as e:
+                if not (idempotency_key and _is_duplicate_key(e)):
+                    raise
+                conn.rollback()
+                return dict(self._find_by_key("bed_holds", user_id, idempotency_key), replayed=True)
+            cursor.execute("SELECT * FROM bed_holds WHERE id = %s", (cursor.lastrowid,))
+            row = cursor.fetchone()
+            cursor.execute(_HOLD_BED_SQL, (ward["id"],))
+            if cursor.rowcount != 1:
+                raise BedUnavailableError("No beds available for the selected ward type")
+        return dict(row, replayed=False)
+
+    def release(self, hold_id: int, *, user_id: Optional[int] = None, status: str = HOLD_RELEASED) -> bool:
+        """Give a held bed back; False if the hold is no longer held (confirmed, released or expired)."""
+
+        sql = "UPDATE bed_holds SET status = %s WHERE id = %s AND status = %s"
+        params: tuple = (status, hold_id, HOLD_HELD)
+        if user_id is not None:
+            sql += " AND user_id = %s"
+            params += (user_id,)
+        with _transaction() as (conn, cursor):
+            cursor.execute(sql, params)
+            if cursor.rowcount != 1:
+                return False
+            cursor.execute(
+                """
+                UPDATE bed_wards w JOIN bed_holds h ON h.ward_id = w.id
+                SET w.available_beds = w.available_beds + 1
+                WHERE h.id = %s
+                """,
+                (hold_id,),
+            )
+        return True
+
+    def expire_holds(self, *, ward_id: Optional[int] = None, limit: int = _SWEEP_BATCH) -> int:
+        """Release holds past their expiry (optionally of one ward); returns how many."""
+
+        if not self.holds_supported:
+            return 0
+        sql = "SELECT id FROM bed_holds WHERE status = %s AND expires_at <= NOW()"
+        params: tuple = (HOLD_HELD,)
+        if ward_id is not None:
+            sql += " AND ward_id = %s"
+            params += (ward_id,)
+        rows = execute_query(sql + " ORDER BY expires_at LIMIT %s", params + (int(limit),), fetch_all=True) or []
+        # One short transaction per hold: a hold confirmed meanwhile simply doesn't match.
+        return sum(1 for row in rows if self.release(int(row["id"]), status=HOLD_EXPIRED))
+
+
+_service: Optional[BedReservationService] = None
+_service_lock = threading.Lock()
+
+
+def get_bed_reservations() -> BedReservationService:
+    """Return the process-wide reservation service (recreated after fork)."""
+
+    global _service
+    service = _service
+    if service is not None and service.pid == os.getpid():
+        return service
+    with _service_lock:
+        if _service is None or _service.pid != os.getpid():
+            _service = BedReservationService(hold_ttl_seconds=Config.BED_HOLD_TTL_SECONDS)
+        return _service
+
+
+def init_app(app) -> None:
+    """Release expired holds every ``BED_HOLD_SWEEP_SECONDS`` in the background."""
+
+    if Config.BED_HOLD_SWEEP_SECONDS <= 0 or app.config.get("TESTING"):
+        return
+
+    def sweep():
+        while True:
+            time.sleep(Config.BED_HOLD_SWEEP_SECONDS)
+            try:
+                released = get_bed_reservations().expire_holds()
+                if released:
+                    logger.info("released %d expired bed hold(s)", released)
+            except Exception as exc:
+                logger.warning("bed hold sweep failed: %s", exc)
+
+    threading.Thread(target=sweep, name="bed-hold-sweep", daemon=True).start()
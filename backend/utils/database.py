@@ -1,9 +1,23 @@
+import os
+import threading
+import time
+import weakref
+from collections import deque
+
 import pymysql
+from flask import g, has_request_context
+from pymysql.constants import SERVER_STATUS
 from config import Config
+from utils.db_metrics import InstrumentedCursor
 
-def get_db_connection():
-    """Create and return a database connection"""
-    connection = pymysql.connect(
+
+class PoolTimeoutError(RuntimeError):
+    """Raised when no pooled connection could be borrowed within the timeout."""
+
+
+def _create_connection():
+    """Open a new raw PyMySQL connection using the configured credentials"""
+    return pymysql.connect(
         host=Config.DB_HOST,
         port=int(Config.DB_PORT),
         user=Config.DB_USER,
@@ -14,39 +28,401 @@ def get_db_connection():
         write_timeout=30,
         cursorclass=pymysql.cursors.DictCursor
     )
-    return connection
+
+
+class PooledConnection:
+    """Thin proxy around a pooled PyMySQL connection.
+
+    Behaves like the underlying connection (cursor/commit/rollback/...), except
+    that ``close()`` hands the connection back to the pool instead of closing
+    the socket. Existing ``conn.close()`` call sites therefore work unchanged.
+    If a borrower forgets to close, the connection is returned when the proxy
+    is garbage collected. Cursors are instrumented (see ``utils.db_metrics``).
+    """
+
+    def __init__(self, pool, raw, wait_ms=0.0):
+        self._pool = pool
+        self._raw = raw
+        self._pool_wait_ms = wait_ms
+        self._finalizer = weakref.finalize(self, pool._release, raw)
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            raise pymysql.err.InterfaceError(0, 'Connection already returned to pool')
+        return getattr(raw, name)
+
+    def cursor(self, *args, **kwargs):
+        raw = self._raw
+        if raw is None:
+            raise pymysql.err.InterfaceError(0, 'Connection already returned to pool')
+        return InstrumentedCursor(raw.cursor(*args, **kwargs), self)
+
+    def _take_pool_wait_ms(self):
+        """Pool wait is attributed to the first statement run on a borrow."""
+        wait_ms, self._pool_wait_ms = self._pool_wait_ms, 0.0
+        return wait_ms
+
+    @property
+    def open(self):
+        return self._raw is not None and self._raw.open
+
+    def close(self):
+        """Return the connection to the pool (idempotent)."""
+        if self._raw is None:
+            return
+        self._raw = None
+        self._finalizer()
+
+    def discard(self):
+        """Drop the connection instead of returning it, e.g. after a fatal error."""
+        if self._raw is None:
+            return
+        raw = self._raw
+        self._raw = None
+        self._finalizer.detach()
+        self._pool._release(raw, discard=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of PyMySQL connections.
+
+    - Keeps at least ``min_size`` connections warm and never opens more than
+      ``max_size`` at once; borrowers block up to ``timeout`` seconds when the
+      pool is exhausted and then get ``PoolTimeoutError``.
+    - Connections idle longer than ``recycle_seconds`` are closed and replaced
+      (MySQL drops idle sessions after ``wait_timeout``).
+    - Connections idle longer than ``ping_interval`` are pinged on borrow;
+      dead ones are replaced transparently.
+    """
+
+    def __init__(self, factory, *, min_size=1, max_size=10, timeout=10.0,
+                 recycle_seconds=300, ping_interval=5.0):
+        if max_size < 1:
+            raise ValueError('max_size must be >= 1')
+        self._factory = factory
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle_seconds = recycle_seconds
+        self.ping_interval = ping_interval
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (raw_connection, returned_at)
+        self._size = 0  # open connections, idle + borrowed
+        self._closed = False
+        self.pid = os.getpid()
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def idle_count(self):
+        return len(self._idle)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            }
+
+    def prefill(self):
+        """Best-effort open connections up to ``min_size``."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                raw = self._factory()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                return
+            self._release(raw)
+
+    def acquire(self, timeout=None):
+        """Borrow a connection, waiting up to ``timeout`` seconds if exhausted."""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            raw, idle_for, stale = self._checkout(deadline)
+            for conn in stale:
+                self._close_quietly(conn)
+
+            if raw is None:
+                try:
+                    raw = self._factory()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                return PooledConnection(self, raw, (time.monotonic() - started) * 1000.0)
+
+            if self._is_healthy(raw, idle_for):
+                return PooledConnection(self, raw, (time.monotonic() - started) * 1000.0)
+
+            self._release(raw, discard=True)
+
+    def _checkout(self, deadline):
+        """Reserve an idle connection or a slot for a new one.
+
+        Returns ``(raw_or_None, idle_seconds, stale_connections)``. ``None``
+        means the caller owns a freshly reserved slot and must open a
+        connection for it.
+        """
+        stale = []
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeoutError('Connection pool is closed')
+
+                now = time.monotonic()
+                while self._idle:
+                    raw, returned_at = self._idle.pop()
+                    idle_for = now - returned_at
+                    if self.recycle_seconds and idle_for > self.recycle_seconds:
+                        self._size -= 1
+                        stale.append(raw)
+                        continue
+                    return raw, idle_for, stale
+
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, 0.0, stale
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise PoolTimeoutError(
+                        f'Timed out waiting for a database connection (pool max_size={self.max_size})'
+                    )
+                self._cond.wait(remaining)
+
+    def _is_healthy(self, raw, idle_for):
+        if not raw.open:
+            return False
+        if idle_for < self.ping_interval:
+            return True
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _release(self, raw, discard=False):
+        if not discard:
+            try:
+                result = getattr(raw, '_result', None)
+                if not raw.open:
+                    discard = True
+                elif result is not None and getattr(result, 'unbuffered_active', False):
+                    # An abandoned streaming cursor left rows on the wire.
+                    discard = True
+                elif raw.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                    # Never hand out a connection with an open transaction.
+                    raw.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            if discard or self._closed or os.getpid() != self.pid:
+                self._size -= 1
+                self._cond.notify()
+            else:
+                self._idle.append((raw, time.monotonic()))
+                self._cond.notify()
+                return
+        self._close_quietly(raw)
+
+    def close(self):
+        """Close all idle connections; borrowed ones are closed on return."""
+        with self._cond:
+            self._closed = True
+            idle = [raw for raw, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for raw in idle:
+            self._close_quietly(raw)
+
+    @staticmethod
+    def _close_quietly(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use.
+
+    The pool is recreated after a fork so gunicorn workers never share sockets
+    with the master process.
+    """
+    global _pool
+    pool = _pool
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = ConnectionPool(
+                _create_connection,
+                min_size=Config.DB_POOL_MIN_SIZE,
+                max_size=Config.DB_POOL_MAX_SIZE,
+                timeout=Config.DB_POOL_TIMEOUT,
+                recycle_seconds=Config.DB_POOL_RECYCLE_SECONDS,
+                ping_interval=Config.DB_POOL_PING_INTERVAL,
+            )
+            _pool.prefill()
+        return _pool
+
+
+def get_db_connection():
+    """Borrow a database connection from the pool.
+
+    Call ``close()`` on the result when done; it returns the connection to the
+    pool rather than closing it.
+    """
+    return get_pool().acquire()
+
+
+def get_request_connection():
+    """Return the connection shared by every execute_query in this request.
+
+    Borrowed lazily on first use and kept on ``flask.g`` until the app context
+    tears down (see ``init_app``). The connection runs in autocommit mode so
+    each statement behaves exactly as if it had its own connection.
+    """
+    conn = g.get('_db_conn')
+    if conn is None or not conn.open:
+        conn = get_db_connection()
+        conn.autocommit(True)
+        g._db_conn = conn
+    return conn
+
+
+def release_request_connection(exc=None):
+    """Teardown hook: hand the request-scoped connection back to the pool."""
+    conn = g.pop('_db_conn', None)
+    if conn is None:
+        return
+    try:
+        conn.autocommit(False)
+    except Exception:
+        conn.discard()
+        return
+    conn.close()
+
+
+def init_app(app):
+    """Register the request-scoped connection teardown on a Flask app."""
+    app.teardown_appcontext(release_request_connection)
+
 
 def execute_query(query, params=None, fetch_one=False, fetch_all=False, commit=False):
     """
     Execute a database query with error handling
-    
+
     Args:
         query: SQL query string
         params: Tuple of parameters for the query
         fetch_one: Return single row
         fetch_all: Return all rows
         commit: Commit changes (for INSERT/UPDATE/DELETE)
-    
+
     Returns:
         Query results or lastrowid for INSERT operations
+
+    Inside a Flask request the request-scoped connection is reused, so a
+    handler issuing several queries only borrows from the pool once.
     """
+    if has_request_context():
+        return _execute(get_request_connection(), query, params, fetch_one, fetch_all, commit)
+
     connection = get_db_connection()
+    try:
+        return _execute(connection, query, params, fetch_one, fetch_all, commit)
+    except Exception as e:
+        try:
+            connection.rollback()
+        except Exception:
+            connection.discard()
+        raise e
+    finally:
+        connection.close()
+
+
+def stream_query(query, params=None, batch_size=500):
+    """Run a SELECT on a server-side cursor and return a lazy row iterator.
+
+    Rows are fetched from MySQL in batches of ``batch_size`` through an
+    ``SSDictCursor`` instead of being buffered in memory. The query runs
+    (and any SQL error is raised) before this function returns; the dedicated
+    connection goes back to the pool once the iterator is exhausted or closed.
+    Do not run other queries on the same connection while streaming, which is
+    why this never uses the request-scoped connection.
+    """
+    connection = get_db_connection()
+    try:
+        cursor = connection.cursor(pymysql.cursors.SSDictCursor)
+        cursor.execute(query, params)
+    except Exception:
+        connection.discard()
+        raise
+    return _iter_stream(connection, cursor, batch_size)
+
+
+def _iter_stream(connection, cursor, batch_size):
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        try:
+            cursor.close()
+        except Exception:
+            connection.discard()
+        connection.close()
+
+
+def _execute(connection, query, params, fetch_one, fetch_all, commit):
     try:
         with connection.cursor() as cursor:
             cursor.execute(query, params)
-            
+
             if commit:
                 connection.commit()
                 return cursor.lastrowid
-            
+
             if fetch_one:
                 return cursor.fetchone()
-            
+
             if fetch_all:
                 return cursor.fetchall()
-            
-    except Exception as e:
-        connection.rollback()
-        raise e
-    finally:
-        connection.close()
+
+    except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+        # Broken socket: make sure the connection never goes back to the pool
+        if isinstance(connection, PooledConnection) and not connection.open:
+            connection.discard()
+        raise
@@ -0,0 +1,259 @@
+"""In-process SQL statement metrics.
+
+Every statement executed through a pooled connection (``execute_query`` and
+direct ``get_db_connection()`` cursors) is recorded here with its normalized
+fingerprint, duration, row count, pool wait time and calling Flask endpoint.
+
+The data is kept per worker process and exposed by the ``/metrics`` endpoint
+registered in ``app.create_app``:
+- per-fingerprint aggregates (count, total/max time, rows, errors)
+- per-endpoint latency histograms
+- a ring buffer of recent slow statements (``DB_SLOW_QUERY_MS`` threshold),
+  which are also logged to the ``pocketcare.db`` logger.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Dict, Optional
+
+from config import Config
+
+
+logger = logging.getLogger("pocketcare.db")
+
+# Histogram bucket upper bounds in milliseconds (last bucket is +Inf).
+HISTOGRAM_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_SLOW_LOG_SIZE = 100
+_MAX_FINGERPRINTS = 1000
+
+_COMMENT_RE = re.compile(r"(--[^\n]*|/\*.*?\*/)", re.S)
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%s|%\(\w+\)s")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.I)
+_VALUES_RE = re.compile(r"\bVALUES\s*\([^()]*\)(?:\s*,\s*\([^()]*\))*", re.I)
+_WS_RE = re.compile(r"\s+")
+
+
+def fingerprint(sql: str) -> str:
+    """Normalize a SQL statement so that queries differing only in literals,
+    placeholders, IN-list length or whitespace share one fingerprint."""
+
+    text = _COMMENT_RE.sub(" ", sql or "")
+    text = _STRING_RE.sub("?", text)
+    text = _PLACEHOLDER_RE.sub("?", text)
+    text = _NUMBER_RE.sub("?", text)
+    text = _IN_LIST_RE.sub("IN (?+)", text)
+    text = _VALUES_RE.sub("VALUES (?+)", text)
+    return _WS_RE.sub(" ", text).strip()
+
+
+def _current_endpoint() -> str:
+    try:
+        from flask import has_request_context, request
+
+        if has_request_context():
+            return request.endpoint or request.path
+    except Exception:
+        pass
+    return "-"
+
+
+class QueryMetrics:
+    """Thread-safe accumulator for statement timings."""
+
+    def __init__(self, *, slow_query_ms: float = 200.0, slow_log_size: int = _SLOW_LOG_SIZE):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._by_fingerprint: Dict[str, Dict[str, Any]] = {}
+        self._by_endpoint: Dict[str, Dict[str, Any]] = {}
+        self._slow: deque = deque(maxlen=slow_log_size)
+        self._started_at = time.time()
+
+    def record(
+        self,
+        sql: str,
+        *,
+        duration_ms: float,
+        rows: int = 0,
+        pool_wait_ms: float = 0.0,
+        error: bool = False,
+        endpoint: Optional[str] = None,
+    ) -> None:
+        fp = fingerprint(sql)
+        endpoint = endpoint or _current_endpoint()
+        rows = max(0, int(rows or 0))
+
+        with self._lock:
+            stats = self._by_fingerprint.get(fp)
+            if stats is None:
+                if len(self._by_fingerprint) >= _MAX_FINGERPRINTS:
+                    fp = "<other>"
+                    stats = self._by_fingerprint.get(fp)
+                if stats is None:
+                    stats = self._by_fingerprint[fp] = {
+                        "count": 0,
+                        "errors": 0,
+                        "total_ms": 0.0,
+                        "max_ms": 0.0,
+                        "rows": 0,
+                        "pool_wait_ms": 0.0,
+                        "endpoints": set(),
+                    }
+            stats["count"] += 1
+            stats["errors"] += 1 if error else 0
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+            stats["rows"] += rows
+            stats["pool_wait_ms"] += pool_wait_ms
+            stats["endpoints"].add(endpoint)
+
+            ep = self._by_endpoint.get(endpoint)
+            if ep is None:
+                ep = self._by_endpoint[endpoint] = {
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "pool_wait_ms": 0.0,
+                    "buckets": [0] * (len(HISTOGRAM_BUCKETS_MS) + 1),
+                }
+            ep["count"] += 1
+            ep["total_ms"] += duration_ms
+            ep["pool_wait_ms"] += pool_wait_ms
+            ep["buckets"][bisect_left(HISTOGRAM_BUCKETS_MS, duration_ms)] += 1
+
+            is_slow = self.slow_query_ms is not None and duration_ms >= self.slow_query_ms
+            if is_slow:
+                self._slow.append(
+                    {
+                        "at": time.time(),
+                        "fingerprint": fp,
+                        "endpoint": endpoint,
+                        "duration_ms": round(duration_ms, 3),
+                        "rows": rows,
+                        "pool_wait_ms": round(pool_wait_ms, 3),
+                        "error": error,
+                    }
+                )
+
+        if is_slow:
+            logger.warning(
+                "slow query %.1fms (wait %.1fms, rows %d) endpoint=%s sql=%s",
+                duration_ms,
+                pool_wait_ms,
+                rows,
+                endpoint,
+                fp,
+            )
+
+    def snapshot(self, *, top: int = 50) -> Dict[str, Any]:
+        """Return a JSON-serializable view, heaviest fingerprints first."""
+
+        with self._lock:
+            fingerprints = [
+                {
+                    "fingerprint": fp,
+                    "count": s["count"],
+                    "errors": s["errors"],
+                    "total_ms": round(s["total_ms"], 3),
+                    "avg_ms": round(s["total_ms"] / s["count"], 3) if s["count"] else 0.0,
+                    "max_ms": round(s["max_ms"], 3),
+                    "rows": s["rows"],
+                    "pool_wait_ms": round(s["pool_wait_ms"], 3),
+                    "endpoints": sorted(s["endpoints"]),
+                }
+                for fp, s in self._by_fingerprint.items()
+            ]
+            endpoints = {}
+            for name, ep in self._by_endpoint.items():
+                cumulative = 0
+                histogram = []
+                for bound, n in zip(list(HISTOGRAM_BUCKETS_MS) + ["+Inf"], ep["buckets"]):
+                    cumulative += n
+                    histogram.append({"le_ms": bound, "count": cumulative})
+                endpoints[name] = {
+                    "count": ep["count"],
+                    "total_ms": round(ep["total_ms"], 3),
+                    "pool_wait_ms": round(ep["pool_wait_ms"], 3),
+                    "histogram": histogram,
+                }
+            slow = list(self._slow)
+
+        fingerprints.sort(key=lambda s: s["total_ms"], reverse=True)
+        return {
+            "since": self._started_at,
+            "slow_query_ms": self.slow_query_ms,
+            "queries": fingerprints[:top],
+            "endpoints": endpoints,
+            "slow_queries": slow,
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._by_fingerprint.clear()
+            self._by_endpoint.clear()
+            self._slow.clear()
+            self._started_at = time.time()
+
+
+metrics = QueryMetrics(slow_query_ms=Config.DB_SLOW_QUERY_MS)
+
+
+class InstrumentedCursor:
+    """Cursor wrapper that times ``execute``/``executemany`` into ``metrics``."""
+
+    def __init__(self, cursor, connection):
+        self._cursor = cursor
+        self._connection = connection
+
+    def _timed(self, method, query, args):
+        pool_wait_ms = self._connection._take_pool_wait_ms()
+        started = time.perf_counter()
+        error = False
+        try:
+            return method(query, args)
+        except Exception:
+            error = True
+            raise
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000.0
+            rows = 0
+            if not error:
+                try:
+                    rows = self._cursor.rowcount
+                except Exception:
+                    rows = 0
+                # Unbuffered (streaming) cursors report an unknown row count
+                if not isinstance(rows, int) or rows < 0 or rows >= 2 ** 63:
+                    rows = 0
+            metrics.record(
+                query,
+                duration_ms=duration_ms,
+                rows=rows,
+                pool_wait_ms=pool_wait_ms,
+                error=error,
+            )
+
+    def execute(self, query, args=None):
+        return self._timed(self._cursor.execute, query, args)
+
+    def executemany(self, query, args):
+        return self._timed(self._cursor.executemany, query, args)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
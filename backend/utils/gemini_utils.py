@@ -1,4 +1,120 @@
-import os
+import json
+
+from config import Config
+from utils.ai_gateway import AIGatewayError, bytes_part, get_gateway, response_text, text_part
+
+
+class NotMedicalDocumentError(ValueError):
+    """The classifier decided the document is not medical (message is user-facing)."""
+
+
+class CombinedResponseError(RuntimeError):
+    """The single-call structured response was missing or malformed."""
+
+
+DEFAULT_NOT_MEDICAL_MESSAGE = (
+    "Only health-related documents can be simplified. Please upload a medical document "
+    "such as a lab report, prescription, X-ray, or diagnosis report."
+)
+
+# Structured output for the combined classify + explain call.
+# ``is_medical`` comes first so the model commits to a verdict before writing.
+COMBINED_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "is_medical": {"type": "BOOLEAN"},
+        "reason": {"type": "STRING"},
+        "explanation": {"type": "STRING"},
+    },
+    "required": ["is_medical", "reason", "explanation"],
+    "propertyOrdering": ["is_medical", "reason", "explanation"],
+}
+
+_COMBINED_GENERATION_CONFIG = {
+    "responseMimeType": "application/json",
+    "responseSchema": COMBINED_RESPONSE_SCHEMA,
+}
+
+_CLASSIFIER_RULES = (
+    "MEDICAL documents: lab reports, blood tests, X-rays, MRI/CT scans, "
+    "prescriptions, medical bills from hospitals/clinics, discharge summaries, doctor's notes, "
+    "pathology reports, vaccination records, health insurance claims, medical certificates, "
+    "or any document directly related to patient healthcare or medical diagnosis.\n\n"
+    "NON-MEDICAL documents: regular invoices, shopping receipts, calendars, "
+    "event notices, personal letters, academic transcripts, ID cards, travel tickets, "
+    "utility bills, tax forms, bank statements, resumes, contracts, or any document "
+    "that is NOT directly related to medical/healthcare purposes.\n\n"
+    "IMPORTANT: Be strict. If you are unsure or the document is ambiguous, treat it as non-medical.\n\n"
+)
+
+
+def _combined_prompt(explanation_rules: str) -> str:
+    return (
+        "You are a strict document classifier and a helpful medical assistant.\n"
+        "Step 1: decide whether the document is a MEDICAL/HEALTHCARE document.\n\n"
+        + _CLASSIFIER_RULES
+        + "Step 2: only if it IS medical, write the explanation.\n"
+        + explanation_rules
+        + "\nRespond with JSON only:\n"
+        "- is_medical: true or false\n"
+        "- reason: empty if medical; otherwise a helpful message like "
+        "\"This appears to be a [document type]. Only health-related documents like lab reports, "
+        "prescriptions, or medical records can be simplified here.\"\n"
+        "- explanation: the explanation if medical, otherwise an empty string\n"
+    )
+
+
+def _parse_combined(data: dict) -> str:
+    """Return the explanation, raise NotMedicalDocumentError, or CombinedResponseError."""
+
+    raw = response_text(data).strip()
+    try:
+        payload = json.loads(raw)
+    except ValueError as exc:
+        raise CombinedResponseError("Combined response was not valid JSON") from exc
+    if not isinstance(payload, dict) or not isinstance(payload.get("is_medical"), bool):
+        raise CombinedResponseError("Combined response is missing is_medical")
+
+    if not payload["is_medical"]:
+        reason = str(payload.get("reason") or "").strip()
+        raise NotMedicalDocumentError(reason or DEFAULT_NOT_MEDICAL_MESSAGE)
+
+    explanation = str(payload.get("explanation") or "").strip()
+    if not explanation:
+        raise CombinedResponseError("Combined response has an empty explanation")
+    return explanation
+
+
+def _combined_enabled(combined: bool | None) -> bool:
+    return Config.GEMINI_COMBINED_REPORT_CALL if combined is None else combined
+
+
+def _should_fall_back(exc: Exception) -> bool:
+    """Use the two-step path when the single call's output or request shape was the problem.
+
+    Capacity/auth failures (429, 5xx, 401/403, network) would fail the same way
+    twice more, so those are raised as-is.
+    """
+
+    if isinstance(exc, CombinedResponseError):
+        return True
+    if isinstance(exc, AIGatewayError):
+        return exc.status_code == 400  # e.g. model without responseSchema support
+    return False
+
+
+def _run_combined(contents, *, model: str, combined: bool | None):
+    """Try the single structured call; ``None`` means use the two-step path."""
+
+    if not _combined_enabled(combined):
+        return None
+    try:
+        data = get_gateway().generate_content(contents, model=model, generation_config=_COMBINED_GENERATION_CONFIG)
+        return _parse_combined(data)
+    except Exception as exc:
+        if not _should_fall_back(exc):
+            raise
+        return None
 
 
 def generate_weight_recommendations(
@@ -16,14 +132,6 @@ def generate_weight_recommendations(
     Returns a dict with either a parsed JSON payload or a fallback text payload.
     """
 
-    from google import genai
-
-    api_key = (os.getenv("GEMINI_API_KEY") or "").strip()
-    if not api_key:
-        raise RuntimeError("GEMINI_API_KEY is not set")
-
-    client = genai.Client(api_key=api_key)
-
     goal_bits = []
     if goal_target_weight_kg is not None:
         goal_bits.append(f"Target weight: {goal_target_weight_kg} kg")
@@ -55,15 +163,9 @@ def generate_weight_recommendations(
         "}\n"
     )
 
-    response = client.models.generate_content(model=model, contents=prompt)
-    text = getattr(response, "text", None)
-    if not text:
-        raise RuntimeError("Empty response from Gemini")
-
-    raw = text.strip()
+    raw = get_gateway().generate_text(prompt, model=model)
 
     # Best-effort JSON parsing (Gemini may wrap in markdown fences)
-    import json
     cleaned = raw
     if cleaned.startswith("```"):
         cleaned = cleaned.strip("`")
@@ -78,161 +180,169 @@ def generate_weight_recommendations(
         return {"ok": True, "payload": {"text": raw, "disclaimer": "General information only; not medical advice."}}
 
 
-def simplify_ocr_text(ocr_text: str, *, model: str = "gemini-3-flash-preview") -> str:
+_OCR_EXPLANATION_RULES = (
+    "Rewrite the OCR text from the medical document into a simple, easy-to-understand explanation.\n"
+    "Rules:\n"
+    "- Use plain language and short bullet points.\n"
+    "- Do NOT invent details that are not present.\n"
+    "- Do NOT provide a diagnosis.\n"
+    "- If there are abnormal lab values or urgent warnings explicitly stated, highlight them as 'Important'.\n"
+    "Output format:\n"
+    "1) Summary (2-4 bullets)\n"
+    "2) Key details (bullets)\n"
+    "3) Next steps (2-4 bullets, general and safe)\n"
+)
+
+_FILE_EXPLANATION_RULES = (
+    "Analyze the attached medical report file.\n"
+    "Rules:\n"
+    "- Be accurate with numbers and units; keep them tied to the correct labels/rows/columns.\n"
+    "- If a value is unclear/blurred, say so instead of guessing.\n"
+    "- Do NOT invent details not present.\n"
+    "- Do NOT provide a diagnosis or medication guidance.\n"
+    "Output format:\n"
+    "1) Summary (1-3 bullets)\n"
+    "2) Key details (bullets; include dates, test names, and measured values)\n"
+    "3) Notable findings (bullets; highlight abnormal/flagged values only if shown)\n"
+    "4) Next steps (2-4 bullets; general and safe)\n"
+)
+
+
+def _trim_ocr_text(ocr_text: str) -> str:
     if not (ocr_text or "").strip():
         raise ValueError("OCR text is empty")
 
-    # Late import so the backend can still start without Gemini deps
-    # unless this feature is called.
-    from google import genai
-
-    api_key = (os.getenv("GEMINI_API_KEY") or "").strip()
-    if not api_key:
-        raise RuntimeError("GEMINI_API_KEY is not set")
-
-    client = genai.Client(api_key=api_key)
-
     # Guardrail against very large OCR dumps
     max_chars = 20000
     trimmed = ocr_text.strip()
     if len(trimmed) > max_chars:
         trimmed = trimmed[:max_chars] + "\n\n[TRUNCATED]"
+    return trimmed
 
-    # First, validate if the document is medical-related
-    validation_prompt = (
-        "You are a strict document classifier. Analyze the following OCR text and determine if it is from a MEDICAL/HEALTHCARE document.\n\n"
-        "MEDICAL documents: lab reports, blood tests, X-rays, MRI/CT scans, "
-        "prescriptions, medical bills from hospitals/clinics, discharge summaries, doctor's notes, "
-        "pathology reports, vaccination records, health insurance claims, medical certificates, "
-        "or any document directly related to patient healthcare or medical diagnosis.\n\n"
-        "NON-MEDICAL documents: regular invoices, shopping receipts, calendars, "
-        "event notices, personal letters, academic transcripts, ID cards, travel tickets, "
-        "utility bills, tax forms, bank statements, resumes, contracts, or any document "
-        "that is NOT directly related to medical/healthcare purposes.\n\n"
-        "IMPORTANT: Be strict. If you are unsure or the document is ambiguous, treat it as non-medical.\n\n"
-        "If this IS a medical document, respond with exactly: MEDICAL\n"
-        "If this is NOT a medical document, respond with a helpful message in this format:\n"
-        "NOT_MEDICAL: This appears to be a [document type]. Only health-related documents like lab reports, prescriptions, or medical records can be simplified here.\n\n"
-        f"OCR TEXT:\n{trimmed}"
-    )
 
-    validation_response = client.models.generate_content(model=model, contents=validation_prompt)
-    validation_text = (getattr(validation_response, "text", None) or "").strip()
-    
+def _file_part(file_bytes: bytes, mime_type: str) -> dict:
+    if not file_bytes:
+        raise ValueError("File bytes are empty")
+    if not (mime_type or "").strip():
+        raise ValueError("mime_type is required")
+    return bytes_part(file_bytes, mime_type)
+
+
+def _raise_unless_medical(validation_text: str) -> None:
     # Only proceed if the response is clearly MEDICAL
     if not validation_text.upper().startswith("MEDICAL"):
         # Extract the AI-generated message or use a default
         if validation_text.upper().startswith("NOT_MEDICAL:"):
             error_msg = validation_text[len("NOT_MEDICAL:"):].strip()
         else:
-            error_msg = "Only health-related documents can be simplified. Please upload a medical document such as a lab report, prescription, X-ray, or diagnosis report."
-        raise ValueError(error_msg)
+            error_msg = DEFAULT_NOT_MEDICAL_MESSAGE
+        raise NotMedicalDocumentError(error_msg)
 
-    # Proceed with medical report simplification
-    prompt = (
-        "You are a helpful medical assistant.\n"
-        "Rewrite the following OCR text from a medical document into a simple, easy-to-understand explanation.\n"
-        "Rules:\n"
-        "- Use plain language and short bullet points.\n"
-        "- Do NOT invent details that are not present.\n"
-        "- Do NOT provide a diagnosis.\n"
-        "- If there are abnormal lab values or urgent warnings explicitly stated, highlight them as 'Important'.\n"
-        "Output format:\n"
-        "1) Summary (2-4 bullets)\n"
-        "2) Key details (bullets)\n"
-        "3) Next steps (2-4 bullets, general and safe)\n\n"
-        "OCR TEXT:\n"
-        f"{trimmed}"
+
+def _validate_ocr_text(trimmed: str, *, model: str) -> None:
+    validation_prompt = (
+        "You are a strict document classifier. Analyze the following OCR text and determine if it is from a MEDICAL/HEALTHCARE document.\n\n"
+        + _CLASSIFIER_RULES
+        + "If this IS a medical document, respond with exactly: MEDICAL\n"
+        "If this is NOT a medical document, respond with a helpful message in this format:\n"
+        "NOT_MEDICAL: This appears to be a [document type]. Only health-related documents like lab reports, prescriptions, or medical records can be simplified here.\n\n"
+        f"OCR TEXT:\n{trimmed}"
+    )
+    _raise_unless_medical(response_text(get_gateway().generate_content(validation_prompt, model=model)).strip())
+
+
+def _validate_file(file_part: dict, *, model: str) -> None:
+    validation_prompt = (
+        "You are a strict document classifier. Analyze the attached document and determine if it is a MEDICAL/HEALTHCARE document.\n\n"
+        + _CLASSIFIER_RULES
+        + "If this IS a medical document, respond with exactly: MEDICAL\n"
+        "If this is NOT a medical document, respond with a helpful message in this format:\n"
+        "NOT_MEDICAL: This appears to be a [document type]. Only health-related documents like lab reports, prescriptions, or medical records can be simplified here."
     )
+    validation_contents = [text_part(validation_prompt), file_part]
+    _raise_unless_medical(response_text(get_gateway().generate_content(validation_contents, model=model)).strip())
 
-    response = client.models.generate_content(model=model, contents=prompt)
-    text = getattr(response, "text", None)
-    if not text:
-        raise RuntimeError("Empty response from Gemini")
-    return text.strip()
 
+def _explain_ocr_text(trimmed: str, *, model: str) -> str:
+    prompt = "You are a helpful medical assistant.\n" + _OCR_EXPLANATION_RULES + f"\nOCR TEXT:\n{trimmed}"
+    return get_gateway().generate_text(prompt, model=model)
 
-def explain_bytes_with_gemini(
-    file_bytes: bytes,
-    *,
-    mime_type: str,
-    model: str = "gemini-3-flash-preview",
-) -> str:
-    """Analyze an image/PDF directly with Gemini for better layout-aware extraction.
 
-    This is intended for medical report understanding where tables/columns matter.
+def _explain_file(file_part: dict, *, model: str) -> str:
+    prompt = "You are a helpful medical assistant. " + _FILE_EXPLANATION_RULES
+    return get_gateway().generate_text([text_part(prompt), file_part], model=model)
+
+
+def classify_report(
+    *,
+    model: str,
+    ocr_text: str | None = None,
+    file_bytes: bytes | None = None,
+    mime_type: str | None = None,
+    combined: bool | None = None,
+) -> str | None:
+    """Classification step on its own: raise NotMedicalDocumentError for non-medical input.
+
+    Pass either ``ocr_text`` or ``file_bytes``/``mime_type``. In combined mode the
+    explanation arrives with the verdict and is returned; otherwise ``None``
+    is returned and ``explain_report`` produces it.
     """
 
-    if not file_bytes:
-        raise ValueError("File bytes are empty")
-    if not (mime_type or "").strip():
-        raise ValueError("mime_type is required")
+    if file_bytes is not None:
+        file_part = _file_part(file_bytes, mime_type)
+        explanation = _run_combined([text_part(_combined_prompt(_FILE_EXPLANATION_RULES)), file_part], model=model, combined=combined)
+        if explanation is None:
+            _validate_file(file_part, model=model)
+        return explanation
 
-    from google import genai
-    from google.genai import types
+    trimmed = _trim_ocr_text(ocr_text)
+    explanation = _run_combined(_combined_prompt(_OCR_EXPLANATION_RULES) + f"\nOCR TEXT:\n{trimmed}", model=model, combined=combined)
+    if explanation is None:
+        _validate_ocr_text(trimmed, model=model)
+    return explanation
 
-    api_key = (os.getenv("GEMINI_API_KEY") or "").strip()
-    if not api_key:
-        raise RuntimeError("GEMINI_API_KEY is not set")
 
-    client = genai.Client(api_key=api_key)
+def explain_report(
+    *,
+    model: str,
+    ocr_text: str | None = None,
+    file_bytes: bytes | None = None,
+    mime_type: str | None = None,
+) -> str:
+    """Explanation step for a document that has already been classified as medical."""
 
-    # First, validate if the document is medical-related
-    validation_prompt = (
-        "You are a strict document classifier. Analyze the attached document and determine if it is a MEDICAL/HEALTHCARE document.\n\n"
-        "MEDICAL documents: lab reports, blood tests, X-rays, MRI/CT scans, "
-        "prescriptions, medical bills from hospitals/clinics, discharge summaries, doctor's notes, "
-        "pathology reports, vaccination records, health insurance claims, medical certificates, "
-        "or any document directly related to patient healthcare or medical diagnosis.\n\n"
-        "NON-MEDICAL documents: regular invoices, shopping receipts, calendars, "
-        "event notices, personal letters, academic transcripts, ID cards, travel tickets, "
-        "utility bills, tax forms, bank statements, resumes, contracts, or any document "
-        "that is NOT directly related to medical/healthcare purposes.\n\n"
-        "IMPORTANT: Be strict. If you are unsure or the document is ambiguous, treat it as non-medical.\n\n"
-        "If this IS a medical document, respond with exactly: MEDICAL\n"
-        "If this is NOT a medical document, respond with a helpful message in this format:\n"
-        "NOT_MEDICAL: This appears to be a [document type]. Only health-related documents like lab reports, prescriptions, or medical records can be simplified here."
-    )
+    if file_bytes is not None:
+        return _explain_file(_file_part(file_bytes, mime_type), model=model)
+    return _explain_ocr_text(_trim_ocr_text(ocr_text), model=model)
 
-    validation_contents = [
-        types.Part.from_text(validation_prompt),
-        types.Part.from_bytes(data=file_bytes, mime_type=mime_type),
-    ]
 
-    validation_response = client.models.generate_content(model=model, contents=validation_contents)
-    validation_text = (getattr(validation_response, "text", None) or "").strip()
-    
-    # Only proceed if the response is clearly MEDICAL
-    if not validation_text.upper().startswith("MEDICAL"):
-        # Extract the AI-generated message or use a default
-        if validation_text.upper().startswith("NOT_MEDICAL:"):
-            error_msg = validation_text[len("NOT_MEDICAL:"):].strip()
-        else:
-            error_msg = "Only health-related documents can be simplified. Please upload a medical document such as a lab report, prescription, X-ray, or diagnosis report."
-        raise ValueError(error_msg)
+def simplify_ocr_text(ocr_text: str, *, model: str = "gemini-3-flash-preview", combined: bool | None = None) -> str:
+    """Classify and explain OCR text.
 
-    # Proceed with medical report analysis
-    prompt = (
-        "You are a helpful medical assistant. Analyze the attached medical report file.\n"
-        "Rules:\n"
-        "- Be accurate with numbers and units; keep them tied to the correct labels/rows/columns.\n"
-        "- If a value is unclear/blurred, say so instead of guessing.\n"
-        "- Do NOT invent details not present.\n"
-        "- Do NOT provide a diagnosis or medication guidance.\n"
-        "Output format:\n"
-        "1) Summary (1-3 bullets)\n"
-        "2) Key details (bullets; include dates, test names, and measured values)\n"
-        "3) Notable findings (bullets; highlight abnormal/flagged values only if shown)\n"
-        "4) Next steps (2-4 bullets; general and safe)\n"
-    )
+    By default (``GEMINI_COMBINED_REPORT_CALL``) this is one structured-output
+    request; the original classify-then-explain pair is the fallback.
+    """
+
+    explanation = classify_report(model=model, ocr_text=ocr_text, combined=combined)
+    if explanation is not None:
+        return explanation
+    return explain_report(model=model, ocr_text=ocr_text)
 
-    contents = [
-        types.Part.from_text(prompt),
-        types.Part.from_bytes(data=file_bytes, mime_type=mime_type),
-    ]
 
-    response = client.models.generate_content(model=model, contents=contents)
-    text = getattr(response, "text", None)
-    if not text:
-        raise RuntimeError("Empty response from Gemini")
-    return text.strip()
+def explain_bytes_with_gemini(
+    file_bytes: bytes,
+    *,
+    mime_type: str,
+    model: str = "gemini-3-flash-preview",
+    combined: bool | None = None,
+) -> str:
+    """Analyze an image/PDF directly with Gemini for better layout-aware extraction.
+
+    This is intended for medical report understanding where tables/columns matter.
+    By default the file is uploaded once, in a single classify + explain call.
+    """
+
+    explanation = classify_report(model=model, file_bytes=file_bytes, mime_type=mime_type, combined=combined)
+    if explanation is not None:
+        return explanation
+    return explain_report(model=model, file_bytes=file_bytes, mime_type=mime_type)
@@ -0,0 +1,314 @@
+"""In-memory spatial index of hospital locations.
+
+Hospital search used to load every hospital row and run haversine against
+each one. ``GeoGridIndex`` buckets points into a fixed lat/lon grid (cells of
+``cell_deg`` degrees, ~11km at the default 0.1) so a radius query only looks
+at the cells overlapping the search circle's bounding box, and a k-nearest
+query walks rings of cells outwards until no closer point can remain.
+Distances for the candidates are computed in one vectorized call
+(``utils.geodesic.PointArray``).
+
+``HospitalLocator`` keeps one index per backend worker in sync with the
+``hospitals`` table:
+
+- built lazily on first use and fully rebuilt every
+  ``HOSPITAL_INDEX_REBUILD_SECONDS`` (picks up edits made elsewhere);
+- new rows are pulled incrementally (``WHERE id > last seen``) at most every
+  ``HOSPITAL_INDEX_REFRESH_SECONDS``, so hospitals registered through another
+  worker appear quickly;
+- writes in this worker call ``upsert``/``remove`` directly.
+
+If the index can't be loaded, callers fall back to a bounding-box query on
+``idx_location`` (see ``bounding_box_clause``).
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from config import Config
+from utils.database import execute_query
+from utils.geodesic import Neighbour, PointArray, rank
+
+
+logger = logging.getLogger("pocketcare.geo")
+
+_KM_PER_DEG_LAT = 111.32
+
+# k-nearest searches rings of cells up to this far out, then ranks every point.
+_RING_SEARCH_MAX_DEG = 5.0
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> Tuple[float, float, List[Tuple[float, float]]]:
+    """Lat range and lon range(s) enclosing a circle; lon is split at the antimeridian."""
+
+    dlat = radius_km / _KM_PER_DEG_LAT
+    min_lat, max_lat = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+    cos_lat = math.cos(math.radians(lat))
+    if min_lat <= -90.0 or max_lat >= 90.0 or cos_lat < 1e-6:
+        return min_lat, max_lat, [(-180.0, 180.0)]
+    dlon = radius_km / (_KM_PER_DEG_LAT * cos_lat)
+    if dlon >= 180.0:
+        return min_lat, max_lat, [(-180.0, 180.0)]
+    west, east = lon - dlon, lon + dlon
+    if west < -180.0:
+        return min_lat, max_lat, [(west + 360.0, 180.0), (-180.0, east)]
+    if east > 180.0:
+        return min_lat, max_lat, [(west, 180.0), (-180.0, east - 360.0)]
+    return min_lat, max_lat, [(west, east)]
+
+
+def bounding_box_clause(lat: float, lon: float, radius_km: float, *, prefix: str = "") -> Tuple[str, list]:
+    """SQL condition (served by ``idx_location``) for rows inside the circle's bounding box."""
+
+    min_lat, max_lat, lon_ranges = bounding_box(lat, lon, radius_km)
+    lon_sql = " OR ".join(f"{prefix}longitude BETWEEN %s AND %s" for _ in lon_ranges)
+    params: list = [min_lat, max_lat]
+    for west, east in lon_ranges:
+        params += [west, east]
+    return f"({prefix}latitude BETWEEN %s AND %s AND ({lon_sql}))", params
+
+
+class GeoGridIndex:
+    """Points bucketed into a ``cell_deg`` x ``cell_deg`` lat/lon grid.
+
+    Coordinates live in a ``PointArray``; the grid only narrows down which
+    rows a query computes distances for.
+    """
+
+    def __init__(self, *, cell_deg: float = 0.1):
+        self.cell_deg = cell_deg
+        self._cols = int(math.ceil(360.0 / cell_deg))
+        self._lock = threading.Lock()
+        self._points = PointArray()
+        self._cells: Dict[Tuple[int, int], Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor((lat + 90.0) / self.cell_deg)), int(math.floor((lon + 180.0) / self.cell_deg)) % self._cols
+
+    def upsert(self, point_id: int, lat: float, lon: float) -> None:
+        with self._lock:
+            self._remove_from_cell(point_id)
+            self._points.upsert(point_id, lat, lon)
+            self._cells.setdefault(self._cell(lat, lon), set()).add(point_id)
+
+    def remove(self, point_id: int) -> None:
+        with self._lock:
+            self._remove_from_cell(point_id)
+            self._points.remove(point_id)
+
+    def _remove_from_cell(self, point_id: int) -> None:
+        old = self._points.get(point_id)
+        if old is None:
+            return
+        cell = self._cell(*old)
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(point_id)
+            if not members:
+                del self._cells[cell]
+
+    def _ids_in_cells(self, rows: range, cols: Iterable[int]) -> List[int]:
+        cols = list(cols)
+        ids: List[int] = []
+        for row in rows:
+            for col in cols:
+                members = self._cells.get((row, col % self._cols))
+                if members:
+                    ids.extend(members)
+        return ids
+
+    def distance_matrix(self, lats: Sequence[float], lons: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """``(ids, distances_km)``: distances from each ``(lats[i], lons[i])`` to every point."""
+
+        with self._lock:
+            return self._points.distance_matrix(lats, lons)
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[Neighbour]:
+        """``(id, distance_km)`` of every point within ``radius_km``, nearest first."""
+
+        if radius_km < 0:
+            return []
+        min_lat, max_lat, lon_ranges = bounding_box(lat, lon, radius_km)
+        row_lo, _ = self._cell(min_lat, 0.0)
+        row_hi, _ = self._cell(max_lat, 0.0)
+        rows = range(row_lo, row_hi + 1)
+        with self._lock:
+            candidates: Set[int] = set()
+            for west, east in lon_ranges:
+                col_lo = int(math.floor((west + 180.0) / self.cell_deg))
+                col_hi = int(math.floor((east + 180.0) / self.cell_deg))
+                candidates.update(self._ids_in_cells(rows, range(col_lo, min(col_hi, col_lo + self._cols - 1) + 1)))
+            return self._points.within(lat, lon, radius_km, rows=self._points.rows_for(candidates))
+
+    def nearest(self, lat: float, lon: float, k: int, *, max_km: Optional[float] = None) -> List[Neighbour]:
+        """The ``k`` nearest points (optionally within ``max_km``), nearest first."""
+
+        if k <= 0:
+            return []
+        center_row, center_col = self._cell(lat, lon)
+        with self._lock:
+            if not len(self._points):
+                return []
+            ids_seen: List[np.ndarray] = []
+            distances_seen: List[np.ndarray] = []
+            ring = 0
+            while True:
+                if ring * self.cell_deg > _RING_SEARCH_MAX_DEG:
+                    # Far from everything (or near a pole): rank all points.
+                    return self._points.nearest(lat, lon, k, max_km=max_km)
+
+                ring_rows = self._points.rows_for(self._ring_ids(center_row, center_col, ring))
+                if len(ring_rows):
+                    ids, distances = self._points.distances(lat, lon, ring_rows)
+                    ids_seen.append(ids)
+                    distances_seen.append(distances)
+
+                # Points outside the rings searched so far are at least ``ring``
+                # cells away north/south or east/west of the query point. East/west
+                # degrees shrink with latitude (and a great circle cuts slightly
+                # inside a parallel, hence the 0.95).
+                lat_km = ring * self.cell_deg * _KM_PER_DEG_LAT
+                lon_km = lat_km * math.cos(math.radians(min(90.0, abs(lat) + ring * self.cell_deg))) * 0.95
+                covered_km = min(lat_km, lon_km)
+                ranked = []
+                if distances_seen:
+                    ranked = rank(np.concatenate(ids_seen), np.concatenate(distances_seen), k=k, max_km=max_km)
+                if len(ranked) == k and ranked[-1][1] <= covered_km:
+                    return ranked
+                if max_km is not None and covered_km >= max_km:
+                    return ranked
+                ring += 1
+
+    def _ring_ids(self, row: int, col: int, ring: int) -> List[int]:
+        if ring == 0:
+            return list(self._cells.get((row, col % self._cols), ()))
+        ids: List[int] = []
+        for r in range(row - ring, row + ring + 1):
+            if r == row - ring or r == row + ring:
+                cols = range(col - ring, col + ring + 1)
+            else:
+                cols = (col - ring, col + ring)
+            ids.extend(self._ids_in_cells(range(r, r + 1), cols))
+        return ids
+
+
+def _apply(index: GeoGridIndex, hospital_id: int, lat, lon) -> None:
+    if lat is None or lon is None:
+        index.remove(hospital_id)
+    else:
+        index.upsert(hospital_id, float(lat), float(lon))
+
+
+class HospitalLocator:
+    """``GeoGridIndex`` of hospital coordinates, kept in sync with the database."""
+
+    def __init__(self, *, refresh_seconds: float = 30.0, rebuild_seconds: float = 600.0, cell_deg: float = 0.1):
+        self.pid = os.getpid()
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self.cell_deg = cell_deg
+        self._lock = threading.Lock()
+        self._index: Optional[GeoGridIndex] = None
+        self._max_id = 0
+        self._built_at = 0.0
+        self._refreshed_at = 0.0
+
+    def _load(self, index: GeoGridIndex, rows) -> None:
+        for row in rows:
+            hospital_id = int(row["id"])
+            self._max_id = max(self._max_id, hospital_id)
+            _apply(index, hospital_id, row.get("latitude"), row.get("longitude"))
+
+    def ensure_fresh(self) -> None:
+        """Build, rebuild or incrementally refresh the index as needed (raises on DB errors)."""
+
+        now = time.monotonic()
+        if self._index is not None and now - self._refreshed_at < self.refresh_seconds:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self._index is None or now - self._built_at >= self.rebuild_seconds:
+                rows = execute_query("SELECT id, latitude, longitude FROM hospitals", fetch_all=True) or []
+                # Build off to the side so readers never see a half-loaded index.
+                index = GeoGridIndex(cell_deg=self.cell_deg)
+                self._max_id = 0
+                self._load(index, rows)
+                self._index = index
+                self._built_at = self._refreshed_at = now
+                logger.info("hospital index built: %d hospitals with coordinates", len(index))
+            elif now - self._refreshed_at >= self.refresh_seconds:
+                rows = execute_query(
+                    "SELECT id, latitude, longitude FROM hospitals WHERE id > %s",
+                    (self._max_id,),
+                    fetch_all=True,
+                ) or []
+                self._load(self._index, rows)
+                self._refreshed_at = now
+
+    def available(self) -> bool:
+        """True if the index is usable; otherwise callers use the SQL bounding-box path."""
+
+        if not Config.HOSPITAL_INDEX_ENABLED:
+            return False
+        try:
+            self.ensure_fresh()
+            return True
+        except Exception:
+            logger.warning("hospital index unavailable, using bounding-box query", exc_info=True)
+            return False
+
+    def upsert(self, hospital_id: int, lat, lon) -> None:
+        """Record a created/updated hospital (no-op until the index is first built)."""
+
+        with self._lock:
+            if self._index is None:
+                return
+            self._max_id = max(self._max_id, int(hospital_id))
+            _apply(self._index, int(hospital_id), lat, lon)
+
+    def remove(self, hospital_id: int) -> None:
+        with self._lock:
+            if self._index is not None:
+                self._index.remove(int(hospital_id))
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[Neighbour]:
+        return self._index.within(lat, lon, radius_km)
+
+    def distance_matrix(self, lats: Sequence[float], lons: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        return self._index.distance_matrix(lats, lons)
+
+    def nearest(self, lat: float, lon: float, k: int, *, max_km: Optional[float] = None) -> List[Neighbour]:
+        return self._index.nearest(lat, lon, k, max_km=max_km)
+
+
+
+_locator: Optional[HospitalLocator] = None
+_locator_lock = threading.Lock()
+
+
+def get_hospital_locator() -> HospitalLocator:
+    """Return the process-wide hospital locator (recreated after fork)."""
+
+    global _locator
+    locator = _locator
+    if locator is not None and locator.pid == os.getpid():
+        return locator
+    with _locator_lock:
+        if _locator is None or _locator.pid != os.getpid():
+            _locator = HospitalLocator(
+                refresh_seconds=Config.HOSPITAL_INDEX_REFRESH_SECONDS,
+                rebuild_seconds=Config.HOSPITAL_INDEX_REBUILD_SECONDS,
+                cell_deg=Config.HOSPITAL_INDEX_CELL_DEG,
+            )
+        return _locator
@@ -0,0 +1,173 @@
+"""Vectorized great-circle distance math.
+
+``PointArray`` keeps ids and coordinates in contiguous float64 NumPy arrays
+(latitudes/longitudes in radians, ``cos(lat)`` precomputed) so a distance,
+radius mask or top-k query over thousands of points is a handful of array
+operations instead of a Python loop of ``math.sin``/``asin`` calls. Points
+can be added, moved and removed in place (amortized O(1)); queries can be
+restricted to a subset of rows, e.g. the candidates from a grid lookup.
+
+``haversine_km`` is the scalar form, for single pairs; ``haversine_matrix_km``
+computes many-to-many distances in one broadcast.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0
+
+Neighbour = Tuple[int, float]  # (id, distance_km)
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in kilometers between two points in decimal degrees."""
+
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _haversine_rad(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray, cos_lats: np.ndarray) -> np.ndarray:
+    lat, lon = math.radians(lat), math.radians(lon)
+    a = np.sin((lats - lat) * 0.5) ** 2 + math.cos(lat) * cos_lats * np.sin((lons - lon) * 0.5) ** 2
+    return (2.0 * EARTH_RADIUS_KM) * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def haversine_km_many(lat: float, lon: float, lats: Sequence[float], lons: Sequence[float]) -> np.ndarray:
+    """Distances in kilometers from one point to many (all in decimal degrees)."""
+
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lons = np.radians(np.asarray(lons, dtype=np.float64))
+    return _haversine_rad(lat, lon, lats, lons, np.cos(lats))
+
+
+def haversine_matrix_km(
+    lats: Sequence[float], lons: Sequence[float], lats2: np.ndarray, lons2: np.ndarray, cos_lats2: np.ndarray
+) -> np.ndarray:
+    """``(len(lats), len(lats2))`` distances in kilometers; ``lats``/``lons`` in degrees, the second set in radians."""
+
+    lats = np.radians(np.asarray(lats, dtype=np.float64))[:, None]
+    lons = np.radians(np.asarray(lons, dtype=np.float64))[:, None]
+    a = np.sin((lats2 - lats) * 0.5) ** 2 + np.cos(lats) * cos_lats2 * np.sin((lons2 - lons) * 0.5) ** 2
+    return (2.0 * EARTH_RADIUS_KM) * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def rank(ids: np.ndarray, distances: np.ndarray, *, k: Optional[int] = None, max_km: Optional[float] = None) -> List[Neighbour]:
+    """``(id, distance)`` pairs within ``max_km``, nearest first (ties by id), at most ``k``."""
+
+    if max_km is not None:
+        mask = distances <= max_km
+        ids, distances = ids[mask], distances[mask]
+    if k is not None:
+        if k <= 0:
+            return []
+        if k < len(distances):
+            # Partition to the k smallest, then sort only those. Points tied
+            # with the k-th distance are all kept so the id tie-break is stable.
+            kth = distances[np.argpartition(distances, k - 1)[k - 1]]
+            keep = distances <= kth
+            ids, distances = ids[keep], distances[keep]
+    order = np.lexsort((ids, distances))
+    if k is not None:
+        order = order[:k]
+    return [(int(i), float(d)) for i, d in zip(ids[order], distances[order])]
+
+
+class PointArray:
+    """Growable id/coordinate arrays with vectorized distance queries (not thread-safe)."""
+
+    def __init__(self, capacity: int = 64):
+        capacity = max(1, capacity)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._lats = np.zeros(capacity, dtype=np.float64)
+        self._lons = np.zeros(capacity, dtype=np.float64)
+        self._cos_lats = np.zeros(capacity, dtype=np.float64)
+        self._degrees: Dict[int, Tuple[float, float]] = {}
+        self._rows: Dict[int, int] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, point_id: int) -> bool:
+        return point_id in self._rows
+
+    def get(self, point_id: int) -> Optional[Tuple[float, float]]:
+        """``(lat, lon)`` in degrees, or None."""
+
+        return self._degrees.get(point_id)
+
+    def _grow(self) -> None:
+        capacity = len(self._ids) * 2
+        for name in ("_ids", "_lats", "_lons", "_cos_lats"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[: self._size] = old[: self._size]
+            setattr(self, name, new)
+
+    def upsert(self, point_id: int, lat: float, lon: float) -> None:
+        row = self._rows.get(point_id)
+        if row is None:
+            if self._size == len(self._ids):
+                self._grow()
+            row = self._size
+            self._size += 1
+            self._rows[point_id] = row
+            self._ids[row] = point_id
+        lat_rad = math.radians(lat)
+        self._lats[row] = lat_rad
+        self._lons[row] = math.radians(lon)
+        self._cos_lats[row] = math.cos(lat_rad)
+        self._degrees[point_id] = (lat, lon)
+
+    def remove(self, point_id: int) -> None:
+        row = self._rows.pop(point_id, None)
+        if row is None:
+            return
+        self._degrees.pop(point_id, None)
+        last = self._size - 1
+        if row != last:
+            # Keep the arrays dense: move the last point into the hole.
+            moved = int(self._ids[last])
+            for arr in (self._ids, self._lats, self._lons, self._cos_lats):
+                arr[row] = arr[last]
+            self._rows[moved] = row
+        self._size = last
+
+    def rows_for(self, ids: Iterable[int]) -> np.ndarray:
+        rows = self._rows
+        return np.fromiter((rows[i] for i in ids if i in rows), dtype=np.int64)
+
+    def distances(self, lat: float, lon: float, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """``(ids, distances_km)`` for all points, or only ``rows``."""
+
+        n = self._size
+        if rows is None:
+            ids, lats, lons, cos_lats = self._ids[:n], self._lats[:n], self._lons[:n], self._cos_lats[:n]
+        else:
+            ids, lats, lons, cos_lats = self._ids[rows], self._lats[rows], self._lons[rows], self._cos_lats[rows]
+        return ids, _haversine_rad(lat, lon, lats, lons, cos_lats)
+
+    def distance_matrix(self, lats: Sequence[float], lons: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """``(ids, distances_km)`` with one row of distances to every point per ``(lats[i], lons[i])``."""
+
+        n = self._size
+        ids = self._ids[:n].copy()
+        return ids, haversine_matrix_km(lats, lons, self._lats[:n], self._lons[:n], self._cos_lats[:n])
+
+    def within(self, lat: float, lon: float, radius_km: float, rows: Optional[np.ndarray] = None) -> List[Neighbour]:
+        """Points within ``radius_km``, nearest first."""
+
+        ids, distances = self.distances(lat, lon, rows)
+        return rank(ids, distances, max_km=radius_km)
+
+    def nearest(self, lat: float, lon: float, k: int, *, max_km: Optional[float] = None, rows: Optional[np.ndarray] = None) -> List[Neighbour]:
+        """The ``k`` nearest points (optionally within ``max_km``), nearest first."""
+
+        ids, distances = self.distances(lat, lon, rows)
+        return rank(ids, distances, k=k, max_km=max_km)
@@ -0,0 +1,213 @@
+"""Process-level cache of the hospital catalog used by hospital search.
+
+``get_hospitals`` used to select the hospitals table on every request,
+``json.loads`` each row's ``services`` and substring-scan the parsed lists
+for the ``service`` filter. ``HospitalCatalog`` loads the listing columns
+once per ``HOSPITAL_CATALOG_TTL_SECONDS`` (or after ``invalidate()``, called
+on hospital writes) into a ``CatalogSnapshot`` holding:
+
+- rows with ``services`` already parsed, in listing order (rating, name);
+- token indexes (normalized word -> hospital ids) over services, city and
+  name. A filter matches when every word of the query is a prefix of some
+  word of the field, so ``city``, ``search`` and ``service`` filters are a
+  few sorted-vocabulary lookups and set intersections.
+
+Snapshots are immutable; a reload builds a new one and swaps it in.
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from config import Config
+from utils.database import execute_query
+
+
+logger = logging.getLogger("pocketcare.hospitals")
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+_CATALOG_SQL = """
+    SELECT
+        id, name, address, city, state,
+        latitude, longitude, phone, email,
+        emergency_contact, total_beds, available_beds,
+        icu_beds, services, rating
+    FROM hospitals
+    ORDER BY rating DESC, name ASC
+"""
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercased words of ``text`` (letters/digits, any script)."""
+
+    return _TOKEN_RE.findall(text.lower()) if text else []
+
+
+def parse_services(raw: Any) -> List[str]:
+    """``services`` column (JSON string or list) as a list of names."""
+
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except (json.JSONDecodeError, TypeError):
+            return []
+    if isinstance(raw, list):
+        return [s for s in raw if isinstance(s, str)]
+    return []
+
+
+class TokenIndex:
+    """Inverted index from word to ids, with prefix lookups over the sorted vocabulary."""
+
+    def __init__(self):
+        self._postings: Dict[str, Set[int]] = {}
+        self._vocab: List[str] = []
+
+    def add(self, item_id: int, texts: Iterable[Optional[str]]) -> None:
+        for text in texts:
+            for token in tokenize(text):
+                self._postings.setdefault(token, set()).add(item_id)
+
+    def freeze(self) -> "TokenIndex":
+        self._vocab = sorted(self._postings)
+        return self
+
+    def prefix(self, prefix: str) -> Set[int]:
+        """Ids having a word that starts with ``prefix``."""
+
+        ids: Set[int] = set()
+        i = bisect.bisect_left(self._vocab, prefix)
+        while i < len(self._vocab) and self._vocab[i].startswith(prefix):
+            ids |= self._postings[self._vocab[i]]
+            i += 1
+        return ids
+
+    def match(self, query: str) -> Optional[Set[int]]:
+        """Ids matching every word of ``query`` by prefix; None if the query has no words."""
+
+        result: Optional[Set[int]] = None
+        for token in tokenize(query):
+            ids = self.prefix(token)
+            result = ids if result is None else result & ids
+            if not result:
+                return set()
+        return result
+
+
+class CatalogSnapshot:
+    """Immutable view of the hospitals table plus its search indexes."""
+
+    def __init__(self, rows: Iterable[Dict[str, Any]]):
+        self.hospitals: Dict[int, Dict[str, Any]] = {}
+        self.order: List[int] = []
+        self.services = TokenIndex()
+        self.cities = TokenIndex()
+        self.names = TokenIndex()
+        for row in rows:
+            hospital = dict(row)
+            hospital['services'] = parse_services(hospital.get('services'))
+            hospital_id = hospital['id']
+            self.hospitals[hospital_id] = hospital
+            self.order.append(hospital_id)
+            self.services.add(hospital_id, hospital['services'])
+            self.cities.add(hospital_id, [hospital.get('city')])
+            self.names.add(hospital_id, [hospital.get('name')])
+        for index in (self.services, self.cities, self.names):
+            index.freeze()
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def filter(self, *, city: Optional[str] = None, search: Optional[str] = None, service: Optional[str] = None) -> List[int]:
+        """Ids matching all given filters, in listing order (rating desc, name asc)."""
+
+        selected: Optional[Set[int]] = None
+        for index, query in ((self.cities, city), (self.names, search), (self.services, service)):
+            if not query:
+                continue
+            ids = index.match(query)
+            if ids is None:
+                continue
+            selected = ids if selected is None else selected & ids
+            if not selected:
+                return []
+        if selected is None:
+            return list(self.order)
+        return [hospital_id for hospital_id in self.order if hospital_id in selected]
+
+    def rows(self, hospital_ids: Iterable[int]) -> List[Dict[str, Any]]:
+        """Shallow copies of the rows (safe for callers to modify), skipping unknown ids."""
+
+        return [dict(self.hospitals[i]) for i in hospital_ids if i in self.hospitals]
+
+
+class HospitalCatalog:
+    """``CatalogSnapshot`` of the hospitals table, reloaded after a TTL or ``invalidate()``."""
+
+    def __init__(self, *, ttl_seconds: float = 60.0):
+        self.pid = os.getpid()
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._loaded_at = 0.0
+        self._generation = 0
+
+    def invalidate(self) -> None:
+        """Drop the snapshot; the next ``snapshot()`` reloads from the database."""
+
+        with self._lock:
+            self._generation += 1
+            self._snapshot = None
+
+    def snapshot(self) -> CatalogSnapshot:
+        """Current snapshot, loading it if missing or older than the TTL (raises on DB errors)."""
+
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._loaded_at < self.ttl_seconds:
+            return snapshot
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() - self._loaded_at < self.ttl_seconds:
+                return self._snapshot
+            generation = self._generation
+        started = time.monotonic()
+        rows = execute_query(_CATALOG_SQL, fetch_all=True) or []
+        snapshot = CatalogSnapshot(rows)
+        with self._lock:
+            # An invalidation while loading means the rows may predate a write:
+            # serve them to this caller but don't keep them.
+            if generation == self._generation:
+                self._snapshot = snapshot
+                self._loaded_at = started
+        logger.debug("hospital catalog loaded: %d hospitals in %.1fms", len(snapshot), (time.monotonic() - started) * 1000.0)
+        return snapshot
+
+
+_catalog: Optional[HospitalCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_hospital_catalog() -> HospitalCatalog:
+    """Return the process-wide hospital catalog (recreated after fork)."""
+
+    global _catalog
+    catalog = _catalog
+    if catalog is not None and catalog.pid == os.getpid():
+        return catalog
+    with _catalog_lock:
+        if _catalog is None or _catalog.pid != os.getpid():
+            _catalog = HospitalCatalog(ttl_seconds=Config.HOSPITAL_CATALOG_TTL_SECONDS)
+        return _catalog
+
+
+def invalidate_hospital_catalog() -> None:
+    """Call after inserting/updating/deleting hospitals in this worker."""
+
+    get_hospital_catalog().invalidate()
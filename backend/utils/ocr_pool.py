@@ -0,0 +1,157 @@
+"""Parallel OCR of rendered report pages.
+
+Tesseract is CPU-bound and single-threaded per page, so multi-page PDFs are
+OCR'd on a bounded process pool (``OCR_WORKERS`` processes per backend
+worker). Pages are submitted as soon as they are rendered, at most
+``2 * workers`` are in flight at a time (bounded memory), and results are
+returned in page order.
+
+Each page has a timeout (``OCR_PAGE_TIMEOUT``), enforced both in the worker
+(Tesseract is killed) and by the caller. An optional ``threading.Event``
+cancels the remaining pages, e.g. when a report job is cancelled.
+``OCR_WORKERS=0`` runs OCR inline in the calling thread.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Iterable, List, Optional, Tuple, Union
+
+from config import Config
+from utils.ocr_utils import extract_text_from_image_bytes
+
+
+PageResult = Tuple[str, Optional[float]]
+
+_POLL_SECONDS = 0.2
+
+
+class OCRTimeoutError(RuntimeError):
+    """A page took longer than the per-page timeout."""
+
+
+class OCRCancelledError(RuntimeError):
+    """OCR was cancelled by the caller before all pages finished."""
+
+
+class OCRPool:
+    def __init__(self, *, workers: int, page_timeout: float = 60.0):
+        self.workers = max(0, workers)
+        self.page_timeout = page_timeout
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: the backend process has DB/HTTP pools and
+                # worker threads that must not be duplicated into children.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _reset_executor(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def map_pages(
+        self,
+        pages: Iterable[Union[bytes, str]],
+        *,
+        lang: str = "eng",
+        cancel_event: Optional[threading.Event] = None,
+        on_page: Optional[Callable[[int], None]] = None,
+        ocr_func: Callable[..., PageResult] = extract_text_from_image_bytes,
+    ) -> List[PageResult]:
+        """OCR each page image and return ``(text, confidence)`` per page, in order.
+
+        Pages are encoded image bytes or file paths; paths keep large images
+        from being pickled to the worker processes.
+
+        ``on_page(n)`` is called after the first ``n`` pages are done.
+        """
+
+        results: List[PageResult] = []
+
+        def collect(result: PageResult) -> None:
+            results.append(result)
+            if on_page is not None:
+                on_page(len(results))
+
+        if self.workers == 0:
+            for page in pages:
+                _check_cancelled(cancel_event)
+                collect(ocr_func(page, lang=lang, timeout=self.page_timeout))
+            return results
+
+        executor = self._get_executor()
+        max_in_flight = self.workers * 2
+        pending = deque()
+        try:
+            for page in pages:
+                _check_cancelled(cancel_event)
+                while len(pending) >= max_in_flight:
+                    collect(self._wait(pending.popleft(), len(results), cancel_event))
+                pending.append(executor.submit(ocr_func, page, lang=lang, timeout=self.page_timeout))
+            while pending:
+                collect(self._wait(pending.popleft(), len(results), cancel_event))
+            return results
+        except BrokenProcessPool as exc:
+            self._reset_executor()
+            raise RuntimeError("OCR worker process crashed") from exc
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _wait(self, future, index: int, cancel_event: Optional[threading.Event]) -> PageResult:
+        deadline = time.monotonic() + self.page_timeout
+        while True:
+            _check_cancelled(cancel_event)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                future.cancel()
+                raise OCRTimeoutError(f"OCR timed out on page {index + 1} (limit {self.page_timeout:g}s)")
+            try:
+                return future.result(timeout=min(_POLL_SECONDS, remaining))
+            except FutureTimeoutError:
+                continue
+
+
+def _check_cancelled(cancel_event: Optional[threading.Event]) -> None:
+    if cancel_event is not None and cancel_event.is_set():
+        raise OCRCancelledError("OCR cancelled")
+
+
+_pool: Optional[OCRPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_ocr_pool() -> OCRPool:
+    """Return the process-wide OCR pool (recreated after fork)."""
+
+    global _pool
+    pool = _pool
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = OCRPool(workers=Config.OCR_WORKERS, page_timeout=Config.OCR_PAGE_TIMEOUT)
+        return _pool
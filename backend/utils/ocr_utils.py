@@ -1,5 +1,14 @@
+import math
 import os
-from typing import Any, Dict, Optional, Tuple
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from config import Config
+
+
+# Encoded image content, or a path to an image file (decoded without reading it into memory first).
+ImageSource = Union[bytes, str, os.PathLike]
 
 
 def _configure_tesseract_cmd() -> None:
@@ -23,20 +32,83 @@ def _configure_tesseract_cmd() -> None:
         return
 
 
-def extract_text_from_image_bytes(
-    image_bytes: bytes,
-    *,
-    lang: str = "eng",
-) -> Tuple[str, Optional[float]]:
-    """Run Tesseract OCR on an image (bytes) and return (text, confidence).
+def text_from_tesseract_data(data: Dict[str, Any]) -> Tuple[str, Optional[float], List[Dict[str, Any]]]:
+    """Rebuild text, mean confidence and word boxes from ``image_to_data`` output.
 
-    Confidence is an average of word-level confidences when available, else None.
+    Words are joined with spaces within a line, lines with newlines, and
+    paragraphs/blocks with a blank line, matching ``image_to_string`` layout.
+    Confidence is the mean of word-level confidences (None if there are none).
     """
 
-    _configure_tesseract_cmd()
+    texts = data.get("text") or []
+    words: List[Dict[str, Any]] = []
+    paragraphs: List[List[str]] = []
+    lines: List[str] = []
+    current_par = None
+    current_line = None
+    line_words: List[str] = []
+    confs: List[float] = []
+
+    def col(name: str, idx: int, default: Any = 0) -> Any:
+        values = data.get(name) or []
+        return values[idx] if idx < len(values) else default
+
+    def flush_line() -> None:
+        if line_words:
+            lines.append(" ".join(line_words))
+            line_words.clear()
+
+    def flush_par() -> None:
+        flush_line()
+        if lines:
+            paragraphs.append(list(lines))
+            lines.clear()
+
+    for idx, raw in enumerate(texts):
+        word = (raw or "").strip()
+        if not word:
+            continue
+
+        par_key = (col("page_num", idx), col("block_num", idx), col("par_num", idx))
+        line_key = par_key + (col("line_num", idx),)
+        if par_key != current_par:
+            flush_par()
+            current_par = par_key
+        elif line_key != current_line:
+            flush_line()
+        current_line = line_key
+        line_words.append(word)
+
+        try:
+            conf = float(col("conf", idx, -1))
+        except (TypeError, ValueError):
+            conf = -1.0
+        if conf >= 0:
+            confs.append(conf)
+
+        words.append(
+            {
+                "text": word,
+                "conf": conf,
+                "left": int(col("left", idx)),
+                "top": int(col("top", idx)),
+                "width": int(col("width", idx)),
+                "height": int(col("height", idx)),
+                "block": int(col("block_num", idx)),
+                "par": int(col("par_num", idx)),
+                "line": int(col("line_num", idx)),
+            }
+        )
+    flush_par()
 
+    text = "\n\n".join("\n".join(par) for par in paragraphs)
+    confidence = (sum(confs) / len(confs)) if confs else None
+    return text, confidence, words
+
+
+def _import_ocr_deps():
     try:
-        from PIL import Image, ImageEnhance, ImageOps
+        from PIL import Image, ImageChops, ImageFilter, ImageOps
         import pytesseract
     except Exception as exc:
         import sys
@@ -46,34 +118,214 @@ def extract_text_from_image_bytes(
             f"Backend Python: {sys.executable} (v{sys.version.split()[0]}). "
             "Fix: run the backend using your project venv and run: `python -m pip install -r backend/requirements.txt`, then restart the backend."
         ) from exc
+    return Image, ImageChops, ImageFilter, ImageOps, pytesseract
 
-    from io import BytesIO
 
-    image = Image.open(BytesIO(image_bytes))
-    image = image.convert("RGB")
+# Images without usable DPI metadata are assumed to show one Letter/A4 page
+# (long edge ~11in). Phone cameras write 72 DPI (or nothing), which says
+# nothing about the document, so metadata outside this range is ignored.
+_ASSUMED_PAGE_INCHES = 11.0
+_METADATA_DPI_RANGE = (100.0, 1200.0)
+_MAX_UPSCALE = 2.0
+_SCALE_TOLERANCE = 0.1  # don't resample for less than a 10% change
+_OSD_MAX_EDGE = 1600  # OSD only needs coarse glyph shapes
+_OSD_MIN_CONFIDENCE = 2.0
+_BINARIZE_OFFSET = 10  # ink must be this many gray levels darker than its neighbourhood
+_CROP_MARGIN = 16
 
-    # Light, safe preprocessing: grayscale + contrast boost.
-    gray = ImageOps.grayscale(image)
-    gray = ImageEnhance.Contrast(gray).enhance(1.6)
 
-    # Main OCR text
-    text = pytesseract.image_to_string(gray, lang=lang)
+@contextmanager
+def _timed(timings: Dict[str, float], stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = round((time.perf_counter() - started) * 1000.0, 2)
+
+
+def _source_dpi(image) -> Tuple[float, bool]:
+    """Return ``(dpi, from_metadata)`` for a freshly opened image."""
 
-    # Confidence (best-effort)
-    confidence: Optional[float] = None
     try:
-        data: Dict[str, Any] = pytesseract.image_to_data(gray, lang=lang, output_type=pytesseract.Output.DICT)
-        confs = []
-        for c in data.get("conf", []) or []:
-            try:
-                v = float(c)
-                if v >= 0:
-                    confs.append(v)
-            except Exception:
-                continue
-        if confs:
-            confidence = sum(confs) / len(confs)
+        dpi = float((image.info.get("dpi") or (0,))[0])
+    except (TypeError, ValueError):
+        dpi = 0.0
+    low, high = _METADATA_DPI_RANGE
+    if low <= dpi <= high:
+        return dpi, True
+    return max(image.size) / _ASSUMED_PAGE_INCHES, False
+
+
+def _target_scale(dpi: float, from_metadata: bool) -> float:
+    scale = 1.0
+    if dpi > Config.OCR_MAX_DPI:
+        scale = Config.OCR_MAX_DPI / dpi
+    elif from_metadata and dpi < Config.OCR_MIN_DPI:
+        # Only upscale when the DPI is known; a small image without metadata
+        # is more likely a cropped snippet than a low-resolution page.
+        scale = min(_MAX_UPSCALE, Config.OCR_MIN_DPI / dpi)
+    return 1.0 if abs(scale - 1.0) < _SCALE_TOLERANCE else scale
+
+
+def _detect_rotation(gray, Image, pytesseract, timeout: float) -> int:
+    """Clockwise rotation (0/90/180/270) Tesseract OSD suggests, 0 if unsure."""
+
+    probe = gray
+    if max(gray.size) > _OSD_MAX_EDGE:
+        probe = gray.copy()
+        probe.thumbnail((_OSD_MAX_EDGE, _OSD_MAX_EDGE), Image.LANCZOS)
+    try:
+        osd = pytesseract.image_to_osd(probe, output_type=pytesseract.Output.DICT, timeout=timeout)
+        rotate = int(osd.get("rotate") or 0) % 360
+        confidence = float(osd.get("orientation_conf") or 0)
     except Exception:
-        confidence = None
+        # OSD fails on pages with little text or without osd.traineddata;
+        # it's an optimisation, so OCR the image as-is.
+        return 0
+    return rotate if rotate in (90, 180, 270) and confidence >= _OSD_MIN_CONFIDENCE else 0
+
+
+def preprocess_image_bytes(image_bytes: ImageSource, *, timeout: float = 0) -> Tuple[Any, Dict[str, Any]]:
+    """Prepare an uploaded image (bytes or a file path) for Tesseract.
+
+    Stages (each timed in ``info["timings_ms"]``):
+
+    - ``decode``: JPEGs are decoded in draft mode (libjpeg scales by 1/2, 1/4
+      or 1/8 while decoding) straight to grayscale when they will be
+      downscaled; EXIF orientation is applied.
+    - ``scale``: resample to ``OCR_MIN_DPI``..``OCR_MAX_DPI``.
+    - ``osd``: rotate by 90/180/270 degrees if Tesseract OSD is confident
+      (``OCR_OSD``).
+    - ``binarize``: adaptive threshold against the local mean, which copes
+      with shadows and uneven lighting in photos (``OCR_BINARIZE``).
+    - ``crop``: trim margins outside the detected ink.
+
+    Returns ``(image, info)``; ``info`` holds the source size and DPI, the
+    applied scale, rotation and crop box (in the scaled, upright frame).
+    """
+
+    Image, ImageChops, ImageFilter, ImageOps, pytesseract = _import_ocr_deps()
+    from io import BytesIO
+
+    timings: Dict[str, float] = {}
+
+    with _timed(timings, "decode"):
+        image = Image.open(image_bytes if isinstance(image_bytes, (str, os.PathLike)) else BytesIO(image_bytes))
+        dpi, from_metadata = _source_dpi(image)
+        scale = _target_scale(dpi, from_metadata)
+        source_long_edge = max(image.size)
+        if scale < 1.0 and image.format == "JPEG":
+            image.draft("L", (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+        image = ImageOps.exif_transpose(image)
+        gray = image.convert("L")
+        source_size = list(image.size)
+        if max(gray.size) != source_long_edge:
+            # Draft decoding shrank the image; report the upright full-size dimensions.
+            factor = source_long_edge / max(gray.size)
+            source_size = [round(gray.width * factor), round(gray.height * factor)]
+
+    with _timed(timings, "scale"):
+        target_long_edge = max(1, round(source_long_edge * scale))
+        if max(gray.size) != target_long_edge:
+            factor = target_long_edge / max(gray.size)
+            size = (max(1, round(gray.width * factor)), max(1, round(gray.height * factor)))
+            gray = gray.resize(size, Image.LANCZOS, reducing_gap=2.0 if factor < 1 else None)
+
+    rotation = 0
+    with _timed(timings, "osd"):
+        if Config.OCR_OSD:
+            rotation = _detect_rotation(gray, Image, pytesseract, timeout)
+            if rotation:
+                gray = gray.rotate(-rotation, expand=True, fillcolor=255)
+
+    with _timed(timings, "binarize"):
+        # Bradley-style threshold: a pixel is ink if it is darker than the mean
+        # of its neighbourhood (window ~ a few character heights).
+        radius = max(5, round(dpi * scale / 12))
+        local_mean = gray.filter(ImageFilter.BoxBlur(radius))
+        ink = ImageChops.subtract(local_mean, gray).point(lambda v: 255 if v > _BINARIZE_OFFSET else 0)
+        if Config.OCR_BINARIZE:
+            gray = ImageOps.invert(ink)
+
+    with _timed(timings, "crop"):
+        width, height = gray.size
+        crop = [0, 0, width, height]
+        bbox = ink.getbbox()
+        if bbox:
+            left, top, right, bottom = bbox
+            crop = [
+                max(0, left - _CROP_MARGIN),
+                max(0, top - _CROP_MARGIN),
+                min(width, right + _CROP_MARGIN),
+                min(height, bottom + _CROP_MARGIN),
+            ]
+            if crop != [0, 0, width, height]:
+                gray = gray.crop(tuple(crop))
+
+    info = {
+        "source_size": source_size,
+        "source_dpi": round(dpi),
+        "dpi_from_metadata": from_metadata,
+        "scale": target_long_edge / source_long_edge,
+        "rotation": rotation,
+        "crop": crop,
+        "size": list(gray.size),
+        "timings_ms": timings,
+    }
+    return gray, info
+
+
+def _words_to_source(words: List[Dict[str, Any]], info: Dict[str, Any]) -> None:
+    """Map word boxes from the preprocessed image back to upright source pixels."""
+
+    scale = info["scale"]
+    offset_x, offset_y = info["crop"][0], info["crop"][1]
+    if scale == 1.0 and not offset_x and not offset_y:
+        return
+    for word in words:
+        word["left"] = round((word["left"] + offset_x) / scale)
+        word["top"] = round((word["top"] + offset_y) / scale)
+        word["width"] = round(word["width"] / scale)
+        word["height"] = round(word["height"] / scale)
+
+
+def ocr_image_bytes(
+    image_bytes: ImageSource,
+    *,
+    lang: str = "eng",
+    timeout: float = 0,
+) -> Dict[str, Any]:
+    """Preprocess an image, run Tesseract once (``image_to_data``) and return text, confidence and word boxes.
+
+    Returns ``{"text": str, "confidence": float|None, "words": [{text, conf, left, top, width, height, block, par, line}], "preprocess": {...}}``.
+    Word boxes are in upright source-image pixels; ``preprocess`` is the
+    ``info`` from ``preprocess_image_bytes`` plus the OCR time.
+    ``timeout`` (seconds, 0 = none) kills a Tesseract run that takes too long.
+    """
+
+    _configure_tesseract_cmd()
+    _, _, _, _, pytesseract = _import_ocr_deps()
+
+    image, info = preprocess_image_bytes(image_bytes, timeout=timeout)
+
+    # Single OCR pass: text and confidence both come from the word-level data.
+    with _timed(info["timings_ms"], "ocr"):
+        data: Dict[str, Any] = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT, timeout=timeout)
+    text, confidence, words = text_from_tesseract_data(data)
+    _words_to_source(words, info)
+    return {"text": text, "confidence": confidence, "words": words, "preprocess": info}
+
+
+def extract_text_from_image_bytes(
+    image_bytes: ImageSource,
+    *,
+    lang: str = "eng",
+    timeout: float = 0,
+) -> Tuple[str, Optional[float]]:
+    """Run Tesseract OCR on an image (bytes) and return (text, confidence).
+
+    Confidence is an average of word-level confidences when available, else None.
+    """
 
-    return text, confidence
+    result = ocr_image_bytes(image_bytes, lang=lang, timeout=timeout)
+    return result["text"], result["confidence"]
@@ -0,0 +1,76 @@
+"""Keyset (cursor) pagination helpers.
+
+Lists are ordered by ``(timestamp, id)`` and each page continues strictly
+after the last row of the previous one, so deep pages cost the same as the
+first page (no OFFSET scans). The position is handed to clients as an opaque
+``next_cursor`` token.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+def encode_cursor(timestamp: Any, row_id: Any) -> str:
+    """Encode a ``(timestamp, id)`` position into an opaque URL-safe token."""
+
+    if isinstance(timestamp, datetime):
+        ts = timestamp.isoformat()
+    else:
+        ts = str(timestamp) if timestamp is not None else None
+    raw = json.dumps({"t": ts, "i": int(row_id)}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """Decode a token from ``encode_cursor``; ``None``/empty means first page.
+
+    Raises ValueError for malformed tokens.
+    """
+
+    token = (token or "").strip()
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        return datetime.fromisoformat(data["t"]), int(data["i"])
+    except Exception as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def parse_limit(raw: Any, *, default: int = 20, maximum: int = 100) -> int:
+    try:
+        value = int(raw)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(value, maximum))
+
+
+def keyset_condition(ts_column: str, id_column: str, position: Optional[Tuple[datetime, int]], *, descending: bool = True) -> Tuple[str, tuple]:
+    """Return ``(sql, params)`` restricting rows to those after ``position``.
+
+    The expanded OR form (instead of a row constructor) lets MySQL use a
+    composite ``(…, ts_column, id_column)`` index as a range scan.
+    """
+
+    if position is None:
+        return "", ()
+    ts, row_id = position
+    op = "<" if descending else ">"
+    sql = f" AND ({ts_column} {op} %s OR ({ts_column} = %s AND {id_column} {op} %s))"
+    return sql, (ts, ts, row_id)
+
+
+def split_page(rows: Optional[Sequence[Dict[str, Any]]], limit: int, *, ts_key: str, id_key: str = "id") -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Trim a ``LIMIT limit + 1`` result to one page and build ``next_cursor``."""
+
+    rows = list(rows or [])
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    last = page[-1]
+    return page, encode_cursor(last.get(ts_key), last.get(id_key))
@@ -1,23 +1,24 @@
 import os
-from typing import Optional, Tuple
+import threading
+import unicodedata
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
-from utils.ocr_utils import extract_text_from_image_bytes
+from config import Config
+from utils.ocr_pool import get_ocr_pool
 
 
-def extract_text_from_pdf_bytes(
-    pdf_bytes: bytes,
-    *,
-    lang: str = "eng",
-    max_pages: int = 10,
-) -> Tuple[str, Optional[float]]:
-    """Extract text from a PDF by rendering pages to images and running OCR.
+PAGE_TEXT_LAYER = "text"
+PAGE_OCR = "ocr"
 
-    Returns a combined text and an averaged confidence (best-effort).
-    """
+# Pages with at least this much native text are trusted even if they also
+# contain large images (e.g. a lab report with a logo or chart).
+_SCAN_CAPTION_CHARS = 200
 
-    if not pdf_bytes:
-        raise ValueError("PDF is empty")
+# PDF content, or a path to a PDF file (opened lazily by PyMuPDF, not read into memory).
+PdfSource = Union[bytes, str, os.PathLike]
 
+
+def _import_fitz():
     try:
         import fitz  # PyMuPDF
     except Exception as exc:
@@ -28,43 +29,161 @@ def extract_text_from_pdf_bytes(
             "Fix: run the backend using your project venv and run: `python -m pip install -r backend/requirements.txt`, then restart the backend. "
             f"Backend Python: {sys.executable} (v{sys.version.split()[0]})."
         ) from exc
+    return fitz
+
+
+def text_layer_usable(text: str, *, min_chars: int = 40) -> bool:
+    """Heuristic: is a page's embedded text good enough to skip OCR?
+
+    Rejects pages with too little text (scans, or a header over a scanned
+    body) and text with many replacement/private-use characters or few
+    letters/digits (broken font encodings).
+    """
+
+    stripped = "".join((text or "").split())
+    if len(stripped) < max(1, min_chars):
+        return False
+    bad = sum(1 for ch in stripped if ch == "\ufffd" or unicodedata.category(ch) in ("Co", "Cn", "Cc"))
+    if bad / len(stripped) > 0.05:
+        return False
+    alnum = sum(1 for ch in stripped if ch.isalnum())
+    return alnum / len(stripped) >= 0.5
+
+
+def _image_coverage(page) -> float:
+    """Fraction of the page area covered by images (0.0 if unknown)."""
+
+    try:
+        page_area = abs(page.rect)
+        if not page_area:
+            return 0.0
+        covered = sum(abs(page.rect & info["bbox"]) for info in page.get_image_info())
+        return min(1.0, covered / page_area)
+    except Exception:
+        return 0.0
+
+
+def _open_pdf(pdf_bytes: PdfSource, max_pages: int):
+    is_path = isinstance(pdf_bytes, (str, os.PathLike))
+    if (os.path.getsize(pdf_bytes) if is_path else len(pdf_bytes)) == 0:
+        raise ValueError("PDF is empty")
+
+    fitz = _import_fitz()
 
     # Allow override via env for large PDFs.
     env_max_pages = (os.getenv("OCR_PDF_MAX_PAGES") or "").strip()
     if env_max_pages.isdigit():
         max_pages = max(1, int(env_max_pages))
 
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    page_count = doc.page_count
-    if page_count == 0:
-        return "", None
+    doc = fitz.open(os.fspath(pdf_bytes), filetype="pdf") if is_path else fitz.open(stream=pdf_bytes, filetype="pdf")
+    if doc.page_count > max_pages:
+        doc.close()
+        raise ValueError(f"PDF has {doc.page_count} pages; max allowed is {max_pages}. Split the PDF or increase OCR_PDF_MAX_PAGES.")
 
-    if page_count > max_pages:
-        raise ValueError(f"PDF has {page_count} pages; max allowed is {max_pages}. Split the PDF or increase OCR_PDF_MAX_PAGES.")
+    # Render at a higher zoom for better OCR.
+    zoom = float((os.getenv("OCR_PDF_RENDER_ZOOM") or "2.0").strip() or 2.0)
+    return doc, fitz.Matrix(zoom, zoom)
+
+
+def extract_pdf_pages(pdf_bytes: PdfSource, *, max_pages: int = 10) -> Iterator[Tuple[str, Union[str, bytes]]]:
+    """Yield ``(PAGE_TEXT_LAYER, text)`` or ``(PAGE_OCR, png_bytes)`` per page, in order.
+
+    Pages whose native text passes ``text_layer_usable`` (and that are not
+    mostly a scanned image) are returned as text; the rest are rendered for
+    OCR. ``OCR_PDF_TEXT_LAYER=false`` forces OCR for every page.
+    """
+
+    doc, matrix = _open_pdf(pdf_bytes, max_pages)
+    try:
+        for idx in range(doc.page_count):
+            page = doc.load_page(idx)
+            if Config.OCR_PDF_TEXT_LAYER:
+                text = page.get_text("text", sort=True)
+                if text_layer_usable(text, min_chars=Config.OCR_PDF_MIN_TEXT_CHARS):
+                    # A caption over a full-page scan still needs OCR.
+                    if len(text.strip()) >= _SCAN_CAPTION_CHARS or _image_coverage(page) < 0.5:
+                        yield PAGE_TEXT_LAYER, text
+                        continue
+            pix = page.get_pixmap(matrix=matrix, alpha=False)
+            # Record the render DPI so OCR preprocessing doesn't have to guess it.
+            dpi = round(72 * matrix.a)
+            pix.set_dpi(dpi, dpi)
+            yield PAGE_OCR, pix.tobytes("png")
+    finally:
+        doc.close()
+
+
+def combine_page_results(results: Iterable[Tuple[str, Optional[float]]]) -> Tuple[str, Optional[float]]:
+    """Join per-page ``(text, confidence)`` results into labelled text + mean confidence."""
 
     combined_parts = []
     conf_sum = 0.0
     conf_n = 0
 
-    # Render at a higher zoom for better OCR.
-    zoom = float((os.getenv("OCR_PDF_RENDER_ZOOM") or "2.0").strip() or 2.0)
-    matrix = fitz.Matrix(zoom, zoom)
-
-    for idx in range(page_count):
-        page = doc.load_page(idx)
-        pix = page.get_pixmap(matrix=matrix, alpha=False)
-        image_bytes = pix.tobytes("png")
-
-        text, conf = extract_text_from_image_bytes(image_bytes, lang=lang)
+    for idx, (text, conf) in enumerate(results):
         label = f"--- Page {idx + 1} ---"
-        combined_parts.append(f"{label}\n{text.strip()}".strip())
+        combined_parts.append(f"{label}\n{(text or '').strip()}".strip())
 
         if isinstance(conf, (int, float)):
             conf_sum += float(conf)
             conf_n += 1
 
-    doc.close()
-
     combined_text = "\n\n".join([p for p in combined_parts if p])
     combined_conf = (conf_sum / conf_n) if conf_n else None
     return combined_text, combined_conf
+
+
+def extract_pdf_text(
+    pdf_bytes: PdfSource,
+    *,
+    lang: str = "eng",
+    max_pages: int = 10,
+    cancel_event: Optional[threading.Event] = None,
+) -> Tuple[str, Optional[float], List[Dict[str, Any]]]:
+    """Hybrid extraction: native text layer where usable, OCR for the rest.
+
+    Returns ``(text, confidence, pages)`` where ``pages`` lists the path each
+    page took (``{"page", "method", "chars"}``). Confidence averages the OCR'd
+    pages only (None when no page needed OCR).
+    """
+
+    methods: List[str] = []
+    page_results: Dict[int, Tuple[str, Optional[float]]] = {}
+    ocr_indexes: List[int] = []
+
+    def pages_to_ocr():
+        for idx, (method, payload) in enumerate(extract_pdf_pages(pdf_bytes, max_pages=max_pages)):
+            methods.append(method)
+            if method == PAGE_TEXT_LAYER:
+                page_results[idx] = (payload, None)
+            else:
+                ocr_indexes.append(idx)
+                yield payload
+
+    ocr_results = get_ocr_pool().map_pages(pages_to_ocr(), lang=lang, cancel_event=cancel_event)
+    page_results.update(zip(ocr_indexes, ocr_results))
+
+    ordered = [page_results[idx] for idx in range(len(methods))]
+    text, confidence = combine_page_results(ordered)
+    pages = [
+        {"page": idx + 1, "method": method, "chars": len((ordered[idx][0] or "").strip())}
+        for idx, method in enumerate(methods)
+    ]
+    return text, confidence, pages
+
+
+def extract_text_from_pdf_bytes(
+    pdf_bytes: PdfSource,
+    *,
+    lang: str = "eng",
+    max_pages: int = 10,
+    cancel_event: Optional[threading.Event] = None,
+) -> Tuple[str, Optional[float]]:
+    """Extract text from a PDF, using the embedded text layer where possible and
+    OCR (in parallel on the shared OCR process pool) for the other pages.
+
+    Returns a combined text (in page order) and an averaged confidence (best-effort).
+    """
+
+    text, confidence, _ = extract_pdf_text(pdf_bytes, lang=lang, max_pages=max_pages, cancel_event=cancel_event)
+    return text, confidence
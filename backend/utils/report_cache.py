@@ -0,0 +1,178 @@
+"""Content-addressed cache for medical report simplification results.
+
+Users often re-upload the same file. Results are keyed on the SHA-256 of the
+uploaded bytes plus the model name, and hold everything needed to save a
+``medical_reports`` row without re-running OCR or Gemini: OCR text,
+confidence, the medical/non-medical verdict and the explanation.
+
+The in-memory layer is an LRU bounded by entry count and approximate size.
+Set ``REPORT_CACHE_DIR`` to also persist entries as JSON files so they
+survive restarts and are shared by workers on the same host (opt-in, since
+the files contain report text).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from config import Config
+
+
+VERDICT_MEDICAL = "medical"
+VERDICT_NOT_MEDICAL = "not_medical"
+
+_SAFE_RE = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def cache_key(data: bytes, model: str) -> str:
+    return digest_key(hashlib.sha256(data).hexdigest(), model)
+
+
+def digest_key(sha256_hex: str, model: str) -> str:
+    """``cache_key`` for content whose SHA-256 is already known (e.g. hashed while spooling)."""
+
+    return f"{sha256_hex}:{model}"
+
+
+def _entry_size(entry: Dict[str, Any]) -> int:
+    return sum(len(v) for v in entry.values() if isinstance(v, str)) + 64
+
+
+class ReportResultCache:
+    def __init__(self, *, max_entries: int = 256, max_bytes: int = 32 * 1024 * 1024, persist_dir: Optional[str] = None, max_disk_bytes: int = 256 * 1024 * 1024):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(1, max_bytes)
+        self.persist_dir = Path(persist_dir) if persist_dir else None
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        if self.persist_dir:
+            self.persist_dir.mkdir(parents=True, exist_ok=True)
+
+    # --- public API ---
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry)
+
+        entry = self._load(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, entry)
+        return dict(entry)
+
+    def put(self, key: str, entry: Dict[str, Any]) -> None:
+        entry = dict(entry)
+        with self._lock:
+            self._store(key, entry)
+        self._save(key, entry)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+    # --- memory layer ---
+
+    def _store(self, key: str, entry: Dict[str, Any]) -> None:
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= _entry_size(old)
+        self._entries[key] = entry
+        self._bytes += _entry_size(entry)
+        while len(self._entries) > self.max_entries or (self._bytes > self.max_bytes and len(self._entries) > 1):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= _entry_size(evicted)
+
+    # --- disk layer ---
+
+    def _path(self, key: str) -> Optional[Path]:
+        if not self.persist_dir:
+            return None
+        return self.persist_dir / (_SAFE_RE.sub("_", key) + ".json")
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        if path is None:
+            return None
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+            os.utime(path)  # keep recently used files from being pruned
+            return entry
+        except Exception:
+            return None
+
+    def _save(self, key: str, entry: Dict[str, Any]) -> None:
+        path = self._path(key)
+        if path is None:
+            return
+        try:
+            fd, tmp = tempfile.mkstemp(dir=str(self.persist_dir), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(entry, fh)
+            os.replace(tmp, path)
+            self._prune_disk()
+        except Exception:
+            # Persistence is best-effort; the memory layer still works.
+            pass
+
+    def _prune_disk(self) -> None:
+        files = []
+        total = 0
+        for p in self.persist_dir.glob("*.json"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+            total += st.st_size
+        if total <= self.max_disk_bytes:
+            return
+        for _, size, p in sorted(files):
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_disk_bytes:
+                break
+
+
+_cache: Optional[ReportResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_report_cache() -> ReportResultCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ReportResultCache(
+                    max_entries=Config.REPORT_CACHE_MAX_ENTRIES,
+                    max_bytes=Config.REPORT_CACHE_MAX_BYTES,
+                    persist_dir=Config.REPORT_CACHE_DIR or None,
+                    max_disk_bytes=Config.REPORT_CACHE_DISK_MAX_BYTES,
+                )
+    return _cache
@@ -0,0 +1,770 @@
+"""Background jobs for report OCR + AI simplification.
+
+``POST /api/reports/jobs`` stores the upload in a per-job work directory,
+inserts a ``report_jobs`` row and returns immediately. A small in-process
+thread pool then runs the stages in order:
+
+    render   PDF pages -> native text (page-N.txt) or, without a usable text layer, PNG for OCR
+    ocr      Tesseract on the rendered pages (text-layer pages pass through) -> ocr_text / ocr_confidence
+    classify medical / non-medical verdict (in combined mode the explanation comes back too)
+    explain  Gemini explanation (skipped when classify already produced it)
+    save     insert into medical_reports -> report_id
+
+After each stage its output and timing are written to the job row, so a job
+that failed (e.g. Gemini overloaded during ``explain``) can be retried and
+picks up at the failed stage instead of re-running render/OCR.
+
+Jobs are claimed with a conditional ``UPDATE ... WHERE status = 'queued'``,
+so several gunicorn workers can share the table; queued or stale running
+jobs are resumed at startup. A claim bumps ``attempts`` and every later write
+of that run is fenced on ``status = 'running' AND attempts = <claimed>``, so a
+run that was cancelled or taken over can't save a second report or overwrite
+the newer run's progress.
+
+Cancelled jobs are final and their work directory is deleted as soon as no
+run uses it. Failed jobs keep theirs for a retry until
+``REPORT_JOB_WORKDIR_TTL_SECONDS`` after they finished.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from config import Config
+from utils.database import execute_query, get_db_connection
+from utils.gemini_utils import NotMedicalDocumentError, classify_report, explain_report
+from utils.ocr_pool import OCRCancelledError, get_ocr_pool
+from utils.pdf_utils import PAGE_OCR, PAGE_TEXT_LAYER, combine_page_results, extract_pdf_pages
+from utils.report_cache import VERDICT_MEDICAL, VERDICT_NOT_MEDICAL, digest_key, get_report_cache
+from utils.upload_spool import SpooledUpload, file_sha256, map_file
+
+
+logger = logging.getLogger("pocketcare.jobs")
+
+STAGES = ("render", "ocr", "classify", "explain", "save")
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+STATUS_REJECTED = "rejected"  # classified as non-medical; retrying would not change the verdict
+STATUS_CANCELLED = "cancelled"
+TERMINAL_STATUSES = frozenset({STATUS_SUCCEEDED, STATUS_FAILED, STATUS_REJECTED, STATUS_CANCELLED})
+RETRYABLE_STATUSES = frozenset({STATUS_FAILED})  # cancelled jobs are final; their files are deleted
+
+OCR_FAILED_PLACEHOLDER = "[OCR failed to extract text, but AI analysis may still succeed]"
+
+_MIME_TYPES = {"pdf": "application/pdf", "png": "image/png"}
+
+
+def mime_type_for(ext: str) -> str:
+    return _MIME_TYPES.get(ext, "image/jpeg")
+
+
+def load_stages(job: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    raw = job.get("stages")
+    if isinstance(raw, dict):
+        return raw
+    try:
+        return json.loads(raw) if raw else {}
+    except ValueError:
+        return {}
+
+
+# ---------------------------------------------------------------------------
+# Persistence
+# ---------------------------------------------------------------------------
+
+_JOB_FIELDS = frozenset(
+    {
+        "status",
+        "stage",
+        "stages",
+        "error",
+        "page_count",
+        "ocr_text",
+        "ocr_confidence",
+        "explanation",
+        "report_id",
+    }
+)
+
+
+class ReportJobStore:
+    """``report_jobs`` table access."""
+
+    def create(self, *, user_id: int, file_name: str, file_ext: str, work_dir: str, model: str) -> int:
+        return execute_query(
+            """
+            INSERT INTO report_jobs (user_id, file_name, file_ext, work_dir, model, status, stages)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """,
+            (user_id, file_name, file_ext, work_dir, model, STATUS_QUEUED, "{}"),
+            commit=True,
+        )
+
+    def get(self, job_id: int, *, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        sql = "SELECT * FROM report_jobs WHERE id = %s"
+        params: tuple = (job_id,)
+        if user_id is not None:
+            sql += " AND user_id = %s"
+            params += (user_id,)
+        return execute_query(sql + " LIMIT 1", params, fetch_one=True)
+
+    @contextmanager
+    def _transaction(self):
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                yield cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _conditional_update(self, sql: str, params: tuple) -> bool:
+        with self._transaction() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount == 1
+
+    def claim(self, job_id: int) -> Optional[int]:
+        """Move a queued job to running and return the attempt number this worker now owns.
+
+        None if another worker got it first. Every later write of the run is
+        fenced on that attempt, so a run that lost the job can't touch it.
+        """
+
+        with self._transaction() as cursor:
+            cursor.execute(
+                """
+                UPDATE report_jobs
+                SET status = %s, attempts = attempts + 1, error = NULL
+                WHERE id = %s AND status = %s
+                """,
+                (STATUS_RUNNING, job_id, STATUS_QUEUED),
+            )
+            if cursor.rowcount != 1:
+                return None
+            cursor.execute("SELECT attempts FROM report_jobs WHERE id = %s", (job_id,))
+            return int(cursor.fetchone()["attempts"])
+
+    def owns(self, job_id: int, attempt: int) -> bool:
+        """True while ``attempt`` is still the running attempt (not cancelled or taken over)."""
+
+        row = execute_query(
+            "SELECT 1 AS owned FROM report_jobs WHERE id = %s AND status = %s AND attempts = %s LIMIT 1",
+            (job_id, STATUS_RUNNING, attempt),
+            fetch_one=True,
+        )
+        return bool(row)
+
+    def requeue(self, job_id: int, *, user_id: int) -> bool:
+        """Put a failed job back in the queue (finished stages are kept).
+
+        Cancelled jobs are final: the cancelled run may still be inside a stage
+        that can't be interrupted, and its work directory is deleted once it
+        stops. Failed jobs whose work directory was swept are refused too.
+        """
+
+        return self._conditional_update(
+            """
+            UPDATE report_jobs
+            SET status = %s, error = NULL, finished_at = NULL
+            WHERE id = %s AND user_id = %s AND status = %s AND work_dir <> ''
+            """,
+            (STATUS_QUEUED, job_id, user_id, STATUS_FAILED),
+        )
+
+    def cancel(self, job_id: int, *, user_id: int) -> Optional[str]:
+        """Mark a queued/running job cancelled and return the status it had (None if neither).
+
+        A running stage notices at its next check.
+        """
+
+        for previous in (STATUS_QUEUED, STATUS_RUNNING):
+            if self._conditional_update(
+                """
+                UPDATE report_jobs
+                SET status = %s, finished_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND user_id = %s AND status = %s
+                """,
+                (STATUS_CANCELLED, job_id, user_id, previous),
+            ):
+                return previous
+        return None
+
+    def status(self, job_id: int) -> Optional[str]:
+        row = execute_query("SELECT status FROM report_jobs WHERE id = %s LIMIT 1", (job_id,), fetch_one=True)
+        return row["status"] if row else None
+
+    def update(self, job_id: int, *, attempt: int, finished: bool = False, **fields) -> None:
+        """Write stage/status fields, but only while ``attempt`` still owns the running job."""
+
+        unknown = set(fields) - _JOB_FIELDS
+        if unknown:
+            raise ValueError(f"Unknown report_jobs fields: {sorted(unknown)}")
+        if "stages" in fields and not isinstance(fields["stages"], str):
+            fields["stages"] = json.dumps(fields["stages"])
+        assignments = [f"{name} = %s" for name in fields]
+        if finished:
+            assignments.append("finished_at = CURRENT_TIMESTAMP")
+        execute_query(
+            f"UPDATE report_jobs SET {', '.join(assignments)} WHERE id = %s AND status = %s AND attempts = %s",
+            (*fields.values(), job_id, STATUS_RUNNING, attempt),
+            commit=True,
+        )
+
+    def clear_work_dir(self, job_id: int, *, work_dir: str, attempt: Optional[int] = None, stages=None) -> bool:
+        """Forget the work directory of a cancelled/failed job; True means the caller deletes it.
+
+        ``attempt`` restricts this to the run that was cancelled, which also
+        records its final ``stages``.
+        """
+
+        assignments, params = ["work_dir = ''"], []
+        if stages is not None:
+            assignments.append("stages = %s")
+            params.append(stages if isinstance(stages, str) else json.dumps(stages))
+        sql = f"UPDATE report_jobs SET {', '.join(assignments)} WHERE id = %s AND work_dir = %s AND status IN (%s, %s)"
+        params += [job_id, work_dir, STATUS_FAILED, STATUS_CANCELLED]
+        if attempt is not None:
+            sql += " AND attempts = %s"
+            params.append(attempt)
+        return self._conditional_update(sql, tuple(params))
+
+    def expired_work_dirs(self, *, ttl_seconds: int, limit: int = 200) -> list:
+        """Failed/cancelled jobs that finished more than ``ttl_seconds`` ago and still hold files."""
+
+        return execute_query(
+            """
+            SELECT id, work_dir FROM report_jobs
+            WHERE status IN (%s, %s) AND work_dir <> ''
+              AND finished_at < (CURRENT_TIMESTAMP - INTERVAL %s SECOND)
+            ORDER BY finished_at
+            LIMIT %s
+            """,
+            (STATUS_FAILED, STATUS_CANCELLED, int(ttl_seconds), int(limit)),
+            fetch_all=True,
+        ) or []
+
+    def resumable_ids(self, *, stale_seconds: int) -> list:
+        """Queued jobs, plus running jobs whose worker stopped updating them (crash/restart)."""
+
+        execute_query(
+            """
+            UPDATE report_jobs
+            SET status = %s
+            WHERE status = %s AND updated_at < (CURRENT_TIMESTAMP - INTERVAL %s SECOND)
+            """,
+            (STATUS_QUEUED, STATUS_RUNNING, int(stale_seconds)),
+            commit=True,
+        )
+        rows = execute_query(
+            "SELECT id FROM report_jobs WHERE status = %s ORDER BY created_at, id",
+            (STATUS_QUEUED,),
+            fetch_all=True,
+        )
+        return [int(r["id"]) for r in rows or []]
+
+    def insert_report(
+        self, job_id: int, *, attempt: int, user_id: int, file_name: str, ocr_text: str, explanation: str
+    ) -> Optional[int]:
+        """Insert the medical_reports row and link it, atomically with the ownership check.
+
+        Returns None when ``attempt`` no longer owns the job. A report already
+        linked by an earlier attempt that crashed before finishing is reused.
+        """
+
+        with self._transaction() as cursor:
+            cursor.execute(
+                "SELECT status, attempts, report_id FROM report_jobs WHERE id = %s FOR UPDATE",
+                (job_id,),
+            )
+            row = cursor.fetchone()
+            if not row or row["status"] != STATUS_RUNNING or int(row["attempts"]) != attempt:
+                return None
+            if row["report_id"]:
+                return int(row["report_id"])
+            cursor.execute(
+                """
+                INSERT INTO medical_reports (user_id, file_name, ocr_text, ai_interpretation, report_type)
+                VALUES (%s, %s, %s, %s, %s)
+                """,
+                (user_id, file_name, ocr_text, explanation, None),
+            )
+            report_id = int(cursor.lastrowid)
+            cursor.execute("UPDATE report_jobs SET report_id = %s WHERE id = %s", (report_id, job_id))
+            return report_id
+
+
+# ---------------------------------------------------------------------------
+# Stages
+# ---------------------------------------------------------------------------
+
+
+class _JobContext:
+    """What a stage sees: the job row (with earlier stages' outputs), its work dir and store."""
+
+    def __init__(
+        self,
+        job: Dict[str, Any],
+        attempt: int,
+        stages: Dict[str, Dict[str, Any]],
+        store: ReportJobStore,
+        report_progress: Callable[[Dict[str, Any]], None],
+        cancel_event: threading.Event,
+    ):
+        self.job = job
+        self.attempt = attempt
+        self.store = store
+        self.cancel_event = cancel_event
+        self.stages = stages
+        self.work_dir = Path(job["work_dir"])
+        self.ext = job["file_ext"]
+        self.model = job["model"]
+        self.report_progress = report_progress
+
+    def value(self, name: str):
+        return self.job.get(name)
+
+    @property
+    def upload_path(self) -> Path:
+        return self.work_dir / f"upload.{self.ext}"
+
+    def page_paths(self):
+        """Per-page files in page order: ``page-NNNN.txt`` (text layer) or ``.png`` (needs OCR)."""
+
+        if self.ext != "pdf":
+            return [self.upload_path]
+        return sorted(self.work_dir.glob("page-*.*"))
+
+
+def _stage_render(ctx: _JobContext):
+    if ctx.ext != "pdf":
+        return {"page_count": 1}, {"pages": 1, "methods": [PAGE_OCR]}
+
+    for old in ctx.work_dir.glob("page-*.*"):
+        old.unlink()
+    methods = []
+    for idx, (method, payload) in enumerate(extract_pdf_pages(ctx.upload_path)):
+        if method == PAGE_TEXT_LAYER:
+            (ctx.work_dir / f"page-{idx + 1:04d}.txt").write_text(payload, encoding="utf-8")
+        else:
+            (ctx.work_dir / f"page-{idx + 1:04d}.png").write_bytes(payload)
+        methods.append(method)
+        ctx.report_progress({"pages": len(methods)})
+    return {"page_count": len(methods)}, {"pages": len(methods), "methods": methods}
+
+
+def _stage_ocr(ctx: _JobContext):
+    paths = ctx.page_paths()
+    text_pages = {idx: (path.read_text(encoding="utf-8"), None) for idx, path in enumerate(paths) if path.suffix == ".txt"}
+    ocr_indexes = [idx for idx in range(len(paths)) if idx not in text_pages]
+
+    results = get_ocr_pool().map_pages(
+        # Workers open the page files themselves; no image bytes are pickled.
+        (str(paths[idx]) for idx in ocr_indexes),
+        cancel_event=ctx.cancel_event,
+        on_page=lambda done: ctx.report_progress({"pages_done": done, "pages_total": len(ocr_indexes)}),
+    )
+    page_results = {**text_pages, **dict(zip(ocr_indexes, results))}
+    ordered = [page_results[idx] for idx in range(len(paths))]
+
+    if ctx.ext == "pdf":
+        text, confidence = combine_page_results(ordered)
+    else:
+        text, confidence = ordered[0] if ordered else ("", None)
+
+    # Keep OCR for database/search even if it's imperfect.
+    if not (text or "").strip():
+        text, confidence = OCR_FAILED_PLACEHOLDER, None
+    info = {"pages_done": len(ocr_indexes), "pages_total": len(ocr_indexes), "text_layer_pages": len(text_pages)}
+    return {"ocr_text": text, "ocr_confidence": confidence}, info
+
+
+def _ocr_usable(ctx: _JobContext) -> bool:
+    text = ctx.value("ocr_text") or ""
+    return bool(text.strip()) and not text.startswith("[OCR failed")
+
+
+def _stage_classify(ctx: _JobContext):
+    # Prefer the original file (layout-aware); fall back to OCR text if the
+    # multimodal request fails for reasons other than the verdict itself.
+    try:
+        with map_file(ctx.upload_path) as file_bytes:
+            explanation = classify_report(model=ctx.model, file_bytes=file_bytes, mime_type=mime_type_for(ctx.ext))
+        source = "file"
+    except NotMedicalDocumentError:
+        raise
+    except Exception:
+        if not _ocr_usable(ctx):
+            raise
+        explanation = classify_report(model=ctx.model, ocr_text=ctx.value("ocr_text"))
+        source = "ocr"
+
+    fields = {"explanation": explanation} if explanation else {}
+    return fields, {"source": source, "combined": bool(explanation)}
+
+
+def _stage_explain(ctx: _JobContext):
+    if ctx.value("explanation"):
+        return {}, {"skipped": True}
+
+    source = ctx.stages.get("classify", {}).get("source", "file")
+    if source == "file":
+        try:
+            with map_file(ctx.upload_path) as file_bytes:
+                explanation = explain_report(model=ctx.model, file_bytes=file_bytes, mime_type=mime_type_for(ctx.ext))
+            return {"explanation": explanation}, {"source": "file"}
+        except Exception:
+            if not _ocr_usable(ctx):
+                raise
+    return {"explanation": explain_report(model=ctx.model, ocr_text=ctx.value("ocr_text"))}, {"source": "ocr"}
+
+
+class _RunStoppedError(Exception):
+    """The run no longer owns its job (cancelled, or requeued as stale and claimed again)."""
+
+
+def _stage_save(ctx: _JobContext):
+    report_id = ctx.store.insert_report(
+        ctx.job["id"],
+        attempt=ctx.attempt,
+        user_id=int(ctx.value("user_id")),
+        file_name=ctx.value("file_name"),
+        ocr_text=ctx.value("ocr_text") or "",
+        explanation=ctx.value("explanation") or "",
+    )
+    if report_id is None:
+        raise _RunStoppedError("job was cancelled or taken over before save")
+    return {"report_id": int(report_id)}, {}
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+
+class ReportJobRunner:
+    """Runs report jobs on a local thread pool (OCR/Gemini are I/O or subprocess bound)."""
+
+    def __init__(self, *, store: Optional[ReportJobStore] = None, workers: int = 2, base_dir: Optional[str] = None):
+        self.store = store or ReportJobStore()
+        self.base_dir = Path(base_dir or Config.REPORT_JOB_DIR)
+        self.pid = os.getpid()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="report-job")
+        self._cancel_lock = threading.Lock()
+        self._cancel_events: Dict[Tuple[int, int], threading.Event] = {}
+
+    # --- submission ---
+
+    def create(self, *, user_id: int, file_name: str, file_ext: str, data: Union[bytes, SpooledUpload], model: str) -> int:
+        """Store the upload and insert the job row; call ``submit`` to start it.
+
+        A spooled upload is moved into the job directory rather than copied.
+        """
+
+        work_dir = self.base_dir / uuid.uuid4().hex
+        work_dir.mkdir(parents=True, exist_ok=True)
+        upload_path = work_dir / f"upload.{file_ext}"
+        if isinstance(data, SpooledUpload):
+            data.save_to(upload_path)
+        else:
+            upload_path.write_bytes(data)
+        try:
+            return int(
+                self.store.create(user_id=user_id, file_name=file_name, file_ext=file_ext, work_dir=str(work_dir), model=model)
+            )
+        except Exception:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+
+    def submit(self, job_id: int) -> None:
+        self._executor.submit(self._run_logged, job_id)
+
+    def resume_pending(self, *, stale_seconds: Optional[int] = None) -> int:
+        stale = Config.REPORT_JOB_STALE_SECONDS if stale_seconds is None else stale_seconds
+        ids = self.store.resumable_ids(stale_seconds=stale)
+        for job_id in ids:
+            self.submit(job_id)
+        return len(ids)
+
+    def cancel(self, job_id: int, *, user_id: int) -> bool:
+        """Cancel a queued/running job. In-flight OCR in this process stops at once;
+        elsewhere the job stops before its next stage.
+
+        A queued job's work directory is deleted here; a running job's by the
+        run itself once it has stopped using it.
+        """
+
+        previous = self.store.cancel(job_id, user_id=user_id)
+        if previous is None:
+            return False
+        if previous == STATUS_QUEUED:
+            job = self.store.get(job_id)
+            if job:
+                self._discard(job)
+        with self._cancel_lock:
+            events = [event for (cancelled_id, _), event in self._cancel_events.items() if cancelled_id == job_id]
+        for event in events:
+            event.set()
+        return True
+
+    def sweep_work_dirs(self, *, ttl_seconds: Optional[int] = None) -> int:
+        """Delete work directories of failed/cancelled jobs nobody retried within the TTL."""
+
+        ttl = Config.REPORT_JOB_WORKDIR_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        swept = 0
+        for row in self.store.expired_work_dirs(ttl_seconds=ttl):
+            if self._discard(row):
+                swept += 1
+        return swept
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+    # --- execution ---
+
+    def _run_logged(self, job_id: int) -> None:
+        try:
+            self.run(job_id)
+        except Exception:
+            logger.exception("report job %s crashed", job_id)
+
+    def run(self, job_id: int) -> Optional[str]:
+        """Claim and run a job to completion or the first failing stage; returns the final status."""
+
+        attempt = self.store.claim(job_id)
+        if not attempt:
+            return None
+        key = (job_id, attempt)
+        event = threading.Event()
+        with self._cancel_lock:
+            self._cancel_events[key] = event
+        try:
+            return self._run_claimed(job_id, attempt, event)
+        finally:
+            with self._cancel_lock:
+                self._cancel_events.pop(key, None)
+
+    def _stopped(self, job_id: int, attempt: int, event: threading.Event) -> bool:
+        return event.is_set() or not self.store.owns(job_id, attempt)
+
+    def _stop(self, job: Dict[str, Any], attempt: int, stages: Dict[str, Dict[str, Any]]) -> Optional[str]:
+        """End a run that lost its job. A cancelled job's files go now; a job
+        that was taken over by a newer attempt is left to that attempt."""
+
+        cancelled = self._discard(job, attempt=attempt, stages=stages)
+        return STATUS_CANCELLED if cancelled else None
+
+    def _run_claimed(self, job_id: int, attempt: int, event: threading.Event) -> Optional[str]:
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+
+        stages = load_stages(job)
+        self._apply_cached_result(job, attempt, stages)
+        if job.get("status") == STATUS_REJECTED:
+            return STATUS_REJECTED
+
+        def progress_for(name):
+            def report(info):
+                stages[name] = {"status": "running", **info}
+                self.store.update(job_id, attempt=attempt, stages=stages)
+
+            return report
+
+        for name in STAGES:
+            if stages.get(name, {}).get("status") == "done":
+                continue
+            if self._stopped(job_id, attempt, event):
+                return self._stop(job, attempt, stages)
+
+            stages[name] = {"status": "running"}
+            self.store.update(job_id, attempt=attempt, stage=name, stages=stages)
+
+            ctx = _JobContext(job, attempt, stages, self.store, progress_for(name), event)
+            started = time.perf_counter()
+            try:
+                fields, info = _STAGE_FUNCS[name](ctx)
+            except NotMedicalDocumentError as exc:
+                stages[name] = {"status": "failed", "ms": _elapsed_ms(started)}
+                self._remember(job, VERDICT_NOT_MEDICAL, reason=str(exc))
+                self.store.update(
+                    job_id, attempt=attempt, status=STATUS_REJECTED, stage=name, stages=stages, error=str(exc), finished=True
+                )
+                self._cleanup(job)
+                return STATUS_REJECTED
+            except Exception as exc:
+                if isinstance(exc, (OCRCancelledError, _RunStoppedError)) or self._stopped(job_id, attempt, event):
+                    stages[name] = {"status": "cancelled", "ms": _elapsed_ms(started)}
+                    return self._stop(job, attempt, stages)
+                logger.warning("report job %s failed in %s: %s", job_id, name, exc)
+                stages[name] = {"status": "failed", "ms": _elapsed_ms(started)}
+                self.store.update(
+                    job_id,
+                    attempt=attempt,
+                    status=STATUS_FAILED,
+                    stage=name,
+                    stages=stages,
+                    error=str(exc)[:2000],
+                    finished=True,
+                )
+                return STATUS_FAILED
+
+            job.update(fields)
+            stages[name] = {"status": "done", "ms": _elapsed_ms(started), **info}
+            self.store.update(job_id, attempt=attempt, stages=stages, **fields)
+
+            if name == "explain":
+                self._remember(job, VERDICT_MEDICAL)
+
+        self.store.update(job_id, attempt=attempt, status=STATUS_SUCCEEDED, stage=None, stages=stages, finished=True)
+        self._cleanup(job)
+        return STATUS_SUCCEEDED
+
+    # --- helpers ---
+
+    def _cache_key(self, job: Dict[str, Any]) -> Optional[str]:
+        try:
+            digest = file_sha256(Path(job["work_dir"]) / f"upload.{job['file_ext']}")
+        except OSError:
+            return None
+        return digest_key(digest, job["model"])
+
+    def _apply_cached_result(self, job: Dict[str, Any], attempt: int, stages: Dict[str, Dict[str, Any]]) -> None:
+        """Mark render..explain done from the report cache when this file was seen before."""
+
+        if any(stages.get(name, {}).get("status") == "done" for name in STAGES):
+            return
+        key = self._cache_key(job)
+        cached = get_report_cache().get(key) if key else None
+        if cached is None:
+            return
+
+        if cached.get("verdict") == VERDICT_NOT_MEDICAL:
+            reason = cached.get("reason") or ""
+            stages["classify"] = {"status": "failed", "cached": True}
+            self.store.update(
+                job["id"], attempt=attempt, status=STATUS_REJECTED, stage="classify", stages=stages, error=reason, finished=True
+            )
+            job["status"] = STATUS_REJECTED
+            self._cleanup(job)
+            return
+
+        fields = {
+            "ocr_text": cached.get("ocr_text") or "",
+            "ocr_confidence": cached.get("confidence"),
+            "explanation": cached.get("explanation") or "",
+        }
+        for name in ("render", "ocr", "classify", "explain"):
+            stages[name] = {"status": "done", "ms": 0, "cached": True}
+        job.update(fields)
+        self.store.update(job["id"], attempt=attempt, stages=stages, **fields)
+
+    def _remember(self, job: Dict[str, Any], verdict: str, *, reason: Optional[str] = None) -> None:
+        key = self._cache_key(job)
+        if not key:
+            return
+        if verdict == VERDICT_NOT_MEDICAL:
+            get_report_cache().put(key, {"verdict": verdict, "reason": reason})
+        else:
+            get_report_cache().put(
+                key,
+                {
+                    "verdict": verdict,
+                    "ocr_text": job.get("ocr_text"),
+                    "confidence": job.get("ocr_confidence"),
+                    "explanation": job.get("explanation"),
+                },
+            )
+
+    def _cleanup(self, job: Dict[str, Any]) -> None:
+        # Failed jobs keep their work directory so a retry can resume, until
+        # sweep_work_dirs expires it.
+        if job.get("work_dir"):
+            shutil.rmtree(job["work_dir"], ignore_errors=True)
+
+    def _discard(self, job: Dict[str, Any], *, attempt: Optional[int] = None, stages=None) -> bool:
+        """Delete the files of a cancelled/failed job once the row no longer points at them."""
+
+        work_dir = job.get("work_dir")
+        if not work_dir or not self.store.clear_work_dir(job["id"], work_dir=work_dir, attempt=attempt, stages=stages):
+            return False
+        shutil.rmtree(work_dir, ignore_errors=True)
+        return True
+
+
+_STAGE_FUNCS = {
+    "render": _stage_render,
+    "ocr": _stage_ocr,
+    "classify": _stage_classify,
+    "explain": _stage_explain,
+    "save": _stage_save,
+}
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000.0, 1)
+
+
+_runner: Optional[ReportJobRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> ReportJobRunner:
+    """Return the process-wide runner (recreated after fork)."""
+
+    global _runner
+    runner = _runner
+    if runner is not None and runner.pid == os.getpid():
+        return runner
+    with _runner_lock:
+        if _runner is None or _runner.pid != os.getpid():
+            _runner = ReportJobRunner(workers=Config.REPORT_JOB_WORKERS)
+        return _runner
+
+
+def init_app(app) -> None:
+    """Resume queued/stale jobs and start the work-dir sweep once the app starts."""
+
+    if Config.REPORT_JOB_WORKERS <= 0 or app.config.get("TESTING"):
+        return
+
+    def resume():
+        try:
+            count = get_job_runner().resume_pending()
+            if count:
+                logger.info("resumed %d report job(s)", count)
+        except Exception as exc:
+            logger.warning("could not resume report jobs: %s", exc)
+
+    threading.Thread(target=resume, name="report-job-resume", daemon=True).start()
+
+    ttl = Config.REPORT_JOB_WORKDIR_TTL_SECONDS
+    if ttl <= 0:
+        return
+
+    def sweep():
+        while True:
+            try:
+                count = get_job_runner().sweep_work_dirs(ttl_seconds=ttl)
+                if count:
+                    logger.info("removed %d expired report job work dir(s)", count)
+            except Exception as exc:
+                logger.warning("could not sweep report job work dirs: %s", exc)
+            time.sleep(min(max(ttl // 4, 60), 3600))
+
+    threading.Thread(target=sweep, name="report-job-sweep", daemon=True).start()
@@ -0,0 +1,132 @@
+"""Cached view of which tables and columns exist in the connected database.
+
+Deployments may run a partially-migrated schema (an older ``doctors`` table,
+no ``emergency_types``, ...). Routes used to discover this per request, by
+running the richest query and retrying simpler variants when MySQL raised
+"unknown column" / "doesn't exist", or by querying
+``INFORMATION_SCHEMA.COLUMNS`` on every call. ``SchemaRegistry`` loads every
+table's columns with one ``INFORMATION_SCHEMA`` query at startup (see
+``init_app``), refreshes it every ``SCHEMA_REGISTRY_REFRESH_SECONDS``, and
+lets callers pick the right query variant up front. Call ``refresh()`` when a
+query still hits a schema error (e.g. a migration ran meanwhile).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, FrozenSet, Optional
+
+from config import Config
+from utils.database import execute_query
+
+
+logger = logging.getLogger("pocketcare.schema")
+
+# Retry a failed load this soon rather than waiting for the full refresh interval.
+_RETRY_SECONDS = 30.0
+
+
+class SchemaRegistry:
+    """Table -> column names of the current database, reloaded periodically."""
+
+    def __init__(self, *, refresh_seconds: float = 300.0):
+        self.pid = os.getpid()
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._tables: Optional[Dict[str, FrozenSet[str]]] = None
+        self._checked_at: Optional[float] = None
+
+    def refresh(self) -> bool:
+        """Reload now; returns False (keeping what was loaded before) if the lookup fails."""
+
+        with self._lock:
+            return self._load()
+
+    def _load(self) -> bool:
+        self._checked_at = time.monotonic()
+        try:
+            rows = execute_query(
+                """
+                SELECT TABLE_NAME, COLUMN_NAME
+                FROM INFORMATION_SCHEMA.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE()
+                """,
+                fetch_all=True,
+            ) or []
+        except Exception:
+            logger.warning("could not read INFORMATION_SCHEMA; assuming the full schema", exc_info=True)
+            return False
+        tables: Dict[str, set] = {}
+        for row in rows:
+            table, column = row.get('TABLE_NAME'), row.get('COLUMN_NAME')
+            if table and column:
+                tables.setdefault(table.lower(), set()).add(column.lower())
+        self._tables = {table: frozenset(columns) for table, columns in tables.items()}
+        logger.debug("schema registry loaded: %d tables", len(self._tables))
+        return True
+
+    def _current(self) -> Optional[Dict[str, FrozenSet[str]]]:
+        checked_at = self._checked_at
+        interval = self.refresh_seconds if self._tables is not None else _RETRY_SECONDS
+        if checked_at is None or time.monotonic() - checked_at >= interval:
+            with self._lock:
+                checked_at = self._checked_at
+                if checked_at is None or time.monotonic() - checked_at >= interval:
+                    self._load()
+        return self._tables
+
+    @property
+    def known(self) -> bool:
+        """True once the schema has been read successfully."""
+
+        return self._current() is not None
+
+    def columns(self, table: str) -> Optional[FrozenSet[str]]:
+        """Lowercased column names of ``table``: empty if the table is missing, None if the schema is unknown."""
+
+        tables = self._current()
+        if tables is None:
+            return None
+        return tables.get(table.lower(), frozenset())
+
+    def has_table(self, table: str) -> bool:
+        """Whether ``table`` exists (assumed True while the schema is unknown)."""
+
+        columns = self.columns(table)
+        return columns is None or bool(columns)
+
+    def has_columns(self, table: str, *columns: str) -> bool:
+        """Whether ``table`` exists with all ``columns`` (assumed True while the schema is unknown)."""
+
+        existing = self.columns(table)
+        if existing is None:
+            return True
+        return bool(existing) and all(column.lower() in existing for column in columns)
+
+
+_registry: Optional[SchemaRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_schema_registry() -> SchemaRegistry:
+    """Return the process-wide schema registry (recreated after fork)."""
+
+    global _registry
+    registry = _registry
+    if registry is not None and registry.pid == os.getpid():
+        return registry
+    with _registry_lock:
+        if _registry is None or _registry.pid != os.getpid():
+            _registry = SchemaRegistry(refresh_seconds=Config.SCHEMA_REGISTRY_REFRESH_SECONDS)
+        return _registry
+
+
+def init_app(app) -> None:
+    """Load the schema in the background once the app starts."""
+
+    if app.config.get("TESTING"):
+        return
+    threading.Thread(target=lambda: get_schema_registry().refresh(), name="schema-registry-load", daemon=True).start()
@@ -0,0 +1,370 @@
+"""Background escalation of unanswered SOS requests.
+
+The expanding visibility radius (``utils/sos_events.py``) used to be applied
+only when a hospital happened to poll or a stream re-checked. Nobody was
+told that a request had just come within reach of more hospitals.
+``SosEscalationScheduler`` runs one thread per worker that wakes at the next
+expansion tick (``SosEventHub.next_tick``), at a local create, or at least
+every ``SOS_STREAM_SYNC_SECONDS`` to pick up requests from other workers.
+On each pass it:
+
+- takes the pending requests that took an expansion step since the last
+  pass (new requests included) and computes one request x hospital distance
+  matrix for them, in chunks of ``matrix_rows`` rows;
+- finds, per hospital, the ring between the previous and the current
+  effective radius. A hospital with an open stream on this worker uses the
+  base radius it subscribed with (the widest, if it has several); others use
+  ``base_radius_km``. Steps only grow, so nothing is notified twice unless a
+  hospital reconnects with a different radius;
+- enqueues one notification per (request, hospital) on a bounded queue that
+  a dispatcher thread delivers to the registered handlers. The default
+  handler wakes the open SOS streams of the notified hospitals so they send
+  ``sos.created`` right away;
+- records the time to acknowledge (or resolve) each request that left the
+  pending set, how many escalation steps and hospitals it took, the delay
+  between a tick being due and its notifications, and the CPU time of every
+  pass. These are exposed under ``sos_escalation`` in ``/metrics``.
+
+Every worker runs its own scheduler and notifies only its own subscribers,
+so the metrics are per worker like the rest of ``/metrics``.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from config import Config
+from utils.geo_index import HospitalLocator, get_hospital_locator
+from utils.sos_events import (
+    BASE_RADIUS_KM_DEFAULT,
+    EXPAND_EVERY_SECONDS,
+    EXPAND_STEP_KM,
+    MAX_RADIUS_KM,
+    SosEventHub,
+    get_sos_hub,
+)
+
+
+logger = logging.getLogger("pocketcare.sos")
+
+# Histogram bucket upper bounds in seconds (last bucket is +Inf).
+LAG_BUCKETS_SECONDS = (0.5, 1, 2, 5, 10, 30, 60)
+ACK_BUCKETS_SECONDS = (30, 60, 120, 180, 300, 600, 900, 1800, 3600)
+
+_RECENT_OUTCOMES = 100
+
+Notification = Dict[str, Any]
+Handler = Callable[[List[Notification]], None]
+
+
+class EscalationMetrics:
+    """Thread-safe counters for scheduler passes, notifications and request outcomes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._passes = 0
+        self._pass_ms_total = 0.0
+        self._pass_ms_max = 0.0
+        self._cpu_ms_total = 0.0
+        self._matrix_cells = 0
+        self._enqueued = 0
+        self._dropped = 0
+        self._delivered = 0
+        self._lag_buckets = [0] * (len(LAG_BUCKETS_SECONDS) + 1)
+        self._ack_buckets = [0] * (len(ACK_BUCKETS_SECONDS) + 1)
+        self._ack_count = 0
+        self._ack_seconds_total = 0.0
+        self._ack_seconds_max = 0.0
+        self._unacknowledged = 0
+        self._recent: deque = deque(maxlen=_RECENT_OUTCOMES)
+
+    def record_pass(self, *, duration_ms: float, cpu_ms: float, matrix_cells: int, enqueued: int, dropped: int) -> None:
+        with self._lock:
+            self._passes += 1
+            self._pass_ms_total += duration_ms
+            self._pass_ms_max = max(self._pass_ms_max, duration_ms)
+            self._cpu_ms_total += cpu_ms
+            self._matrix_cells += matrix_cells
+            self._enqueued += enqueued
+            self._dropped += dropped
+
+    def record_lag(self, seconds: float) -> None:
+        """Delay between an expansion tick (or a request's creation) being due and its notifications."""
+
+        with self._lock:
+            self._lag_buckets[bisect_left(LAG_BUCKETS_SECONDS, max(0.0, seconds))] += 1
+
+    def record_delivered(self, count: int) -> None:
+        with self._lock:
+            self._delivered += count
+
+    def record_outcome(
+        self,
+        request_id: int,
+        *,
+        status: str,
+        open_seconds: float,
+        steps: int,
+        hospitals_notified: int,
+    ) -> None:
+        with self._lock:
+            if status == 'acknowledged':
+                self._ack_count += 1
+                self._ack_seconds_total += open_seconds
+                self._ack_seconds_max = max(self._ack_seconds_max, open_seconds)
+                self._ack_buckets[bisect_left(ACK_BUCKETS_SECONDS, open_seconds)] += 1
+            else:
+                self._unacknowledged += 1
+            self._recent.append(
+                {
+                    'request_id': request_id,
+                    'status': status,
+                    'open_seconds': round(open_seconds, 1),
+                    'steps': steps,
+                    'hospitals_notified': hospitals_notified,
+                }
+            )
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'passes': self._passes,
+                'pass_ms_avg': round(self._pass_ms_total / self._passes, 3) if self._passes else 0.0,
+                'pass_ms_max': round(self._pass_ms_max, 3),
+                'cpu_ms_total': round(self._cpu_ms_total, 3),
+                'matrix_cells': self._matrix_cells,
+                'notifications': {'enqueued': self._enqueued, 'dropped': self._dropped, 'delivered': self._delivered},
+                'escalation_lag_seconds': {'buckets': list(LAG_BUCKETS_SECONDS), 'counts': list(self._lag_buckets)},
+                'time_to_acknowledge_seconds': {
+                    'count': self._ack_count,
+                    'avg': round(self._ack_seconds_total / self._ack_count, 1) if self._ack_count else None,
+                    'max': round(self._ack_seconds_max, 1) if self._ack_count else None,
+                    'buckets': list(ACK_BUCKETS_SECONDS),
+                    'counts': list(self._ack_buckets),
+                },
+                'closed_without_acknowledgement': self._unacknowledged,
+                'recent': list(self._recent),
+            }
+
+
+class SosEscalationScheduler:
+    """Notifies hospitals as pending SOS requests come within their radius."""
+
+    def __init__(
+        self,
+        hub: SosEventHub,
+        locator: HospitalLocator,
+        *,
+        base_radius_km: float = BASE_RADIUS_KM_DEFAULT,
+        queue_size: int = 1000,
+        matrix_rows: int = 256,
+    ):
+        self.pid = os.getpid()
+        self.hub = hub
+        self.locator = locator
+        self.base_radius_km = base_radius_km
+        self.matrix_rows = max(1, matrix_rows)
+        self.notifications: "queue.Queue[Notification]" = queue.Queue(maxsize=max(1, queue_size))
+        self.metrics = EscalationMetrics()
+        self._handlers: List[Handler] = [self._wake_streams]
+        self._tracked: Dict[int, Dict[str, Any]] = {}  # only touched by the scheduling thread
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._start_lock = threading.Lock()
+
+    def add_handler(self, handler: Handler) -> None:
+        """Also deliver notification batches to ``handler`` (called on the dispatcher thread)."""
+
+        self._handlers.append(handler)
+
+    # --- scheduling ---
+
+    def run_once(self, now: Optional[datetime] = None) -> int:
+        """One pass over the pending requests; returns the number of notifications enqueued."""
+
+        started = time.perf_counter()
+        cpu_started = time.thread_time()
+        now = now or datetime.now()
+        if not self.hub.ensure_synced() or not self.locator.available():
+            return 0
+
+        pending = self.hub.escalation_snapshot(now)
+        grown = []  # (request id, lat, lng, steps, previous steps)
+        for request_id, lat, lng, created_at, steps in pending:
+            state = self._tracked.get(request_id)
+            if state is None:
+                state = self._tracked[request_id] = {
+                    'created_at': created_at or now,
+                    'steps': -1,  # not matched against any hospital yet
+                    'notified': 0,
+                }
+            if steps > state['steps']:
+                grown.append((request_id, lat, lng, steps, state['steps']))
+                # Due when created (first pass) or when the latest tick fired.
+                due = state['created_at'] + timedelta(seconds=EXPAND_EVERY_SECONDS * steps)
+                self.metrics.record_lag((now - due).total_seconds())
+                state['steps'] = steps
+
+        still_pending = {request_id for request_id, *_ in pending}
+        for request_id in [r for r in self._tracked if r not in still_pending]:
+            self._finish(request_id, now)
+
+        enqueued = dropped = cells = 0
+        subscribed = self.hub.subscriber_radii() if grown else {}
+        for offset in range(0, len(grown), self.matrix_rows):
+            chunk = grown[offset: offset + self.matrix_rows]
+            hospital_ids, distances = self.locator.distance_matrix([r[1] for r in chunk], [r[2] for r in chunk])
+            if not len(hospital_ids):
+                break
+            cells += distances.size
+            base = np.array([subscribed.get(int(h), self.base_radius_km) for h in hospital_ids])[None, :]
+            steps = np.array([r[3] for r in chunk])[:, None]
+            previous_steps = np.array([r[4] for r in chunk])[:, None]
+            radius = np.minimum(base + EXPAND_STEP_KM * steps, MAX_RADIUS_KM)
+            previous = np.where(previous_steps < 0, -1.0, np.minimum(base + EXPAND_STEP_KM * previous_steps, MAX_RADIUS_KM))
+            rows, cols = np.nonzero((distances <= radius) & (distances > previous))
+            for row, col in zip(rows.tolist(), cols.tolist()):
+                request_id = chunk[row][0]
+                notification = {
+                    'request_id': request_id,
+                    'hospital_id': int(hospital_ids[col]),
+                    'distance_km': round(float(distances[row, col]), 3),
+                    'radius_km': float(radius[row, col]),
+                    'steps': chunk[row][3],
+                    'enqueued_at': now,
+                }
+                try:
+                    self.notifications.put_nowait(notification)
+                except queue.Full:
+                    dropped += 1
+                    continue
+                self._tracked[request_id]['notified'] += 1
+                enqueued += 1
+
+        if dropped:
+            logger.warning("SOS notification queue full: dropped %d notification(s)", dropped)
+        self.metrics.record_pass(
+            duration_ms=(time.perf_counter() - started) * 1000.0,
+            cpu_ms=(time.thread_time() - cpu_started) * 1000.0,
+            matrix_cells=cells,
+            enqueued=enqueued,
+            dropped=dropped,
+        )
+        return enqueued
+
+    def _finish(self, request_id: int, now: datetime) -> None:
+        state = self._tracked.pop(request_id)
+        outcome = self.hub.outcome(request_id) or {}
+        status = outcome.get('status') or 'resolved'
+        closed_at = (self.hub.acknowledged_at(request_id) if status == 'acknowledged' else None) or now
+        self.metrics.record_outcome(
+            request_id,
+            status=status,
+            open_seconds=max(0.0, (closed_at - state['created_at']).total_seconds()),
+            steps=state['steps'],
+            hospitals_notified=state['notified'],
+        )
+
+    def _schedule_loop(self) -> None:
+        hub = self.hub
+        while not self._stop.is_set():
+            version = hub.version
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("SOS escalation pass failed")
+            timeout = hub.sync_seconds
+            next_tick = hub.next_tick()
+            if next_tick is not None:
+                timeout = min(timeout, (next_tick - datetime.now()).total_seconds())
+            hub.wait(version, max(0.05, timeout))
+
+    # --- delivery ---
+
+    def _wake_streams(self, batch: List[Notification]) -> None:
+        for request_id in sorted({n['request_id'] for n in batch}):
+            logger.info("SOS #%d escalated to %d hospital(s)", request_id, sum(1 for n in batch if n['request_id'] == request_id))
+        self.hub.wake_hospitals(n['hospital_id'] for n in batch)
+
+    def dispatch(self, timeout: float = 1.0) -> int:
+        """Deliver queued notifications in one batch; returns how many."""
+
+        try:
+            batch = [self.notifications.get(timeout=timeout)]
+        except queue.Empty:
+            return 0
+        while True:
+            try:
+                batch.append(self.notifications.get_nowait())
+            except queue.Empty:
+                break
+        for handler in list(self._handlers):
+            try:
+                handler(batch)
+            except Exception:
+                logger.exception("SOS notification handler failed")
+        self.metrics.record_delivered(len(batch))
+        return len(batch)
+
+    def _dispatch_loop(self) -> None:
+        while not self._stop.is_set():
+            self.dispatch()
+
+    # --- lifecycle ---
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for name, target in (("sos-escalation", self._schedule_loop), ("sos-notify", self._dispatch_loop)):
+                thread = threading.Thread(target=target, name=name, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        with self._start_lock:
+            self._stop.set()
+            self.hub.wake_subscribers()
+            for thread in self._threads:
+                thread.join(timeout)
+            self._threads = []
+
+
+_scheduler: Optional[SosEscalationScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_escalation_scheduler() -> SosEscalationScheduler:
+    """Return the process-wide escalation scheduler (recreated after fork; not started)."""
+
+    global _scheduler
+    scheduler = _scheduler
+    if scheduler is not None and scheduler.pid == os.getpid():
+        return scheduler
+    with _scheduler_lock:
+        if _scheduler is None or _scheduler.pid != os.getpid():
+            _scheduler = SosEscalationScheduler(
+                get_sos_hub(),
+                get_hospital_locator(),
+                queue_size=Config.SOS_ESCALATION_QUEUE_SIZE,
+            )
+        return _scheduler
+
+
+def init_app(app) -> None:
+    """Start the scheduler threads once the app starts."""
+
+    if not Config.SOS_ESCALATION_ENABLED or app.config.get("TESTING"):
+        return
+    get_escalation_scheduler().start()
@@ -0,0 +1,540 @@
+"""In-memory registry and push delivery of open SOS requests.
+
+Hospital dashboards used to poll ``/hospital/emergency/requests``, and every
+poll evaluated the expanding-radius rule in MySQL (``TIMESTAMPDIFF`` plus
+haversine trig on each pending row). Instead:
+
+- ``SosEventHub`` keeps this worker's open requests in a ``GeoGridIndex``
+  keyed by request id. Each request's radius expansion step is advanced from
+  a min-heap of tick times, once per ``EXPAND_EVERY_SECONDS`` tick, rather
+  than recomputed on every query. A hospital query looks only at the grid
+  cells within ``MAX_RADIUS_KM`` and compares each candidate's distance with
+  ``min(base + steps * EXPAND_STEP_KM, MAX_RADIUS_KM)``.
+- The database is only the source of truth: the registry is built from it on
+  first use. Writes in this worker (create/accept/resolve) update it
+  directly. Changes made through other workers are picked up by one
+  pending-requests query per worker every ``SOS_STREAM_SYNC_SECONDS``,
+  however many hospitals poll or stream.
+- ``SosSubscription`` (one per open stream) compares what its hospital can
+  currently see with what it has already been sent, and yields:
+
+  - ``sos.snapshot``: everything visible when the stream opens;
+  - ``sos.created``: a request entered the radius (new, or the radius grew);
+  - ``sos.accepted`` / ``sos.resolved``: a request it was shown is no
+    longer pending.
+
+  Open streams are registered with the hub by hospital id, so the
+  escalation scheduler can use each hospital's own base radius and wake only
+  the streams of hospitals a request just reached.
+"""
+
+from __future__ import annotations
+
+import heapq
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from config import Config
+from utils.database import execute_query
+from utils.geo_index import GeoGridIndex
+from utils.geodesic import haversine_km_many
+from utils.schema_registry import get_schema_registry
+
+
+logger = logging.getLogger("pocketcare.sos")
+
+# SOS visibility expansion (hospital discovery of pending requests).
+# Rationale: if no nearby hospital sees/accepts a request quickly, gradually
+# widen the radius so farther hospitals can respond.
+BASE_RADIUS_KM_DEFAULT = 10.0
+EXPAND_EVERY_SECONDS = 180  # 3 minutes
+EXPAND_STEP_KM = 10.0
+MAX_RADIUS_KM = 50.0
+
+# Accepted requests stay listed (as "accepted by ...") for other hospitals this long.
+_ACCEPTED_KEEP_SECONDS = 300
+# Outcomes of recently closed requests, for subscribers that still show them.
+_CLOSED_KEEP = 1000
+_PENDING_LOAD_LIMIT = 2000
+_GRID_CELL_DEG = 0.25
+
+_PENDING_SQL = [
+    """
+        SELECT
+          er.id, er.user_id,
+          u.name AS user_name, u.phone AS user_phone, u.blood_group AS blood_group,
+          er.latitude, er.longitude, er.emergency_type,
+          COALESCE(
+            et.label,
+            CASE
+              WHEN er.emergency_type IS NULL OR er.emergency_type = '' THEN 'General'
+              ELSE er.emergency_type
+            END
+          ) AS emergency_type_label,
+          er.note, er.status, er.hospital_id, NULL AS accepted_hospital_name,
+          er.created_at, er.acknowledged_at, er.resolved_at
+        FROM emergency_requests er
+        JOIN users u ON u.id = er.user_id
+        LEFT JOIN emergency_types et ON et.code = er.emergency_type
+        WHERE er.status = 'pending'
+        ORDER BY er.created_at DESC
+        LIMIT %s
+    """,
+    # Older schemas without emergency_types / the optional columns.
+    """
+        SELECT
+          er.id, er.user_id,
+          u.name AS user_name, u.phone AS user_phone, u.blood_group AS blood_group,
+          er.latitude, er.longitude,
+          NULL AS emergency_type, 'General' AS emergency_type_label, NULL AS note,
+          er.status, NULL AS hospital_id, NULL AS accepted_hospital_name,
+          er.created_at, NULL AS acknowledged_at, NULL AS resolved_at
+        FROM emergency_requests er
+        JOIN users u ON u.id = er.user_id
+        WHERE er.status = 'pending'
+        ORDER BY er.created_at DESC
+        LIMIT %s
+    """,
+]
+
+
+# Optional emergency_requests columns used by the full query shapes.
+_OPTIONAL_COLUMNS = ('emergency_type', 'note', 'hospital_id', 'acknowledged_at', 'resolved_at')
+
+
+def sos_schema_variant() -> str:
+    """Richest SOS query shape the database supports: ``with_types``, ``without_types`` or ``minimal``."""
+
+    schema = get_schema_registry()
+    if not schema.has_columns('emergency_requests', *_OPTIONAL_COLUMNS):
+        return 'minimal'
+    if not schema.has_columns('emergency_types', 'code', 'label'):
+        return 'without_types'
+    return 'with_types'
+
+
+def _load_pending() -> List[Dict[str, Any]]:
+    sql = _PENDING_SQL[0] if sos_schema_variant() == 'with_types' else _PENDING_SQL[1]
+    return execute_query(sql, (_PENDING_LOAD_LIMIT,), fetch_all=True) or []
+
+
+def _load_outcomes(request_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    rows = execute_query(
+        f"""
+            SELECT er.id, er.status, er.hospital_id, h.name AS hospital_name, er.acknowledged_at
+            FROM emergency_requests er
+            LEFT JOIN hospitals h ON h.id = er.hospital_id
+            WHERE er.id IN ({', '.join(['%s'] * len(request_ids))})
+        """,
+        tuple(request_ids),
+        fetch_all=True,
+    ) or []
+    return {row['id']: row for row in rows}
+
+
+def expansion_steps(age_seconds: float) -> int:
+    """Completed ``EXPAND_EVERY_SECONDS`` ticks for a request ``age_seconds`` old."""
+
+    return max(0, int(age_seconds // EXPAND_EVERY_SECONDS))
+
+
+def effective_radius_km(base_km: float, steps: int) -> float:
+    """Visibility radius after ``steps`` expansion ticks."""
+
+    return min(base_km + EXPAND_STEP_KM * steps, MAX_RADIUS_KM)
+
+
+# Ticks after which no base radius can grow further (base_km >= 0).
+_MAX_STEPS = int(-(-MAX_RADIUS_KM // EXPAND_STEP_KM))
+
+
+class SosEventHub:
+    """Open SOS requests of this worker in a geo grid, plus change notification."""
+
+    def __init__(self, *, sync_seconds: float = 2.0):
+        self.pid = os.getpid()
+        self.sync_seconds = sync_seconds
+        self._cond = threading.Condition()
+        self._sync_lock = threading.Lock()
+        self._grid = GeoGridIndex(cell_deg=_GRID_CELL_DEG)
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._steps: Dict[int, int] = {}
+        self._ticks: List[Tuple[datetime, int]] = []  # (next expansion, request id)
+        self._accepted: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._closed: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._version = 0
+        self._synced_at: Optional[float] = None
+        self._healthy = False
+        self._dirty = True
+        self._subscriptions: Dict[int, List["SosSubscription"]] = {}  # hospital id -> open streams
+        self.subscribers = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def _bump(self) -> None:
+        self._version += 1
+        self._cond.notify_all()
+
+    # --- registry maintenance (callers hold self._cond) ---
+
+    def _add(self, row: Dict[str, Any], now: datetime) -> None:
+        request_id = int(row['id'])
+        self._pending[request_id] = row
+        if row.get('latitude') is None or row.get('longitude') is None:
+            return  # kept for outcomes, but can't be matched to hospitals
+        self._grid.upsert(request_id, float(row['latitude']), float(row['longitude']))
+        created_at = row.get('created_at') or now
+        steps = expansion_steps((now - created_at).total_seconds())
+        self._steps[request_id] = steps
+        if steps < _MAX_STEPS:
+            heapq.heappush(self._ticks, (created_at + timedelta(seconds=EXPAND_EVERY_SECONDS * (steps + 1)), request_id))
+
+    def _discard(self, request_id: int) -> Optional[Dict[str, Any]]:
+        self._grid.remove(request_id)
+        self._steps.pop(request_id, None)  # its heap entries are skipped when popped
+        return self._pending.pop(request_id, None)
+
+    def _advance(self, now: datetime) -> None:
+        """Apply expansion ticks that are due."""
+
+        while self._ticks and self._ticks[0][0] <= now:
+            due, request_id = heapq.heappop(self._ticks)
+            if request_id not in self._steps:
+                continue
+            steps = self._steps[request_id] = self._steps[request_id] + 1
+            if steps < _MAX_STEPS:
+                heapq.heappush(self._ticks, (due + timedelta(seconds=EXPAND_EVERY_SECONDS), request_id))
+
+    def _record_closed(
+        self,
+        request_id: int,
+        status: Optional[str],
+        hospital_id: Optional[int],
+        hospital_name: Optional[str],
+        acknowledged_at: Optional[datetime] = None,
+    ) -> None:
+        row = self._discard(request_id)
+        status = status or 'resolved'
+        self._closed[request_id] = {
+            'request_id': request_id,
+            'status': status,
+            'hospital_id': hospital_id,
+            'hospital_name': hospital_name,
+        }
+        self._closed.move_to_end(request_id)
+        while len(self._closed) > _CLOSED_KEEP:
+            self._closed.popitem(last=False)
+        if status == 'acknowledged' and row is not None:
+            self._accepted[request_id] = dict(
+                row,
+                status='acknowledged',
+                hospital_id=hospital_id,
+                accepted_hospital_name=hospital_name,
+                acknowledged_at=acknowledged_at or datetime.now(),
+            )
+        else:
+            self._accepted.pop(request_id, None)
+        cutoff = datetime.now() - timedelta(seconds=_ACCEPTED_KEEP_SECONDS)
+        while self._accepted and next(iter(self._accepted.values()))['acknowledged_at'] < cutoff:
+            self._accepted.popitem(last=False)
+
+    def ensure_synced(self) -> bool:
+        """Rebuild from the database if stale or flagged dirty (one thread at a time).
+
+        Returns False if the registry has never loaded or the last load failed;
+        callers then query the database directly.
+        """
+
+        if not self._dirty and self._synced_at is not None and time.monotonic() - self._synced_at < self.sync_seconds:
+            return self._healthy
+        if not self._sync_lock.acquire(blocking=False):
+            return self._healthy  # another thread is syncing
+        try:
+            with self._cond:
+                self._dirty = False
+                known = list(self._pending)
+            try:
+                rows = _load_pending()
+                current = {int(row['id']): row for row in rows}
+                gone = [request_id for request_id in known if request_id not in current]
+                outcomes = _load_outcomes(gone) if gone else {}
+            except Exception:
+                logger.warning("SOS pending sync failed", exc_info=True)
+                self._healthy = False
+                return False
+            finally:
+                self._synced_at = time.monotonic()
+            now = datetime.now()
+            with self._cond:
+                changed = False
+                for request_id in gone:
+                    if request_id in self._closed:
+                        continue  # closed in this worker; already announced
+                    outcome = outcomes.get(request_id) or {'status': 'resolved'}
+                    self._record_closed(
+                        request_id, outcome.get('status'), outcome.get('hospital_id'),
+                        outcome.get('hospital_name'), outcome.get('acknowledged_at'),
+                    )
+                    changed = True
+                for request_id, row in current.items():
+                    # A request closed in this worker may still be pending in rows
+                    # read just before the update; status never goes back to pending.
+                    if request_id in self._closed:
+                        continue
+                    if request_id not in self._pending:
+                        self._add(row, now)
+                        changed = True
+                    else:
+                        self._pending[request_id] = row
+                if changed:
+                    self._bump()
+            self._healthy = True
+            return True
+        finally:
+            self._sync_lock.release()
+
+    # --- writes in this worker ---
+
+    def publish_created(self, request_id: int) -> None:
+        """A request was created in this worker: the next reader resyncs now rather than at the next interval."""
+
+        with self._cond:
+            self._dirty = True
+            self._bump()
+
+    def publish_closed(self, request_id: int, *, status: str, hospital_id: Optional[int] = None, hospital_name: Optional[str] = None) -> None:
+        """A request was accepted (``acknowledged``) or resolved in this worker."""
+
+        with self._cond:
+            self._record_closed(int(request_id), status, hospital_id, hospital_name)
+            self._bump()
+
+    # --- queries ---
+
+    def visible(self, latitude: float, longitude: float, base_km: float, *, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Pending requests within their effective radius of a hospital, newest first.
+
+        Rows are copies with ``distance_km`` and ``effective_radius_km`` added.
+        """
+
+        now = now or datetime.now()
+        with self._cond:
+            self._advance(now)
+            hits = self._grid.within(latitude, longitude, MAX_RADIUS_KM)
+            visible = []
+            for request_id, distance in hits:
+                radius = effective_radius_km(base_km, self._steps[request_id])
+                if distance <= radius:
+                    visible.append(dict(self._pending[request_id], distance_km=distance, effective_radius_km=radius))
+        visible.sort(key=lambda row: row.get('created_at') or datetime.min, reverse=True)
+        return visible
+
+    def recently_accepted(
+        self,
+        latitude: float,
+        longitude: float,
+        base_km: float,
+        *,
+        since: datetime,
+        exclude_hospital_id: Optional[int] = None,
+        now: Optional[datetime] = None,
+    ) -> List[Dict[str, Any]]:
+        """Requests accepted by another hospital at or after ``since`` that are within this hospital's radius."""
+
+        now = now or datetime.now()
+        with self._cond:
+            rows = [
+                row for row in self._accepted.values()
+                if row['acknowledged_at'] >= since
+                and row.get('hospital_id') != exclude_hospital_id
+                and row.get('latitude') is not None and row.get('longitude') is not None
+            ]
+        if not rows:
+            return []
+        distances = haversine_km_many(latitude, longitude, [r['latitude'] for r in rows], [r['longitude'] for r in rows])
+        accepted = []
+        for row, distance in zip(rows, distances):
+            created_at = row.get('created_at') or now
+            radius = effective_radius_km(base_km, expansion_steps((now - created_at).total_seconds()))
+            if distance <= radius:
+                accepted.append(dict(row, distance_km=float(distance), effective_radius_km=radius))
+        return accepted
+
+    def outcome(self, request_id: int) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            return self._closed.get(request_id)
+
+    def acknowledged_at(self, request_id: int) -> Optional[datetime]:
+        """When a recently accepted request was accepted (None if unknown or not accepted)."""
+
+        with self._cond:
+            row = self._accepted.get(request_id)
+            return row.get('acknowledged_at') if row else None
+
+    # --- escalation (see utils/sos_escalation.py) ---
+
+    def next_tick(self) -> Optional[datetime]:
+        """When the next radius expansion is due, if any."""
+
+        with self._cond:
+            while self._ticks and self._ticks[0][1] not in self._steps:
+                heapq.heappop(self._ticks)
+            return self._ticks[0][0] if self._ticks else None
+
+    def escalation_snapshot(self, now: Optional[datetime] = None) -> List[Tuple[int, float, float, Optional[datetime], int]]:
+        """``(id, latitude, longitude, created_at, steps)`` of every locatable pending request, after applying due ticks."""
+
+        now = now or datetime.now()
+        with self._cond:
+            self._advance(now)
+            snapshot = []
+            for request_id, steps in self._steps.items():
+                row = self._pending[request_id]
+                snapshot.append((request_id, float(row['latitude']), float(row['longitude']), row.get('created_at'), steps))
+            return snapshot
+
+    def wake_subscribers(self) -> None:
+        """Make open streams re-check visibility now instead of at their next timeout."""
+
+        with self._cond:
+            self._bump()
+
+    def wake_hospitals(self, hospital_ids: Iterable[int]) -> None:
+        """Make only these hospitals' open streams re-check visibility now."""
+
+        with self._cond:
+            woken = False
+            for hospital_id in set(hospital_ids):
+                for subscription in self._subscriptions.get(hospital_id, ()):
+                    subscription.woken = woken = True
+            if woken:
+                self._cond.notify_all()
+
+    def wait(self, version: int, timeout: float, *, subscription: Optional["SosSubscription"] = None) -> None:
+        """Block until something changed after ``version``, ``subscription`` was woken, or ``timeout`` seconds."""
+
+        deadline = time.monotonic() + max(0.0, timeout)
+        with self._cond:
+            while self._version == version and not self._dirty and not (subscription is not None and subscription.woken):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if subscription is not None:
+                subscription.woken = False
+
+    def attach(self, subscription: "SosSubscription") -> None:
+        with self._cond:
+            self._subscriptions.setdefault(subscription.hospital_id, []).append(subscription)
+            self.subscribers += 1
+
+    def detach(self, subscription: "SosSubscription") -> None:
+        with self._cond:
+            streams = self._subscriptions.get(subscription.hospital_id, [])
+            if subscription in streams:
+                streams.remove(subscription)
+                self.subscribers -= 1
+            if not streams:
+                self._subscriptions.pop(subscription.hospital_id, None)
+
+    def subscriber_radii(self) -> Dict[int, float]:
+        """Base radius per hospital with an open stream (the widest, if it has several)."""
+
+        with self._cond:
+            return {hospital_id: max(s.radius_km for s in streams) for hospital_id, streams in self._subscriptions.items()}
+
+    def subscribe(self, **kwargs) -> "SosSubscription":
+        return SosSubscription(self, **kwargs)
+
+
+class SosSubscription:
+    """What one hospital's stream has been sent, and the events to bring it up to date."""
+
+    def __init__(self, hub: SosEventHub, *, hospital_id: int, latitude: float, longitude: float, radius_km: float):
+        self.hub = hub
+        self.hospital_id = hospital_id
+        self.latitude = latitude
+        self.longitude = longitude
+        self.radius_km = radius_km
+        self.woken = False  # set by SosEventHub.wake_hospitals
+        self._sent: Set[int] = set()
+
+    def visible(self) -> Dict[int, Dict[str, Any]]:
+        """Pending requests visible to this hospital, newest first."""
+
+        return {int(row['id']): row for row in self.hub.visible(self.latitude, self.longitude, self.radius_km)}
+
+    def snapshot(self) -> Dict[str, Any]:
+        visible = self.visible()
+        self._sent = set(visible)
+        return {'type': 'sos.snapshot', 'requests': list(visible.values())}
+
+    def poll(self) -> List[Dict[str, Any]]:
+        """Events since the last ``snapshot``/``poll``."""
+
+        visible = self.visible()
+        events: List[Dict[str, Any]] = []
+        for request_id in self._sent - visible.keys():
+            outcome = self.hub.outcome(request_id) or {'request_id': request_id, 'status': 'resolved'}
+            kind = 'sos.accepted' if outcome.get('status') == 'acknowledged' else 'sos.resolved'
+            events.append(dict(outcome, type=kind))
+        for request_id, row in reversed(list(visible.items())):  # oldest first
+            if request_id not in self._sent:
+                events.append({'type': 'sos.created', 'request': row})
+        self._sent = set(visible)
+        return events
+
+    def stream(self, *, max_seconds: float, heartbeat_seconds: float) -> Iterator[Optional[Dict[str, Any]]]:
+        """Snapshot, then events as they happen; ``None`` means "send a heartbeat"."""
+
+        hub = self.hub
+        hub.attach(self)
+        try:
+            hub.ensure_synced()
+            version = hub.version
+            yield self.snapshot()
+            deadline = time.monotonic() + max_seconds
+            last_sent = time.monotonic()
+            while time.monotonic() < deadline:
+                # Wake for local changes, the next cross-worker sync, or an escalation reaching this hospital.
+                hub.wait(
+                    version,
+                    min(hub.sync_seconds, heartbeat_seconds, max(0.0, deadline - time.monotonic())),
+                    subscription=self,
+                )
+                hub.ensure_synced()
+                version = hub.version
+                events = self.poll()
+                for event in events:
+                    yield event
+                if events:
+                    last_sent = time.monotonic()
+                elif time.monotonic() - last_sent >= heartbeat_seconds:
+                    yield None
+                    last_sent = time.monotonic()
+        finally:
+            hub.detach(self)
+
+
+_hub: Optional[SosEventHub] = None
+_hub_lock = threading.Lock()
+
+
+def get_sos_hub() -> SosEventHub:
+    """Return the process-wide SOS registry (recreated after fork)."""
+
+    global _hub
+    hub = _hub
+    if hub is not None and hub.pid == os.getpid():
+        return hub
+    with _hub_lock:
+        if _hub is None or _hub.pid != os.getpid():
+            _hub = SosEventHub(sync_seconds=Config.SOS_STREAM_SYNC_SECONDS)
+        return _hub
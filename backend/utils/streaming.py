@@ -0,0 +1,65 @@
+"""Chunked JSON / NDJSON responses for large row sets.
+
+Used together with ``utils.database.stream_query`` so that big reads are
+serialized row by row instead of being materialized as one list first.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Optional
+
+from flask import Response, current_app, request, stream_with_context
+
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def wants_ndjson() -> bool:
+    """True when the client asked for NDJSON (``?format=ndjson`` or Accept header)."""
+
+    fmt = (request.args.get("format") or "").strip().lower()
+    if fmt == "ndjson":
+        return True
+    return NDJSON_MIMETYPE in (request.headers.get("Accept") or "")
+
+
+def stream_json_response(
+    rows: Iterable[Any],
+    *,
+    key: str,
+    extra: Optional[Dict[str, Any]] = None,
+    ndjson: Optional[bool] = None,
+    status: int = 200,
+) -> Response:
+    """Stream ``rows`` as ``{"<key>": [...], **extra}`` or as NDJSON lines.
+
+    The JSON variant produces the same document ``jsonify`` would, so existing
+    clients keep working; values are encoded with the app's JSON provider.
+    """
+
+    dumps = current_app.json.dumps
+    if ndjson is None:
+        ndjson = wants_ndjson()
+
+    if ndjson:
+        def generate_ndjson():
+            for row in rows:
+                yield dumps(row) + "\n"
+
+        return Response(stream_with_context(generate_ndjson()), status=status, mimetype=NDJSON_MIMETYPE)
+
+    def generate_json():
+        yield "{%s: [" % dumps(key)
+        first = True
+        for row in rows:
+            if first:
+                first = False
+                yield dumps(row)
+            else:
+                yield "," + dumps(row)
+        yield "]"
+        for name, value in (extra or {}).items():
+            yield ", %s: %s" % (dumps(name), dumps(value))
+        yield "}\n"
+
+    return Response(stream_with_context(generate_json()), status=status, mimetype="application/json")
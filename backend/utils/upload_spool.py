@@ -0,0 +1,286 @@
+"""Bounded-memory handling of report uploads.
+
+Uploads are copied from the request stream in chunks. Small files stay in
+memory; anything above ``UPLOAD_SPOOL_THRESHOLD`` (or that would push the
+process over ``UPLOAD_MEMORY_BUDGET`` of in-memory uploads) is written to a
+named temp file under ``UPLOAD_SPOOL_DIR``. Spooled files are handed to
+PyMuPDF/Pillow by path and to the AI gateway as a read-only ``memoryview``
+over an mmap, so a 10MB upload is never held as several bytes copies.
+
+The SHA-256 used by the report cache is computed while copying.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, Optional, Union
+
+from config import Config
+
+
+_CHUNK_SIZE = 64 * 1024
+
+UploadSource = Union[bytes, str]
+
+
+class UploadTooLargeError(ValueError):
+    """The upload exceeds ``MAX_FILE_SIZE``."""
+
+
+class _MemoryBudget:
+    """Process-wide accounting of upload bytes held in memory."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.peak = 0
+        self.kept_in_memory = 0
+        self.spooled_to_disk = 0
+        self.spooled_bytes = 0
+        self.active_files = 0
+
+    def try_acquire(self, size: int, limit: int) -> bool:
+        with self._lock:
+            if self.in_use + size > limit:
+                return False
+            self.in_use += size
+            self.peak = max(self.peak, self.in_use)
+            return True
+
+    def release(self, size: int) -> None:
+        with self._lock:
+            self.in_use = max(0, self.in_use - size)
+
+    def record(self, *, spooled: bool, size: int) -> None:
+        with self._lock:
+            if spooled:
+                self.spooled_to_disk += 1
+                self.spooled_bytes += size
+                self.active_files += 1
+            else:
+                self.kept_in_memory += 1
+
+    def file_closed(self) -> None:
+        with self._lock:
+            self.active_files = max(0, self.active_files - 1)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "in_memory_bytes": self.in_use,
+                "peak_in_memory_bytes": self.peak,
+                "kept_in_memory": self.kept_in_memory,
+                "spooled_to_disk": self.spooled_to_disk,
+                "spooled_bytes": self.spooled_bytes,
+                "active_files": self.active_files,
+            }
+
+
+_budget = _MemoryBudget()
+
+
+class SpooledUpload:
+    """An upload held in memory (small) or in a temp file (large).
+
+    Use as a context manager, or call ``close()``: it releases the memory
+    budget, unmaps the file and deletes it (unless it was moved with
+    ``save_to``).
+    """
+
+    def __init__(self, *, data: Optional[bytes], path: Optional[str], size: int, sha256: str):
+        self._data = data
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self._mmap: Optional[mmap.mmap] = None
+        self._file: Optional[BinaryIO] = None
+        self._closed = False
+
+    @property
+    def in_memory(self) -> bool:
+        return self.path is None
+
+    def source(self) -> UploadSource:
+        """``bytes`` or a file path, for APIs that can open either (PyMuPDF, Pillow)."""
+
+        return self._data if self.path is None else self.path
+
+    def view(self) -> memoryview:
+        """Read-only view of the content; spooled files are mmapped, not read."""
+
+        if self.path is None:
+            return memoryview(self._data)
+        if self._mmap is None:
+            self._file = open(self.path, "rb")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._mmap)
+
+    def copy_to(self, dest: Union[str, Path]) -> None:
+        if self.path is None:
+            Path(dest).write_bytes(self._data)
+        else:
+            shutil.copyfile(self.path, str(dest))
+
+    def save_to(self, dest: Union[str, Path]) -> None:
+        """Write the upload to ``dest``; a spooled file is moved rather than copied."""
+
+        if self.path is None:
+            Path(dest).write_bytes(self._data)
+            return
+        self._unmap()
+        shutil.move(self.path, str(dest))
+        self.path = str(dest)
+        self._closed = True  # dest now owns the file
+        _budget.file_closed()
+
+    def _unmap(self) -> None:
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A view is still referenced; the mapping goes away with it.
+                pass
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self.path is None:
+            _budget.release(self.size)
+            self._data = None
+            return
+        self._unmap()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+        _budget.file_closed()
+
+    def __enter__(self) -> "SpooledUpload":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def spool_upload(
+    stream: BinaryIO,
+    *,
+    max_bytes: Optional[int] = None,
+    threshold: Optional[int] = None,
+    spool_dir: Optional[str] = None,
+) -> SpooledUpload:
+    """Copy ``stream`` into a ``SpooledUpload``, hashing as it goes.
+
+    Raises ``UploadTooLargeError`` past ``max_bytes`` (default ``MAX_FILE_SIZE``).
+    """
+
+    max_bytes = Config.MAX_FILE_SIZE if max_bytes is None else max_bytes
+    threshold = Config.UPLOAD_SPOOL_THRESHOLD if threshold is None else threshold
+    spool_dir = Config.UPLOAD_SPOOL_DIR if spool_dir is None else spool_dir
+
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    spool: Optional[BinaryIO] = None
+    size = 0
+    try:
+        while True:
+            chunk = stream.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLargeError(f"File is larger than the {max_bytes // (1024 * 1024)}MB limit")
+            digest.update(chunk)
+            if spool is None and size > threshold:
+                Path(spool_dir).mkdir(parents=True, exist_ok=True)
+                spool = tempfile.NamedTemporaryFile(dir=spool_dir, prefix="upload-", delete=False)
+                spool.write(buffer)
+                buffer = bytearray()
+            if spool is None:
+                buffer += chunk
+            else:
+                spool.write(chunk)
+    except BaseException:
+        if spool is not None:
+            spool.close()
+            os.unlink(spool.name)
+        raise
+
+    if spool is None and not _budget.try_acquire(size, Config.UPLOAD_MEMORY_BUDGET):
+        # Too many concurrent in-memory uploads: spool this one as well.
+        Path(spool_dir).mkdir(parents=True, exist_ok=True)
+        spool = tempfile.NamedTemporaryFile(dir=spool_dir, prefix="upload-", delete=False)
+        spool.write(buffer)
+        buffer = bytearray()
+
+    if spool is not None:
+        spool.close()
+        _budget.record(spooled=True, size=size)
+        return SpooledUpload(data=None, path=spool.name, size=size, sha256=digest.hexdigest())
+    _budget.record(spooled=False, size=size)
+    return SpooledUpload(data=bytes(buffer), path=None, size=size, sha256=digest.hexdigest())
+
+
+@contextmanager
+def map_file(path: Union[str, Path]) -> Iterator[memoryview]:
+    """Read-only ``memoryview`` of a file via mmap (empty files give an empty view)."""
+
+    with open(path, "rb") as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            yield memoryview(b"")
+            return
+        mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        try:
+            yield view
+        finally:
+            view.release()
+            try:
+                mapped.close()
+            except BufferError:
+                pass
+
+
+def file_sha256(path: Union[str, Path]) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def memory_stats() -> Dict[str, Any]:
+    """Current/peak RSS of this worker plus upload spooling counters."""
+
+    return {"rss_bytes": _rss_bytes(), "peak_rss_bytes": _peak_rss_bytes(), "uploads": _budget.stats()}
@@ -23,7 +23,8 @@ CREATE TABLE IF NOT EXISTS users (
     address TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-    INDEX idx_email (email)
+    INDEX idx_email (email),
+    INDEX idx_users_created (created_at, id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4; 
 
 -- ============================================================================
@@ -62,6 +63,7 @@ CREATE TABLE IF NOT EXISTS doctors (
     INDEX idx_specialty (specialty),
     INDEX idx_specialty_id (specialty_id),
     INDEX idx_hospital (hospital_id),
+    INDEX idx_doctors_created (created_at, id),
     CONSTRAINT fk_doctors_specialty_id FOREIGN KEY (specialty_id) REFERENCES specialties(id) ON DELETE SET NULL
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
@@ -177,7 +179,8 @@ CREATE TABLE IF NOT EXISTS symptom_logs (
     urgency_level ENUM('low', 'medium', 'high'),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-    INDEX idx_user (user_id)
+    INDEX idx_user (user_id),
+    INDEX idx_symptom_logs_user_created (user_id, created_at, id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- ============================================================================
@@ -193,7 +196,39 @@ CREATE TABLE IF NOT EXISTS medical_reports (
     report_type VARCHAR(100) COMMENT 'e.g., blood test, x-ray',
     uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-    INDEX idx_user (user_id)
+    INDEX idx_user (user_id),
+    INDEX idx_medical_reports_user_uploaded (user_id, uploaded_at, id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- ============================================================================
+-- TABLE: report_jobs
+-- Background OCR + AI simplification jobs (stages: render, ocr, classify, explain, save).
+-- Each finished stage stores its output here so a failed job resumes from the failed stage.
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS report_jobs (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    user_id INT NOT NULL,
+    file_name VARCHAR(255) NOT NULL,
+    file_ext VARCHAR(10) NOT NULL,
+    work_dir VARCHAR(500) NOT NULL COMMENT 'Upload + rendered pages on local disk',
+    model VARCHAR(100) NOT NULL,
+    status ENUM('queued', 'running', 'succeeded', 'failed', 'rejected', 'cancelled') DEFAULT 'queued',
+    stage VARCHAR(20) NULL COMMENT 'Stage currently running, or the one that failed',
+    stages TEXT NULL COMMENT 'JSON per-stage progress: {stage: {status, ms, ...}}',
+    attempts INT NOT NULL DEFAULT 0,
+    error TEXT NULL,
+    page_count INT NULL,
+    ocr_text MEDIUMTEXT NULL,
+    ocr_confidence FLOAT NULL,
+    explanation MEDIUMTEXT NULL,
+    report_id INT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (report_id) REFERENCES medical_reports(id) ON DELETE SET NULL,
+    INDEX idx_report_jobs_user_created (user_id, created_at, id),
+    INDEX idx_report_jobs_status (status, created_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- ============================================================================
@@ -214,7 +249,8 @@ CREATE TABLE IF NOT EXISTS emergency_requests (
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (hospital_id) REFERENCES hospitals(id) ON DELETE SET NULL,
     INDEX idx_user (user_id),
-    INDEX idx_status (status)
+    INDEX idx_status (status),
+    INDEX idx_emergency_status_location (status, latitude, longitude)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- ============================================================================
@@ -261,7 +297,8 @@ CREATE TABLE IF NOT EXISTS chat_messages (
     message TEXT NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-    INDEX idx_user (user_id)
+    INDEX idx_user (user_id),
+    INDEX idx_chat_messages_user_created (user_id, created_at, id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- =========================================================================
@@ -430,6 +467,7 @@ CREATE TABLE IF NOT EXISTS user_bed_bookings (
     ward_type ENUM('general', 'maternity', 'pediatrics', 'icu', 'emergency', 'private_room') NOT NULL,
     ac_type ENUM('ac', 'non_ac', 'not_applicable') DEFAULT 'not_applicable',
     room_config VARCHAR(50) NULL COMMENT 'For private rooms: 1_bed_no_bath, 1_bed_with_bath, 2_bed_with_bath',
+    ward_id INT NULL COMMENT 'bed_wards row the bed was taken from; cancelling gives it back there',
     patient_name VARCHAR(100) NOT NULL,
     patient_age INT NULL,
     patient_gender ENUM('male', 'female', 'other') NULL,
@@ -443,10 +481,13 @@ CREATE TABLE IF NOT EXISTS user_bed_bookings (
     special_requirements TEXT NULL,
     status ENUM('pending', 'confirmed', 'rejected', 'cancelled', 'completed') DEFAULT 'pending',
     notes TEXT NULL,
+    idempotency_key VARCHAR(64) NULL COMMENT 'Client-supplied key; a retried request returns the original booking',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (hospital_id) REFERENCES hospitals(id) ON DELETE CASCADE,
+    FOREIGN KEY (ward_id) REFERENCES bed_wards(id) ON DELETE SET NULL,
+    UNIQUE KEY uq_user_bed_bookings_idempotency (user_id, idempotency_key),
     INDEX idx_user_bookings (user_id),
     INDEX idx_hospital_bookings (hospital_id),
     INDEX idx_booking_status (status),
@@ -454,6 +495,28 @@ CREATE TABLE IF NOT EXISTS user_bed_bookings (
     INDEX idx_preferred_date (preferred_date)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- ============================================================================
+-- TABLE: bed_holds
+-- Beds set aside (taken out of bed_wards.available_beds) until confirmed or expired
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS bed_holds (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    ward_id INT NOT NULL,
+    user_id INT NOT NULL,
+    idempotency_key VARCHAR(64) NULL,
+    status ENUM('held', 'confirmed', 'released', 'expired') NOT NULL DEFAULT 'held',
+    booking_id INT NULL,
+    expires_at DATETIME NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (ward_id) REFERENCES bed_wards(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (booking_id) REFERENCES user_bed_bookings(id) ON DELETE SET NULL,
+    UNIQUE KEY uq_bed_holds_idempotency (user_id, idempotency_key),
+    INDEX idx_bed_holds_expiry (status, expires_at),
+    INDEX idx_bed_holds_ward (ward_id, status)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
 -- ============================================================================
 -- MIGRATION: user_bed_bookings schema update
 -- Run these commands if you have the old schema with admission_date/medical_condition
@@ -464,6 +527,47 @@ CREATE TABLE IF NOT EXISTS user_bed_bookings (
 --     ADD COLUMN patient_email VARCHAR(255) NULL AFTER patient_phone,
 --     ADD INDEX idx_preferred_date (preferred_date);
 
+-- ============================================================================
+-- MIGRATION: keyset pagination indexes
+-- Run these commands on databases created before the (created_at, id) indexes
+-- ============================================================================
+-- ALTER TABLE chat_messages ADD INDEX idx_chat_messages_user_created (user_id, created_at, id);
+-- ALTER TABLE symptom_logs ADD INDEX idx_symptom_logs_user_created (user_id, created_at, id);
+-- ALTER TABLE medical_reports ADD INDEX idx_medical_reports_user_uploaded (user_id, uploaded_at, id);
+-- ALTER TABLE users ADD INDEX idx_users_created (created_at, id);
+-- ALTER TABLE doctors ADD INDEX idx_doctors_created (created_at, id);
+
+-- ============================================================================
+-- MIGRATION: report_jobs cancellation
+-- Run this if report_jobs was created before the 'cancelled' status existed
+-- ============================================================================
+-- ALTER TABLE report_jobs MODIFY status ENUM('queued', 'running', 'succeeded', 'failed', 'rejected', 'cancelled') DEFAULT 'queued';
+
+-- ============================================================================
+-- MIGRATION: bed booking idempotency keys
+-- Run this on databases created before user_bed_bookings.idempotency_key existed
+-- (bed_holds is created by the CREATE TABLE above)
+-- ============================================================================
+-- ALTER TABLE user_bed_bookings
+--     ADD COLUMN idempotency_key VARCHAR(64) NULL AFTER notes,
+--     ADD UNIQUE KEY uq_user_bed_bookings_idempotency (user_id, idempotency_key);
+
+-- ============================================================================
+-- MIGRATION: bed booking ward ids
+-- Run this on databases created before user_bed_bookings.ward_id existed.
+-- Older bookings keep ward_id NULL and are restored by ward type/AC/room config.
+-- ============================================================================
+-- ALTER TABLE user_bed_bookings
+--     ADD COLUMN ward_id INT NULL AFTER room_config,
+--     ADD CONSTRAINT fk_user_bed_bookings_ward FOREIGN KEY (ward_id) REFERENCES bed_wards(id) ON DELETE SET NULL;
+
+-- ============================================================================
+-- MIGRATION: SOS bounding-box index
+-- Run this on databases created before emergency_requests had it; the hospital
+-- SOS fallback query filters on status plus a latitude/longitude range
+-- ============================================================================
+-- ALTER TABLE emergency_requests ADD INDEX idx_emergency_status_location (status, latitude, longitude);
+
 -- ============================================================================
 -- END OF SCHEMA
 -- ============================================================================
@@ -134,6 +134,9 @@ function AdminDashboard() {
   const [doctorsSearch, setDoctorsSearch] = useState('');
   const [doctorsPage, setDoctorsPage] = useState(1);
   const [doctorsTotalPages, setDoctorsTotalPages] = useState(1);
+  // Keyset cursors per page number (page 1 has none); reset when search changes
+  const usersCursorsRef = useRef({ search: '', cursors: {} });
+  const doctorsCursorsRef = useRef({ search: '', cursors: {} });
   const [confirmModal, setConfirmModal] = useState({ open: false, type: '', id: null, name: '', action: '' });
 
   const [toast, setToast] = useState({ isOpen: false, type: 'success', message: '' });
@@ -228,9 +231,16 @@ function AdminDashboard() {
   const fetchUsersList = async (page = 1, search = '') => {
     setUsersLoading(true);
     try {
+      const pageCursors = usersCursorsRef.current;
+      if (pageCursors.search !== search) {
+        pageCursors.search = search;
+        pageCursors.cursors = {};
+      }
+      const cursor = pageCursors.cursors[page];
       const response = await api.get('/auth/admin/users', {
-        params: { page, limit: 10, search }
+        params: cursor ? { cursor, limit: 10, search } : { page, limit: 10, search }
       });
+      pageCursors.cursors[page + 1] = response.data.next_cursor || undefined;
       setUsersList(response.data.users || []);
       setUsersTotalPages(response.data.total_pages || 1);
       setUsersPage(page);
@@ -245,9 +255,16 @@ function AdminDashboard() {
   const fetchDoctorsList = async (page = 1, search = '') => {
     setDoctorsLoading(true);
     try {
+      const pageCursors = doctorsCursorsRef.current;
+      if (pageCursors.search !== search) {
+        pageCursors.search = search;
+        pageCursors.cursors = {};
+      }
+      const cursor = pageCursors.cursors[page];
       const response = await api.get('/auth/admin/doctors', {
-        params: { page, limit: 10, search }
+        params: cursor ? { cursor, limit: 10, search } : { page, limit: 10, search }
       });
+      pageCursors.cursors[page + 1] = response.data.next_cursor || undefined;
       setDoctorsList(response.data.doctors || []);
       setDoctorsTotalPages(response.data.total_pages || 1);
       setDoctorsPage(page);
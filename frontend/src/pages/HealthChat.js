@@ -4,13 +4,28 @@ import api from "../utils/api";
 import ChatMessage from "../components/ChatMessage";
 import BackToDashboardButton from "../components/BackToDashboardButton";
 
+// /chat/history rows -> chat bubbles, oldest first.
+const toChatMessages = (history) =>
+  history
+    .map((msg) => ({
+      sender: msg.sender,
+      text: msg.message,
+      created_at: msg.created_at,
+    }))
+    .sort((a, b) => new Date(a.created_at) - new Date(b.created_at));
+
 function HealthChat() {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState("");
   const [loading, setLoading] = useState(false);
+  // Cursor for the page before the oldest loaded message (null: nothing older)
+  const [olderCursor, setOlderCursor] = useState(null);
+  const [loadingOlder, setLoadingOlder] = useState(false);
 
   const scrollContainerRef = useRef(null);
   const bottomRef = useRef(null);
+  // Scroll height before older messages were prepended, to keep the view in place
+  const prependHeightRef = useRef(null);
 
   const welcomeMessage = useMemo(
     () => ({
@@ -30,14 +45,8 @@ function HealthChat() {
           Array.isArray(res.data.history) &&
           res.data.history.length
         ) {
-          const sorted = res.data.history
-            .map((msg) => ({
-              sender: msg.sender,
-              text: msg.message,
-              created_at: msg.created_at,
-            }))
-            .sort((a, b) => new Date(a.created_at) - new Date(b.created_at));
-          setMessages(sorted);
+          setMessages(toChatMessages(res.data.history));
+          setOlderCursor(res.data.next_cursor || null);
         } else {
           setMessages([welcomeMessage]);
         }
@@ -49,34 +58,115 @@ function HealthChat() {
   }, [welcomeMessage]);
 
   useEffect(() => {
+    const container = scrollContainerRef.current;
+    if (prependHeightRef.current !== null && container) {
+      // Older messages went on top: stay on the message the user was reading.
+      container.scrollTop += container.scrollHeight - prependHeightRef.current;
+      prependHeightRef.current = null;
+      return;
+    }
     bottomRef.current?.scrollIntoView({ behavior: "smooth" });
   }, [messages, loading]);
 
+  const loadOlder = async () => {
+    if (!olderCursor || loadingOlder) return;
+    setLoadingOlder(true);
+    try {
+      const res = await api.get("/chat/history", {
+        params: { cursor: olderCursor },
+      });
+      const older = Array.isArray(res.data?.history) ? res.data.history : [];
+      prependHeightRef.current = scrollContainerRef.current?.scrollHeight ?? null;
+      setMessages((prev) => [...toChatMessages(older), ...prev]);
+      setOlderCursor(res.data?.next_cursor || null);
+    } catch (err) {
+      // Keep the cursor so the user can try again
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
+  // Stream Sage's reply over Server-Sent Events from /chat/stream.
+  // Calls onToken(fullTextSoFar) per delta; resolves with the final text.
+  const streamReply = async (message, onToken) => {
+    const res = await fetch(`${api.defaults.baseURL}/chat/stream`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        Authorization: `Bearer ${localStorage.getItem("token")}`,
+      },
+      body: JSON.stringify({ message }),
+    });
+    if (!res.ok || !res.body) {
+      // Nothing was processed server-side, so the blocking endpoint can retry it
+      const err = new Error(`stream failed (${res.status})`);
+      err.canFallback = true;
+      throw err;
+    }
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let text = "";
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let sep;
+      while ((sep = buffer.indexOf("\n\n")) !== -1) {
+        const block = buffer.slice(0, sep);
+        buffer = buffer.slice(sep + 2);
+        const event = (block.match(/^event: (.*)$/m) || [])[1];
+        const data = JSON.parse((block.match(/^data: (.*)$/m) || [])[1] || "{}");
+        if (event === "token") {
+          text += data.text || "";
+          onToken(text);
+        } else if (event === "done") {
+          return data.response || text;
+        } else if (event === "error") {
+          throw new Error(data.error || "stream error");
+        }
+      }
+    }
+    return text;
+  };
+
   const sendMessage = async (e) => {
     e.preventDefault();
     if (!input.trim()) return;
-    const userMessage = { sender: "user", text: input };
+    const message = input;
+    const userMessage = { sender: "user", text: message };
     setMessages((prev) => [...prev, userMessage]);
+    setInput("");
     setLoading(true);
+
+    let started = false;
+    const showPartial = (text) => {
+      if (!started) {
+        started = true;
+        setLoading(false);
+        setMessages((prev) => [...prev, { sender: "ai", text }]);
+        return;
+      }
+      setMessages((prev) => [...prev.slice(0, -1), { sender: "ai", text }]);
+    };
+
     try {
-      const res = await api.post("/chat/send", { message: input });
-      setMessages((prev) => [
-        ...prev,
-        {
-          sender: "ai",
-          text: res.data.response || "Sorry, I could not understand that.",
-        },
-      ]);
+      const finalText = await streamReply(message, showPartial);
+      showPartial(finalText || "Sorry, I could not understand that.");
     } catch (err) {
-      setMessages((prev) => [
-        ...prev,
-        {
-          sender: "ai",
-          text: "There was an error connecting to the AI service.",
-        },
-      ]);
+      if (started || !err.canFallback) {
+        showPartial("There was an error connecting to the AI service.");
+      } else {
+        // Streaming unavailable: fall back to the blocking endpoint
+        try {
+          const res = await api.post("/chat/send", { message });
+          showPartial(res.data.response || "Sorry, I could not understand that.");
+        } catch (fallbackErr) {
+          showPartial("There was an error connecting to the AI service.");
+        }
+      }
     }
-    setInput("");
     setLoading(false);
   };
 
@@ -113,6 +203,18 @@ function HealthChat() {
               className="flex-1 min-h-0 overflow-y-auto px-4 sm:px-6 py-6"
             >
               <div className="space-y-4">
+                {olderCursor && (
+                  <div className="flex justify-center">
+                    <button
+                      type="button"
+                      onClick={loadOlder}
+                      disabled={loadingOlder}
+                      className="text-xs font-medium px-3 py-1.5 rounded-full border border-gray-200 bg-white text-gray-600 hover:bg-gray-50 disabled:opacity-50"
+                    >
+                      {loadingOlder ? "Loading…" : "Load older messages"}
+                    </button>
+                  </div>
+                )}
                 {messages.map((msg, idx) => (
                   <ChatMessage key={idx} sender={msg.sender} text={msg.text} />
                 ))}
@@ -1,4 +1,4 @@
-import React, { useCallback, useEffect, useMemo, useState } from 'react';
+import React, { useCallback, useEffect, useMemo, useRef, useState } from 'react';
 import api from '../utils/api';
 
 const TAB = {
@@ -7,6 +7,10 @@ const TAB = {
   RESOLVED: 'resolved',
 };
 
+const POLL_INTERVAL_MS = 5000; // only while the event stream is unavailable
+const STREAM_RETRY_MS = 30000;
+const ACCEPTED_VISIBLE_MS = 60000; // same window the server uses for "recently accepted" rows
+
 const toNumberOrNull = (v) => {
   if (v === null || v === undefined) return null;
   const n = typeof v === 'number' ? v : Number(v);
@@ -43,6 +47,44 @@ const isSameDay = (a, b) => {
   );
 };
 
+const byNewest = (rows) =>
+  [...rows].sort((a, b) => (toDateOrNull(b.created_at)?.getTime() || 0) - (toDateOrNull(a.created_at)?.getTime() || 0));
+
+// Follow /hospital/emergency/stream over Server-Sent Events. fetch() rather than
+// EventSource so the hospital token goes in the Authorization header.
+// Calls onEvent(type, data) per event; resolves when the server ends the stream.
+const readSosStream = async (radiusKm, signal, onEvent) => {
+  const res = await fetch(
+    `${api.defaults.baseURL}/hospital/emergency/stream?radius_km=${encodeURIComponent(radiusKm)}`,
+    {
+      headers: { Authorization: `Bearer ${localStorage.getItem('hospitalToken')}` },
+      signal,
+    }
+  );
+  if (!res.ok || !res.body) {
+    throw new Error(`stream failed (${res.status})`);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) return;
+    buffer += decoder.decode(value, { stream: true });
+    let sep;
+    while ((sep = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      // Heartbeats (": ping") and the "retry:" hint carry no event.
+      const event = (block.match(/^event: (.*)$/m) || [])[1];
+      if (event) {
+        onEvent(event, JSON.parse((block.match(/^data: (.*)$/m) || [])[1] || '{}'));
+      }
+    }
+  }
+};
+
 const HospitalEmergencySOS = () => {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
@@ -57,6 +99,10 @@ const HospitalEmergencySOS = () => {
   const [busyId, setBusyId] = useState(null);
   const [lastUpdatedAt, setLastUpdatedAt] = useState(null);
   const [search, setSearch] = useState('');
+  const [streamFailed, setStreamFailed] = useState(false);
+
+  const currentHospitalIdRef = useRef(null);
+  const acceptedTimersRef = useRef([]);
 
   const hospitalInfo = useMemo(() => {
     try {
@@ -76,6 +122,7 @@ const HospitalEmergencySOS = () => {
       setPending(Array.isArray(res.data?.pending) ? res.data.pending : []);
       setAssigned(Array.isArray(res.data?.assigned) ? res.data.assigned : []);
       setCurrentHospitalId(toNumberOrNull(res.data?.hospital_id));
+      currentHospitalIdRef.current = toNumberOrNull(res.data?.hospital_id);
       setLastUpdatedAt(new Date());
     } catch (e) {
       const msg = e?.response?.data?.error || e?.message || 'Failed to fetch emergency requests';
@@ -89,13 +136,93 @@ const HospitalEmergencySOS = () => {
     refresh();
   }, [refresh]);
 
+  // Apply one stream event to the lists fetched by refresh().
+  const applyEvent = useCallback(
+    (type, data) => {
+      setLastUpdatedAt(new Date());
+      if (type === 'sos.snapshot') {
+        const requests = Array.isArray(data.requests) ? data.requests : [];
+        const ids = new Set(requests.map((r) => r.id));
+        // The snapshot only has pending requests; keep other hospitals' recently accepted cards.
+        setPending((prev) => byNewest([...requests, ...prev.filter((r) => r.status === 'acknowledged' && !ids.has(r.id))]));
+        setLoading(false);
+      } else if (type === 'sos.created' && data.request) {
+        setPending((prev) => byNewest([data.request, ...prev.filter((r) => r.id !== data.request.id)]));
+      } else if (type === 'sos.accepted') {
+        const hospitalId = toNumberOrNull(data.hospital_id);
+        if (hospitalId != null && hospitalId === currentHospitalIdRef.current) {
+          // Accepted by this hospital (here or in another tab): it moves to the assigned list.
+          setPending((prev) => prev.filter((r) => r.id !== data.request_id));
+          refresh();
+          return;
+        }
+        setPending((prev) =>
+          prev.map((r) =>
+            r.id === data.request_id
+              ? { ...r, status: 'acknowledged', hospital_id: hospitalId, accepted_hospital_name: data.hospital_name }
+              : r
+          )
+        );
+        acceptedTimersRef.current.push(
+          setTimeout(() => setPending((prev) => prev.filter((r) => r.id !== data.request_id)), ACCEPTED_VISIBLE_MS)
+        );
+      } else if (type === 'sos.resolved') {
+        setPending((prev) => prev.filter((r) => r.id !== data.request_id));
+        setAssigned((prev) =>
+          prev.map((r) =>
+            r.id === data.request_id ? { ...r, status: 'resolved', resolved_at: new Date().toISOString() } : r
+          )
+        );
+      }
+    },
+    [refresh]
+  );
+
   useEffect(() => {
     if (!autoRefresh) return undefined;
+    const controller = new AbortController();
+    let retryTimer = null;
+
+    const connect = async () => {
+      let received = false;
+      try {
+        await readSosStream(radiusKm, controller.signal, (type, data) => {
+          if (!received) {
+            received = true;
+            setStreamFailed(false);
+          }
+          applyEvent(type, data);
+        });
+        if (!received) throw new Error('stream closed without a snapshot');
+        // The server closes streams after a while; reconnect for a fresh snapshot.
+        if (!controller.signal.aborted) connect();
+      } catch (e) {
+        if (controller.signal.aborted) return;
+        setStreamFailed(true);
+        retryTimer = setTimeout(connect, STREAM_RETRY_MS);
+      }
+    };
+    connect();
+
+    return () => {
+      controller.abort();
+      clearTimeout(retryTimer);
+    };
+  }, [autoRefresh, radiusKm, applyEvent]);
+
+  // Polling is only the fallback while the stream can't be opened.
+  useEffect(() => {
+    if (!autoRefresh || !streamFailed) return undefined;
     const timer = setInterval(() => {
       refresh();
-    }, 5000);
+    }, POLL_INTERVAL_MS);
     return () => clearInterval(timer);
-  }, [autoRefresh, refresh]);
+  }, [autoRefresh, streamFailed, refresh]);
+
+  useEffect(() => {
+    const timers = acceptedTimersRef.current;
+    return () => timers.forEach(clearTimeout);
+  }, []);
 
   const acceptRequest = async (id) => {
     try {
@@ -237,7 +364,8 @@ const HospitalEmergencySOS = () => {
         <div>
           <h2 className="text-2xl font-bold text-gray-900">Emergency SOS</h2>
           <p className="text-gray-600 mt-1">
-            Nearby SOS alerts are shown in real time (auto-refresh every 5 seconds).
+            Nearby SOS alerts are shown in real time
+            {autoRefresh && streamFailed ? ' (live updates unavailable, refreshing every 5 seconds).' : '.'}
           </p>
           {hospitalInfo?.name ? (
             <p className="text-xs text-gray-500 mt-1">Signed in as: {hospitalInfo.name}</p>
@@ -351,7 +479,7 @@ const HospitalEmergencySOS = () => {
             checked={autoRefresh}
             onChange={(e) => setAutoRefresh(e.target.checked)}
           />
-          Auto refresh
+          Live updates
         </label>
       </div>
 
@@ -405,7 +533,7 @@ const HospitalEmergencySOS = () => {
         <div className="p-6 bg-gray-50 border border-gray-200 rounded-xl text-gray-700">
           No SOS requests found for this view.
           {activeTab === TAB.PENDING ? (
-            <div className="text-xs text-gray-500 mt-2">Try increasing radius or keep auto-refresh enabled.</div>
+            <div className="text-xs text-gray-500 mt-2">Try increasing radius or keep live updates enabled.</div>
           ) : null}
         </div>
       ) : (
@@ -14,6 +14,9 @@ import api from "../utils/api";
 import ConfirmationModal from "../components/ConfirmationModal";
 import BackToDashboardButton from "../components/BackToDashboardButton";
 
+const JOB_DONE_STATUSES = ["succeeded", "failed", "rejected", "cancelled"];
+const JOB_POLL_INTERVAL_MS = 1500;
+
 function MedicalReports() {
   const [file, setFile] = useState(null);
   const [previewUrl, setPreviewUrl] = useState("");
@@ -34,6 +37,7 @@ function MedicalReports() {
 
   const [copied, setCopied] = useState(false);
   const copiedTimerRef = useRef(null);
+  const activeJobRef = useRef(null);
 
   useEffect(() => {
     return () => {
@@ -41,6 +45,11 @@ function MedicalReports() {
         clearTimeout(copiedTimerRef.current);
         copiedTimerRef.current = null;
       }
+      // Leaving the page cancels an in-flight report job (frees OCR workers).
+      if (activeJobRef.current) {
+        api.post(`/reports/jobs/${activeJobRef.current}/cancel`).catch(() => {});
+        activeJobRef.current = null;
+      }
     };
   }, []);
 
@@ -230,12 +239,30 @@ function MedicalReports() {
       const form = new FormData();
       form.append("file", file);
 
-      const res = await api.post("/reports/simplify", form);
-      const extracted = (res.data?.text || "").toString();
+      // Processing runs as a background job; poll its status until it finishes.
+      let job = (await api.post("/reports/jobs", form)).data;
+      activeJobRef.current = job?.job_id ?? null;
+      while (!JOB_DONE_STATUSES.includes(job?.status)) {
+        if (activeJobRef.current !== job.job_id) return; // unmounted
+        const ocrDone = (job?.stages || []).some(
+          (stage) => stage.name === "ocr" && stage.status === "done"
+        );
+        setOcrLoading(!ocrDone);
+        await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+        if (activeJobRef.current !== job.job_id) return; // unmounted
+        job = (await api.get(`/reports/jobs/${job.job_id}`)).data;
+      }
+      activeJobRef.current = null;
+      if (job.status !== "succeeded") {
+        throw new Error(job.error || "Simplify failed");
+      }
+
+      const result = job.result || {};
+      const extracted = (result.text || "").toString();
       const conf =
-        typeof res.data?.confidence === "number" ? res.data.confidence : null;
-      const explanation = (res.data?.explanation || "").toString();
-      const reportId = res.data?.report_id;
+        typeof result.confidence === "number" ? result.confidence : null;
+      const explanation = (result.explanation || "").toString();
+      const reportId = result.report_id;
 
       setOcrText(extracted);
       setConfidence(conf);